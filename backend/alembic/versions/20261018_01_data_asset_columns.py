@@ -0,0 +1,46 @@
+"""新增数据资产字段表
+
+Revision ID: 20261018_01
+Revises:
+Create Date: 2026-10-18 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '20261018_01'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# data_assets.data_level 已创建的枚举类型
+DATA_LEVEL = postgresql.ENUM(name="datalevel", create_type=False)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # 通过 init_db.py（create_all）建库时表可能已存在
+    if sa.inspect(bind).has_table("data_asset_columns"):
+        return
+    op.create_table(
+        "data_asset_columns",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("asset_id", sa.Integer(), sa.ForeignKey("data_assets.id", ondelete="CASCADE"), nullable=False, comment="资产ID"),
+        sa.Column("column_name", sa.String(200), nullable=False, comment="字段名"),
+        sa.Column("data_type", sa.String(100), comment="字段类型"),
+        sa.Column("ordinal_position", sa.Integer(), comment="字段序号"),
+        sa.Column("is_nullable", sa.Boolean(), comment="是否可空"),
+        sa.Column("data_level", DATA_LEVEL, comment="字段识别出的数据级别"),
+        sa.Column("matched_tags", sa.String(500), comment="命中的敏感标签编码（逗号分隔）"),
+        sa.UniqueConstraint("asset_id", "column_name", name="uq_asset_column"),
+    )
+    op.create_index("ix_data_asset_columns_asset_id", "data_asset_columns", ["asset_id"])
+    # 字段元数据由下一次元数据扫描写入，不做回填
+
+
+def downgrade() -> None:
+    op.drop_index("ix_data_asset_columns_asset_id", table_name="data_asset_columns")
+    op.drop_table("data_asset_columns")
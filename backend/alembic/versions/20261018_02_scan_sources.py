@@ -0,0 +1,45 @@
+"""新增扫描数据源表
+
+Revision ID: 20261018_02
+Revises: 20261018_01
+Create Date: 2026-10-18 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261018_02'
+down_revision = '20261018_01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # 通过 init_db.py（create_all）建库时表可能已存在
+    if sa.inspect(bind).has_table("scan_sources"):
+        return
+    op.create_table(
+        "scan_sources",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("source_name", sa.String(100), nullable=False, unique=True, comment="数据源名称（写入资产来源系统）"),
+        sa.Column("connection_url", sa.String(500), nullable=False, comment="数据库连接URL"),
+        sa.Column("schemas", sa.String(1000), comment="限定扫描的Schema（逗号分隔，为空则扫描全部）"),
+        sa.Column("max_concurrency", sa.Integer(), comment="单数据源最大并发连接数"),
+        sa.Column("timeout_seconds", sa.Integer(), comment="单数据源扫描超时（秒）"),
+        sa.Column("is_active", sa.Boolean(), comment="是否启用"),
+        sa.Column("last_scan_time", sa.DateTime(timezone=True), comment="最后扫描时间"),
+        sa.Column("last_scan_status", sa.String(20), comment="最后扫描状态：成功/部分失败/失败/超时"),
+        sa.Column("last_scan_count", sa.Integer(), comment="最后一次新增资产数"),
+        sa.Column("last_error", sa.Text(), comment="最后一次错误信息"),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+    )
+    op.create_index("ix_scan_sources_id", "scan_sources", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_scan_sources_id", table_name="scan_sources")
+    op.drop_table("scan_sources")
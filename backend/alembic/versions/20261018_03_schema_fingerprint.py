@@ -0,0 +1,32 @@
+"""数据资产新增表结构指纹字段（增量扫描）
+
+Revision ID: 20261018_03
+Revises: 20261018_02
+Create Date: 2026-10-18 11:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261018_03'
+down_revision = '20261018_02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # 通过 init_db.py（create_all）建库时字段可能已存在
+    existing = {column["name"] for column in sa.inspect(bind).get_columns("data_assets")}
+    if "schema_fingerprint" not in existing:
+        op.add_column(
+            "data_assets",
+            sa.Column("schema_fingerprint", sa.String(64), comment="表结构指纹（字段数:md5(字段名:类型)），用于增量扫描")
+        )
+    # 指纹为空的资产在下一次扫描时按结构变化处理并写入指纹，不做回填
+
+
+def downgrade() -> None:
+    op.drop_column("data_assets", "schema_fingerprint")
@@ -0,0 +1,57 @@
+"""数据资产记录数改为 BIGINT，新增内容剖析时间及字段抽样结果
+
+Revision ID: 20261018_04
+Revises: 20261018_03
+Create Date: 2026-10-18 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261018_04'
+down_revision = '20261018_03'
+branch_labels = None
+depends_on = None
+
+COLUMN_SAMPLE_COLUMNS = [
+    sa.Column("sample_size", sa.Integer(), comment="抽样非空值数量"),
+    sa.Column("sample_hit_ratio", sa.Float(), comment="抽样值命中率（各值级规则中最高）"),
+    sa.Column("sample_rules", sa.String(200), comment="抽样命中的值级规则（逗号分隔）"),
+]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    # 通过 init_db.py（create_all）建库时字段可能已存在
+    asset_columns = {column["name"]: column for column in inspector.get_columns("data_assets")}
+    if "last_profile_time" not in asset_columns:
+        op.add_column(
+            "data_assets",
+            sa.Column("last_profile_time", sa.DateTime(timezone=True), comment="最后内容剖析时间")
+        )
+    # 大表的估算记录数可能超过 INTEGER 范围
+    if not isinstance(asset_columns["record_count"]["type"], sa.BigInteger):
+        with op.batch_alter_table("data_assets") as batch_op:
+            batch_op.alter_column(
+                "record_count", type_=sa.BigInteger(), existing_type=sa.Integer(),
+                existing_comment="记录数（估算）"
+            )
+
+    existing = {column["name"] for column in inspector.get_columns("data_asset_columns")}
+    for column in COLUMN_SAMPLE_COLUMNS:
+        if column.name not in existing:
+            op.add_column("data_asset_columns", column)
+
+
+def downgrade() -> None:
+    for column in reversed(COLUMN_SAMPLE_COLUMNS):
+        op.drop_column("data_asset_columns", column.name)
+    with op.batch_alter_table("data_assets") as batch_op:
+        batch_op.alter_column(
+            "record_count", type_=sa.Integer(), existing_type=sa.BigInteger(),
+            existing_comment="记录数（估算）"
+        )
+    op.drop_column("data_assets", "last_profile_time")
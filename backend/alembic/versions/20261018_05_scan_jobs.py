@@ -0,0 +1,47 @@
+"""新增扫描任务表
+
+Revision ID: 20261018_05
+Revises: 20261018_04
+Create Date: 2026-10-18 13:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261018_05'
+down_revision = '20261018_04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # 通过 init_db.py（create_all）建库时表可能已存在
+    if sa.inspect(bind).has_table("scan_jobs"):
+        return
+    op.create_table(
+        "scan_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("trigger_type", sa.String(20), nullable=False, comment="触发方式：定时/手动"),
+        sa.Column("status", sa.String(20), nullable=False, comment="任务状态：排队中/运行中/成功/部分失败/失败/已跳过"),
+        sa.Column("source_ids", sa.String(1000), comment="扫描的数据源ID（逗号分隔，为空则扫描全部启用的数据源）"),
+        sa.Column("scanned_count", sa.Integer(), comment="新增资产数"),
+        sa.Column("summary", sa.Text(), comment="扫描结果摘要（JSON）"),
+        sa.Column("error", sa.Text(), comment="错误信息"),
+        sa.Column("created_by", sa.Integer(), sa.ForeignKey("users.id"), comment="发起人ID（定时任务为空）"),
+        sa.Column("started_at", sa.DateTime(timezone=True), comment="开始时间"),
+        sa.Column("finished_at", sa.DateTime(timezone=True), comment="结束时间"),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_scan_jobs_id", "scan_jobs", ["id"])
+    op.create_index("ix_scan_jobs_status", "scan_jobs", ["status"])
+    op.create_index("ix_scan_jobs_created_at", "scan_jobs", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_scan_jobs_created_at", table_name="scan_jobs")
+    op.drop_index("ix_scan_jobs_status", table_name="scan_jobs")
+    op.drop_index("ix_scan_jobs_id", table_name="scan_jobs")
+    op.drop_table("scan_jobs")
@@ -0,0 +1,84 @@
+"""新增资产血缘边表并从 upstream_assets/downstream_assets JSON 字段回填
+
+Revision ID: 20261018_06
+Revises: 20261018_05
+Create Date: 2026-10-18 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import json
+
+
+# revision identifiers, used by Alembic.
+revision = '20261018_06'
+down_revision = '20261018_05'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def _parse_asset_ids(raw) -> list:
+    """解析JSON数组形式的资产ID"""
+    try:
+        asset_ids = json.loads(raw) if raw else []
+    except (json.JSONDecodeError, TypeError):
+        return []
+    return [i for i in asset_ids if isinstance(i, int)] if isinstance(asset_ids, list) else []
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # 通过 init_db.py（create_all）建库时表可能已存在
+    if not sa.inspect(bind).has_table("asset_lineage"):
+        op.create_table(
+            "asset_lineage",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("source_asset_id", sa.Integer(), sa.ForeignKey("data_assets.id", ondelete="CASCADE"), nullable=False, comment="上游资产ID"),
+            sa.Column("target_asset_id", sa.Integer(), sa.ForeignKey("data_assets.id", ondelete="CASCADE"), nullable=False, comment="下游资产ID"),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.UniqueConstraint("source_asset_id", "target_asset_id", name="uq_asset_lineage_edge"),
+        )
+        op.create_index("ix_asset_lineage_target_source", "asset_lineage", ["target_asset_id", "source_asset_id"])
+    
+    # 回填：分批读取旧版 JSON 血缘字段，跳过自环、已删除的资产和已存在的边（与 init_lineage.py 的导入规则一致）
+    assets = sa.table(
+        "data_assets",
+        sa.column("id", sa.Integer), sa.column("upstream_assets", sa.Text), sa.column("downstream_assets", sa.Text)
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(assets.c.id, assets.c.upstream_assets, assets.c.downstream_assets)
+            .where(assets.c.id > last_id)
+            .order_by(assets.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        edges = set()
+        for row in rows:
+            for related_id in _parse_asset_ids(row.upstream_assets):
+                if related_id != row.id:
+                    edges.add((related_id, row.id))
+            for related_id in _parse_asset_ids(row.downstream_assets):
+                if related_id != row.id:
+                    edges.add((row.id, related_id))
+        if edges:
+            bind.execute(
+                sa.text(
+                    "INSERT INTO asset_lineage (source_asset_id, target_asset_id) "
+                    "SELECT :source_id, :target_id "
+                    "WHERE EXISTS (SELECT 1 FROM data_assets WHERE id = :source_id) "
+                    "AND EXISTS (SELECT 1 FROM data_assets WHERE id = :target_id) "
+                    "ON CONFLICT DO NOTHING"
+                ),
+                [{"source_id": source_id, "target_id": target_id} for source_id, target_id in sorted(edges)]
+            )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_asset_lineage_target_source", table_name="asset_lineage")
+    op.drop_table("asset_lineage")
@@ -0,0 +1,69 @@
+"""数据资产新增有效数据级别（沿血缘取上游最高级别）
+
+Revision ID: 20261018_07
+Revises: 20261018_06
+Create Date: 2026-10-18 15:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '20261018_07'
+down_revision = '20261018_06'
+branch_labels = None
+depends_on = None
+
+# data_assets.data_level 已创建的枚举类型
+DATA_LEVEL = postgresql.ENUM(name="datalevel", create_type=False)
+
+# 与 classification_engine.DATA_LEVEL_RANK 一致（枚举按名称存储）
+LEVEL_RANK = {"PUBLIC": 0, "INTERNAL": 1, "PERSONAL": 2, "SENSITIVE": 3, "IMPORTANT": 4, "CORE": 5}
+
+
+def _rank(column: str) -> str:
+    """级别序号表达式"""
+    cases = " ".join(f"WHEN '{name}' THEN {rank}" for name, rank in LEVEL_RANK.items())
+    return f"(CASE {column} {cases} ELSE 0 END)"
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    # 通过 init_db.py（create_all）建库时字段可能已存在
+    existing = {column["name"] for column in inspector.get_columns("data_assets")}
+    if "effective_level" not in existing:
+        op.add_column(
+            "data_assets",
+            sa.Column("effective_level", DATA_LEVEL, comment="有效数据级别（自身及全部上游资产的最高级别）")
+        )
+    indexes = {index["name"] for index in inspector.get_indexes("data_assets")}
+    if "ix_data_assets_effective_level" not in indexes:
+        op.create_index("ix_data_assets_effective_level", "data_assets", ["effective_level"])
+    
+    # 回填：先取自身级别，再沿血缘边逐层取上游最高级别直至不再变化（每轮至少推进一层）
+    op.execute(sa.text("UPDATE data_assets SET effective_level = data_level WHERE effective_level IS NULL"))
+    upstream = (
+        "FROM asset_lineage l JOIN data_assets s ON s.id = l.source_asset_id "
+        "WHERE l.target_asset_id = data_assets.id"
+    )
+    propagate = sa.text(f"""
+        UPDATE data_assets SET effective_level = (
+            SELECT s.effective_level {upstream}
+            ORDER BY {_rank('s.effective_level')} DESC
+            LIMIT 1
+        )
+        WHERE EXISTS (
+            SELECT 1 {upstream}
+            AND {_rank('s.effective_level')} > {_rank('data_assets.effective_level')}
+        )
+    """)
+    while bind.execute(propagate).rowcount:
+        pass
+
+
+def downgrade() -> None:
+    op.drop_index("ix_data_assets_effective_level", table_name="data_assets")
+    op.drop_column("data_assets", "effective_level")
@@ -0,0 +1,85 @@
+"""数据资产新增检索分词文本及全文检索、三元组索引
+
+Revision ID: 20261018_08
+Revises: 20261018_07
+Create Date: 2026-10-18 16:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.utils.text_search import build_search_text
+
+
+# revision identifiers, used by Alembic.
+revision = '20261018_08'
+down_revision = '20261018_07'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+# 与 DataAsset.__table_args__ 中的索引定义一致（ASSET_SEARCH_VECTOR 与索引表达式一致才能走索引）
+SEARCH_VECTOR = "to_tsvector('simple'::regconfig, coalesce(search_text, ''))"
+TRGM_INDEXES = {"ix_data_assets_name_trgm": "asset_name", "ix_data_assets_code_trgm": "asset_code"}
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    # 通过 init_db.py（create_all）建库时字段可能已存在
+    existing = {column["name"] for column in inspector.get_columns("data_assets")}
+    if "search_text" not in existing:
+        op.add_column(
+            "data_assets",
+            sa.Column("search_text", sa.Text(), comment="检索分词文本（名称、编码、描述分词，中文按二元组切分）")
+        )
+    
+    # 回填：分批按名称、编码、描述生成分词文本（与 DataAssetService.rebuild_search_index 一致）
+    assets = sa.table(
+        "data_assets",
+        sa.column("id", sa.Integer), sa.column("asset_name", sa.String), sa.column("asset_code", sa.String),
+        sa.column("description", sa.Text), sa.column("search_text", sa.Text)
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(assets.c.id, assets.c.asset_name, assets.c.asset_code, assets.c.description)
+            .where(assets.c.id > last_id)
+            .order_by(assets.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        bind.execute(
+            assets.update().where(assets.c.id == sa.bindparam("asset_id")).values(search_text=sa.bindparam("text")),
+            [
+                {"asset_id": row.id, "text": build_search_text(row.asset_name, row.asset_code, row.description)}
+                for row in rows
+            ]
+        )
+    
+    # 检索索引仅用于 PostgreSQL，其他数据库的检索退化为 ILIKE
+    if bind.dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    indexes = {index["name"] for index in inspector.get_indexes("data_assets")}
+    if "ix_data_assets_search_vector" not in indexes:
+        op.create_index(
+            "ix_data_assets_search_vector", "data_assets", [sa.text(SEARCH_VECTOR)], postgresql_using="gin"
+        )
+    for name, column in TRGM_INDEXES.items():
+        if name not in indexes:
+            op.create_index(
+                name, "data_assets", [column], postgresql_using="gin", postgresql_ops={column: "gin_trgm_ops"}
+            )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        for name in TRGM_INDEXES:
+            op.drop_index(name, table_name="data_assets")
+        op.drop_index("ix_data_assets_search_vector", table_name="data_assets")
+    # pg_trgm 扩展可能被其他对象使用，不随降级删除
+    op.drop_column("data_assets", "search_text")
@@ -0,0 +1,56 @@
+"""新增批量任务表
+
+Revision ID: 20261018_09
+Revises: 20261018_08
+Create Date: 2026-10-18 17:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261018_09'
+down_revision = '20261018_08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # 通过 init_db.py（create_all）建库时表可能已存在
+    if sa.inspect(bind).has_table("batch_jobs"):
+        return
+    op.create_table(
+        "batch_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("job_type", sa.String(50), nullable=False, comment="任务类型"),
+        sa.Column("status", sa.String(20), nullable=False, comment="任务状态：排队中/运行中/成功/部分失败/失败/已取消"),
+        sa.Column("params", sa.Text(), comment="任务参数（JSON）"),
+        sa.Column("item_ids", sa.Text(), nullable=False, comment="待处理ID（JSON数组）"),
+        sa.Column("total_count", sa.Integer(), comment="待处理总数"),
+        sa.Column("processed_count", sa.Integer(), comment="已处理数"),
+        sa.Column("success_count", sa.Integer(), comment="成功数"),
+        sa.Column("error_count", sa.Integer(), comment="失败数"),
+        sa.Column("next_offset", sa.Integer(), comment="下一批起始位置"),
+        sa.Column("errors", sa.Text(), comment="错误信息（JSON数组，超出上限截断）"),
+        sa.Column("cancel_requested", sa.Boolean(), comment="是否已请求取消"),
+        sa.Column("created_by", sa.Integer(), sa.ForeignKey("users.id"), comment="发起人ID"),
+        sa.Column("started_at", sa.DateTime(timezone=True), comment="开始时间"),
+        sa.Column("heartbeat_at", sa.DateTime(timezone=True), comment="执行心跳时间（超时未更新视为执行进程已退出）"),
+        sa.Column("runner_token", sa.String(32), comment="当前执行者标识（抢占任务时生成，进度只由持有者写入）"),
+        sa.Column("finished_at", sa.DateTime(timezone=True), comment="结束时间"),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_batch_jobs_id", "batch_jobs", ["id"])
+    op.create_index("ix_batch_jobs_job_type", "batch_jobs", ["job_type"])
+    op.create_index("ix_batch_jobs_status", "batch_jobs", ["status"])
+    op.create_index("ix_batch_jobs_created_at", "batch_jobs", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_batch_jobs_created_at", table_name="batch_jobs")
+    op.drop_index("ix_batch_jobs_status", table_name="batch_jobs")
+    op.drop_index("ix_batch_jobs_job_type", table_name="batch_jobs")
+    op.drop_index("ix_batch_jobs_id", table_name="batch_jobs")
+    op.drop_table("batch_jobs")
@@ -0,0 +1,78 @@
+"""新增审批-数据资产关联表并从 data_assets JSON 字段回填
+
+Revision ID: 20261019_01
+Revises: 20261018_09
+Create Date: 2026-10-19 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import json
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_01'
+down_revision = '20261018_09'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def _parse_asset_ids(raw) -> list:
+    """解析JSON数组形式的资产ID"""
+    try:
+        asset_ids = json.loads(raw) if raw else []
+    except (json.JSONDecodeError, TypeError):
+        return []
+    return [i for i in asset_ids if isinstance(i, int)] if isinstance(asset_ids, list) else []
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # 通过 init_db.py（create_all）建库时关联表可能已存在
+    if not sa.inspect(bind).has_table("approval_asset"):
+        op.create_table(
+            "approval_asset",
+            sa.Column("approval_id", sa.Integer(), nullable=False, comment="审批ID"),
+            sa.Column("asset_id", sa.Integer(), nullable=False, comment="资产ID"),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()")),
+            sa.ForeignKeyConstraint(["approval_id"], ["transfer_approvals.id"], ondelete="CASCADE"),
+            sa.ForeignKeyConstraint(["asset_id"], ["data_assets.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("approval_id", "asset_id"),
+        )
+        op.create_index("ix_approval_asset_asset_approval", "approval_asset", ["asset_id", "approval_id"])
+    
+    # 回填：分批读取审批的 data_assets，跳过已删除的资产和已存在的关联
+    approvals = sa.table("transfer_approvals", sa.column("id", sa.Integer), sa.column("data_assets", sa.Text))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(approvals.c.id, approvals.c.data_assets)
+            .where(approvals.c.id > last_id)
+            .order_by(approvals.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        pairs = [
+            {"approval_id": row.id, "asset_id": asset_id}
+            for row in rows
+            for asset_id in dict.fromkeys(_parse_asset_ids(row.data_assets))
+        ]
+        if pairs:
+            bind.execute(
+                sa.text(
+                    "INSERT INTO approval_asset (approval_id, asset_id) "
+                    "SELECT :approval_id, :asset_id "
+                    "WHERE EXISTS (SELECT 1 FROM data_assets WHERE id = :asset_id) "
+                    "ON CONFLICT DO NOTHING"
+                ),
+                pairs
+            )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_approval_asset_asset_approval", table_name="approval_asset")
+    op.drop_table("approval_asset")
@@ -0,0 +1,64 @@
+"""传输审批新增工作队列字段（风险评分、排队序号、领取租约）
+
+Revision ID: 20261019_02
+Revises: 20261019_01
+Create Date: 2026-10-19 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_02'
+down_revision = '20261019_01'
+branch_labels = None
+depends_on = None
+
+# 与 APPROVAL_QUEUE_AGING_POINTS_PER_HOUR 默认值一致，调整配置后可调用 /approvals/queue/rebuild 重算
+AGING_POINTS_PER_HOUR = 1.0
+
+COLUMNS = [
+    sa.Column("risk_score", sa.Numeric(5, 2), comment="风险评分（100 - 场景最近一次评估的综合评分，越高风险越大）"),
+    sa.Column("queue_rank", sa.Float(), comment="排队序号（越小越优先，综合风险评分与等待时长）"),
+    sa.Column("claimed_by", sa.Integer(), sa.ForeignKey("users.id"), comment="领取人ID"),
+    sa.Column("claimed_at", sa.DateTime(timezone=True), comment="领取时间"),
+    sa.Column("lease_expires_at", sa.DateTime(timezone=True), comment="领取租约到期时间（到期后可被他人领取）"),
+]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # 通过 init_db.py（create_all）建库时字段可能已存在
+    existing = {column["name"] for column in sa.inspect(bind).get_columns("transfer_approvals")}
+    for column in COLUMNS:
+        if column.name not in existing:
+            op.add_column("transfer_approvals", column)
+
+    indexes = {index["name"] for index in sa.inspect(bind).get_indexes("transfer_approvals")}
+    if "ix_transfer_approvals_queue" not in indexes:
+        op.create_index("ix_transfer_approvals_queue", "transfer_approvals", ["approval_status", "queue_rank"])
+
+    # 待审批申请按场景最近一次风险评估回填风险评分和排队序号
+    op.execute(sa.text("""
+        UPDATE transfer_approvals ta
+        SET risk_score = (
+            SELECT 100 - ra.overall_score FROM risk_assessments ra
+            WHERE ra.scenario_id = ta.scenario_id AND ra.overall_score IS NOT NULL
+            ORDER BY ra.created_at DESC, ra.id DESC
+            LIMIT 1
+        )
+        WHERE ta.approval_status = 'PENDING'
+    """))
+    op.execute(sa.text(f"""
+        UPDATE transfer_approvals
+        SET queue_rank = EXTRACT(EPOCH FROM COALESCE(created_at, now())) / 3600 * {AGING_POINTS_PER_HOUR}
+            - COALESCE(risk_score, 0)
+        WHERE approval_status = 'PENDING'
+    """))
+
+
+def downgrade() -> None:
+    op.drop_index("ix_transfer_approvals_queue", table_name="transfer_approvals")
+    for column in reversed(COLUMNS):
+        op.drop_column("transfer_approvals", column.name)
@@ -0,0 +1,40 @@
+"""审批新增已过期状态及到期扫描索引
+
+Revision ID: 20261019_03
+Revises: 20261019_02
+Create Date: 2026-10-19 16:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_03'
+down_revision = '20261019_02'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_cross_border_scenarios_status_expiry", "cross_border_scenarios", ["status", "expiry_date"]),
+    ("ix_transfer_approvals_status_created", "transfer_approvals", ["approval_status", "created_at"]),
+    ("ix_transfer_approvals_status_end", "transfer_approvals", ["approval_status", "transfer_end_time"]),
+]
+
+
+def upgrade() -> None:
+    # 枚举新增取值不能与使用该取值的语句处于同一事务
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE approvalstatus ADD VALUE IF NOT EXISTS 'EXPIRED'")
+
+    bind = op.get_bind()
+    for name, table, columns in INDEXES:
+        # 通过 init_db.py（create_all）建库时索引可能已存在
+        if name not in {index["name"] for index in sa.inspect(bind).get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    # PostgreSQL 不支持删除枚举取值，仅删除索引
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,29 @@
+"""审计日志操作用户允许为空（系统自动操作）
+
+Revision ID: 20261019_04
+Revises: 20261019_03
+Create Date: 2026-10-19 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_04'
+down_revision = '20261019_03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.alter_column(
+        "audit_logs", "user_id",
+        existing_type=sa.Integer(), nullable=True,
+        comment="操作用户ID（系统自动操作时可为空）"
+    )
+
+
+def downgrade() -> None:
+    # 系统自动操作的日志没有操作用户，恢复非空约束前需先清理或补全
+    op.alter_column("audit_logs", "user_id", existing_type=sa.Integer(), nullable=False)
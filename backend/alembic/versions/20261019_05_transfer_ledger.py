@@ -0,0 +1,73 @@
+"""新增跨境传输台账表和累计量表
+
+Revision ID: 20261019_05
+Revises: 20261019_04
+Create Date: 2026-10-19 20:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_05'
+down_revision = '20261019_04'
+branch_labels = None
+depends_on = None
+
+# data_assets.data_level 已创建的枚举类型
+DATA_CATEGORY = postgresql.ENUM(name="datalevel", create_type=False)
+
+KEY_COLUMNS = ["recipient_name", "destination_country", "year", "data_category"]
+
+
+def _key_columns() -> list:
+    """累计维度字段"""
+    return [
+        sa.Column("recipient_name", sa.String(200), nullable=False, comment="接收方名称"),
+        sa.Column("destination_country", sa.String(100), nullable=False, comment="目的国"),
+        sa.Column("year", sa.Integer(), nullable=False, comment="传输年度"),
+        sa.Column("data_category", DATA_CATEGORY, nullable=False, comment="数据类别"),
+    ]
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # 通过 init_db.py（create_all）建库时表可能已存在
+    if not sa.inspect(bind).has_table("transfer_ledger"):
+        op.create_table(
+            "transfer_ledger",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("audit_log_id", sa.Integer(), sa.ForeignKey("audit_logs.id"), nullable=False, comment="传输审计日志ID"),
+            sa.Column("approval_id", sa.Integer(), sa.ForeignKey("transfer_approvals.id"), comment="审批ID"),
+            sa.Column("scenario_id", sa.Integer(), sa.ForeignKey("cross_border_scenarios.id"), comment="场景ID"),
+            *_key_columns(),
+            sa.Column("volume", sa.Numeric(20, 0), nullable=False, comment="传输数据量"),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()")),
+        )
+        op.create_index("ix_transfer_ledger_audit_log_id", "transfer_ledger", ["audit_log_id"])
+        op.create_index("ix_transfer_ledger_approval_id", "transfer_ledger", ["approval_id"])
+        op.create_index("ix_transfer_ledger_scenario_id", "transfer_ledger", ["scenario_id"])
+        op.create_index("ix_transfer_ledger_key", "transfer_ledger", KEY_COLUMNS)
+
+    if not sa.inspect(bind).has_table("transfer_volume_totals"):
+        op.create_table(
+            "transfer_volume_totals",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            *_key_columns(),
+            sa.Column("total_volume", sa.Numeric(20, 0), nullable=False, server_default="0", comment="累计传输数据量"),
+            sa.Column("transfer_count", sa.Integer(), nullable=False, server_default="0", comment="累计传输次数"),
+            sa.Column("last_transfer_at", sa.DateTime(timezone=True), comment="最近一次传输时间"),
+            sa.UniqueConstraint(*KEY_COLUMNS, name="uq_transfer_volume_totals_key"),
+        )
+    # 此前没有写入传输审计日志的代码路径，且历史日志不含接收方和数据类别，不做回填
+
+
+def downgrade() -> None:
+    op.drop_table("transfer_volume_totals")
+    op.drop_index("ix_transfer_ledger_key", table_name="transfer_ledger")
+    op.drop_index("ix_transfer_ledger_scenario_id", table_name="transfer_ledger")
+    op.drop_index("ix_transfer_ledger_approval_id", table_name="transfer_ledger")
+    op.drop_index("ix_transfer_ledger_audit_log_id", table_name="transfer_ledger")
+    op.drop_table("transfer_ledger")
@@ -3,13 +3,14 @@ API v1 路由
 作者：张彦龙
 """
 from fastapi import APIRouter
-from app.api.v1.endpoints import data_assets, scenarios, risk_assessments, approvals, audit, users, dashboard, auth, roles, export, batch, interception, notifications, system_config
+from app.api.v1.endpoints import data_assets, scenarios, risk_assessments, approvals, audit, users, dashboard, auth, roles, export, batch, interception, notifications, system_config, scans
 
 api_router = APIRouter()
 
 # 注册各个模块的路由
 api_router.include_router(auth.router, prefix="/auth", tags=["认证"])
 api_router.include_router(data_assets.router, prefix="/data-assets", tags=["数据资产"])
+api_router.include_router(scans.router, prefix="/scans", tags=["数据扫描"])
 api_router.include_router(scenarios.router, prefix="/scenarios", tags=["跨境场景"])
 api_router.include_router(risk_assessments.router, prefix="/risk-assessments", tags=["风险评估"])
 api_router.include_router(approvals.router, prefix="/approvals", tags=["传输审批"])
@@ -2,61 +2,133 @@
 传输审批API端点
 作者：张彦龙
 """
-import json
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.core.database import get_db
 from app.schemas.approval import (
     TransferApprovalCreate, TransferApprovalUpdate,
-    TransferApprovalResponse
+    TransferApprovalResponse, ApprovalClaimRequest, ApprovalLeaseRequest
 )
 from app.services.approval_service import ApprovalService
+from app.services.expiry_service import ExpiryService
+from app.services.auto_approval_service import AutoApprovalService
+from app.services.interception_service import parse_asset_ids
+from app.utils.query_count import COUNT_NONE, COUNT_STRATEGY_PATTERN, set_count_headers
 
 router = APIRouter()
 
 
+def _to_response(approval) -> TransferApprovalResponse:
+    """构建审批响应（涉及资产取自 approval_asset 关联表，未迁移的旧记录回退解析JSON字段）"""
+    return TransferApprovalResponse(
+        id=approval.id,
+        scenario_id=approval.scenario_id,
+        approval_status=approval.approval_status,
+        applicant_id=approval.applicant_id,
+        approver_id=approval.approver_id,
+        transfer_type=approval.transfer_type,
+        transfer_start_time=approval.transfer_start_time,
+        transfer_end_time=approval.transfer_end_time,
+        actual_volume=approval.actual_volume,
+        approval_comment=approval.approval_comment,
+        approved_at=approval.approved_at,
+        rejected_reason=approval.rejected_reason,
+        risk_score=approval.risk_score,
+        claimed_by=approval.claimed_by,
+        lease_expires_at=approval.lease_expires_at,
+        created_at=approval.created_at,
+        updated_at=approval.updated_at,
+        data_assets=approval.asset_ids or parse_asset_ids(approval.data_assets)
+    )
+
+
 @router.get("/", response_model=List[TransferApprovalResponse])
 async def list_approvals(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     scenario_id: Optional[int] = None,
     status: Optional[str] = None,
+    asset_id: Optional[int] = Query(None, description="按涉及的数据资产筛选"),
+    count: str = Query(
+        COUNT_NONE, pattern=COUNT_STRATEGY_PATTERN,
+        description="总数统计方式（结果通过 X-Total-Count / X-Count-Strategy 响应头返回）"
+    ),
     db: Session = Depends(get_db)
 ):
     """获取传输审批列表"""
     service = ApprovalService(db)
-    approvals = service.list_approvals(skip=skip, limit=limit, scenario_id=scenario_id, status=status)
-    # 转换data_assets从JSON字符串到列表
-    result = []
-    for approval in approvals:
-        # 先手动构建字典，转换data_assets
-        approval_dict = {
-            "id": approval.id,
-            "scenario_id": approval.scenario_id,
-            "approval_status": approval.approval_status,
-            "applicant_id": approval.applicant_id,
-            "approver_id": approval.approver_id,
-            "transfer_type": approval.transfer_type,
-            "transfer_start_time": approval.transfer_start_time,
-            "transfer_end_time": approval.transfer_end_time,
-            "actual_volume": approval.actual_volume,
-            "approval_comment": approval.approval_comment,
-            "approved_at": approval.approved_at,
-            "rejected_reason": approval.rejected_reason,
-            "created_at": approval.created_at,
-            "updated_at": approval.updated_at,
-        }
-        # 处理data_assets字段
-        if approval.data_assets:
-            try:
-                approval_dict["data_assets"] = json.loads(approval.data_assets)
-            except (json.JSONDecodeError, TypeError):
-                approval_dict["data_assets"] = []
-        else:
-            approval_dict["data_assets"] = []
-        result.append(TransferApprovalResponse(**approval_dict))
-    return result
+    approvals = service.list_approvals(
+        skip=skip, limit=limit, scenario_id=scenario_id, status=status, asset_id=asset_id
+    )
+    total, count_strategy = service.count_approvals(
+        scenario_id=scenario_id, status=status, count=count, asset_id=asset_id
+    )
+    set_count_headers(response, total, count_strategy)
+    return [_to_response(approval) for approval in approvals]
+
+
+@router.post("/queue/claim", response_model=List[TransferApprovalResponse])
+async def claim_approvals(request: ApprovalClaimRequest, db: Session = Depends(get_db)):
+    """领取下一批待审批申请（按风险评分与等待时长排序，并发领取互不重复）"""
+    service = ApprovalService(db)
+    try:
+        approvals = service.claim_next(request.approver_id, request.limit, request.lease_seconds)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return [_to_response(approval) for approval in approvals]
+
+
+@router.get("/queue/mine", response_model=List[TransferApprovalResponse])
+async def list_my_claims(approver_id: int, db: Session = Depends(get_db)):
+    """获取审批人当前持有的待审批申请"""
+    service = ApprovalService(db)
+    return [_to_response(approval) for approval in service.list_my_claims(approver_id)]
+
+
+@router.post("/queue/renew")
+async def renew_claims(
+    request: ApprovalLeaseRequest,
+    lease_seconds: Optional[int] = Query(None, ge=60),
+    db: Session = Depends(get_db)
+):
+    """续租审批人持有的申请"""
+    service = ApprovalService(db)
+    renewed = service.renew_claims(request.approver_id, request.approval_ids, lease_seconds)
+    return {"renewed_ids": renewed}
+
+
+@router.post("/queue/release")
+async def release_claims(request: ApprovalLeaseRequest, db: Session = Depends(get_db)):
+    """释放审批人持有的申请，使其回到队列"""
+    service = ApprovalService(db)
+    released = service.release_claims(request.approver_id, request.approval_ids)
+    return {"released_ids": released}
+
+
+@router.post("/queue/rebuild")
+async def rebuild_queue_ranks(db: Session = Depends(get_db)):
+    """按最新风险评估重算待审批申请的排队序号"""
+    service = ApprovalService(db)
+    return {"updated_count": service.rebuild_queue_ranks()}
+
+
+@router.post("/auto-approve/run")
+async def run_auto_approval(
+    scenario_id: Optional[int] = None,
+    dry_run: bool = Query(False, description="只返回判定结果，不执行批准"),
+    db: Session = Depends(get_db)
+):
+    """按自动审批规则评估待审批申请（可限定场景）"""
+    service = AutoApprovalService(db)
+    return service.run(scenario_ids=[scenario_id] if scenario_id else None, dry_run=dry_run)
+
+
+@router.post("/expiry/sweep")
+async def sweep_expired(db: Session = Depends(get_db)):
+    """立即执行一轮到期扫描（审批超时、传输有效期结束、场景到期）"""
+    return ExpiryService(db).sweep()
 
 
 @router.get("/{approval_id}", response_model=TransferApprovalResponse)
@@ -66,32 +138,7 @@ async def get_approval(approval_id: int, db: Session = Depends(get_db)):
     approval = service.get_approval(approval_id)
     if not approval:
         raise HTTPException(status_code=404, detail="审批记录不存在")
-    # 手动构建字典，转换data_assets
-    approval_dict = {
-        "id": approval.id,
-        "scenario_id": approval.scenario_id,
-        "approval_status": approval.approval_status,
-        "applicant_id": approval.applicant_id,
-        "approver_id": approval.approver_id,
-        "transfer_type": approval.transfer_type,
-        "transfer_start_time": approval.transfer_start_time,
-        "transfer_end_time": approval.transfer_end_time,
-        "actual_volume": approval.actual_volume,
-        "approval_comment": approval.approval_comment,
-        "approved_at": approval.approved_at,
-        "rejected_reason": approval.rejected_reason,
-        "created_at": approval.created_at,
-        "updated_at": approval.updated_at,
-    }
-    # 处理data_assets字段
-    if approval.data_assets:
-        try:
-            approval_dict["data_assets"] = json.loads(approval.data_assets)
-        except (json.JSONDecodeError, TypeError):
-            approval_dict["data_assets"] = []
-    else:
-        approval_dict["data_assets"] = []
-    return TransferApprovalResponse(**approval_dict)
+    return _to_response(approval)
 
 
 @router.post("/", response_model=TransferApprovalResponse)
@@ -101,33 +148,14 @@ async def create_approval(
 ):
     """创建传输审批申请"""
     service = ApprovalService(db)
-    created = service.create_approval(approval)
-    # 手动构建字典，转换data_assets
-    approval_dict = {
-        "id": created.id,
-        "scenario_id": created.scenario_id,
-        "approval_status": created.approval_status,
-        "applicant_id": created.applicant_id,
-        "approver_id": created.approver_id,
-        "transfer_type": created.transfer_type,
-        "transfer_start_time": created.transfer_start_time,
-        "transfer_end_time": created.transfer_end_time,
-        "actual_volume": created.actual_volume,
-        "approval_comment": created.approval_comment,
-        "approved_at": created.approved_at,
-        "rejected_reason": created.rejected_reason,
-        "created_at": created.created_at,
-        "updated_at": created.updated_at,
-    }
-    # 处理data_assets字段
-    if created.data_assets:
-        try:
-            approval_dict["data_assets"] = json.loads(created.data_assets)
-        except (json.JSONDecodeError, TypeError):
-            approval_dict["data_assets"] = []
-    else:
-        approval_dict["data_assets"] = []
-    return TransferApprovalResponse(**approval_dict)
+    try:
+        created = service.create_approval(approval)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # 场景已有评估结果时，新申请提交即按自动审批规则判定
+    if AutoApprovalService(db).run(approval_ids=[created.id])["approved_ids"]:
+        db.refresh(created)
+    return _to_response(created)
 
 
 @router.post("/{approval_id}/approve", response_model=TransferApprovalResponse)
@@ -139,35 +167,13 @@ async def approve_transfer(
 ):
     """批准传输"""
     service = ApprovalService(db)
-    approval = service.approve_transfer(approval_id, approver_id, comment)
+    try:
+        approval = service.approve_transfer(approval_id, approver_id, comment)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not approval:
         raise HTTPException(status_code=404, detail="审批记录不存在")
-    # 手动构建字典，转换data_assets
-    approval_dict = {
-        "id": approval.id,
-        "scenario_id": approval.scenario_id,
-        "approval_status": approval.approval_status,
-        "applicant_id": approval.applicant_id,
-        "approver_id": approval.approver_id,
-        "transfer_type": approval.transfer_type,
-        "transfer_start_time": approval.transfer_start_time,
-        "transfer_end_time": approval.transfer_end_time,
-        "actual_volume": approval.actual_volume,
-        "approval_comment": approval.approval_comment,
-        "approved_at": approval.approved_at,
-        "rejected_reason": approval.rejected_reason,
-        "created_at": approval.created_at,
-        "updated_at": approval.updated_at,
-    }
-    # 处理data_assets字段
-    if approval.data_assets:
-        try:
-            approval_dict["data_assets"] = json.loads(approval.data_assets)
-        except (json.JSONDecodeError, TypeError):
-            approval_dict["data_assets"] = []
-    else:
-        approval_dict["data_assets"] = []
-    return TransferApprovalResponse(**approval_dict)
+    return _to_response(approval)
 
 
 @router.post("/{approval_id}/reject", response_model=TransferApprovalResponse)
@@ -179,33 +185,11 @@ async def reject_transfer(
 ):
     """拒绝传输"""
     service = ApprovalService(db)
-    approval = service.reject_transfer(approval_id, approver_id, reason)
+    try:
+        approval = service.reject_transfer(approval_id, approver_id, reason)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not approval:
         raise HTTPException(status_code=404, detail="审批记录不存在")
-    # 手动构建字典，转换data_assets
-    approval_dict = {
-        "id": approval.id,
-        "scenario_id": approval.scenario_id,
-        "approval_status": approval.approval_status,
-        "applicant_id": approval.applicant_id,
-        "approver_id": approval.approver_id,
-        "transfer_type": approval.transfer_type,
-        "transfer_start_time": approval.transfer_start_time,
-        "transfer_end_time": approval.transfer_end_time,
-        "actual_volume": approval.actual_volume,
-        "approval_comment": approval.approval_comment,
-        "approved_at": approval.approved_at,
-        "rejected_reason": approval.rejected_reason,
-        "created_at": approval.created_at,
-        "updated_at": approval.updated_at,
-    }
-    # 处理data_assets字段
-    if approval.data_assets:
-        try:
-            approval_dict["data_assets"] = json.loads(approval.data_assets)
-        except (json.JSONDecodeError, TypeError):
-            approval_dict["data_assets"] = []
-    else:
-        approval_dict["data_assets"] = []
-    return TransferApprovalResponse(**approval_dict)
+    return _to_response(approval)
 
@@ -9,6 +9,7 @@ from datetime import datetime
 from app.core.database import get_db
 from app.schemas.audit import AuditLogResponse
 from app.services.audit_service import AuditService
+from app.core.permissions import require_permission
 
 router = APIRouter()
 
@@ -56,3 +57,15 @@ async def list_anomalies(
     service = AuditService(db)
     return service.list_anomalies(skip=skip, limit=limit)
 
+
+@router.post("/anomalies/replay", response_model=dict)
+async def replay_anomalies(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    dry_run: bool = True,
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(require_permission("audit:write"))
+):
+    """按批回放历史审计日志重新检测异常（dry_run 时只返回统计，不写回标记）"""
+    service = AuditService(db)
+    return service.replay_anomalies(start_date=start_date, end_date=end_date, dry_run=dry_run)
@@ -2,13 +2,15 @@
 批量操作API端点
 作者：张彦龙
 """
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.core.database import get_db
 from app.services.scenario_service import ScenarioService
 from app.services.approval_service import ApprovalService
 from app.services.data_asset_service import DataAssetService
+from app.services.batch_job_service import BatchJobService
+from app.schemas.batch_job import BatchJobCreate, BatchJobResponse, BatchJobProgress, BatchJobListResponse
 
 router = APIRouter()
 
@@ -22,25 +24,10 @@ async def batch_approve_scenarios(
 ):
     """批量批准场景"""
     service = ScenarioService(db)
-    results = []
-    errors = []
-    
-    for scenario_id in scenario_ids:
-        try:
-            scenario = service.approve_scenario(scenario_id, approver_id, comment)
-            if scenario:
-                results.append(scenario_id)
-            else:
-                errors.append(f"场景 {scenario_id} 不存在或状态不允许")
-        except Exception as e:
-            errors.append(f"场景 {scenario_id}: {str(e)}")
-    
-    return {
-        "success_count": len(results),
-        "error_count": len(errors),
-        "success_ids": results,
-        "errors": errors
-    }
+    try:
+        return service.batch_approve(scenario_ids, approver_id, comment)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post("/scenarios/reject")
@@ -52,25 +39,10 @@ async def batch_reject_scenarios(
 ):
     """批量拒绝场景"""
     service = ScenarioService(db)
-    results = []
-    errors = []
-    
-    for scenario_id in scenario_ids:
-        try:
-            scenario = service.reject_scenario(scenario_id, approver_id, reason)
-            if scenario:
-                results.append(scenario_id)
-            else:
-                errors.append(f"场景 {scenario_id} 不存在或状态不允许")
-        except Exception as e:
-            errors.append(f"场景 {scenario_id}: {str(e)}")
-    
-    return {
-        "success_count": len(results),
-        "error_count": len(errors),
-        "success_ids": results,
-        "errors": errors
-    }
+    try:
+        return service.batch_reject(scenario_ids, approver_id, reason)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post("/approvals/approve")
@@ -82,25 +54,10 @@ async def batch_approve_transfers(
 ):
     """批量批准传输"""
     service = ApprovalService(db)
-    results = []
-    errors = []
-    
-    for approval_id in approval_ids:
-        try:
-            approval = service.approve_transfer(approval_id, approver_id, comment)
-            if approval:
-                results.append(approval_id)
-            else:
-                errors.append(f"审批 {approval_id} 不存在或状态不允许")
-        except Exception as e:
-            errors.append(f"审批 {approval_id}: {str(e)}")
-    
-    return {
-        "success_count": len(results),
-        "error_count": len(errors),
-        "success_ids": results,
-        "errors": errors
-    }
+    try:
+        return service.batch_approve(approval_ids, approver_id, comment)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post("/approvals/reject")
@@ -112,25 +69,10 @@ async def batch_reject_transfers(
 ):
     """批量拒绝传输"""
     service = ApprovalService(db)
-    results = []
-    errors = []
-    
-    for approval_id in approval_ids:
-        try:
-            approval = service.reject_transfer(approval_id, approver_id, reason)
-            if approval:
-                results.append(approval_id)
-            else:
-                errors.append(f"审批 {approval_id} 不存在或状态不允许")
-        except Exception as e:
-            errors.append(f"审批 {approval_id}: {str(e)}")
-    
-    return {
-        "success_count": len(results),
-        "error_count": len(errors),
-        "success_ids": results,
-        "errors": errors
-    }
+    try:
+        return service.batch_reject(approval_ids, approver_id, reason)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.delete("/data-assets")
@@ -138,27 +80,77 @@ async def batch_delete_assets(
     asset_ids: List[int] = Body(...),
     db: Session = Depends(get_db)
 ):
-    """批量删除数据资产"""
+    """批量删除数据资产（级联删除字段、标签、血缘和审批关联，被审批引用的资产不删除）"""
     service = DataAssetService(db)
-    results = []
-    errors = []
-    
-    for asset_id in asset_ids:
-        try:
-            asset = service.get_asset(asset_id)
-            if asset:
-                # 这里需要添加删除方法
-                # service.delete_asset(asset_id)
-                results.append(asset_id)
-            else:
-                errors.append(f"资产 {asset_id} 不存在")
-        except Exception as e:
-            errors.append(f"资产 {asset_id}: {str(e)}")
-    
-    return {
-        "success_count": len(results),
-        "error_count": len(errors),
-        "success_ids": results,
-        "errors": errors
-    }
+    return service.delete_assets(asset_ids)
 
+
+# ========== 后台批量任务 ==========
+@router.post("/jobs", response_model=BatchJobResponse)
+async def create_batch_job(job: BatchJobCreate, db: Session = Depends(get_db)):
+    """提交后台批量任务（立即返回任务，通过任务状态和进度接口查询执行情况）"""
+    service = BatchJobService(db)
+    try:
+        return service.create_job(job.job_type, job.item_ids, job.params, created_by=job.created_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/jobs", response_model=BatchJobListResponse)
+async def list_batch_jobs(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=200),
+    status: Optional[str] = None,
+    job_type: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """获取批量任务列表"""
+    service = BatchJobService(db)
+    jobs, total = service.list_jobs(skip=skip, limit=limit, status=status, job_type=job_type)
+    return BatchJobListResponse(items=jobs, total=total)
+
+
+@router.get("/jobs/{job_id}", response_model=BatchJobResponse)
+async def get_batch_job(job_id: int, db: Session = Depends(get_db)):
+    """获取批量任务状态"""
+    service = BatchJobService(db)
+    job = service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="批量任务不存在")
+    return job
+
+
+@router.get("/jobs/{job_id}/progress", response_model=BatchJobProgress)
+async def get_batch_job_progress(job_id: int, db: Session = Depends(get_db)):
+    """获取批量任务进度"""
+    service = BatchJobService(db)
+    job = service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="批量任务不存在")
+    return job
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=BatchJobResponse)
+async def cancel_batch_job(job_id: int, db: Session = Depends(get_db)):
+    """取消批量任务（运行中的任务在当前批次完成后停止）"""
+    service = BatchJobService(db)
+    try:
+        job = service.cancel_job(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not job:
+        raise HTTPException(status_code=404, detail="批量任务不存在")
+    return job
+
+
+@router.post("/jobs/{job_id}/resume", response_model=BatchJobResponse)
+async def resume_batch_job(job_id: int, db: Session = Depends(get_db)):
+    """继续执行已取消或失败的批量任务"""
+    service = BatchJobService(db)
+    try:
+        job = service.resume_job(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not job:
+        raise HTTPException(status_code=404, detail="批量任务不存在")
+    return job
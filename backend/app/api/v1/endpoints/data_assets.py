@@ -10,12 +10,14 @@ from pydantic import BaseModel
 from app.core.database import get_db
 from app.models.data_asset import DataAsset, DataClassification, SensitiveTag
 from app.schemas.data_asset import (
-    DataAssetCreate, DataAssetUpdate, DataAssetResponse,
+    DataAssetCreate, DataAssetUpdate, DataAssetResponse, DataAssetColumnResponse,
     DataClassificationCreate, DataClassificationResponse,
     SensitiveTagCreate, SensitiveTagResponse,
-    LineageGraph
+    LineageGraph, LineageUpdate, ImpactAnalysis, LineagePath
 )
 from app.services.data_asset_service import DataAssetService
+from app.services.impact_service import ImpactService
+from app.utils.query_count import COUNT_EXACT, COUNT_STRATEGY_PATTERN
 
 router = APIRouter()
 
@@ -23,9 +25,10 @@ router = APIRouter()
 class DataAssetListResponse(BaseModel):
     """数据资产列表响应（包含总数）"""
     items: List[DataAssetResponse]
-    total: int
+    total: Optional[int] = None
     skip: int
     limit: int
+    count_strategy: str = COUNT_EXACT
 
 
 @router.get("/", response_model=DataAssetListResponse)
@@ -40,12 +43,16 @@ async def list_data_assets(
     is_active: Optional[bool] = None,
     created_from: Optional[datetime] = Query(None, description="创建时间起始"),
     created_to: Optional[datetime] = Query(None, description="创建时间结束"),
-    search: Optional[str] = Query(None, description="通用搜索（名称、编码、描述）"),
+    search: Optional[str] = Query(None, description="通用搜索（名称、编码、描述，按相关度排序）"),
+    count: str = Query(
+        COUNT_EXACT, pattern=COUNT_STRATEGY_PATTERN,
+        description="总数统计方式：exact精确，estimate执行计划估算，cached短时缓存，none不统计"
+    ),
     db: Session = Depends(get_db)
 ):
     """获取数据资产列表（支持高级搜索）"""
     service = DataAssetService(db)
-    assets, total = service.list_assets(
+    assets, total, count_strategy = service.list_assets(
         skip=skip,
         limit=limit,
         data_level=data_level,
@@ -56,9 +63,12 @@ async def list_data_assets(
         is_active=is_active,
         created_from=created_from,
         created_to=created_to,
-        search=search
+        search=search,
+        count=count
+    )
+    return DataAssetListResponse(
+        items=assets, total=total, skip=skip, limit=limit, count_strategy=count_strategy
     )
-    return DataAssetListResponse(items=assets, total=total, skip=skip, limit=limit)
 
 
 @router.get("/{asset_id}", response_model=DataAssetResponse)
@@ -89,14 +99,30 @@ async def update_data_asset(asset_id: int, asset: DataAssetUpdate, db: Session =
 
 
 @router.post("/scan", response_model=dict)
-async def scan_data_assets(
+def scan_data_assets(
     source_system: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """扫描数据资产（元数据扫描和自动打标）"""
     service = DataAssetService(db)
     result = service.scan_and_classify(source_system)
-    return {"message": "扫描完成", "scanned_count": result.get("count", 0)}
+    return {"message": "扫描完成", "scanned_count": result.get("count", 0), **result}
+
+
+@router.post("/effective-levels/recompute", response_model=dict)
+def recompute_effective_levels(db: Session = Depends(get_db)):
+    """全量重算资产有效级别（沿血缘取上游最高级别）"""
+    service = DataAssetService(db)
+    result = service.recompute_effective_levels()
+    return {"message": "有效级别已重算", **result}
+
+
+@router.post("/search-index/rebuild", response_model=dict)
+def rebuild_search_index(db: Session = Depends(get_db)):
+    """重建资产检索分词文本"""
+    service = DataAssetService(db)
+    updated_count = service.rebuild_search_index()
+    return {"message": "检索索引已重建", "updated_count": updated_count}
 
 
 @router.get("/classifications/", response_model=List[DataClassificationResponse])
@@ -130,16 +156,68 @@ async def create_sensitive_tag(tag: SensitiveTagCreate, db: Session = Depends(ge
     return service.create_tag(tag)
 
 
+@router.get("/{asset_id}/columns", response_model=List[DataAssetColumnResponse])
+async def list_asset_columns(asset_id: int, db: Session = Depends(get_db)):
+    """获取数据资产的字段及敏感识别结果"""
+    service = DataAssetService(db)
+    if not service.get_asset(asset_id):
+        raise HTTPException(status_code=404, detail="数据资产不存在")
+    return service.list_columns(asset_id)
+
+
 @router.get("/{asset_id}/lineage", response_model=LineageGraph)
 async def get_asset_lineage(
     asset_id: int,
     depth: int = Query(2, ge=1, le=5, description="血缘关系深度"),
+    max_nodes: Optional[int] = Query(None, ge=1, le=5000, description="最多返回的节点数"),
     db: Session = Depends(get_db)
 ):
     """获取数据资产的血缘关系图"""
     service = DataAssetService(db)
     try:
-        return service.get_lineage_graph(asset_id, depth)
+        return service.get_lineage_graph(asset_id, depth, max_nodes=max_nodes)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.put("/{asset_id}/lineage", response_model=LineageGraph)
+async def update_asset_lineage(
+    asset_id: int,
+    lineage: LineageUpdate,
+    db: Session = Depends(get_db)
+):
+    """设置数据资产的直接上下游"""
+    service = DataAssetService(db)
+    try:
+        return service.set_lineage(asset_id, lineage.upstream_ids, lineage.downstream_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/{asset_id}/impact", response_model=ImpactAnalysis)
+async def analyze_asset_impact(
+    asset_id: int,
+    max_depth: Optional[int] = Query(None, ge=1, description="最大下游层数，为空则分析全部传递下游"),
+    limit: int = Query(1000, ge=1, le=10000, description="最多返回的下游资产数"),
+    db: Session = Depends(get_db)
+):
+    """影响分析：传递下游资产及涉及这些资产的已批准审批和场景"""
+    service = ImpactService(db)
+    try:
+        return service.analyze(asset_id, max_depth=max_depth, limit=limit)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+
+@router.get("/{asset_id}/lineage/path", response_model=LineagePath)
+async def get_lineage_path(
+    asset_id: int,
+    target_id: int = Query(..., description="目标资产ID"),
+    db: Session = Depends(get_db)
+):
+    """查找两个资产之间沿下游方向的最短血缘路径"""
+    service = ImpactService(db)
+    try:
+        return service.find_path(asset_id, target_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
@@ -5,12 +5,17 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from datetime import datetime
 from app.core.database import get_db
 from app.schemas.interception import (
     WhitelistEntry, BlacklistEntry, InterceptionCheckRequest,
-    InterceptionCheckResponse, DesensitizationRequest, DesensitizationResponse
+    InterceptionCheckResponse, DesensitizationRequest, DesensitizationResponse,
+    TransferRequest, TransferResponse
 )
 from app.services.interception_service import InterceptionService
+from app.services.transfer_ledger_service import (
+    TransferLedgerService, TRANSFER_SUCCEEDED, TRANSFER_INTERCEPTED, TRANSFER_RATE_LIMITED
+)
 from app.services.approval_service import ApprovalService
 from app.services.data_asset_service import DataAssetService
 from app.core.permissions import require_permission
@@ -34,6 +39,86 @@ async def check_interception(
     return InterceptionCheckResponse(**result)
 
 
+@router.post("/transfer", response_model=TransferResponse)
+async def record_transfer(
+    request: TransferRequest,
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(require_permission("interception:write"))
+):
+    """检查拦截并记录跨境传输（成功的传输计入接收方年度累计出境量）"""
+    approval = ApprovalService(db).get_approval(request.approval_id)
+    if not approval:
+        raise HTTPException(status_code=404, detail="审批不存在")
+    
+    service = InterceptionService(db)
+    result = service.check_interception(
+        approval_id=request.approval_id,
+        asset_ids=request.asset_ids,
+        data=request.data or {},
+        volumes=request.volumes
+    )
+    if result["allowed"]:
+        transfer_status = TRANSFER_SUCCEEDED
+    else:
+        transfer_status = TRANSFER_RATE_LIMITED if result["rate_limited"] else TRANSFER_INTERCEPTED
+    ledger = TransferLedgerService(db)
+    try:
+        db_log = ledger.record_transfer(
+            request.approval_id,
+            request.volumes,
+            user_id=current_user_id,
+            transfer_status=transfer_status,
+            operation_details={"asset_ids": request.asset_ids, "reason": result["reason"]},
+            # 黑名单、审批范围和累计量检查都通过后才扣减传输频率额度
+            rate_check=lambda: service.acquire_rate(request.approval_id)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if transfer_status == TRANSFER_SUCCEEDED and db_log.transfer_status != TRANSFER_SUCCEEDED:
+        # 记录时锁定累计量复核超过阈值（并发传输已先计入）或传输频率额度不足，改为拦截
+        result.update(
+            allowed=False,
+            intercepted=True,
+            rate_limited=db_log.transfer_status == TRANSFER_RATE_LIMITED,
+            reason=db_log.operation_details["reason"],
+            desensitized_data=None
+        )
+    
+    return TransferResponse(
+        **result,
+        audit_log_id=db_log.id,
+        cumulative_exposure=ledger.cumulative_exposure(approval.scenario)
+    )
+
+
+@router.get("/exposure", response_model=dict)
+async def get_cumulative_exposure(
+    recipient_name: str,
+    destination_country: str,
+    year: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(require_permission("interception:read"))
+):
+    """查询接收方在目的国的年度累计出境量（按数据类别）"""
+    totals = TransferLedgerService(db).get_totals(recipient_name, destination_country, year)
+    return {
+        "recipient_name": recipient_name,
+        "destination_country": destination_country,
+        "year": year or datetime.now().year,
+        "by_category": {category.value: volume for category, volume in totals.items()}
+    }
+
+
+@router.post("/ledger/rebuild", response_model=dict)
+async def rebuild_transfer_totals(
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(require_permission("interception:write"))
+):
+    """按台账明细重建累计出境量"""
+    count = TransferLedgerService(db).rebuild_totals()
+    return {"message": "累计出境量已重建", "total_rows": count}
+
+
 @router.get("/whitelist", response_model=List[WhitelistEntry])
 async def get_whitelist(
     db: Session = Depends(get_db),
@@ -41,49 +126,8 @@ async def get_whitelist(
 ):
     """获取白名单列表"""
     service = InterceptionService(db)
-    approval_service = ApprovalService(db)
-    
     # 从已批准的审批中获取白名单
-    approvals = approval_service.list_approvals(
-        skip=0,
-        limit=1000,
-        status="APPROVED"
-    )
-    
-    whitelist_entries = []
-    for approval in approvals:
-        # 所有已批准的审批都应该显示在白名单中
-        # 获取场景信息
-        scenario = None
-        if approval.scenario_id:
-            from app.services.scenario_service import ScenarioService
-            scenario_service = ScenarioService(db)
-            scenario = scenario_service.get_scenario(approval.scenario_id)
-        
-        # 获取资产信息
-        asset_ids = []
-        if approval.data_assets:
-            if isinstance(approval.data_assets, list):
-                asset_ids = approval.data_assets
-            elif isinstance(approval.data_assets, str):
-                import json
-                try:
-                    asset_ids = json.loads(approval.data_assets)
-                except:
-                    asset_ids = []
-        
-        # 使用approved_at或created_at作为添加时间
-        added_at = approval.approved_at if hasattr(approval, 'approved_at') and approval.approved_at else approval.created_at
-        
-        whitelist_entries.append(WhitelistEntry(
-            approval_id=approval.id,
-            scenario_id=scenario.id if scenario else None,
-            scenario_name=scenario.scenario_name if scenario else None,
-            asset_ids=asset_ids,
-            added_at=added_at
-        ))
-    
-    return whitelist_entries
+    return [WhitelistEntry(**entry) for entry in service.list_whitelist_entries(limit=1000)]
 
 
 @router.post("/whitelist/{approval_id}", response_model=dict)
@@ -123,23 +167,18 @@ async def get_blacklist(
 ):
     """获取黑名单列表"""
     service = InterceptionService(db)
-    asset_service = DataAssetService(db)
-    
-    blacklist_entries = []
-    for asset_id in service.blacklist:
-        asset = asset_service.get_asset(asset_id)
-        if asset:
-            from datetime import datetime
-            blacklist_entries.append(BlacklistEntry(
-                asset_id=asset.id,
-                asset_name=asset.asset_name,
-                asset_code=asset.asset_code,
-                data_level=asset.data_level.value if asset.data_level else None,
-                reason="手动添加到黑名单",
-                added_at=datetime.now()  # 使用当前时间作为添加时间
-            ))
-    
-    return blacklist_entries
+    added_at = datetime.now()  # 使用当前时间作为添加时间
+    return [
+        BlacklistEntry(
+            asset_id=asset.id,
+            asset_name=asset.asset_name,
+            asset_code=asset.asset_code,
+            data_level=asset.data_level.value if asset.data_level else None,
+            reason="手动添加到黑名单",
+            added_at=added_at
+        )
+        for asset in service.list_blacklist_assets()
+    ]
 
 
 @router.post("/blacklist/{asset_id}", response_model=dict)
@@ -158,7 +197,14 @@ async def add_to_blacklist(
         raise HTTPException(status_code=404, detail="数据资产不存在")
     
     service.add_to_blacklist(asset_id)
-    return {"message": "已添加到黑名单", "asset_id": asset_id, "reason": reason}
+    # 返回涉及该资产的已批准审批，便于评估影响
+    affected_approval_ids = service.find_approvals_by_assets([asset_id])
+    return {
+        "message": "已添加到黑名单",
+        "asset_id": asset_id,
+        "reason": reason,
+        "affected_approval_ids": affected_approval_ids
+    }
 
 
 @router.delete("/blacklist/{asset_id}", response_model=dict)
@@ -2,20 +2,82 @@
 通知API端点
 作者：张彦龙
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from starlette.websockets import WebSocketState
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from app.core.database import get_db
+import asyncio
+import json
+from app.core.config import settings
+from app.core.database import get_db, SessionLocal
 from app.schemas.notification import (
     NotificationCreate, NotificationUpdate, NotificationResponse, NotificationStats
 )
 from app.models.notification import NotificationType
 from app.services.notification_service import NotificationService
-from app.core.permissions import get_current_user_id, require_permission
+from app.core.permissions import get_current_user_id, require_permission, oauth2_scheme
+from app.utils.notification_broker import notification_broker, EVENT_STATS, EVENT_RESYNC
 
 router = APIRouter()
 
 
+def _authenticate(token: Optional[str]) -> int:
+    """校验推送连接的令牌（独立短会话，长连接期间不占用数据库连接）"""
+    db = SessionLocal()
+    try:
+        return get_current_user_id(token, db)
+    finally:
+        db.close()
+
+
+def _load_stats(user_id: int) -> dict:
+    """查询通知统计快照（独立短会话）"""
+    db = SessionLocal()
+    try:
+        return NotificationService(db).get_stats(user_id).model_dump()
+    finally:
+        db.close()
+
+
+async def _push_events(user_id: int):
+    """推送连接的事件序列：先登记连接再发送统计快照，之后转发新事件，空闲时产生心跳（None）"""
+    subscription = notification_broker.subscribe(user_id)
+    try:
+        yield EVENT_STATS, await asyncio.to_thread(_load_stats, user_id)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.NOTIFICATION_PUSH_MAX_CONNECTION_SECONDS
+        while loop.time() < deadline:
+            item = await subscription.get(settings.NOTIFICATION_PUSH_HEARTBEAT_SECONDS)
+            if item is not None and item[0] == EVENT_RESYNC:
+                # 事件可能已丢失，改发最新统计快照；此前排队的事件已包含在快照中，一并丢弃
+                subscription.clear()
+                item = (EVENT_RESYNC, await asyncio.to_thread(_load_stats, user_id))
+            yield item
+    finally:
+        notification_broker.unsubscribe(subscription)
+
+
+async def _sse_stream(user_id: int):
+    """按 Server-Sent Events 格式输出推送事件"""
+    yield "retry: 3000\n\n"
+    async for item in _push_events(user_id):
+        if item is None:
+            yield ": ping\n\n"
+            continue
+        event, data = item
+        yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _wait_disconnect(websocket: WebSocket):
+    """读取客户端消息直到断开（推送连接不处理客户端消息）"""
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+
+
 @router.get("/", response_model=List[NotificationResponse])
 async def list_notifications(
     skip: int = Query(0, ge=0),
@@ -53,6 +115,48 @@ async def get_notification_stats(
     return service.get_stats(user_id)
 
 
+@router.get("/stream")
+async def stream_notifications(
+    token: Optional[str] = Query(None, description="访问令牌（EventSource 无法设置请求头时使用）"),
+    header_token: Optional[str] = Depends(oauth2_scheme)
+):
+    """通知推送（Server-Sent Events）：连接后先推送统计快照，之后实时推送新通知及统计增量"""
+    user_id = await asyncio.to_thread(_authenticate, header_token or token)
+    return StreamingResponse(
+        _sse_stream(user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/ws")
+async def notifications_websocket(websocket: WebSocket, token: Optional[str] = Query(None)):
+    """通知推送（WebSocket）：消息格式为 {"event": 事件类型, "data": 事件数据}"""
+    try:
+        user_id = await asyncio.to_thread(_authenticate, token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    await websocket.accept()
+    disconnected = asyncio.create_task(_wait_disconnect(websocket))
+    events = _push_events(user_id)
+    try:
+        async for item in events:
+            if disconnected.done():
+                break
+            event, data = item if item is not None else ("ping", {})
+            await websocket.send_json({"event": event, "data": data})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await events.aclose()
+        if not disconnected.done() and websocket.client_state == WebSocketState.CONNECTED:
+            # 达到最长连接时间，由客户端重连
+            await websocket.close()
+        disconnected.cancel()
+
+
 @router.get("/{notification_id}", response_model=NotificationResponse)
 async def get_notification(
     notification_id: int,
@@ -33,6 +33,17 @@ async def list_assessments(
     return result
 
 
+@router.post("/rescore", response_model=dict)
+async def rescore_assessments(
+    dry_run: bool = Query(True, description="只返回变化汇总，不写回"),
+    sample_size: int = Query(20, ge=0, le=1000),
+    db: Session = Depends(get_db)
+):
+    """按当前权重和阈值批量重算全部已完成的风险评估"""
+    service = RiskAssessmentService(db)
+    return service.rescore_all(dry_run=dry_run, sample_size=sample_size)
+
+
 @router.get("/{assessment_id}", response_model=RiskAssessmentResponse)
 async def get_assessment(assessment_id: int, db: Session = Depends(get_db)):
     """获取风险评估详情"""
@@ -0,0 +1,138 @@
+"""
+数据扫描API端点
+作者：张彦龙
+"""
+from fastapi import APIRouter, Depends, HTTPException, Body, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from app.core.database import get_db
+from app.schemas.scan import (
+    ScanSourceCreate, ScanSourceUpdate, ScanSourceResponse, MultiSourceScanResponse,
+    ScanJobResponse, ScanJobListResponse
+)
+from app.services.scan_service import ScanService
+from app.core.permissions import require_permission
+
+router = APIRouter()
+
+
+@router.get("/sources", response_model=List[ScanSourceResponse])
+async def list_scan_sources(
+    is_active: Optional[bool] = None,
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(require_permission("data_asset:read"))
+):
+    """获取扫描数据源列表"""
+    service = ScanService(db)
+    return service.list_sources(is_active=is_active)
+
+
+@router.post("/sources", response_model=ScanSourceResponse)
+async def create_scan_source(
+    source: ScanSourceCreate,
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(require_permission("data_asset:scan"))
+):
+    """登记扫描数据源"""
+    service = ScanService(db)
+    try:
+        return service.create_source(source)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.put("/sources/{source_id}", response_model=ScanSourceResponse)
+async def update_scan_source(
+    source_id: int,
+    source: ScanSourceUpdate,
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(require_permission("data_asset:scan"))
+):
+    """更新扫描数据源"""
+    service = ScanService(db)
+    try:
+        updated = service.update_source(source_id, source)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not updated:
+        raise HTTPException(status_code=404, detail="数据源不存在")
+    return updated
+
+
+@router.delete("/sources/{source_id}", response_model=dict)
+async def delete_scan_source(
+    source_id: int,
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(require_permission("data_asset:scan"))
+):
+    """删除扫描数据源"""
+    service = ScanService(db)
+    if not service.delete_source(source_id):
+        raise HTTPException(status_code=404, detail="数据源不存在")
+    return {"message": "数据源已删除", "source_id": source_id}
+
+
+@router.post("/sources/{source_id}/profile", response_model=dict)
+async def profile_scan_source(
+    source_id: int,
+    resample: bool = Body(False, embed=True),
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(require_permission("data_asset:scan"))
+):
+    """提交数据源内容抽样剖析任务（后台执行；resample 为真时对已剖析的表重新抽样）"""
+    service = ScanService(db)
+    if not service.get_source(source_id):
+        raise HTTPException(status_code=404, detail="数据源不存在")
+    service.submit_profile(source_id, resample=resample)
+    return {"message": "内容剖析任务已提交", "source_id": source_id}
+
+
+@router.post("/run", response_model=MultiSourceScanResponse)
+def run_multi_source_scan(
+    source_ids: Optional[List[int]] = Body(None, embed=True),
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(require_permission("data_asset:scan"))
+):
+    """并发扫描已登记的数据源（不指定则扫描全部启用的数据源）"""
+    service = ScanService(db)
+    return service.scan_sources(source_ids)
+
+
+@router.post("/jobs", response_model=ScanJobResponse)
+async def create_scan_job(
+    source_ids: Optional[List[int]] = Body(None, embed=True),
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(require_permission("data_asset:scan"))
+):
+    """提交后台扫描任务（立即返回任务，通过任务状态接口查询进度）"""
+    service = ScanService(db)
+    return service.create_job(source_ids, created_by=current_user_id)
+
+
+@router.get("/jobs", response_model=ScanJobListResponse)
+async def list_scan_jobs(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=200),
+    status: Optional[str] = None,
+    trigger_type: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(require_permission("data_asset:read"))
+):
+    """获取扫描任务列表"""
+    service = ScanService(db)
+    jobs, total = service.list_jobs(skip=skip, limit=limit, status=status, trigger_type=trigger_type)
+    return ScanJobListResponse(items=jobs, total=total)
+
+
+@router.get("/jobs/{job_id}", response_model=ScanJobResponse)
+async def get_scan_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user_id: int = Depends(require_permission("data_asset:read"))
+):
+    """获取扫描任务状态"""
+    service = ScanService(db)
+    job = service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="扫描任务不存在")
+    return job
@@ -8,9 +8,11 @@ from typing import List, Optional, Dict, Any
 from app.core.database import get_db
 from app.models.system_config import ConfigCategory, ConfigType
 from app.schemas.system_config import (
-    SystemConfigCreate, SystemConfigUpdate, SystemConfigResponse, ConfigValueResponse
+    SystemConfigCreate, SystemConfigUpdate, SystemConfigResponse, ConfigValueResponse,
+    ThresholdSimulationRequest
 )
 from app.services.system_config_service import SystemConfigService
+from app.services.risk_service import RiskAssessmentService
 from app.core.permissions import get_current_user_id, require_permission
 
 router = APIRouter()
@@ -75,6 +77,17 @@ async def get_config_by_key(
     )
 
 
+@router.post("/simulate", response_model=Dict[str, Any])
+async def simulate_thresholds(
+    request: ThresholdSimulationRequest,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(require_permission("config:read"))
+):
+    """模拟阈值与权重变更的影响（评估等级与监管审批翻转、自动审批资格变化），不写入任何数据"""
+    service = RiskAssessmentService(db)
+    return service.simulate_thresholds(request.model_dump(exclude={"sample_size"}), request.sample_size)
+
+
 @router.post("/", response_model=SystemConfigResponse)
 async def create_config(
     config: SystemConfigCreate,
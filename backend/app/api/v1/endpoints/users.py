@@ -2,7 +2,7 @@
 用户管理API端点
 作者：张彦龙
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import exists
 from typing import List
@@ -10,19 +10,27 @@ from app.core.database import get_db
 from app.schemas.user import UserCreate, UserUpdate, UserResponse
 from app.services.user_service import UserService
 from app.models.user import User
+from app.utils.query_count import COUNT_NONE, COUNT_STRATEGY_PATTERN, set_count_headers
 
 router = APIRouter()
 
 
 @router.get("/", response_model=List[UserResponse])
 async def list_users(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    count: str = Query(
+        COUNT_NONE, pattern=COUNT_STRATEGY_PATTERN,
+        description="总数统计方式（结果通过 X-Total-Count / X-Count-Strategy 响应头返回）"
+    ),
     db: Session = Depends(get_db)
 ):
     """获取用户列表"""
     service = UserService(db)
     users = service.list_users(skip=skip, limit=limit)
+    total, count_strategy = service.count_users(count)
+    set_count_headers(response, total, count_strategy)
     # 添加角色信息
     result = []
     for user in users:
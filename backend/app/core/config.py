@@ -37,11 +37,87 @@ class Settings(BaseSettings):
     PERSONAL_INFO_THRESHOLD: int = 1000000  # 100万个人信息
     SENSITIVE_INFO_THRESHOLD: int = 100000   # 10万敏感个人信息
     
+    # 数据扫描配置
+    SCAN_MAX_WORKERS: int = 4  # 同时扫描的数据源数量
+    SCAN_DEFAULT_TIMEOUT_SECONDS: int = 600  # 单数据源默认超时
+    
+    # 内容抽样剖析配置
+    PROFILE_MAX_WORKERS: int = 2  # 后台剖析线程数
+    PROFILE_SAMPLE_ROWS: int = 1000  # 单表抽样行数上限
+    PROFILE_MAX_COLUMNS: int = 50  # 单表抽样字段数上限
+    PROFILE_TIMEOUT_SECONDS: int = 30  # 单表抽样语句超时
+    PROFILE_HIT_RATIO_THRESHOLD: float = 0.3  # 值级规则命中率达到该比例即认定字段敏感
+    
+    # 定时扫描配置（扫描间隔取系统配置 system.data_scan.interval）
+    SCAN_SCHEDULER_ENABLED: bool = True  # 是否在应用进程内启动定时扫描（首次定时扫描在启动后一个扫描间隔加随机延迟执行）
+    SCAN_SCHEDULER_POLL_SECONDS: int = 60  # 检查是否到期的轮询间隔
+    SCAN_SCHEDULE_JITTER_SECONDS: int = 300  # 到期后随机延迟上限，错开多实例
+    SCAN_LOCK_KEY: int = 73020001  # 扫描单飞锁（PostgreSQL advisory lock）键值
+    
+    # 血缘查询配置
+    LINEAGE_MAX_NODES: int = 500  # 单次血缘图最多返回的节点数
+    LINEAGE_MAX_EDGES: int = 2000  # 单次血缘图最多返回的边数
+    LINEAGE_GRAPH_TTL_SECONDS: int = 300  # 内存血缘图全量重载间隔（多进程部署时兜底同步）
+    RISK_SNAPSHOT_RELOAD_SECONDS: int = 3600  # 风险评估内存快照全量重载间隔（其间按更新时间增量刷新）
+    
+    # 列表总数统计配置
+    COUNT_CACHE_TTL_SECONDS: int = 30  # cached 方式下同一筛选条件总数的缓存时间
+    COUNT_CACHE_MAX_ENTRIES: int = 1000  # 总数缓存条目上限
+    COUNT_ESTIMATE_EXACT_BELOW: int = 1000  # 估算行数低于该值时改为精确统计（小结果集估算误差大且精确统计代价低）
+    
+    # 审批工作队列配置
+    APPROVAL_LEASE_SECONDS: int = 900  # 领取租约时长，到期未处理的申请回到队列
+    APPROVAL_CLAIM_MAX: int = 50  # 单次最多领取条数
+    APPROVAL_QUEUE_AGING_POINTS_PER_HOUR: float = 1.0  # 每等待1小时相当于增加的风险评分（防止低风险申请长期排不上）
+    
+    # 到期扫描配置
+    EXPIRY_SWEEPER_ENABLED: bool = True  # 是否启用进程内到期扫描
+    EXPIRY_SWEEP_SECONDS: int = 300  # 扫描间隔
+    EXPIRY_SWEEP_BATCH_SIZE: int = 500  # 每批流转的记录数（每批一个事务）
+    
+    # 审计异常检测配置
+    ANOMALY_DETECTION_ENABLED: bool = True  # 写入审计日志时实时检测异常
+    ANOMALY_WINDOW_SECONDS: int = 3600  # 操作频率滑动窗口
+    ANOMALY_WINDOW_BUCKETS: int = 60  # 滑动窗口分桶数（窗口按桶滑动）
+    ANOMALY_USER_MAX_EVENTS: int = 300  # 单用户窗口内最多操作数
+    ANOMALY_COUNTRY_MAX_TRANSFERS: int = 1000  # 单目的国窗口内最多传输次数
+    ANOMALY_VOLUME_HALF_LIFE_HOURS: float = 168  # 传输量基线（指数衰减均值）的半衰期
+    ANOMALY_VOLUME_SIGMA: float = 3.0  # 传输量超过基线均值多少倍标准差视为异常
+    ANOMALY_MIN_HISTORY: int = 10  # 有效历史样本不足时不判定传输量异常与新目的国
+    ANOMALY_WORK_HOURS_START: int = 8  # 工作时间开始（时，本地时间）
+    ANOMALY_WORK_HOURS_END: int = 20  # 工作时间结束（时，本地时间）
+    ANOMALY_WARMUP_HOURS: int = 168  # 启动时回放最近多少小时的审计日志预热检测状态（0 不预热）
+    ANOMALY_REPLAY_BATCH_SIZE: int = 50000  # 回放历史日志时每批读取条数
+    
+    # 批量任务配置
+    BATCH_JOB_MAX_WORKERS: int = 2  # 后台批量任务线程数
+    BATCH_JOB_CHUNK_SIZE: int = 500  # 每批处理条数（每批一个事务）
+    BATCH_JOB_MAX_ITEMS: int = 100000  # 单个任务最多处理条数
+    BATCH_JOB_MAX_ERRORS: int = 500  # 任务保留的错误信息条数上限
+    BATCH_JOB_STALE_SECONDS: int = 300  # 运行中任务心跳超时后视为执行进程已退出，可被接管续跑
+    BATCH_JOB_HEARTBEAT_SECONDS: int = 30  # 执行期间刷新心跳的间隔（需明显小于心跳超时，批次耗时较长也不会被误接管）
+    BATCH_JOB_WATCH_SECONDS: int = 60  # 检查未完成任务的间隔
+    
     # Redis配置（可选）
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
     
+    # 传输限流配置
+    RATE_LIMIT_BACKEND: str = "memory"  # memory：每个工作进程内存计数；redis：多进程共享计数（Lua 原子判定）
+    RATE_LIMIT_REDIS_PREFIX: str = "datareg:ratelimit:"  # Redis 令牌桶键前缀
+    RATE_LIMIT_REDIS_TIMEOUT: float = 0.05  # Redis 连接与读写超时（秒）
+    RATE_LIMIT_REDIS_RETRY_SECONDS: int = 30  # Redis 不可用后退回内存模式的时长
+    
+    # 通知推送配置
+    NOTIFICATION_PUSH_BACKEND: str = "memory"  # memory：只推送给本进程的连接；redis：经 Redis 发布订阅推送给所有工作进程的连接
+    NOTIFICATION_PUSH_REDIS_CHANNEL: str = "datareg:notifications"  # Redis 发布订阅频道
+    NOTIFICATION_PUSH_REDIS_TIMEOUT: float = 0.2  # Redis 发布的连接与读写超时（秒）
+    NOTIFICATION_PUSH_REDIS_RETRY_SECONDS: int = 30  # Redis 不可用后只推送本进程连接的时长
+    NOTIFICATION_PUSH_QUEUE_SIZE: int = 100  # 单个连接待发送事件上限（积压时丢弃并通知客户端重新同步）
+    NOTIFICATION_PUSH_HEARTBEAT_SECONDS: int = 25  # 连接空闲时的心跳间隔（避免代理断开长连接）
+    NOTIFICATION_PUSH_MAX_CONNECTION_SECONDS: int = 1800  # 单个连接最长保持时间，到期由客户端自动重连（进程退出时不必等待长连接）
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
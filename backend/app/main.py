@@ -2,10 +2,16 @@
 银行重要数据跨境数据管控系统 - 主应用入口
 作者：张彦龙
 """
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api.v1 import api_router
+from app.utils.scan_scheduler import scan_scheduler
+from app.utils.batch_job_watchdog import batch_job_watchdog
+from app.utils.expiry_sweeper import expiry_sweeper
+from app.utils.notification_broker import notification_broker
+from app.services.audit_service import warm_up_anomaly_detector
 
 app = FastAPI(
     title="银行重要数据跨境数据管控系统",
@@ -23,12 +29,70 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Count-Strategy"],
 )
 
 # 注册路由
 app.include_router(api_router, prefix="/api/v1")
 
 
+@app.on_event("startup")
+async def start_scan_scheduler():
+    """启动定时扫描调度"""
+    if settings.SCAN_SCHEDULER_ENABLED:
+        scan_scheduler.start()
+
+
+@app.on_event("shutdown")
+async def stop_scan_scheduler():
+    """停止定时扫描调度"""
+    await scan_scheduler.stop()
+
+
+@app.on_event("startup")
+async def start_batch_job_watchdog():
+    """启动批量任务接管（继续执行重启前未完成的任务）"""
+    batch_job_watchdog.start()
+
+
+@app.on_event("shutdown")
+async def stop_batch_job_watchdog():
+    """停止批量任务接管"""
+    await batch_job_watchdog.stop()
+
+
+@app.on_event("startup")
+async def start_expiry_sweeper():
+    """启动到期扫描（审批超时、场景到期）"""
+    if settings.EXPIRY_SWEEPER_ENABLED:
+        expiry_sweeper.start()
+
+
+@app.on_event("shutdown")
+async def stop_expiry_sweeper():
+    """停止到期扫描"""
+    await expiry_sweeper.stop()
+
+
+@app.on_event("startup")
+async def start_notification_broker():
+    """启动通知推送代理"""
+    notification_broker.start()
+
+
+@app.on_event("shutdown")
+async def stop_notification_broker():
+    """停止通知推送代理"""
+    await notification_broker.stop()
+
+
+@app.on_event("startup")
+async def start_anomaly_warm_up():
+    """以最近的审计日志预热实时异常检测状态（后台执行，不阻塞启动）"""
+    if settings.ANOMALY_DETECTION_ENABLED and settings.ANOMALY_WARMUP_HOURS > 0:
+        asyncio.get_running_loop().run_in_executor(None, warm_up_anomaly_detector)
+
+
 @app.get("/")
 async def root():
     """根路径"""
@@ -3,20 +3,31 @@
 作者：张彦龙
 """
 from app.models.user import User, Role
-from app.models.data_asset import DataAsset, DataClassification, SensitiveTag
-from app.models.scenario import CrossBorderScenario, TransferApproval
+from app.models.data_asset import DataAsset, DataAssetColumn, AssetLineage, DataClassification, SensitiveTag
+from app.models.scenario import CrossBorderScenario, TransferApproval, ApprovalAsset
 from app.models.risk import RiskAssessment
 from app.models.audit import AuditLog
+from app.models.scan import ScanSource, ScanJob
+from app.models.batch_job import BatchJob
+from app.models.transfer_ledger import TransferLedgerEntry, TransferVolumeTotal
 
 __all__ = [
     "User",
     "Role",
     "DataAsset",
+    "DataAssetColumn",
+    "AssetLineage",
     "DataClassification",
     "SensitiveTag",
     "CrossBorderScenario",
     "TransferApproval",
+    "ApprovalAsset",
     "RiskAssessment",
     "AuditLog",
+    "ScanSource",
+    "ScanJob",
+    "BatchJob",
+    "TransferLedgerEntry",
+    "TransferVolumeTotal",
 ]
 
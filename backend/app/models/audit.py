@@ -35,7 +35,7 @@ class AuditLog(Base):
     resource_id = Column(Integer, index=True, comment="资源ID")
     
     # 用户信息
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, comment="操作用户ID（系统自动操作时可为空）")
     username = Column(String(50), comment="用户名（冗余字段，便于查询）")
     ip_address = Column(String(50), comment="IP地址")
     user_agent = Column(String(500), comment="用户代理")
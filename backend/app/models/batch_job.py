@@ -0,0 +1,34 @@
+"""
+批量任务模型
+作者：张彦龙
+"""
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class BatchJob(Base):
+    """批量任务表（后台分批执行的批量审批、批量删除等操作）"""
+    __tablename__ = "batch_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_type = Column(String(50), nullable=False, index=True, comment="任务类型")
+    status = Column(String(20), nullable=False, index=True, comment="任务状态：排队中/运行中/成功/部分失败/失败/已取消")
+    params = Column(Text, comment="任务参数（JSON）")
+    item_ids = Column(Text, nullable=False, comment="待处理ID（JSON数组）")
+    
+    # 进度（next_offset 为下一批在 item_ids 中的起始位置，重启后从此处继续）
+    total_count = Column(Integer, default=0, comment="待处理总数")
+    processed_count = Column(Integer, default=0, comment="已处理数")
+    success_count = Column(Integer, default=0, comment="成功数")
+    error_count = Column(Integer, default=0, comment="失败数")
+    next_offset = Column(Integer, default=0, comment="下一批起始位置")
+    errors = Column(Text, comment="错误信息（JSON数组，超出上限截断）")
+    
+    cancel_requested = Column(Boolean, default=False, comment="是否已请求取消")
+    created_by = Column(Integer, ForeignKey("users.id"), comment="发起人ID")
+    started_at = Column(DateTime(timezone=True), comment="开始时间")
+    heartbeat_at = Column(DateTime(timezone=True), comment="执行心跳时间（超时未更新视为执行进程已退出）")
+    runner_token = Column(String(32), comment="当前执行者标识（抢占任务时生成，进度只由持有者写入）")
+    finished_at = Column(DateTime(timezone=True), comment="结束时间")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -2,11 +2,16 @@
 数据资产模型
 作者：张彦龙
 """
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import (
+    Column, Integer, BigInteger, Float, String, Text, Boolean, DateTime, ForeignKey, Enum as SQLEnum,
+    UniqueConstraint, Index
+)
+from sqlalchemy import event, literal_column, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
 from app.core.database import Base
+from app.utils.text_search import build_search_text
 
 
 class DataLevel(str, enum.Enum):
@@ -22,6 +27,22 @@ class DataLevel(str, enum.Enum):
 class DataAsset(Base):
     """数据资产表"""
     __tablename__ = "data_assets"
+    __table_args__ = (
+        # PostgreSQL 检索索引：全文检索 GIN 索引，名称/编码 pg_trgm 三元组 GIN 索引（加速 ILIKE 与相似度排序）
+        Index(
+            "ix_data_assets_search_vector",
+            text("to_tsvector('simple'::regconfig, coalesce(search_text, ''))"),
+            postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_data_assets_name_trgm", "asset_name",
+            postgresql_using="gin", postgresql_ops={"asset_name": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_data_assets_code_trgm", "asset_code",
+            postgresql_using="gin", postgresql_ops={"asset_code": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     asset_name = Column(String(200), nullable=False, index=True, comment="资产名称")
@@ -33,26 +54,88 @@ class DataAsset(Base):
     
     # 分类分级信息
     data_level = Column(SQLEnum(DataLevel), nullable=False, default=DataLevel.INTERNAL, comment="数据安全级别")
+    effective_level = Column(SQLEnum(DataLevel), index=True, comment="有效数据级别（自身及全部上游资产的最高级别）")
     classification_id = Column(Integer, ForeignKey("data_classifications.id"), comment="分类ID")
     
     # 元数据
     description = Column(Text, comment="描述")
     field_count = Column(Integer, comment="字段数量")
-    record_count = Column(Integer, comment="记录数（估算）")
+    record_count = Column(BigInteger, comment="记录数（估算）")
+    schema_fingerprint = Column(String(64), comment="表结构指纹（字段数:md5(字段名:类型)），用于增量扫描")
+    search_text = Column(Text, comment="检索分词文本（名称、编码、描述分词，中文按二元组切分）")
     
     # 血缘关系
-    upstream_assets = Column(Text, comment="上游资产（JSON）")
-    downstream_assets = Column(Text, comment="下游资产（JSON）")
+    # 旧版血缘字段，仅用于迁移，血缘关系以 asset_lineage 表为准
+    upstream_assets = Column(Text, comment="上游资产（JSON，已废弃）")
+    downstream_assets = Column(Text, comment="下游资产（JSON，已废弃）")
     
     # 状态
     is_active = Column(Boolean, default=True, comment="是否启用")
     last_scan_time = Column(DateTime(timezone=True), comment="最后扫描时间")
+    last_profile_time = Column(DateTime(timezone=True), comment="最后内容剖析时间")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # 关系
     classification = relationship("DataClassification", back_populates="assets")
     sensitive_tags = relationship("SensitiveTag", secondary="asset_tag_association", back_populates="assets")
+    columns = relationship("DataAssetColumn", back_populates="asset", cascade="all, delete-orphan")
+
+
+# 全文检索向量表达式（与 ix_data_assets_search_vector 的索引表达式一致才能走索引）
+ASSET_SEARCH_VECTOR = func.to_tsvector(
+    literal_column("'simple'::regconfig"),
+    func.coalesce(DataAsset.search_text, literal_column("''"))
+)
+
+
+@event.listens_for(DataAsset, "before_insert")
+@event.listens_for(DataAsset, "before_update")
+def _refresh_search_text(mapper, connection, target):
+    """ORM写入资产时同步检索分词文本"""
+    target.search_text = build_search_text(target.asset_name, target.asset_code, target.description)
+
+
+class DataAssetColumn(Base):
+    """数据资产字段表（扫描得到的字段元数据及识别结果）"""
+    __tablename__ = "data_asset_columns"
+    __table_args__ = (
+        UniqueConstraint("asset_id", "column_name", name="uq_asset_column"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    asset_id = Column(Integer, ForeignKey("data_assets.id", ondelete="CASCADE"), nullable=False, index=True, comment="资产ID")
+    column_name = Column(String(200), nullable=False, comment="字段名")
+    data_type = Column(String(100), comment="字段类型")
+    ordinal_position = Column(Integer, comment="字段序号")
+    is_nullable = Column(Boolean, comment="是否可空")
+    
+    # 识别结果
+    data_level = Column(SQLEnum(DataLevel), comment="字段识别出的数据级别")
+    matched_tags = Column(String(500), comment="命中的敏感标签编码（逗号分隔）")
+    
+    # 内容抽样结果
+    sample_size = Column(Integer, comment="抽样非空值数量")
+    sample_hit_ratio = Column(Float, comment="抽样值命中率（各值级规则中最高）")
+    sample_rules = Column(String(200), comment="抽样命中的值级规则（逗号分隔）")
+    
+    # 关系
+    asset = relationship("DataAsset", back_populates="columns")
+
+
+class AssetLineage(Base):
+    """资产血缘边表（上游资产 -> 下游资产）"""
+    __tablename__ = "asset_lineage"
+    __table_args__ = (
+        # 唯一约束的索引覆盖按上游查下游，反向索引覆盖按下游查上游
+        UniqueConstraint("source_asset_id", "target_asset_id", name="uq_asset_lineage_edge"),
+        Index("ix_asset_lineage_target_source", "target_asset_id", "source_asset_id"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    source_asset_id = Column(Integer, ForeignKey("data_assets.id", ondelete="CASCADE"), nullable=False, comment="上游资产ID")
+    target_asset_id = Column(Integer, ForeignKey("data_assets.id", ondelete="CASCADE"), nullable=False, comment="下游资产ID")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
 class DataClassification(Base):
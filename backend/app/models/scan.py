@@ -0,0 +1,49 @@
+"""
+数据扫描模型
+作者：张彦龙
+"""
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class ScanSource(Base):
+    """扫描数据源表（需要盘点的源系统）"""
+    __tablename__ = "scan_sources"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    source_name = Column(String(100), unique=True, nullable=False, comment="数据源名称（写入资产来源系统）")
+    connection_url = Column(String(500), nullable=False, comment="数据库连接URL")
+    schemas = Column(String(1000), comment="限定扫描的Schema（逗号分隔，为空则扫描全部）")
+    max_concurrency = Column(Integer, default=2, comment="单数据源最大并发连接数")
+    timeout_seconds = Column(Integer, default=600, comment="单数据源扫描超时（秒）")
+    is_active = Column(Boolean, default=True, comment="是否启用")
+    
+    # 最近一次扫描结果
+    last_scan_time = Column(DateTime(timezone=True), comment="最后扫描时间")
+    last_scan_status = Column(String(20), comment="最后扫描状态：成功/部分失败/失败/超时")
+    last_scan_count = Column(Integer, comment="最后一次新增资产数")
+    last_error = Column(Text, comment="最后一次错误信息")
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class ScanJob(Base):
+    """扫描任务表（定时或手动触发的后台扫描）"""
+    __tablename__ = "scan_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    trigger_type = Column(String(20), nullable=False, comment="触发方式：定时/手动")
+    status = Column(String(20), nullable=False, index=True, comment="任务状态：排队中/运行中/成功/部分失败/失败/已跳过")
+    source_ids = Column(String(1000), comment="扫描的数据源ID（逗号分隔，为空则扫描全部启用的数据源）")
+    
+    # 执行结果
+    scanned_count = Column(Integer, default=0, comment="新增资产数")
+    summary = Column(Text, comment="扫描结果摘要（JSON）")
+    error = Column(Text, comment="错误信息")
+    
+    created_by = Column(Integer, ForeignKey("users.id"), comment="发起人ID（定时任务为空）")
+    started_at = Column(DateTime(timezone=True), comment="开始时间")
+    finished_at = Column(DateTime(timezone=True), comment="结束时间")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -2,7 +2,7 @@
 跨境传输场景模型
 作者：张彦龙
 """
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Enum as SQLEnum, Numeric
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Enum as SQLEnum, Numeric, Float, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -25,11 +25,16 @@ class ApprovalStatus(str, enum.Enum):
     APPROVED = "已批准"
     REJECTED = "已拒绝"
     CANCELLED = "已取消"
+    EXPIRED = "已过期"
 
 
 class CrossBorderScenario(Base):
     """跨境传输场景表"""
     __tablename__ = "cross_border_scenarios"
+    __table_args__ = (
+        # 到期扫描：按状态过滤后按到期日期范围查询
+        Index("ix_cross_border_scenarios_status_expiry", "status", "expiry_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     scenario_name = Column(String(200), nullable=False, index=True, comment="场景名称")
@@ -73,6 +78,13 @@ class CrossBorderScenario(Base):
 class TransferApproval(Base):
     """传输审批表"""
     __tablename__ = "transfer_approvals"
+    __table_args__ = (
+        # 审批工作队列：按状态过滤后按排队序号领取
+        Index("ix_transfer_approvals_queue", "approval_status", "queue_rank"),
+        # 到期扫描：待审批按提交时间、已批准按传输结束时间范围查询
+        Index("ix_transfer_approvals_status_created", "approval_status", "created_at"),
+        Index("ix_transfer_approvals_status_end", "approval_status", "transfer_end_time"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     scenario_id = Column(Integer, ForeignKey("cross_border_scenarios.id"), nullable=False, index=True)
@@ -84,6 +96,7 @@ class TransferApproval(Base):
     
     # 传输详情
     transfer_type = Column(String(50), comment="传输类型：API/文件/数据库")
+    # 旧版资产字段（JSON数组），与 approval_asset 表同步写入，查询以关联表为准
     data_assets = Column(Text, comment="涉及的数据资产（JSON数组）")
     transfer_start_time = Column(DateTime(timezone=True), comment="传输开始时间")
     transfer_end_time = Column(DateTime(timezone=True), comment="传输结束时间")
@@ -94,6 +107,13 @@ class TransferApproval(Base):
     approved_at = Column(DateTime(timezone=True), comment="批准时间")
     rejected_reason = Column(Text, comment="拒绝原因")
     
+    # 审批工作队列
+    risk_score = Column(Numeric(5, 2), comment="风险评分（100 - 场景最近一次评估的综合评分，越高风险越大）")
+    queue_rank = Column(Float, comment="排队序号（越小越优先，综合风险评分与等待时长）")
+    claimed_by = Column(Integer, ForeignKey("users.id"), comment="领取人ID")
+    claimed_at = Column(DateTime(timezone=True), comment="领取时间")
+    lease_expires_at = Column(DateTime(timezone=True), comment="领取租约到期时间（到期后可被他人领取）")
+    
     # 元数据
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -102,4 +122,30 @@ class TransferApproval(Base):
     scenario = relationship("CrossBorderScenario", back_populates="approvals")
     applicant = relationship("User", foreign_keys=[applicant_id])
     approver_rel = relationship("User", foreign_keys=[approver_id])
+    asset_links = relationship(
+        "ApprovalAsset", back_populates="approval", cascade="all, delete-orphan", passive_deletes=True,
+        order_by="ApprovalAsset.asset_id"
+    )
+    
+    @property
+    def asset_ids(self) -> list:
+        """审批涉及的数据资产ID"""
+        return [link.asset_id for link in self.asset_links]
+
+
+class ApprovalAsset(Base):
+    """审批-数据资产关联表"""
+    __tablename__ = "approval_asset"
+    __table_args__ = (
+        # 主键覆盖按审批查资产，反向索引覆盖按资产查审批
+        Index("ix_approval_asset_asset_approval", "asset_id", "approval_id"),
+    )
+    
+    approval_id = Column(
+        Integer, ForeignKey("transfer_approvals.id", ondelete="CASCADE"), primary_key=True, comment="审批ID"
+    )
+    asset_id = Column(Integer, ForeignKey("data_assets.id", ondelete="CASCADE"), primary_key=True, comment="资产ID")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    approval = relationship("TransferApproval", back_populates="asset_links")
 
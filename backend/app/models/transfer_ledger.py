@@ -0,0 +1,52 @@
+"""
+跨境传输台账模型
+作者：张彦龙
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum as SQLEnum, Numeric, UniqueConstraint, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+from app.models.data_asset import DataLevel
+
+
+class TransferLedgerEntry(Base):
+    """跨境传输台账表（只追加，一次传输按数据类别各记一行，与传输审计日志同一事务写入）"""
+    __tablename__ = "transfer_ledger"
+    __table_args__ = (
+        # 按累计维度核对或重建累计量
+        Index("ix_transfer_ledger_key", "recipient_name", "destination_country", "year", "data_category"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    audit_log_id = Column(Integer, ForeignKey("audit_logs.id"), nullable=False, index=True, comment="传输审计日志ID")
+    approval_id = Column(Integer, ForeignKey("transfer_approvals.id"), index=True, comment="审批ID")
+    scenario_id = Column(Integer, ForeignKey("cross_border_scenarios.id"), index=True, comment="场景ID")
+    
+    # 累计维度
+    recipient_name = Column(String(200), nullable=False, comment="接收方名称")
+    destination_country = Column(String(100), nullable=False, comment="目的国")
+    year = Column(Integer, nullable=False, comment="传输年度")
+    data_category = Column(SQLEnum(DataLevel), nullable=False, comment="数据类别")
+    
+    volume = Column(Numeric(20, 0), nullable=False, comment="传输数据量")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class TransferVolumeTotal(Base):
+    """跨境传输累计量表（按接收方、目的国、年度、数据类别维护的累计值，随台账原子递增）"""
+    __tablename__ = "transfer_volume_totals"
+    __table_args__ = (
+        # 唯一约束的索引覆盖按接收方和年度查询累计量
+        UniqueConstraint(
+            "recipient_name", "destination_country", "year", "data_category", name="uq_transfer_volume_totals_key"
+        ),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    recipient_name = Column(String(200), nullable=False, comment="接收方名称")
+    destination_country = Column(String(100), nullable=False, comment="目的国")
+    year = Column(Integer, nullable=False, comment="传输年度")
+    data_category = Column(SQLEnum(DataLevel), nullable=False, comment="数据类别")
+    
+    total_volume = Column(Numeric(20, 0), nullable=False, default=0, comment="累计传输数据量")
+    transfer_count = Column(Integer, nullable=False, default=0, comment="累计传输次数")
+    last_transfer_at = Column(DateTime(timezone=True), comment="最近一次传输时间")
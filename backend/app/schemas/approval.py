@@ -40,9 +40,25 @@ class TransferApprovalResponse(TransferApprovalBase):
     approval_comment: Optional[str]
     approved_at: Optional[datetime]
     rejected_reason: Optional[str]
+    risk_score: Optional[Decimal] = None
+    claimed_by: Optional[int] = None
+    lease_expires_at: Optional[datetime] = None
     created_at: datetime
     updated_at: Optional[datetime]
     
     class Config:
         from_attributes = True
 
+
+class ApprovalClaimRequest(BaseModel):
+    """领取待审批申请请求"""
+    approver_id: int = Field(..., description="审批人ID")
+    limit: int = Field(10, ge=1, description="领取条数")
+    lease_seconds: Optional[int] = Field(None, ge=60, description="租约时长（秒），默认取系统配置")
+
+
+class ApprovalLeaseRequest(BaseModel):
+    """续租或释放领取请求"""
+    approver_id: int = Field(..., description="审批人ID")
+    approval_ids: List[int] = Field(..., description="审批ID列表")
+
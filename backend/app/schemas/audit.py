@@ -15,7 +15,7 @@ class AuditLogResponse(BaseModel):
     action: AuditAction
     resource_type: Optional[str]
     resource_id: Optional[int]
-    user_id: int
+    user_id: Optional[int]
     username: Optional[str]
     ip_address: Optional[str]
     user_agent: Optional[str]
@@ -0,0 +1,81 @@
+"""
+批量任务Schema
+作者：张彦龙
+"""
+from pydantic import BaseModel, Field, field_validator, computed_field
+from typing import Optional, List, Dict, Any
+from datetime import datetime
+import json
+
+
+class BatchJobCreate(BaseModel):
+    """批量任务创建模型"""
+    job_type: str = Field(
+        ...,
+        description="任务类型：approve_approvals/reject_approvals/approve_scenarios/reject_scenarios/delete_assets"
+    )
+    item_ids: List[int] = Field(..., description="待处理ID列表")
+    params: Dict[str, Any] = Field(default_factory=dict, description="任务参数（如 approver_id、comment、reason）")
+    created_by: Optional[int] = Field(None, description="发起人ID")
+
+
+class BatchJobProgress(BaseModel):
+    """批量任务进度"""
+    id: int
+    status: str
+    total_count: int
+    processed_count: int
+    success_count: int
+    error_count: int
+    cancel_requested: bool
+    
+    @computed_field
+    @property
+    def progress(self) -> float:
+        """完成百分比"""
+        if not self.total_count:
+            return 100.0
+        return round(self.processed_count * 100 / self.total_count, 2)
+    
+    class Config:
+        from_attributes = True
+
+
+class BatchJobResponse(BatchJobProgress):
+    """批量任务响应模型（不含待处理ID明细）"""
+    job_type: str
+    params: Optional[Dict[str, Any]]
+    errors: List[str] = Field(default_factory=list)
+    created_by: Optional[int]
+    started_at: Optional[datetime]
+    heartbeat_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    created_at: datetime
+    
+    @field_validator("params", mode="before")
+    @classmethod
+    def parse_params(cls, value):
+        if isinstance(value, str):
+            try:
+                return json.loads(value)
+            except ValueError:
+                return None
+        return value
+    
+    @field_validator("errors", mode="before")
+    @classmethod
+    def parse_errors(cls, value):
+        if value is None:
+            return []
+        if isinstance(value, str):
+            try:
+                return json.loads(value)
+            except ValueError:
+                return []
+        return value
+
+
+class BatchJobListResponse(BaseModel):
+    """批量任务列表响应"""
+    items: List[BatchJobResponse]
+    total: int
@@ -38,11 +38,13 @@ class DataAssetResponse(DataAssetBase):
     """数据资产响应模型"""
     id: int
     data_level: DataLevel
+    effective_level: Optional[DataLevel] = None
     classification_id: Optional[int]
     field_count: Optional[int]
     record_count: Optional[int]
     is_active: bool
     last_scan_time: Optional[datetime]
+    last_profile_time: Optional[datetime] = None
     created_at: datetime
     updated_at: Optional[datetime]
     
@@ -50,6 +52,24 @@ class DataAssetResponse(DataAssetBase):
         from_attributes = True
 
 
+class DataAssetColumnResponse(BaseModel):
+    """数据资产字段响应模型"""
+    id: int
+    asset_id: int
+    column_name: str
+    data_type: Optional[str]
+    ordinal_position: Optional[int]
+    is_nullable: Optional[bool]
+    data_level: Optional[DataLevel]
+    matched_tags: Optional[str]
+    sample_size: Optional[int] = None
+    sample_hit_ratio: Optional[float] = None
+    sample_rules: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+
 class DataClassificationBase(BaseModel):
     """数据分类基础模型"""
     category_name: str
@@ -126,4 +146,46 @@ class LineageGraph(BaseModel):
     nodes: List[LineageNode]
     edges: List[LineageEdge]
     center_node_id: int
+    truncated: bool = Field(False, description="是否因节点或边数量上限被截断")
+
+
+class LineageUpdate(BaseModel):
+    """更新资产的直接上下游（为空表示不修改该方向）"""
+    upstream_ids: Optional[List[int]] = None
+    downstream_ids: Optional[List[int]] = None
+
+
+
+class ImpactNode(BaseModel):
+    """影响分析中的资产节点"""
+    id: int
+    name: str
+    code: str
+    data_level: DataLevel
+    depth: int = Field(0, description="距分析起点的血缘层数")
+
+
+class ImpactApproval(BaseModel):
+    """受影响的已批准传输审批"""
+    approval_id: int
+    scenario_id: int
+    asset_ids: List[int] = Field(description="审批中位于影响范围内的资产")
+
+
+class ImpactAnalysis(BaseModel):
+    """影响分析结果"""
+    asset: ImpactNode
+    downstream: List[ImpactNode]
+    downstream_count: int
+    approvals: List[ImpactApproval]
+    scenario_ids: List[int]
+    truncated: bool = Field(False, description="下游资产列表是否被截断")
+    elapsed_ms: float
+
 
+class LineagePath(BaseModel):
+    """两个资产之间的最短血缘路径"""
+    source_id: int
+    target_id: int
+    found: bool
+    nodes: List[ImpactNode]
@@ -5,6 +5,7 @@
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
+from app.models.data_asset import DataLevel
 
 
 class WhitelistEntry(BaseModel):
@@ -37,10 +38,25 @@ class InterceptionCheckResponse(BaseModel):
     """拦截检查响应"""
     allowed: bool = Field(..., description="是否允许传输")
     intercepted: bool = Field(..., description="是否被拦截")
+    rate_limited: bool = Field(False, description="是否因传输频率超限被拦截")
     reason: Optional[str] = Field(None, description="拦截原因")
     desensitized_data: Optional[Dict[str, Any]] = Field(None, description="脱敏后的数据")
 
 
+class TransferRequest(BaseModel):
+    """跨境传输请求（检查拦截并记录传输）"""
+    approval_id: int = Field(..., description="审批ID")
+    asset_ids: List[int] = Field(..., description="数据资产ID列表")
+    volumes: Dict[DataLevel, int] = Field(default_factory=dict, description="按数据类别的传输数据量")
+    data: Optional[Dict[str, Any]] = Field(default_factory=dict, description="待传输数据")
+
+
+class TransferResponse(InterceptionCheckResponse):
+    """跨境传输响应"""
+    audit_log_id: int = Field(..., description="传输审计日志ID")
+    cumulative_exposure: Optional[Dict[str, Any]] = Field(None, description="接收方年度累计出境量")
+
+
 class DesensitizationRequest(BaseModel):
     """脱敏请求"""
     data: Dict[str, Any] = Field(..., description="待脱敏数据")
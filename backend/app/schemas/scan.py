@@ -0,0 +1,112 @@
+"""
+数据扫描Schema
+作者：张彦龙
+"""
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional, List, Dict, Any
+from datetime import datetime
+from sqlalchemy.engine import make_url
+import json
+
+
+class ScanSourceBase(BaseModel):
+    """扫描数据源基础模型"""
+    source_name: str = Field(..., description="数据源名称")
+    schemas: Optional[str] = Field(None, description="限定扫描的Schema（逗号分隔）")
+    max_concurrency: int = Field(2, ge=1, le=16, description="单数据源最大并发连接数")
+    timeout_seconds: int = Field(600, ge=10, le=86400, description="单数据源扫描超时（秒）")
+    is_active: bool = Field(True, description="是否启用")
+
+
+class ScanSourceCreate(ScanSourceBase):
+    """创建扫描数据源"""
+    connection_url: str = Field(..., description="数据库连接URL")
+
+
+class ScanSourceUpdate(BaseModel):
+    """更新扫描数据源"""
+    connection_url: Optional[str] = None
+    schemas: Optional[str] = None
+    max_concurrency: Optional[int] = Field(None, ge=1, le=16)
+    timeout_seconds: Optional[int] = Field(None, ge=10, le=86400)
+    is_active: Optional[bool] = None
+
+
+class ScanSourceResponse(ScanSourceBase):
+    """扫描数据源响应模型（连接URL隐藏密码）"""
+    id: int
+    connection_url: str
+    last_scan_time: Optional[datetime]
+    last_scan_status: Optional[str]
+    last_scan_count: Optional[int]
+    last_error: Optional[str]
+    created_at: datetime
+    updated_at: Optional[datetime]
+    
+    @field_validator("connection_url")
+    @classmethod
+    def hide_password(cls, value: str) -> str:
+        try:
+            return make_url(value).render_as_string(hide_password=True)
+        except Exception:
+            return "***"
+    
+    class Config:
+        from_attributes = True
+
+
+class SourceScanResult(BaseModel):
+    """单个数据源的扫描结果"""
+    source_id: int
+    source_name: str
+    status: str
+    count: int = 0
+    column_count: int = 0
+    elapsed_seconds: float = 0
+    errors: List[str] = Field(default_factory=list)
+    summary: Dict[str, Any] = Field(default_factory=dict)
+    profile_submitted: bool = False
+
+
+class MultiSourceScanResponse(BaseModel):
+    """多数据源扫描响应"""
+    total_sources: int
+    succeeded: int
+    failed: int
+    scanned_count: int
+    elapsed_seconds: float
+    results: List[SourceScanResult]
+
+
+class ScanJobResponse(BaseModel):
+    """扫描任务响应模型"""
+    id: int
+    trigger_type: str
+    status: str
+    source_ids: Optional[str]
+    scanned_count: Optional[int]
+    summary: Optional[Dict[str, Any]]
+    error: Optional[str]
+    created_by: Optional[int]
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    created_at: datetime
+    
+    @field_validator("summary", mode="before")
+    @classmethod
+    def parse_summary(cls, value):
+        if isinstance(value, str):
+            try:
+                return json.loads(value)
+            except ValueError:
+                return None
+        return value
+    
+    class Config:
+        from_attributes = True
+
+
+class ScanJobListResponse(BaseModel):
+    """扫描任务列表响应"""
+    items: List[ScanJobResponse]
+    total: int
@@ -3,7 +3,7 @@
 作者：张彦龙
 """
 from pydantic import BaseModel, Field, field_validator
-from typing import Optional, Any
+from typing import Optional, Any, Dict
 from datetime import datetime
 from app.models.system_config import ConfigCategory, ConfigType
 
@@ -53,3 +53,14 @@ class ConfigValueResponse(BaseModel):
     config_value: Any
     config_type: str
 
+
+class ThresholdSimulationRequest(BaseModel):
+    """阈值模拟请求（未填写的项沿用当前配置）"""
+    personal_info_max: Optional[float] = Field(None, ge=0, description="个人信息最大数量阈值")
+    sensitive_info_max: Optional[float] = Field(None, ge=0, description="敏感个人信息最大数量阈值")
+    risk_score_high: Optional[float] = Field(None, description="高风险评分阈值")
+    risk_score_medium: Optional[float] = Field(None, description="中风险评分阈值")
+    weights: Optional[Dict[str, float]] = Field(None, description="风险评分各维度权重")
+    auto_approve_risk_threshold: Optional[float] = Field(None, description="自动审批风险阈值")
+    multi_level_risk_threshold: Optional[float] = Field(None, description="多级审批风险阈值")
+    sample_size: int = Field(20, ge=0, le=1000, description="每类返回的样例ID数")
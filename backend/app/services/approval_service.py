@@ -2,13 +2,41 @@
 传输审批服务
 作者：张彦龙
 """
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import datetime
-from app.models.scenario import TransferApproval, ApprovalStatus
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import select, update, or_
+from typing import List, Optional, Tuple, Iterable, Dict, Any
+from datetime import datetime, timedelta, timezone
+import json
+from app.core.config import settings
+from app.models.scenario import TransferApproval, ApprovalAsset, ApprovalStatus
+from app.models.risk import RiskAssessment
+from app.models.data_asset import DataAsset
+from app.models.user import User
+from app.models.audit import AuditAction
 from app.schemas.approval import TransferApprovalCreate, TransferApprovalUpdate
-from app.services.interception_service import InterceptionService
+from app.services.interception_service import InterceptionService, parse_asset_ids
+from app.utils.data_scanner import insert_ignore
 from app.utils.config_helper import ConfigHelper
+from app.utils.lineage_graph import lineage_index
+from app.utils.query_count import count_query, COUNT_EXACT
+from app.utils.batch_transition import transition_pending, batch_summary, audit_rows
+from app.services.audit_service import AuditService
+from app.services.risk_service import risk_score_of
+
+# 审批完成后清空领取信息
+CLAIM_CLEARED = {"claimed_by": None, "claimed_at": None, "lease_expires_at": None}
+
+# 排队序号的时间基准（UTC纪元）
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def queue_rank(risk_score, created_at: datetime) -> float:
+    """计算排队序号（越小越优先）：提交时刻按每小时老化分折算后减去风险评分"""
+    # 序号只取决于提交时刻和风险评分、不随时间变化，可直接按索引顺序领取
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    hours = (created_at - _EPOCH).total_seconds() / 3600
+    return hours * settings.APPROVAL_QUEUE_AGING_POINTS_PER_HOUR - float(risk_score or 0)
 
 
 class ApprovalService:
@@ -24,17 +52,43 @@ class ApprovalService:
         skip: int = 0,
         limit: int = 100,
         scenario_id: Optional[int] = None,
-        status: Optional[str] = None
+        status: Optional[str] = None,
+        asset_id: Optional[int] = None
     ) -> List[TransferApproval]:
-        """获取传输审批列表"""
+        """获取传输审批列表（涉及资产随审批批量预加载）"""
+        query = self._filtered_query(scenario_id, status, asset_id)
+        return query.options(selectinload(TransferApproval.asset_links)).offset(skip).limit(limit).all()
+    
+    def count_approvals(
+        self,
+        scenario_id: Optional[int] = None,
+        status: Optional[str] = None,
+        count: str = COUNT_EXACT,
+        asset_id: Optional[int] = None
+    ) -> Tuple[Optional[int], str]:
+        """统计传输审批总数，返回（总数，实际采用的统计方式）"""
+        return count_query(self.db, self._filtered_query(scenario_id, status, asset_id), count)
+    
+    def _filtered_query(
+        self,
+        scenario_id: Optional[int] = None,
+        status: Optional[str] = None,
+        asset_id: Optional[int] = None
+    ):
+        """按场景、状态和涉及资产筛选的审批查询"""
         query = self.db.query(TransferApproval)
         
         if scenario_id:
             query = query.filter(TransferApproval.scenario_id == scenario_id)
         if status:
             query = query.filter(TransferApproval.approval_status == status)
+        if asset_id:
+            # 按资产反查审批走 approval_asset 的 (asset_id, approval_id) 索引
+            query = query.filter(TransferApproval.id.in_(
+                select(ApprovalAsset.approval_id).where(ApprovalAsset.asset_id == asset_id)
+            ))
         
-        return query.offset(skip).limit(limit).all()
+        return query
     
     def get_approval(self, approval_id: int) -> Optional[TransferApproval]:
         """获取审批详情"""
@@ -44,14 +98,14 @@ class ApprovalService:
     
     def create_approval(self, approval_data: TransferApprovalCreate) -> TransferApproval:
         """创建传输审批申请"""
-        # 将data_assets列表转为JSON字符串
         approval_dict = approval_data.model_dump()
-        if approval_dict.get("data_assets"):
-            import json
-            approval_dict["data_assets"] = json.dumps(approval_dict["data_assets"])
+        asset_ids = approval_dict.pop("data_assets", None) or []
         
         db_approval = TransferApproval(**approval_dict)
         db_approval.approval_status = ApprovalStatus.PENDING
+        db_approval.risk_score = self._scenario_risk_score(db_approval.scenario_id)
+        db_approval.queue_rank = queue_rank(db_approval.risk_score, datetime.now(timezone.utc))
+        self._set_assets(db_approval, asset_ids)
         self.db.add(db_approval)
         self.db.commit()
         self.db.refresh(db_approval)
@@ -71,6 +125,7 @@ class ApprovalService:
         
         if db_approval.approval_status != ApprovalStatus.PENDING:
             raise ValueError("只有待审批状态的申请才能批准")
+        self._check_claim(db_approval, approver_id)
         
         # 检查是否需要多级审批
         if self.config_helper.get_require_multi_level() and risk_score:
@@ -83,12 +138,14 @@ class ApprovalService:
         db_approval.approver_id = approver_id
         db_approval.approval_comment = comment
         db_approval.approved_at = datetime.now()
+        self._clear_claim(db_approval)
         
         # 在拦截服务中注册白名单
         self.interception_service.add_to_whitelist(db_approval)
         
         self.db.commit()
         self.db.refresh(db_approval)
+        lineage_index.set_approval(db_approval.id, db_approval.scenario_id, db_approval.asset_ids)
         return db_approval
     
     def reject_transfer(
@@ -104,12 +161,279 @@ class ApprovalService:
         
         if db_approval.approval_status != ApprovalStatus.PENDING:
             raise ValueError("只有待审批状态的申请才能拒绝")
+        self._check_claim(db_approval, approver_id)
         
         db_approval.approval_status = ApprovalStatus.REJECTED
         db_approval.approver_id = approver_id
         db_approval.rejected_reason = reason
+        self._clear_claim(db_approval)
         
         self.db.commit()
         self.db.refresh(db_approval)
         return db_approval
-
+    
+    def batch_approve(
+        self,
+        approval_ids: List[int],
+        approver_id: int,
+        comment: Optional[str] = None,
+        commit: bool = True
+    ) -> Dict[str, Any]:
+        """批量批准传输（单事务：锁定待审批记录、批量更新并多行写入审计日志，commit=False 时由调用方提交后调用 after_approve）"""
+        approver = self._get_approver(approver_id)
+        result = transition_pending(
+            self.db, TransferApproval, TransferApproval.approval_status, approval_ids, ApprovalStatus.PENDING,
+            {
+                "approval_status": ApprovalStatus.APPROVED,
+                "approver_id": approver_id,
+                "approval_comment": comment,
+                "approved_at": datetime.now(),
+                **CLAIM_CLEARED
+            }
+        )
+        AuditService(self.db).add_logs(audit_rows(
+            result.updated_ids, AuditAction.APPROVE, "审批", approver,
+            ApprovalStatus.PENDING.value, ApprovalStatus.APPROVED.value, {"batch": True, "comment": comment}
+        ))
+        if commit:
+            self.db.commit()
+            self.after_approve(result.updated_ids)
+        return batch_summary(result, "审批", "只有待审批状态的申请才能批准")
+    
+    def after_approve(self, approval_ids: List[int]):
+        """批准提交后在拦截服务和血缘图中登记新批准的审批"""
+        self.interception_service.whitelist.update(approval_ids)
+        self.register_approved(approval_ids)
+    
+    def batch_reject(
+        self,
+        approval_ids: List[int],
+        approver_id: int,
+        reason: str,
+        commit: bool = True
+    ) -> Dict[str, Any]:
+        """批量拒绝传输（单事务：锁定待审批记录、批量更新并多行写入审计日志，commit=False 时由调用方提交）"""
+        approver = self._get_approver(approver_id)
+        result = transition_pending(
+            self.db, TransferApproval, TransferApproval.approval_status, approval_ids, ApprovalStatus.PENDING,
+            {
+                "approval_status": ApprovalStatus.REJECTED,
+                "approver_id": approver_id,
+                "rejected_reason": reason,
+                **CLAIM_CLEARED
+            }
+        )
+        AuditService(self.db).add_logs(audit_rows(
+            result.updated_ids, AuditAction.REJECT, "审批", approver,
+            ApprovalStatus.PENDING.value, ApprovalStatus.REJECTED.value, {"batch": True, "reason": reason}
+        ))
+        if commit:
+            self.db.commit()
+        return batch_summary(result, "审批", "只有待审批状态的申请才能拒绝")
+    
+    def claim_next(
+        self,
+        approver_id: int,
+        limit: int = 10,
+        lease_seconds: Optional[int] = None
+    ) -> List[TransferApproval]:
+        """领取下一批待审批申请（按风险评分与等待时长排序，FOR UPDATE SKIP LOCKED 跳过他人正在领取的行，审批人之间互不等待）"""
+        self._get_approver(approver_id)
+        limit = max(1, min(limit, settings.APPROVAL_CLAIM_MAX))
+        now = datetime.now(timezone.utc)
+        lease = timedelta(seconds=lease_seconds or settings.APPROVAL_LEASE_SECONDS)
+        
+        # 未被领取或租约已到期的待审批申请
+        ids = [row.id for row in self.db.query(TransferApproval.id).filter(
+            TransferApproval.approval_status == ApprovalStatus.PENDING,
+            or_(
+                TransferApproval.claimed_by.is_(None),
+                TransferApproval.lease_expires_at.is_(None),
+                TransferApproval.lease_expires_at < now
+            )
+        ).order_by(
+            TransferApproval.queue_rank.asc().nulls_last(), TransferApproval.id
+        ).limit(limit).with_for_update(skip_locked=True).all()]
+        if not ids:
+            self.db.commit()
+            return []
+        
+        self.db.execute(
+            update(TransferApproval).where(TransferApproval.id.in_(ids)).values(
+                claimed_by=approver_id, claimed_at=now, lease_expires_at=now + lease
+            ).execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+        return self.list_my_claims(approver_id, approval_ids=ids)
+    
+    def list_my_claims(
+        self,
+        approver_id: int,
+        approval_ids: Optional[List[int]] = None
+    ) -> List[TransferApproval]:
+        """获取审批人当前持有（租约未到期）的待审批申请"""
+        query = self.db.query(TransferApproval).options(selectinload(TransferApproval.asset_links)).filter(
+            TransferApproval.approval_status == ApprovalStatus.PENDING,
+            TransferApproval.claimed_by == approver_id,
+            TransferApproval.lease_expires_at >= datetime.now(timezone.utc)
+        )
+        if approval_ids is not None:
+            query = query.filter(TransferApproval.id.in_(approval_ids))
+        return query.order_by(TransferApproval.queue_rank.asc().nulls_last(), TransferApproval.id).all()
+    
+    def renew_claims(
+        self,
+        approver_id: int,
+        approval_ids: List[int],
+        lease_seconds: Optional[int] = None
+    ) -> List[int]:
+        """续租审批人持有的申请（租约已到期且已被他人领取的不再续租），返回续租成功的审批ID"""
+        now = datetime.now(timezone.utc)
+        lease = timedelta(seconds=lease_seconds or settings.APPROVAL_LEASE_SECONDS)
+        renewed = self.db.execute(
+            update(TransferApproval).where(
+                TransferApproval.id.in_(approval_ids),
+                TransferApproval.approval_status == ApprovalStatus.PENDING,
+                TransferApproval.claimed_by == approver_id
+            ).values(lease_expires_at=now + lease).returning(TransferApproval.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        self.db.commit()
+        return sorted(renewed)
+    
+    def release_claims(self, approver_id: int, approval_ids: List[int]) -> List[int]:
+        """释放审批人持有的申请，使其回到队列，返回释放成功的审批ID"""
+        released = self.db.execute(
+            update(TransferApproval).where(
+                TransferApproval.id.in_(approval_ids),
+                TransferApproval.approval_status == ApprovalStatus.PENDING,
+                TransferApproval.claimed_by == approver_id
+            ).values(**CLAIM_CLEARED).returning(TransferApproval.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        self.db.commit()
+        return sorted(released)
+    
+    def rebuild_queue_ranks(self, batch_size: int = 1000) -> int:
+        """按场景最新风险评估重算待审批申请的风险评分与排队序号（风险评估更新或调整老化系数后执行），返回更新条数"""
+        updated = 0
+        last_id = 0
+        scores: Dict[int, Any] = {}
+        while True:
+            rows = self.db.query(
+                TransferApproval.id, TransferApproval.scenario_id, TransferApproval.created_at
+            ).filter(
+                TransferApproval.approval_status == ApprovalStatus.PENDING,
+                TransferApproval.id > last_id
+            ).order_by(TransferApproval.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            for row in rows:
+                if row.scenario_id not in scores:
+                    scores[row.scenario_id] = self._scenario_risk_score(row.scenario_id)
+            self.db.execute(update(TransferApproval), [
+                {
+                    "id": row.id,
+                    "risk_score": scores[row.scenario_id],
+                    "queue_rank": queue_rank(scores[row.scenario_id], row.created_at or datetime.now(timezone.utc))
+                }
+                for row in rows
+            ])
+            self.db.commit()
+            updated += len(rows)
+        return updated
+    
+    def _scenario_risk_score(self, scenario_id: int):
+        """场景最近一次风险评估换算的风险评分（无评估时为空）"""
+        return risk_score_of(self.db.query(RiskAssessment.overall_score).filter(
+            RiskAssessment.scenario_id == scenario_id,
+            RiskAssessment.overall_score.isnot(None)
+        ).order_by(RiskAssessment.created_at.desc(), RiskAssessment.id.desc()).limit(1).scalar())
+    
+    @staticmethod
+    def _check_claim(approval: TransferApproval, approver_id: int):
+        """申请被其他审批人领取且租约未到期时不允许处理"""
+        if approval.claimed_by is None or approval.claimed_by == approver_id or approval.lease_expires_at is None:
+            return
+        expires = approval.lease_expires_at
+        if expires.tzinfo is None:
+            expires = expires.replace(tzinfo=timezone.utc)
+        if expires >= datetime.now(timezone.utc):
+            raise ValueError("该申请已被其他审批人领取")
+    
+    @staticmethod
+    def _clear_claim(approval: TransferApproval):
+        """清空申请的领取信息"""
+        for key, value in CLAIM_CLEARED.items():
+            setattr(approval, key, value)
+    
+    def _get_approver(self, approver_id: int) -> User:
+        """获取审批人（不存在时抛出异常）"""
+        approver = self.db.query(User).filter(User.id == approver_id).first()
+        if not approver:
+            raise ValueError("审批人不存在")
+        return approver
+    
+    def register_approved(self, approval_ids: List[int]):
+        """批量登记已批准审批到血缘图（两次查询取场景与涉及资产）"""
+        if not approval_ids:
+            return
+        scenarios = dict(self.db.query(TransferApproval.id, TransferApproval.scenario_id).filter(
+            TransferApproval.id.in_(approval_ids)
+        ).all())
+        asset_ids: Dict[int, List[int]] = {approval_id: [] for approval_id in approval_ids}
+        for row in self.db.query(ApprovalAsset.approval_id, ApprovalAsset.asset_id).filter(
+            ApprovalAsset.approval_id.in_(approval_ids)
+        ).all():
+            asset_ids[row.approval_id].append(row.asset_id)
+        for approval_id in approval_ids:
+            lineage_index.set_approval(approval_id, scenarios[approval_id], asset_ids[approval_id])
+    
+    def _set_assets(self, approval: TransferApproval, asset_ids: Iterable[int]):
+        """设置审批涉及的数据资产（写入关联表，并同步旧版JSON字段）"""
+        asset_ids = list(dict.fromkeys(asset_ids))
+        if asset_ids:
+            found = {row.id for row in self.db.query(DataAsset.id).filter(DataAsset.id.in_(asset_ids)).all()}
+            missing = [i for i in asset_ids if i not in found]
+            if missing:
+                raise ValueError(f"数据资产不存在: {missing}")
+        approval.asset_links = [ApprovalAsset(asset_id=asset_id) for asset_id in asset_ids]
+        approval.data_assets = json.dumps(asset_ids) if asset_ids else None
+    
+    def import_legacy_assets(self, batch_size: int = 1000) -> int:
+        """将审批表中的 data_assets JSON 字段导入 approval_asset 关联表（可重复执行），返回导入行数"""
+        imported = 0
+        last_id = 0
+        while True:
+            rows = self.db.query(TransferApproval.id, TransferApproval.data_assets).filter(
+                TransferApproval.id > last_id
+            ).order_by(TransferApproval.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            pairs = {
+                (row.id, asset_id)
+                for row in rows
+                for asset_id in parse_asset_ids(row.data_assets)
+                if isinstance(asset_id, int)
+            }
+            if not pairs:
+                continue
+            # 已删除的资产和已存在的关联不导入
+            found = {r.id for r in self.db.query(DataAsset.id).filter(
+                DataAsset.id.in_({asset_id for _, asset_id in pairs})
+            ).all()}
+            existing = set(self.db.query(ApprovalAsset.approval_id, ApprovalAsset.asset_id).filter(
+                ApprovalAsset.approval_id.in_({approval_id for approval_id, _ in pairs})
+            ).all())
+            link_rows = [
+                {"approval_id": approval_id, "asset_id": asset_id}
+                for approval_id, asset_id in sorted(pairs)
+                if asset_id in found and (approval_id, asset_id) not in existing
+            ]
+            if link_rows:
+                self.db.execute(insert_ignore(self.db, ApprovalAsset), link_rows)
+                self.db.commit()
+                imported += len(link_rows)
+        return imported
@@ -3,10 +3,41 @@
 作者：张彦龙
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from sqlalchemy import event, func, and_, or_, insert, update
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import datetime, timedelta
+import logging
+import time
+from app.core.config import settings
+from app.core.database import SessionLocal
 from app.models.audit import AuditLog, AuditAction
+from app.utils.anomaly_detector import AnomalyDetector, anomaly_detector, to_event
+
+logger = logging.getLogger(__name__)
+
+# 会话内待计入异常检测状态的事件（每次写入操作一组，随事务提交计入）
+PENDING_ANOMALY_KEY = "pending_anomaly_events"
+
+
+def flag_logs(db: Session, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """检测一次操作待写入的审计日志并填写异常字段，事件在会话事务提交后才计入检测状态"""
+    events = anomaly_detector.flag(rows)
+    if events:
+        db.info.setdefault(PENDING_ANOMALY_KEY, []).append(events)
+    return rows
+
+
+@event.listens_for(Session, "after_commit")
+def _record_pending_anomaly_events(session: Session):
+    """事务提交后计入本事务写入的审计事件"""
+    for events in session.info.pop(PENDING_ANOMALY_KEY, None) or []:
+        anomaly_detector.record(events)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_anomaly_events(session: Session):
+    """事务回滚时丢弃未提交的审计事件"""
+    session.info.pop(PENDING_ANOMALY_KEY, None)
 
 
 class AuditService:
@@ -116,18 +147,110 @@ class AuditService:
         ip_address: Optional[str] = None,
         user_agent: Optional[str] = None
     ) -> AuditLog:
-        """创建审计日志"""
-        db_log = AuditLog(
-            action=action,
-            resource_type=resource_type,
-            resource_id=resource_id,
-            user_id=user_id,
-            operation_details=operation_details,
-            ip_address=ip_address,
-            user_agent=user_agent
-        )
+        """创建审计日志（写入前检测异常）"""
+        row, = flag_logs(self.db, [{
+            "action": action,
+            "resource_type": resource_type,
+            "resource_id": resource_id,
+            "user_id": user_id,
+            "operation_details": operation_details,
+            "ip_address": ip_address,
+            "user_agent": user_agent
+        }])
+        db_log = AuditLog(**row)
         self.db.add(db_log)
         self.db.commit()
         self.db.refresh(db_log)
         return db_log
+    
+    def add_logs(self, logs: List[Dict[str, Any]]):
+        """多行插入审计日志（写入前检测异常，一次调用计为一次操作；在调用方事务内执行，不提交）"""
+        if logs:
+            self.db.execute(insert(AuditLog), flag_logs(self.db, [dict(log) for log in logs]))
+    
+    def replay_anomalies(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        dry_run: bool = False,
+        install: bool = False,
+        sample_size: int = 20
+    ) -> Dict[str, Any]:
+        """按时间顺序分批回放历史审计日志重新检测异常（独立检测器，不影响实时检测状态）
+        
+        非试运行时写回变化的异常标记；install 时回放截止于开始时刻，结束后并入回放期间实时计入的事件并替换实时检测器
+        """
+        started = time.monotonic()
+        detector = AnomalyDetector()
+        if install:
+            captured_at = anomaly_detector.begin_capture()
+            end_date = min(end_date, captured_at) if end_date else captured_at
+        stats: Dict[str, Any] = {"processed": 0, "flagged": 0, "changed": 0, "by_type": {}, "sample_flagged_ids": []}
+        query = self.db.query(
+            AuditLog.id, AuditLog.action, AuditLog.user_id, AuditLog.destination_country,
+            AuditLog.transfer_volume, AuditLog.created_at,
+            AuditLog.is_anomaly, AuditLog.anomaly_type, AuditLog.anomaly_reason
+        )
+        if start_date:
+            query = query.filter(AuditLog.created_at >= start_date)
+        if end_date:
+            query = query.filter(AuditLog.created_at <= end_date)
+        
+        last = None
+        while True:
+            batch = query
+            if last is not None:
+                batch = batch.filter(or_(
+                    AuditLog.created_at > last.created_at,
+                    and_(AuditLog.created_at == last.created_at, AuditLog.id > last.id)
+                ))
+            rows = batch.order_by(AuditLog.created_at, AuditLog.id).limit(settings.ANOMALY_REPLAY_BATCH_SIZE).all()
+            if not rows:
+                break
+            last = rows[-1]
+            
+            results = detector.replay([
+                to_event(row.action, row.user_id, row.destination_country, row.transfer_volume, row.created_at)
+                for row in rows
+            ])
+            changes = []
+            for row, anomaly in zip(rows, results):
+                anomaly_type, reason = anomaly or (None, None)
+                if anomaly:
+                    stats["flagged"] += 1
+                    stats["by_type"][anomaly_type] = stats["by_type"].get(anomaly_type, 0) + 1
+                    if len(stats["sample_flagged_ids"]) < sample_size:
+                        stats["sample_flagged_ids"].append(row.id)
+                if bool(row.is_anomaly) != bool(anomaly) or row.anomaly_type != anomaly_type or row.anomaly_reason != reason:
+                    changes.append({
+                        "id": row.id, "is_anomaly": bool(anomaly), "anomaly_type": anomaly_type, "anomaly_reason": reason
+                    })
+            stats["processed"] += len(rows)
+            stats["changed"] += len(changes)
+            if changes and not dry_run:
+                self.db.execute(update(AuditLog), changes)
+                self.db.commit()
+            if len(rows) < settings.ANOMALY_REPLAY_BATCH_SIZE:
+                break
+        
+        if install:
+            anomaly_detector.install(detector)
+        stats["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        logger.info(
+            "审计异常回放完成：%s 条，异常 %s 条，标记变化 %s 条，耗时 %.3f 秒",
+            stats["processed"], stats["flagged"], stats["changed"], stats["elapsed_seconds"]
+        )
+        return stats
+
 
+def warm_up_anomaly_detector():
+    """回放最近的审计日志预热实时异常检测状态（独立会话，不写回标记）"""
+    db = SessionLocal()
+    try:
+        AuditService(db).replay_anomalies(
+            start_date=datetime.now() - timedelta(hours=settings.ANOMALY_WARMUP_HOURS), dry_run=True, install=True
+        )
+    except Exception:
+        logger.exception("审计异常检测预热失败")
+    finally:
+        db.close()
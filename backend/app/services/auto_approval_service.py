@@ -0,0 +1,206 @@
+"""
+自动审批服务
+作者：张彦龙
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import List, Optional, Dict, Any, Iterable
+from datetime import datetime, timezone
+import logging
+from app.models.scenario import (
+    CrossBorderScenario, ScenarioStatus, TransferApproval, ApprovalAsset, ApprovalStatus
+)
+from app.models.risk import RiskAssessment, AssessmentStatus
+from app.models.data_asset import DataAsset, DataLevel
+from app.models.user import User
+from app.models.audit import AuditAction
+from app.services.approval_service import ApprovalService, CLAIM_CLEARED
+from app.services.audit_service import AuditService
+from app.services.interception_service import InterceptionService
+from app.services.risk_service import risk_score_of
+from app.utils.auto_approval import ApprovalFacts, load_policy, compile_policy
+from app.utils.batch_transition import transition_pending
+from app.utils.config_helper import ConfigHelper
+
+logger = logging.getLogger(__name__)
+
+# 审计日志中系统自动操作的用户名
+SYSTEM_USERNAME = "系统自动审批"
+
+# 每批加载的待审批申请数
+BATCH_SIZE = 1000
+
+
+class AutoApprovalService:
+    """自动审批服务类（批量加载审批事实，按编译后的规则判定，符合条件的在一个事务内批准）"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.config_helper = ConfigHelper(db)
+    
+    def run(
+        self,
+        scenario_ids: Optional[Iterable[int]] = None,
+        approval_ids: Optional[Iterable[int]] = None,
+        triggered_by: Optional[int] = None,
+        dry_run: bool = False
+    ) -> Dict[str, Any]:
+        """评估待审批申请并自动批准符合条件的申请（可按场景或审批限定范围，dry_run 时只返回判定结果）"""
+        policy = load_policy(self.config_helper)
+        stats: Dict[str, Any] = {"enabled": policy.enabled, "evaluated": 0, "approved_ids": [], "skipped": {}}
+        if not policy.enabled and not dry_run:
+            return stats
+        
+        decide = compile_policy(policy)
+        eligible: List[ApprovalFacts] = []
+        for facts in self.load_facts(scenario_ids, approval_ids):
+            stats["evaluated"] += 1
+            reason = decide(facts)
+            if reason is None:
+                eligible.append(facts)
+            else:
+                stats["skipped"][reason] = stats["skipped"].get(reason, 0) + 1
+        
+        if dry_run:
+            stats["approved_ids"] = [facts.approval_id for facts in eligible]
+            return stats
+        if not eligible:
+            return stats
+        
+        user = self.db.query(User).filter(User.id == triggered_by).first() if triggered_by else None
+        comment = f"系统自动审批（风险评分不高于 {policy.risk_threshold:g}）"
+        by_id = {facts.approval_id: facts for facts in eligible}
+        approved: List[int] = []
+        for start in range(0, len(eligible), BATCH_SIZE):
+            chunk = [facts.approval_id for facts in eligible[start:start + BATCH_SIZE]]
+            result = transition_pending(
+                self.db, TransferApproval, TransferApproval.approval_status, chunk, ApprovalStatus.PENDING,
+                {
+                    "approval_status": ApprovalStatus.APPROVED,
+                    "approver_id": None,
+                    "approval_comment": comment,
+                    "approved_at": datetime.now(),
+                    **CLAIM_CLEARED
+                }
+            )
+            AuditService(self.db).add_logs([
+                {
+                    "action": AuditAction.APPROVE,
+                    "resource_type": "审批",
+                    "resource_id": approval_id,
+                    "user_id": user.id if user else None,
+                    "username": SYSTEM_USERNAME,
+                    "operation_details": {
+                        "auto_approved": True,
+                        "triggered_by": user.username if user else None,
+                        "scenario_id": by_id[approval_id].scenario_id,
+                        "risk_score": by_id[approval_id].risk_score,
+                        "risk_threshold": policy.risk_threshold
+                    },
+                    "before_data": {"status": ApprovalStatus.PENDING.value},
+                    "after_data": {"status": ApprovalStatus.APPROVED.value}
+                }
+                for approval_id in result.updated_ids
+            ])
+            approved.extend(result.updated_ids)
+        self.db.commit()
+        
+        ApprovalService(self.db).register_approved(approved)
+        stats["approved_ids"] = approved
+        if approved:
+            logger.info("自动审批通过 %s 条申请", len(approved))
+        return stats
+    
+    def load_facts(
+        self,
+        scenario_ids: Optional[Iterable[int]],
+        approval_ids: Optional[Iterable[int]]
+    ) -> Iterable[ApprovalFacts]:
+        """按批加载待审批申请的判定事实（每批固定查询次数，与审批条数无关）"""
+        blacklist = InterceptionService(self.db).get_blacklist()
+        now = datetime.now(timezone.utc)
+        scenario_cache: Dict[int, tuple] = {}
+        last_id = 0
+        while True:
+            query = self.db.query(TransferApproval.id, TransferApproval.scenario_id).filter(
+                TransferApproval.approval_status == ApprovalStatus.PENDING,
+                TransferApproval.id > last_id
+            )
+            if scenario_ids is not None:
+                query = query.filter(TransferApproval.scenario_id.in_(list(scenario_ids)))
+            if approval_ids is not None:
+                query = query.filter(TransferApproval.id.in_(list(approval_ids)))
+            rows = query.order_by(TransferApproval.id).limit(BATCH_SIZE).all()
+            if not rows:
+                return
+            last_id = rows[-1].id
+            ids = [row.id for row in rows]
+            
+            missing = {row.scenario_id for row in rows} - set(scenario_cache)
+            if missing:
+                scenario_cache.update(self._load_scenarios(missing, now))
+            
+            core_ids = {r.approval_id for r in self.db.query(ApprovalAsset.approval_id).join(
+                DataAsset, DataAsset.id == ApprovalAsset.asset_id
+            ).filter(
+                ApprovalAsset.approval_id.in_(ids),
+                func.coalesce(DataAsset.effective_level, DataAsset.data_level) == DataLevel.CORE
+            ).distinct().all()}
+            blacklisted_ids = set()
+            if blacklist:
+                blacklisted_ids = {r.approval_id for r in self.db.query(ApprovalAsset.approval_id).filter(
+                    ApprovalAsset.approval_id.in_(ids),
+                    ApprovalAsset.asset_id.in_(blacklist)
+                ).distinct().all()}
+            
+            for row in rows:
+                active, risk_score, regulatory, exceeds = scenario_cache[row.scenario_id]
+                yield ApprovalFacts(
+                    approval_id=row.id,
+                    scenario_id=row.scenario_id,
+                    scenario_active=active,
+                    risk_score=risk_score,
+                    requires_regulatory_approval=regulatory,
+                    exceeds_threshold=exceeds,
+                    has_core_asset=row.id in core_ids,
+                    has_blacklisted_asset=row.id in blacklisted_ids
+                )
+            if len(rows) < BATCH_SIZE:
+                return
+    
+    def _load_scenarios(self, scenario_ids: Iterable[int], now: datetime) -> Dict[int, tuple]:
+        """批量加载场景状态及其最近一次已完成风险评估：{场景ID: (是否有效, 风险评分, 需监管审批, 超过阈值)}"""
+        scenario_ids = list(scenario_ids)
+        facts = {scenario_id: (False, None, False, False) for scenario_id in scenario_ids}
+        
+        latest = self.db.query(func.max(RiskAssessment.id)).filter(
+            RiskAssessment.scenario_id.in_(scenario_ids),
+            RiskAssessment.status == AssessmentStatus.COMPLETED,
+            RiskAssessment.overall_score.isnot(None)
+        ).group_by(RiskAssessment.scenario_id)
+        assessments = {
+            row.scenario_id: row for row in self.db.query(
+                RiskAssessment.scenario_id, RiskAssessment.overall_score,
+                RiskAssessment.requires_regulatory_approval,
+                RiskAssessment.exceeds_personal_threshold, RiskAssessment.exceeds_sensitive_threshold
+            ).filter(RiskAssessment.id.in_(latest)).all()
+        }
+        
+        for row in self.db.query(
+            CrossBorderScenario.id, CrossBorderScenario.status, CrossBorderScenario.expiry_date
+        ).filter(CrossBorderScenario.id.in_(scenario_ids)).all():
+            expiry = row.expiry_date
+            if expiry is not None and expiry.tzinfo is None:
+                expiry = expiry.replace(tzinfo=timezone.utc)
+            active = row.status == ScenarioStatus.APPROVED and (expiry is None or expiry > now)
+            assessment = assessments.get(row.id)
+            if assessment is None:
+                facts[row.id] = (active, None, False, False)
+                continue
+            facts[row.id] = (
+                active,
+                float(risk_score_of(assessment.overall_score)),
+                bool(assessment.requires_regulatory_approval),
+                bool(assessment.exceeds_personal_threshold or assessment.exceeds_sensitive_threshold)
+            )
+        return facts
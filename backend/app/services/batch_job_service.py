@@ -0,0 +1,360 @@
+"""
+批量任务服务
+作者：张彦龙
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import update, or_, and_
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Tuple, Callable
+from datetime import datetime, timedelta
+import json
+import logging
+import threading
+import uuid
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.batch_job import BatchJob
+from app.services.approval_service import ApprovalService
+from app.services.scenario_service import ScenarioService
+from app.services.data_asset_service import DataAssetService
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_STATUS_PENDING = "排队中"
+JOB_STATUS_RUNNING = "运行中"
+JOB_STATUS_SUCCESS = "成功"
+JOB_STATUS_PARTIAL = "部分失败"
+JOB_STATUS_FAILED = "失败"
+JOB_STATUS_CANCELLED = "已取消"
+JOB_FINISHED_STATUSES = (JOB_STATUS_SUCCESS, JOB_STATUS_PARTIAL, JOB_STATUS_FAILED, JOB_STATUS_CANCELLED)
+
+# 任务类型
+JOB_TYPE_APPROVE_APPROVALS = "approve_approvals"
+JOB_TYPE_REJECT_APPROVALS = "reject_approvals"
+JOB_TYPE_APPROVE_SCENARIOS = "approve_scenarios"
+JOB_TYPE_REJECT_SCENARIOS = "reject_scenarios"
+JOB_TYPE_DELETE_ASSETS = "delete_assets"
+
+# 各任务类型必需的参数
+_REQUIRED_PARAMS = {
+    JOB_TYPE_APPROVE_APPROVALS: ("approver_id",),
+    JOB_TYPE_REJECT_APPROVALS: ("approver_id", "reason"),
+    JOB_TYPE_APPROVE_SCENARIOS: ("approver_id",),
+    JOB_TYPE_REJECT_SCENARIOS: ("approver_id", "reason"),
+    JOB_TYPE_DELETE_ASSETS: (),
+}
+
+# 批量任务在后台线程池中分批执行
+_batch_pool = ThreadPoolExecutor(max_workers=settings.BATCH_JOB_MAX_WORKERS, thread_name_prefix="batch-job")
+
+# 本进程已提交到线程池、尚未执行完的任务（避免重复排队）
+_submitted: set = set()
+_submitted_lock = threading.Lock()
+
+
+def _run_chunk(db: Session, job_type: str, params: Dict[str, Any], ids: List[int]) -> Tuple[Dict[str, Any], Callable]:
+    """在调用方事务内处理一批ID（不提交），返回（处理结果，提交后需执行的回调）"""
+    if job_type == JOB_TYPE_APPROVE_APPROVALS:
+        service = ApprovalService(db)
+        result = service.batch_approve(ids, params["approver_id"], params.get("comment"), commit=False)
+        if result["success_count"]:
+            return result, lambda: service.after_approve(result["success_ids"])
+    elif job_type == JOB_TYPE_REJECT_APPROVALS:
+        result = ApprovalService(db).batch_reject(ids, params["approver_id"], params["reason"], commit=False)
+    elif job_type == JOB_TYPE_APPROVE_SCENARIOS:
+        result = ScenarioService(db).batch_approve(ids, params["approver_id"], params.get("comment"), commit=False)
+    elif job_type == JOB_TYPE_REJECT_SCENARIOS:
+        result = ScenarioService(db).batch_reject(ids, params["approver_id"], params["reason"], commit=False)
+    elif job_type == JOB_TYPE_DELETE_ASSETS:
+        service = DataAssetService(db)
+        result = service.delete_assets(ids, commit=False)
+        if result["success_count"]:
+            return result, lambda: service.after_delete(result["downstream_ids"])
+    else:
+        raise ValueError(f"不支持的任务类型: {job_type}")
+    return result, lambda: None
+
+
+def _update_owned(db: Session, job_id: int, token: str, **values) -> bool:
+    """仅当任务仍由该执行者持有时更新（不提交），返回是否更新成功"""
+    return db.execute(
+        update(BatchJob).where(BatchJob.id == job_id, BatchJob.runner_token == token).values(**values),
+        execution_options={"synchronize_session": False}
+    ).rowcount == 1
+
+
+class _Heartbeat(threading.Thread):
+    """执行期间定期刷新任务心跳（单批耗时较长时避免被其他实例判定超时接管），失去所有权时置位 lost"""
+    
+    def __init__(self, job_id: int, token: str):
+        super().__init__(name=f"batch-job-heartbeat-{job_id}", daemon=True)
+        self.job_id = job_id
+        self.token = token
+        self.lost = threading.Event()
+        self._stopped = threading.Event()
+    
+    def run(self):
+        while not self._stopped.wait(settings.BATCH_JOB_HEARTBEAT_SECONDS):
+            db = SessionLocal()
+            try:
+                owned = _update_owned(db, self.job_id, self.token, heartbeat_at=datetime.now())
+                db.commit()
+            except Exception as e:
+                logger.warning("批量任务 %s 心跳刷新失败: %s", self.job_id, e)
+                continue
+            finally:
+                db.close()
+            if not owned:
+                self.lost.set()
+                return
+    
+    def stop(self):
+        """停止刷新心跳"""
+        self._stopped.set()
+        self.join()
+
+
+class BatchJobService:
+    """批量任务服务类"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def create_job(
+        self,
+        job_type: str,
+        item_ids: List[int],
+        params: Optional[Dict[str, Any]] = None,
+        created_by: Optional[int] = None,
+        submit: bool = True
+    ) -> BatchJob:
+        """登记批量任务并提交后台执行"""
+        if job_type not in _REQUIRED_PARAMS:
+            raise ValueError(f"不支持的任务类型: {job_type}")
+        params = params or {}
+        missing = [key for key in _REQUIRED_PARAMS[job_type] if params.get(key) in (None, "")]
+        if missing:
+            raise ValueError(f"缺少任务参数: {', '.join(missing)}")
+        item_ids = list(dict.fromkeys(item_ids))
+        if not item_ids:
+            raise ValueError("待处理ID不能为空")
+        if len(item_ids) > settings.BATCH_JOB_MAX_ITEMS:
+            raise ValueError(f"单个任务最多处理 {settings.BATCH_JOB_MAX_ITEMS} 条")
+        
+        job = BatchJob(
+            job_type=job_type,
+            status=JOB_STATUS_PENDING,
+            params=json.dumps(params, ensure_ascii=False),
+            item_ids=json.dumps(item_ids),
+            total_count=len(item_ids),
+            processed_count=0,
+            success_count=0,
+            error_count=0,
+            next_offset=0,
+            cancel_requested=False,
+            created_by=created_by
+        )
+        self.db.add(job)
+        self.db.commit()
+        self.db.refresh(job)
+        if submit:
+            BatchJobService.submit(job.id)
+        return job
+    
+    def list_jobs(
+        self,
+        skip: int = 0,
+        limit: int = 20,
+        status: Optional[str] = None,
+        job_type: Optional[str] = None
+    ) -> Tuple[List[BatchJob], int]:
+        """获取批量任务列表"""
+        query = self.db.query(BatchJob)
+        if status:
+            query = query.filter(BatchJob.status == status)
+        if job_type:
+            query = query.filter(BatchJob.job_type == job_type)
+        total = query.count()
+        jobs = query.order_by(BatchJob.created_at.desc(), BatchJob.id.desc()).offset(skip).limit(limit).all()
+        return jobs, total
+    
+    def get_job(self, job_id: int) -> Optional[BatchJob]:
+        """获取批量任务"""
+        return self.db.query(BatchJob).filter(BatchJob.id == job_id).first()
+    
+    def cancel_job(self, job_id: int) -> Optional[BatchJob]:
+        """取消任务：排队中的任务直接取消，运行中的任务在当前批次完成后停止"""
+        job = self.get_job(job_id)
+        if not job:
+            return None
+        if job.status in JOB_FINISHED_STATUSES:
+            raise ValueError("任务已结束，无法取消")
+        if job.status == JOB_STATUS_PENDING:
+            job.status = JOB_STATUS_CANCELLED
+            job.finished_at = datetime.now()
+        job.cancel_requested = True
+        self.db.commit()
+        self.db.refresh(job)
+        return job
+    
+    def resume_job(self, job_id: int) -> Optional[BatchJob]:
+        """继续执行已取消或失败的任务（从中断的批次开始）"""
+        job = self.get_job(job_id)
+        if not job:
+            return None
+        if job.status not in (JOB_STATUS_CANCELLED, JOB_STATUS_FAILED):
+            raise ValueError("只有已取消或失败的任务才能继续执行")
+        if job.next_offset >= job.total_count:
+            raise ValueError("任务已全部处理完毕")
+        job.status = JOB_STATUS_PENDING
+        job.cancel_requested = False
+        job.finished_at = None
+        self.db.commit()
+        self.db.refresh(job)
+        BatchJobService.submit(job.id)
+        return job
+    
+    # ========== 后台执行 ==========
+    @staticmethod
+    def submit(job_id: int):
+        """提交任务到后台线程池（本进程已排队的任务不重复提交）"""
+        with _submitted_lock:
+            if job_id in _submitted:
+                return
+            _submitted.add(job_id)
+        _batch_pool.submit(BatchJobService.run_job, job_id)
+    
+    @staticmethod
+    def resume_unfinished() -> int:
+        """接管未完成的任务：排队中的任务，以及心跳超时（执行进程已退出）的运行中任务，返回提交数"""
+        db = SessionLocal()
+        try:
+            stale_before = datetime.now() - timedelta(seconds=settings.BATCH_JOB_STALE_SECONDS)
+            job_ids = [row.id for row in db.query(BatchJob.id).filter(
+                BatchJob.cancel_requested == False,
+                or_(
+                    BatchJob.status == JOB_STATUS_PENDING,
+                    and_(BatchJob.status == JOB_STATUS_RUNNING, BatchJob.heartbeat_at < stale_before)
+                )
+            ).order_by(BatchJob.id).all()]
+        finally:
+            db.close()
+        for job_id in job_ids:
+            BatchJobService.submit(job_id)
+        return len(job_ids)
+    
+    @staticmethod
+    def _claim(db: Session, job_id: int) -> Optional[str]:
+        """以条件更新抢占任务（多实例时只有一个执行者能抢到），返回执行者标识（未抢到返回None）"""
+        now = datetime.now()
+        token = uuid.uuid4().hex
+        stale_before = now - timedelta(seconds=settings.BATCH_JOB_STALE_SECONDS)
+        claimed = db.execute(
+            update(BatchJob).where(
+                BatchJob.id == job_id,
+                BatchJob.cancel_requested == False,
+                or_(
+                    BatchJob.status == JOB_STATUS_PENDING,
+                    and_(BatchJob.status == JOB_STATUS_RUNNING, BatchJob.heartbeat_at < stale_before)
+                )
+            ).values(status=JOB_STATUS_RUNNING, heartbeat_at=now, runner_token=token),
+            execution_options={"synchronize_session": False}
+        ).rowcount
+        db.commit()
+        return token if claimed == 1 else None
+    
+    @staticmethod
+    def run_job(job_id: int):
+        """分批执行任务：每批一个事务（处理结果与进度一并提交），每批开始前检查取消请求
+        
+        执行期间后台线程持续刷新心跳；进度和状态只在任务仍由本执行者持有时写入，
+        已被其他实例接管时回滚当前批次并停止。
+        """
+        db = SessionLocal()
+        heartbeat = None
+        token = None
+        try:
+            token = BatchJobService._claim(db, job_id)
+            if token is None:
+                return
+            heartbeat = _Heartbeat(job_id, token)
+            heartbeat.start()
+            job = db.query(BatchJob).filter(BatchJob.id == job_id).first()
+            if job.started_at is None:
+                _update_owned(db, job_id, token, started_at=datetime.now())
+                db.commit()
+            item_ids = json.loads(job.item_ids)
+            params = json.loads(job.params or "{}")
+            errors = json.loads(job.errors or "[]")
+            next_offset = job.next_offset
+            success_total = job.success_count
+            error_total = job.error_count
+            chunk_size = max(settings.BATCH_JOB_CHUNK_SIZE, 1)
+            
+            while next_offset < len(item_ids):
+                db.refresh(job)
+                if job.runner_token != token or heartbeat.lost.is_set():
+                    logger.warning("批量任务 %s 已被其他执行者接管，停止执行", job_id)
+                    return
+                if job.cancel_requested:
+                    if _update_owned(db, job_id, token, status=JOB_STATUS_CANCELLED, finished_at=datetime.now()):
+                        db.commit()
+                        logger.info("批量任务 %s 已取消，已处理 %s/%s", job_id, next_offset, job.total_count)
+                    return
+                
+                chunk = item_ids[next_offset:next_offset + chunk_size]
+                after_commit = None
+                try:
+                    result, after_commit = _run_chunk(db, job.job_type, params, chunk)
+                    chunk_errors = result["errors"]
+                    success_count = result["success_count"]
+                except Exception as e:
+                    logger.exception("批量任务 %s 第 %s 条起的批次执行失败", job_id, next_offset)
+                    db.rollback()
+                    chunk_errors = [f"第 {next_offset + 1}-{next_offset + len(chunk)} 条处理失败: {e}"]
+                    success_count = 0
+                
+                next_offset += len(chunk)
+                success_total += success_count
+                error_total += len(chunk) - success_count
+                errors.extend(chunk_errors[:max(settings.BATCH_JOB_MAX_ERRORS - len(errors), 0)])
+                # 进度与本批处理结果同一事务提交，失去所有权时本批一并回滚
+                if not _update_owned(
+                    db, job_id, token,
+                    next_offset=next_offset,
+                    processed_count=next_offset,
+                    success_count=success_total,
+                    error_count=error_total,
+                    errors=json.dumps(errors, ensure_ascii=False),
+                    heartbeat_at=datetime.now()
+                ):
+                    db.rollback()
+                    logger.warning("批量任务 %s 已被其他执行者接管，本批次已回滚并停止执行", job_id)
+                    return
+                db.commit()
+                if after_commit is not None:
+                    after_commit()
+            
+            if error_total == 0:
+                status = JOB_STATUS_SUCCESS
+            elif success_total > 0:
+                status = JOB_STATUS_PARTIAL
+            else:
+                status = JOB_STATUS_FAILED
+            if _update_owned(db, job_id, token, status=status, finished_at=datetime.now()):
+                db.commit()
+                logger.info("批量任务 %s 执行完成：成功 %s 条，失败 %s 条", job_id, success_total, error_total)
+        except Exception:
+            logger.exception("批量任务 %s 执行异常", job_id)
+            db.rollback()
+            if token is not None and _update_owned(
+                db, job_id, token, status=JOB_STATUS_FAILED, finished_at=datetime.now()
+            ):
+                db.commit()
+        finally:
+            if heartbeat is not None:
+                heartbeat.stop()
+            db.close()
+            with _submitted_lock:
+                _submitted.discard(job_id)
@@ -50,7 +50,9 @@ class DashboardService:
         total_volume = sum(
             float(log.transfer_volume) for log in transfer_logs if log.transfer_volume
         )
-        intercepted_count = len([log for log in transfer_logs if log.transfer_status == "拦截"])
+        # 频率超限的传输同属拦截，另行计数
+        rate_limited_count = len([log for log in transfer_logs if log.transfer_status == "限流"])
+        intercepted_count = len([log for log in transfer_logs if log.transfer_status == "拦截"]) + rate_limited_count
         
         # 风险评估统计
         high_risk_assessments = self.db.query(RiskAssessment).filter(
@@ -79,6 +81,7 @@ class DashboardService:
                 "total": total_transfers,
                 "total_volume": total_volume,
                 "intercepted": intercepted_count,
+                "rate_limited": rate_limited_count,
                 "success_rate": (total_transfers - intercepted_count) / total_transfers * 100 if total_transfers > 0 else 0
             },
             "risks": {
@@ -350,7 +353,8 @@ class DashboardService:
             "PENDING": "待审批",
             "APPROVED": "已批准",
             "REJECTED": "已拒绝",
-            "CANCELLED": "已取消"
+            "CANCELLED": "已取消",
+            "EXPIRED": "已过期"
         }
         status_distribution = {
             approval_status_map.get(str(status).split('.')[-1], str(status)): count 
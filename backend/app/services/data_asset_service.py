@@ -3,18 +3,28 @@
 作者：张彦龙
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from typing import List, Optional, Dict, Set, Tuple
+from sqlalchemy import and_, or_, func, update, delete
+from typing import List, Optional, Dict, Set, Tuple, Any
 from datetime import datetime
 import json
-from app.models.data_asset import DataAsset, DataClassification, SensitiveTag, DataLevel
+from app.core.config import settings
+from app.models.data_asset import (
+    DataAsset, DataAssetColumn, AssetLineage, DataClassification, SensitiveTag, DataLevel, ASSET_SEARCH_VECTOR,
+    asset_tag_association
+)
+from app.models.scenario import TransferApproval, ApprovalAsset, ApprovalStatus
 from app.schemas.data_asset import (
     DataAssetCreate, DataAssetUpdate,
     DataClassificationCreate, SensitiveTagCreate,
     LineageNode, LineageEdge, LineageGraph
 )
-from app.utils.data_scanner import DataScanner
+from app.utils.data_scanner import DataScanner, insert_ignore
 from app.utils.classification_engine import ClassificationEngine
+from app.services.scan_service import ScanService
+from app.utils.lineage_graph import lineage_index
+from app.utils.level_propagation import LevelPropagator
+from app.utils.text_search import build_search_text, build_tsquery
+from app.utils.query_count import count_query, COUNT_EXACT
 
 
 class DataAssetService:
@@ -37,9 +47,10 @@ class DataAssetService:
         is_active: Optional[bool] = None,
         created_from: Optional[datetime] = None,
         created_to: Optional[datetime] = None,
-        search: Optional[str] = None
-    ) -> tuple[List[DataAsset], int]:
-        """获取数据资产列表（支持高级搜索）"""
+        search: Optional[str] = None,
+        count: str = COUNT_EXACT
+    ) -> tuple[List[DataAsset], Optional[int], str]:
+        """获取数据资产列表（支持高级搜索），返回（资产列表，总数，实际采用的总数统计方式）"""
         query = self.db.query(DataAsset)
         
         # 精确匹配筛选
@@ -59,14 +70,9 @@ class DataAssetService:
             query = query.filter(DataAsset.asset_code.ilike(f"%{asset_code}%"))
         
         # 通用搜索（搜索名称、编码、描述）
+        rank = None
         if search:
-            query = query.filter(
-                or_(
-                    DataAsset.asset_name.ilike(f"%{search}%"),
-                    DataAsset.asset_code.ilike(f"%{search}%"),
-                    DataAsset.description.ilike(f"%{search}%")
-                )
-            )
+            query, rank = self._apply_search(query, search)
         
         # 日期范围筛选
         if created_from:
@@ -75,12 +81,63 @@ class DataAssetService:
             query = query.filter(DataAsset.created_at <= created_to)
         
         # 获取总数
-        total = query.count()
+        total, count_strategy = count_query(self.db, query, count)
+        
+        # 分页（有检索词时按相关度排序）
+        if rank is not None:
+            query = query.order_by(rank.desc(), DataAsset.created_at.desc())
+        else:
+            query = query.order_by(DataAsset.created_at.desc())
+        assets = query.offset(skip).limit(limit).all()
         
-        # 分页
-        assets = query.order_by(DataAsset.created_at.desc()).offset(skip).limit(limit).all()
+        return assets, total, count_strategy
+    
+    def _apply_search(self, query, term: str):
+        """通用检索：PostgreSQL 使用全文检索与三元组索引并返回相关度表达式，其他数据库退化为 ILIKE"""
+        term = term.strip()
+        pattern = f"%{term}%"
+        tsquery = build_tsquery(term)
+        if self.db.get_bind().dialect.name != "postgresql" or not tsquery:
+            return query.filter(
+                or_(
+                    DataAsset.asset_name.ilike(pattern),
+                    DataAsset.asset_code.ilike(pattern),
+                    DataAsset.description.ilike(pattern)
+                )
+            ), None
         
-        return assets, total
+        ts_query = func.to_tsquery("simple", tsquery)
+        query = query.filter(
+            or_(
+                ASSET_SEARCH_VECTOR.bool_op("@@")(ts_query),
+                DataAsset.asset_name.ilike(pattern),
+                DataAsset.asset_code.ilike(pattern)
+            )
+        )
+        rank = func.ts_rank(ASSET_SEARCH_VECTOR, ts_query) + func.greatest(
+            func.similarity(DataAsset.asset_name, term),
+            func.similarity(DataAsset.asset_code, term)
+        )
+        return query, rank
+    
+    def rebuild_search_index(self, batch_size: int = 5000) -> int:
+        """重建全部资产的检索分词文本（用于历史数据回填或分词规则调整后），返回更新数量"""
+        updated = 0
+        last_id = 0
+        while True:
+            rows = self.db.query(
+                DataAsset.id, DataAsset.asset_name, DataAsset.asset_code, DataAsset.description
+            ).filter(DataAsset.id > last_id).order_by(DataAsset.id).limit(batch_size).all()
+            if not rows:
+                break
+            self.db.execute(update(DataAsset), [
+                {"id": row.id, "search_text": build_search_text(row.asset_name, row.asset_code, row.description)}
+                for row in rows
+            ])
+            self.db.commit()
+            updated += len(rows)
+            last_id = rows[-1].id
+        return updated
     
     def get_asset(self, asset_id: int) -> Optional[DataAsset]:
         """获取数据资产详情"""
@@ -89,9 +146,11 @@ class DataAssetService:
     def create_asset(self, asset_data: DataAssetCreate) -> DataAsset:
         """创建数据资产"""
         db_asset = DataAsset(**asset_data.model_dump())
+        db_asset.effective_level = db_asset.data_level
         self.db.add(db_asset)
         self.db.commit()
         self.db.refresh(db_asset)
+        lineage_index.upsert_asset(db_asset.id, db_asset.asset_name, db_asset.asset_code, db_asset.data_level)
         return db_asset
     
     def update_asset(self, asset_id: int, asset_data: DataAssetUpdate) -> Optional[DataAsset]:
@@ -100,36 +159,91 @@ class DataAssetService:
         if not db_asset:
             return None
         
+        old_level = db_asset.data_level
         update_data = asset_data.model_dump(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_asset, field, value)
         
         self.db.commit()
         self.db.refresh(db_asset)
+        lineage_index.upsert_asset(db_asset.id, db_asset.asset_name, db_asset.asset_code, db_asset.data_level)
+        if db_asset.data_level != old_level or db_asset.effective_level is None:
+            # 级别变化沿血缘传播到全部下游
+            LevelPropagator(self.db).propagate([asset_id])
+            self.db.refresh(db_asset)
         return db_asset
     
-    def scan_and_classify(self, source_system: Optional[str] = None) -> dict:
-        """扫描数据资产并自动分类分级"""
-        # 扫描元数据
-        scanned_assets = self.scanner.scan_metadata(source_system)
-        
-        # 自动分类分级
-        classified_count = 0
-        for asset in scanned_assets:
-            # 使用分类引擎进行自动识别
-            classification_result = self.classifier.classify_asset(asset)
-            if classification_result:
-                asset.data_level = classification_result.get("data_level", DataLevel.INTERNAL)
-                asset.classification_id = classification_result.get("classification_id")
-                classified_count += 1
+    def delete_assets(self, asset_ids: List[int], commit: bool = True) -> Dict[str, Any]:
+        """批量删除数据资产（集合操作，级联删除字段、标签、血缘边和审批关联，被待审批或已批准审批引用的资产不删除）"""
+        asset_ids = list(dict.fromkeys(asset_ids))
+        existing = {row.id for row in self.db.query(DataAsset.id).filter(DataAsset.id.in_(asset_ids)).all()}
+        referenced: Dict[int, List[int]] = {}
+        for row in self.db.query(ApprovalAsset.asset_id, ApprovalAsset.approval_id).join(
+            TransferApproval, TransferApproval.id == ApprovalAsset.approval_id
+        ).filter(
+            ApprovalAsset.asset_id.in_(existing),
+            TransferApproval.approval_status.in_([ApprovalStatus.PENDING, ApprovalStatus.APPROVED])
+        ).order_by(ApprovalAsset.approval_id).all():
+            referenced.setdefault(row.asset_id, []).append(row.approval_id)
         
-        self.db.commit()
+        deleted = [i for i in asset_ids if i in existing and i not in referenced]
+        errors = []
+        for asset_id in asset_ids:
+            if asset_id not in existing:
+                errors.append(f"资产 {asset_id} 不存在")
+            elif asset_id in referenced:
+                errors.append(f"资产 {asset_id}: 被审批 {referenced[asset_id]} 引用，不能删除")
+        
+        downstream_ids: List[int] = []
+        if deleted:
+            deleted_set = set(deleted)
+            downstream_ids = sorted({
+                row.target_asset_id for row in self.db.query(AssetLineage.target_asset_id).filter(
+                    AssetLineage.source_asset_id.in_(deleted)
+                ).all()
+            } - deleted_set)
+            # 显式删除子表记录（不依赖数据库外键级联，标签关联表无级联）
+            self.db.execute(delete(DataAssetColumn).where(DataAssetColumn.asset_id.in_(deleted)))
+            self.db.execute(delete(asset_tag_association).where(asset_tag_association.c.asset_id.in_(deleted)))
+            self.db.execute(delete(AssetLineage).where(or_(
+                AssetLineage.source_asset_id.in_(deleted), AssetLineage.target_asset_id.in_(deleted)
+            )))
+            self.db.execute(delete(ApprovalAsset).where(ApprovalAsset.asset_id.in_(deleted)))
+            self.db.execute(
+                delete(DataAsset).where(DataAsset.id.in_(deleted)),
+                execution_options={"synchronize_session": False}
+            )
+            if commit:
+                self.db.commit()
+                self.after_delete(downstream_ids)
         
         return {
-            "count": len(scanned_assets),
-            "classified_count": classified_count
+            "success_count": len(deleted),
+            "error_count": len(errors),
+            "success_ids": deleted,
+            "errors": errors,
+            "downstream_ids": downstream_ids
         }
     
+    def after_delete(self, downstream_ids: List[int]):
+        """删除提交后刷新血缘图，并重算失去上游的下游资产有效级别（可能降级）"""
+        lineage_index.invalidate()
+        if downstream_ids:
+            LevelPropagator(self.db).propagate(downstream_ids)
+    
+    def scan_and_classify(self, source_system: Optional[str] = None) -> dict:
+        """扫描数据资产并自动分类分级（表名与字段名一并识别），随后在后台抽样剖析内容"""
+        result = self.scanner.scan_metadata(source_system, self.classifier)
+        ScanService.submit_profile(source_system=source_system or "未知")
+        result["profile_submitted"] = True
+        return result
+    
+    def list_columns(self, asset_id: int) -> List[DataAssetColumn]:
+        """获取数据资产的字段列表"""
+        return self.db.query(DataAssetColumn).filter(
+            DataAssetColumn.asset_id == asset_id
+        ).order_by(DataAssetColumn.ordinal_position).all()
+    
     def list_classifications(self) -> List[DataClassification]:
         """获取数据分类列表"""
         return self.db.query(DataClassification).all()
@@ -154,69 +268,60 @@ class DataAssetService:
         self.db.refresh(db_tag)
         return db_tag
     
-    def get_lineage_graph(self, asset_id: int, depth: int = 2) -> LineageGraph:
-        """获取数据资产的血缘关系图"""
+    def get_lineage_graph(
+        self,
+        asset_id: int,
+        depth: int = 2,
+        max_nodes: Optional[int] = None,
+        max_edges: Optional[int] = None
+    ) -> LineageGraph:
+        """获取数据资产的血缘关系图（按层扩展，每层一次查询，超过节点/边上限时截断）"""
         center_asset = self.get_asset(asset_id)
         if not center_asset:
             raise ValueError(f"数据资产 {asset_id} 不存在")
+        max_nodes = max_nodes or settings.LINEAGE_MAX_NODES
+        max_edges = max_edges or settings.LINEAGE_MAX_EDGES
         
-        # 收集所有相关资产ID
-        asset_ids: Set[int] = {asset_id}
-        nodes: Dict[int, DataAsset] = {asset_id: center_asset}
-        edges: List[LineageEdge] = []
+        visited: Set[int] = {asset_id}
+        frontier: Set[int] = {asset_id}
+        edges: Dict[Tuple[int, int], None] = {}
+        truncated = False
         
-        # 递归收集上游和下游资产
-        def collect_related_assets(current_id: int, current_depth: int):
-            if current_depth > depth:
-                return
-            
-            asset = nodes.get(current_id)
-            if not asset:
-                return
-            
-            # 收集上游资产
-            if asset.upstream_assets:
-                try:
-                    upstream_ids = json.loads(asset.upstream_assets)
-                    if isinstance(upstream_ids, list):
-                        for upstream_id in upstream_ids:
-                            if upstream_id not in asset_ids:
-                                upstream_asset = self.get_asset(upstream_id)
-                                if upstream_asset:
-                                    asset_ids.add(upstream_id)
-                                    nodes[upstream_id] = upstream_asset
-                                    edges.append(LineageEdge(
-                                        source=upstream_id,
-                                        target=current_id,
-                                        type="downstream"
-                                    ))
-                                    collect_related_assets(upstream_id, current_depth + 1)
-                except (json.JSONDecodeError, TypeError):
-                    pass
+        for _ in range(depth):
+            if not frontier or truncated:
+                break
+            frontier_ids = list(frontier)
+            # 一次取回当前层所有节点的上下游边；多取一些以便识别截断
+            rows = self.db.query(AssetLineage.source_asset_id, AssetLineage.target_asset_id).filter(
+                or_(
+                    AssetLineage.source_asset_id.in_(frontier_ids),
+                    AssetLineage.target_asset_id.in_(frontier_ids)
+                )
+            ).order_by(AssetLineage.id).limit(2 * max_edges + 1).all()
+            if len(rows) > 2 * max_edges:
+                truncated = True
             
-            # 收集下游资产
-            if asset.downstream_assets:
-                try:
-                    downstream_ids = json.loads(asset.downstream_assets)
-                    if isinstance(downstream_ids, list):
-                        for downstream_id in downstream_ids:
-                            if downstream_id not in asset_ids:
-                                downstream_asset = self.get_asset(downstream_id)
-                                if downstream_asset:
-                                    asset_ids.add(downstream_id)
-                                    nodes[downstream_id] = downstream_asset
-                                    edges.append(LineageEdge(
-                                        source=current_id,
-                                        target=downstream_id,
-                                        type="downstream"
-                                    ))
-                                    collect_related_assets(downstream_id, current_depth + 1)
-                except (json.JSONDecodeError, TypeError):
-                    pass
+            next_frontier: Set[int] = set()
+            for source_id, target_id in rows:
+                if (source_id, target_id) in edges:
+                    continue
+                if len(edges) >= max_edges:
+                    truncated = True
+                    break
+                neighbor = target_id if source_id in frontier else source_id
+                if neighbor not in visited:
+                    if len(visited) >= max_nodes:
+                        truncated = True
+                        continue
+                    visited.add(neighbor)
+                    next_frontier.add(neighbor)
+                edges[(source_id, target_id)] = None
+            frontier = next_frontier
         
-        collect_related_assets(asset_id, 0)
-        
-        # 转换为响应模型
+        # 一次取回全部节点
+        assets = self.db.query(
+            DataAsset.id, DataAsset.asset_name, DataAsset.asset_code, DataAsset.asset_type, DataAsset.data_level
+        ).filter(DataAsset.id.in_(visited)).all()
         lineage_nodes = [
             LineageNode(
                 id=node.id,
@@ -225,12 +330,100 @@ class DataAssetService:
                 type=node.asset_type,
                 data_level=node.data_level.value
             )
-            for node in nodes.values()
+            for node in assets
+        ]
+        lineage_edges = [
+            LineageEdge(source=source_id, target=target_id, type="downstream")
+            for source_id, target_id in edges
         ]
         
         return LineageGraph(
             nodes=lineage_nodes,
-            edges=edges,
-            center_node_id=asset_id
+            edges=lineage_edges,
+            center_node_id=asset_id,
+            truncated=truncated
         )
-
+    
+    def set_lineage(
+        self,
+        asset_id: int,
+        upstream_ids: Optional[List[int]] = None,
+        downstream_ids: Optional[List[int]] = None
+    ) -> LineageGraph:
+        """替换资产的直接上游和/或下游"""
+        if not self.get_asset(asset_id):
+            raise ValueError(f"数据资产 {asset_id} 不存在")
+        
+        related = set(upstream_ids or []) | set(downstream_ids or [])
+        if asset_id in related:
+            raise ValueError("资产不能作为自身的上下游")
+        if related:
+            found = {row.id for row in self.db.query(DataAsset.id).filter(DataAsset.id.in_(related)).all()}
+            missing = sorted(related - found)
+            if missing:
+                raise ValueError(f"数据资产 {missing} 不存在")
+        
+        # 原下游失去上游后同样需要重算有效级别
+        affected = {asset_id} | set(downstream_ids or [])
+        if downstream_ids is not None:
+            affected.update(row.target_asset_id for row in self.db.query(AssetLineage.target_asset_id).filter(
+                AssetLineage.source_asset_id == asset_id
+            ).all())
+        
+        rows = []
+        if upstream_ids is not None:
+            self.db.query(AssetLineage).filter(
+                AssetLineage.target_asset_id == asset_id
+            ).delete(synchronize_session=False)
+            rows.extend({"source_asset_id": i, "target_asset_id": asset_id} for i in set(upstream_ids))
+        if downstream_ids is not None:
+            self.db.query(AssetLineage).filter(
+                AssetLineage.source_asset_id == asset_id
+            ).delete(synchronize_session=False)
+            rows.extend({"source_asset_id": asset_id, "target_asset_id": i} for i in set(downstream_ids))
+        if rows:
+            self.db.execute(insert_ignore(self.db, AssetLineage), rows)
+        self.db.commit()
+        lineage_index.replace_edges(asset_id, upstream_ids, downstream_ids)
+        LevelPropagator(self.db).propagate(affected)
+        return self.get_lineage_graph(asset_id, depth=1)
+    
+    def import_legacy_lineage(self) -> int:
+        """将旧版 upstream_assets/downstream_assets JSON 字段迁移到血缘边表"""
+        edges: Set[Tuple[int, int]] = set()
+        rows = self.db.query(DataAsset.id, DataAsset.upstream_assets, DataAsset.downstream_assets).filter(
+            or_(DataAsset.upstream_assets.isnot(None), DataAsset.downstream_assets.isnot(None))
+        ).all()
+        for row in rows:
+            for raw, upstream in ((row.upstream_assets, True), (row.downstream_assets, False)):
+                if not raw:
+                    continue
+                try:
+                    related_ids = json.loads(raw)
+                except (json.JSONDecodeError, TypeError):
+                    continue
+                if not isinstance(related_ids, list):
+                    continue
+                for related_id in related_ids:
+                    if isinstance(related_id, int) and related_id != row.id:
+                        edges.add((related_id, row.id) if upstream else (row.id, related_id))
+        if not edges:
+            return 0
+        
+        asset_ids = {i for edge in edges for i in edge}
+        found = {row.id for row in self.db.query(DataAsset.id).filter(DataAsset.id.in_(asset_ids)).all()}
+        edge_rows = [
+            {"source_asset_id": source_id, "target_asset_id": target_id}
+            for source_id, target_id in edges
+            if source_id in found and target_id in found
+        ]
+        if edge_rows:
+            self.db.execute(insert_ignore(self.db, AssetLineage), edge_rows)
+        self.db.commit()
+        lineage_index.load(self.db)
+        LevelPropagator(self.db).propagate(row["target_asset_id"] for row in edge_rows)
+        return len(edge_rows)
+    
+    def recompute_effective_levels(self) -> dict:
+        """全量重算有效级别"""
+        return LevelPropagator(self.db).recompute_all()
@@ -0,0 +1,153 @@
+"""
+审批超时与场景到期服务
+作者：张彦龙
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
+import logging
+from app.core.config import settings
+from app.models.scenario import CrossBorderScenario, ScenarioStatus, TransferApproval, ApprovalStatus
+from app.models.notification import NotificationType
+from app.services.approval_service import CLAIM_CLEARED
+from app.services.notification_service import NotificationService
+from app.utils.config_helper import ConfigHelper
+from app.utils.lineage_graph import lineage_index
+
+logger = logging.getLogger(__name__)
+
+# 过期原因
+EXPIRE_REASON_TIMEOUT = "审批超时未处理"
+EXPIRE_REASON_TRANSFER_END = "传输有效期已结束"
+EXPIRE_REASON_SCENARIO = "所属场景已到期"
+
+
+class ExpiryService:
+    """审批超时与场景到期服务类（按批流转：SKIP LOCKED 锁定一批、条件 UPDATE 写入，多实例并发执行互不重复）"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.config_helper = ConfigHelper(db)
+        self.notification_service = NotificationService(db)
+    
+    def sweep(self, batch_size: Optional[int] = None, now: Optional[datetime] = None) -> Dict[str, int]:
+        """执行一轮到期扫描：场景到期、已到期场景下的审批、审批超时、传输有效期结束，返回各类流转条数"""
+        batch_size = max(batch_size or settings.EXPIRY_SWEEP_BATCH_SIZE, 1)
+        now = now or datetime.now(timezone.utc)
+        stats = {
+            "scenarios_expired": self._drain(lambda: self._expire_scenarios(now, batch_size), batch_size),
+            "scenario_approvals_expired": self._drain(lambda: self._expire_approvals(
+                [ApprovalStatus.PENDING, ApprovalStatus.APPROVED],
+                TransferApproval.scenario_id.in_(
+                    select(CrossBorderScenario.id).where(CrossBorderScenario.status == ScenarioStatus.EXPIRED)
+                ),
+                EXPIRE_REASON_SCENARIO, batch_size
+            ), batch_size),
+            "approvals_timed_out": 0,
+            "approvals_expired": self._drain(lambda: self._expire_approvals(
+                [ApprovalStatus.APPROVED],
+                TransferApproval.transfer_end_time < now,
+                EXPIRE_REASON_TRANSFER_END, batch_size
+            ), batch_size),
+        }
+        
+        timeout_days = int(self.config_helper.get_approval_timeout_days() or 0)
+        if timeout_days > 0:
+            deadline = now - timedelta(days=timeout_days)
+            stats["approvals_timed_out"] = self._drain(lambda: self._expire_approvals(
+                [ApprovalStatus.PENDING],
+                TransferApproval.created_at < deadline,
+                EXPIRE_REASON_TIMEOUT, batch_size
+            ), batch_size)
+        
+        if any(stats.values()):
+            logger.info("到期扫描完成：%s", stats)
+        return stats
+    
+    @staticmethod
+    def _drain(step, batch_size: int) -> int:
+        """重复执行单批流转直至不足一批"""
+        total = 0
+        while True:
+            count = step()
+            total += count
+            if count < batch_size:
+                return total
+    
+    def _expire_scenarios(self, now: datetime, batch_size: int) -> int:
+        """将一批已过到期日期的已批准场景置为已过期，并通知场景创建人"""
+        rows = self.db.query(CrossBorderScenario.id, CrossBorderScenario.scenario_name).filter(
+            CrossBorderScenario.status == ScenarioStatus.APPROVED,
+            CrossBorderScenario.expiry_date < now
+        ).order_by(CrossBorderScenario.expiry_date, CrossBorderScenario.id).limit(batch_size).with_for_update(
+            skip_locked=True
+        ).all()
+        if not rows:
+            self.db.commit()
+            return 0
+        
+        expired = self.db.execute(
+            update(CrossBorderScenario).where(
+                CrossBorderScenario.id.in_([row.id for row in rows]),
+                CrossBorderScenario.status == ScenarioStatus.APPROVED
+            ).values(status=ScenarioStatus.EXPIRED).returning(
+                CrossBorderScenario.id, CrossBorderScenario.scenario_name, CrossBorderScenario.created_by
+            ).execution_options(synchronize_session=False)
+        ).all()
+        self.notification_service.add_notifications([
+            self._notification(
+                row.created_by, "scenario", row.id,
+                f"跨境传输场景已到期：{row.scenario_name}",
+                f"场景「{row.scenario_name}」已超过到期日期，状态已变更为已过期，相关传输审批将同步失效。"
+            )
+            for row in expired
+        ])
+        self.db.commit()
+        return len(rows)
+    
+    def _expire_approvals(self, statuses: List[ApprovalStatus], condition, reason: str, batch_size: int) -> int:
+        """将一批满足条件的审批置为已过期，通知申请人，并将原已批准的审批移出血缘图白名单"""
+        rows = self.db.query(TransferApproval.id).filter(
+            TransferApproval.approval_status.in_(statuses),
+            condition
+        ).order_by(TransferApproval.id).limit(batch_size).with_for_update(skip_locked=True).all()
+        if not rows:
+            self.db.commit()
+            return 0
+        
+        expired = self.db.execute(
+            update(TransferApproval).where(
+                TransferApproval.id.in_([row.id for row in rows]),
+                TransferApproval.approval_status.in_(statuses)
+            ).values(approval_status=ApprovalStatus.EXPIRED, **CLAIM_CLEARED).returning(
+                TransferApproval.id, TransferApproval.scenario_id, TransferApproval.applicant_id
+            ).execution_options(synchronize_session=False)
+        ).all()
+        self.notification_service.add_notifications([
+            self._notification(
+                row.applicant_id, "approval", row.id,
+                f"传输审批已过期：#{row.id}",
+                f"传输审批 #{row.id} 已过期（{reason}），相关数据传输将被拦截。"
+            )
+            for row in expired
+        ])
+        self.db.commit()
+        
+        # 拦截服务白名单按已批准状态从数据库加载，状态流转后即失效；进程内血缘图需显式移除
+        for row in expired:
+            lineage_index.set_approval(row.id, row.scenario_id, None, approved=False)
+        return len(rows)
+    
+    @staticmethod
+    def _notification(user_id: int, resource_type: str, resource_id: int, title: str, content: str) -> Dict[str, Any]:
+        """构造到期提醒通知行"""
+        return {
+            "user_id": user_id,
+            "type": NotificationType.REMINDER,
+            "title": title,
+            "content": content,
+            "resource_type": resource_type,
+            "resource_id": resource_id,
+            "priority": 1
+        }
@@ -0,0 +1,73 @@
+"""
+血缘影响分析服务
+作者：张彦龙
+"""
+from sqlalchemy.orm import Session
+from typing import Optional
+import time
+from app.schemas.data_asset import ImpactNode, ImpactApproval, ImpactAnalysis, LineagePath
+from app.utils.lineage_graph import lineage_index, AssetInfo
+
+
+class ImpactService:
+    """血缘影响分析服务类（查询基于内存血缘图，不访问数据库）"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    @staticmethod
+    def _node(info: AssetInfo, depth: int = 0) -> ImpactNode:
+        """转换为响应节点"""
+        return ImpactNode(
+            id=info.asset_id,
+            name=info.name,
+            code=info.code,
+            data_level=info.data_level,
+            depth=depth
+        )
+    
+    def analyze(
+        self,
+        asset_id: int,
+        max_depth: Optional[int] = None,
+        limit: int = 1000
+    ) -> ImpactAnalysis:
+        """分析资产的传递下游及涉及这些资产的已批准审批和场景"""
+        lineage_index.ensure_loaded(self.db, asset_id)
+        if not lineage_index.has_asset(asset_id):
+            raise ValueError(f"数据资产 {asset_id} 不存在")
+        
+        started = time.perf_counter()
+        downstream = lineage_index.downstream(asset_id, max_depth=max_depth)
+        subtree = [asset_id] + [info.asset_id for info, _ in downstream]
+        approvals = lineage_index.approvals_touching(subtree)
+        
+        return ImpactAnalysis(
+            asset=self._node(lineage_index.get_asset(asset_id)),
+            downstream=[self._node(info, depth) for info, depth in downstream[:limit]],
+            downstream_count=len(downstream),
+            approvals=[
+                ImpactApproval(approval_id=hit.approval_id, scenario_id=hit.scenario_id, asset_ids=hit.asset_ids)
+                for hit in approvals
+            ],
+            scenario_ids=sorted({hit.scenario_id for hit in approvals}),
+            truncated=len(downstream) > limit,
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 3)
+        )
+    
+    def find_path(self, source_id: int, target_id: int) -> LineagePath:
+        """查找两个资产之间沿下游方向的最短血缘路径"""
+        lineage_index.ensure_loaded(self.db, source_id)
+        for asset_id in (source_id, target_id):
+            if not lineage_index.has_asset(asset_id):
+                lineage_index.ensure_loaded(self.db, asset_id)
+            if not lineage_index.has_asset(asset_id):
+                raise ValueError(f"数据资产 {asset_id} 不存在")
+        
+        path = lineage_index.shortest_path(source_id, target_id)
+        return LineagePath(
+            source_id=source_id,
+            target_id=target_id,
+            found=path is not None,
+            nodes=[self._node(info, depth) for depth, info in enumerate(path or [])]
+        )
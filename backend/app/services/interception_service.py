@@ -2,11 +2,30 @@
 拦截与脱敏服务
 作者：张彦龙
 """
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import func
 from typing import List, Optional, Dict, Any
-from app.models.scenario import TransferApproval
+import json
+import math
+from app.models.scenario import TransferApproval, ApprovalAsset, CrossBorderScenario
 from app.models.data_asset import DataAsset, DataLevel
+from app.services.transfer_ledger_service import TransferLedgerService
+from app.utils.config_helper import ConfigHelper
 from app.utils.desensitization import DesensitizationEngine
+from app.utils.rate_limiter import transfer_rate_limiter, daily_limit, frequency_limit
+
+
+def parse_asset_ids(raw) -> List[int]:
+    """解析审批记录中的数据资产ID（JSON数组字符串或列表）"""
+    if not raw:
+        return []
+    if isinstance(raw, list):
+        return raw
+    try:
+        asset_ids = json.loads(raw)
+    except (json.JSONDecodeError, TypeError):
+        return []
+    return asset_ids if isinstance(asset_ids, list) else []
 
 
 class InterceptionService:
@@ -23,10 +42,11 @@ class InterceptionService:
     def _load_whitelist(self) -> set:
         """从数据库加载白名单（已批准的审批）"""
         from app.models.scenario import TransferApproval, ApprovalStatus
-        approved_approvals = self.db.query(TransferApproval).filter(
+        # 只取主键，避免每次构造服务时加载完整审批记录
+        approved_ids = self.db.query(TransferApproval.id).filter(
             TransferApproval.approval_status == ApprovalStatus.APPROVED
         ).all()
-        return {approval.id for approval in approved_approvals}
+        return {row.id for row in approved_ids}
     
     def _load_blacklist(self) -> set:
         """从数据库加载黑名单（从配置或标记中获取）"""
@@ -60,20 +80,65 @@ class InterceptionService:
         """获取黑名单"""
         return self.blacklist
     
+    def list_whitelist_entries(self, limit: int = 1000) -> List[Dict[str, Any]]:
+        """获取白名单条目（审批与场景联表查询，涉及资产批量预加载）"""
+        from app.models.scenario import ApprovalStatus
+        approvals = self.db.query(TransferApproval).options(
+            joinedload(TransferApproval.scenario),
+            selectinload(TransferApproval.asset_links)
+        ).filter(
+            TransferApproval.approval_status == ApprovalStatus.APPROVED
+        ).order_by(TransferApproval.id).limit(limit).all()
+        
+        entries = []
+        for approval in approvals:
+            scenario = approval.scenario
+            entries.append({
+                "approval_id": approval.id,
+                "scenario_id": scenario.id if scenario else None,
+                "scenario_name": scenario.scenario_name if scenario else None,
+                "asset_ids": approval.asset_ids,
+                # 使用批准时间或创建时间作为添加时间
+                "added_at": approval.approved_at or approval.created_at
+            })
+        return entries
+    
+    def list_blacklist_assets(self) -> List[DataAsset]:
+        """获取黑名单中的数据资产（一次IN查询）"""
+        if not self.blacklist:
+            return []
+        return self.db.query(DataAsset).filter(
+            DataAsset.id.in_(self.blacklist)
+        ).order_by(DataAsset.id).all()
+    
     def add_to_blacklist(self, asset_id: int):
         """添加到黑名单"""
         self.blacklist.add(asset_id)
     
+    def find_approvals_by_assets(self, asset_ids: List[int], approved_only: bool = True) -> List[int]:
+        """按数据资产反查涉及的审批ID（走 approval_asset 按资产的索引）"""
+        if not asset_ids:
+            return []
+        from app.models.scenario import ApprovalStatus
+        query = self.db.query(ApprovalAsset.approval_id).filter(ApprovalAsset.asset_id.in_(asset_ids))
+        if approved_only:
+            query = query.join(TransferApproval, TransferApproval.id == ApprovalAsset.approval_id).filter(
+                TransferApproval.approval_status == ApprovalStatus.APPROVED
+            )
+        return [row.approval_id for row in query.distinct().order_by(ApprovalAsset.approval_id).all()]
+    
     def check_interception(
         self,
         approval_id: Optional[int],
         asset_ids: List[int],
-        data: Dict[str, Any]
+        data: Dict[str, Any],
+        volumes: Optional[Dict[DataLevel, int]] = None
     ) -> Dict[str, Any]:
-        """检查是否需要拦截"""
+        """检查是否需要拦截（提供本次传输量时同时检查接收方年度累计出境量；传输频率只判定不扣减额度）"""
         result = {
             "allowed": False,
             "intercepted": False,
+            "rate_limited": False,
             "reason": None,
             "desensitized_data": None
         }
@@ -86,13 +151,41 @@ class InterceptionService:
                 result["reason"] = "数据资产在黑名单中，禁止出境"
                 return result
             
-            # 检查是否为核心数据
-            assets = self.db.query(DataAsset).filter(DataAsset.id.in_(asset_ids)).all()
-            if any(asset.data_level == DataLevel.CORE for asset in assets):
+            # 检查请求的资产是否都在审批范围内（未登记涉及资产的旧审批不做限制）
+            approved_ids = {row.asset_id for row in self.db.query(ApprovalAsset.asset_id).filter(
+                ApprovalAsset.approval_id == approval_id
+            ).all()}
+            if approved_ids and not set(asset_ids).issubset(approved_ids):
+                result["intercepted"] = True
+                result["reason"] = "数据资产不在审批范围内"
+                return result
+            
+            # 检查是否为核心数据（按有效级别判断，包含由上游核心数据派生的资产）
+            core_asset = self.db.query(DataAsset.id).filter(
+                DataAsset.id.in_(asset_ids),
+                func.coalesce(DataAsset.effective_level, DataAsset.data_level) == DataLevel.CORE
+            ).first()
+            if core_asset:
                 result["intercepted"] = True
                 result["reason"] = "涉及核心数据，严禁出境"
                 return result
             
+            # 检查计入本次传输后的累计出境量
+            if volumes:
+                reason = TransferLedgerService(self.db).check_transfer(approval_id, volumes)
+                if reason:
+                    result["intercepted"] = True
+                    result["reason"] = reason
+                    return result
+            
+            # 检查传输频率（只读检查不扣减额度，实际传输记录时再扣减）
+            reason = self._check_rate(approval_id, consume=False)
+            if reason:
+                result["intercepted"] = True
+                result["rate_limited"] = True
+                result["reason"] = reason
+                return result
+            
             # 允许传输，但需要脱敏
             result["allowed"] = True
             result["desensitized_data"] = self.desensitizer.desensitize(data, asset_ids)
@@ -103,6 +196,35 @@ class InterceptionService:
         result["reason"] = "传输申请未批准或已过期"
         return result
     
+    def acquire_rate(self, approval_id: int) -> Optional[str]:
+        """扣减一次传输频率额度，超出时返回限流原因（用于记录实际传输）"""
+        return self._check_rate(approval_id, consume=True)
+    
+    def _check_rate(self, approval_id: int, consume: bool) -> Optional[str]:
+        """按场景每天最大传输次数及场景申报的传输频率限流，超出时返回拦截原因（consume 为真时扣减额度）"""
+        max_per_day = ConfigHelper(self.db).get_transfer_frequency_max()
+        row = self.db.query(TransferApproval.scenario_id, CrossBorderScenario.transfer_frequency).join(
+            CrossBorderScenario, CrossBorderScenario.id == TransferApproval.scenario_id
+        ).filter(TransferApproval.id == approval_id).first()
+        if not row or not max_per_day or max_per_day <= 0:
+            return None
+        
+        scenario_key = f"scenario:{row.scenario_id}"
+        limits = {scenario_key: daily_limit(max_per_day)}
+        approval_limit = frequency_limit(row.transfer_frequency, max_per_day)
+        if approval_limit:
+            limits[f"approval:{approval_id}"] = approval_limit
+        decision = (transfer_rate_limiter.acquire if consume else transfer_rate_limiter.peek)(limits)
+        if decision.allowed:
+            return None
+        
+        retry = f"，约{math.ceil(decision.retry_after)}秒后可重试" if decision.retry_after else ""
+        if decision.key == scenario_key:
+            return f"场景传输频率超过限制（每天最多{max_per_day}次）{retry}"
+        if row.transfer_frequency == "一次性":
+            return f"一次性传输审批的传输次数已达上限（{max_per_day}次）"
+        return f"传输频率超过场景申报的传输频率（每{row.transfer_frequency}最多{max_per_day}次）{retry}"
+    
     def intercept_transfer(
         self,
         approval_id: Optional[int],
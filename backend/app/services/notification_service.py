@@ -3,12 +3,45 @@
 作者：张彦龙
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
-from typing import List, Optional, Dict
+from sqlalchemy import and_, or_, func, insert, event
+from typing import List, Optional, Dict, Any
 from datetime import datetime
 from app.models.notification import Notification, NotificationType, NotificationStatus
-from app.schemas.notification import NotificationCreate, NotificationUpdate, NotificationStats
+from app.schemas.notification import NotificationCreate, NotificationUpdate, NotificationResponse, NotificationStats
 from app.utils.config_helper import ConfigHelper
+from app.utils.notification_broker import (
+    notification_broker, push_message, EVENT_NOTIFICATION, EVENT_READ, EVENT_DELETED
+)
+
+# 会话中待事务提交后推送的消息
+PENDING_PUSH_KEY = "pending_notification_push"
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending_push(session: Session):
+    """事务提交后推送会话中暂存的通知消息"""
+    messages = session.info.pop(PENDING_PUSH_KEY, None)
+    if messages:
+        notification_broker.publish(messages)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_push(session: Session):
+    """事务回滚时丢弃暂存的通知消息"""
+    session.info.pop(PENDING_PUSH_KEY, None)
+
+
+def stats_delta(total: int = 0, unread: int = 0, read: int = 0, by_type: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """通知统计增量（客户端据此更新未读数等，无需重新查询统计）"""
+    return {"total": total, "unread": unread, "read": read, "by_type": by_type or {}}
+
+
+def notification_message(notification: Notification) -> Dict[str, Any]:
+    """新通知的推送消息"""
+    return push_message(notification.user_id, EVENT_NOTIFICATION, {
+        "notification": NotificationResponse.model_validate(notification).model_dump(mode="json"),
+        "delta": stats_delta(total=1, unread=1, by_type={notification.type.value: 1})
+    })
 
 
 class NotificationService:
@@ -29,8 +62,27 @@ class NotificationService:
         self.db.add(db_notification)
         self.db.commit()
         self.db.refresh(db_notification)
+        if notification_broker.has_audience(db_notification.user_id):
+            notification_broker.publish([notification_message(db_notification)])
         return db_notification
     
+    def add_notifications(self, notifications: List[Dict[str, Any]]) -> int:
+        """多行插入通知（在调用方事务内执行，不提交；站内通知未启用时不写入，调用方提交后推送），返回写入条数"""
+        if not notifications or not self.config_helper.get_in_app_notification_enabled():
+            return 0
+        if not any(notification_broker.has_audience(row["user_id"]) for row in notifications):
+            self.db.execute(insert(Notification), notifications)
+            return len(notifications)
+        
+        # 有在线接收者时一并取回写入的通知（含 ID 和默认值）用于推送
+        created = self.db.scalars(insert(Notification).returning(Notification), notifications).all()
+        self.stage_push([notification_message(notification) for notification in created])
+        return len(created)
+    
+    def stage_push(self, messages: List[Dict[str, Any]]):
+        """暂存推送消息，当前事务提交后发送（回滚则丢弃）"""
+        self.db.info.setdefault(PENDING_PUSH_KEY, []).extend(messages)
+    
     def get_notifications(
         self,
         user_id: int,
@@ -72,11 +124,17 @@ class NotificationService:
         if not notification:
             return None
         
+        was_unread = not notification.is_read
         notification.is_read = True
         notification.status = NotificationStatus.READ
         notification.read_at = datetime.now()
         self.db.commit()
         self.db.refresh(notification)
+        if was_unread:
+            notification_broker.publish([push_message(user_id, EVENT_READ, {
+                "ids": [notification.id],
+                "delta": stats_delta(unread=-1, read=1)
+            })])
         return notification
     
     def mark_all_as_read(self, user_id: int) -> int:
@@ -92,6 +150,12 @@ class NotificationService:
             Notification.read_at: datetime.now()
         })
         self.db.commit()
+        if count:
+            # ids 为空表示该用户的全部通知
+            notification_broker.publish([push_message(user_id, EVENT_READ, {
+                "ids": None,
+                "delta": stats_delta(unread=-count, read=count)
+            })])
         return count
     
     def delete_notification(self, notification_id: int, user_id: int) -> bool:
@@ -100,8 +164,18 @@ class NotificationService:
         if not notification:
             return False
         
+        notification_id, notification_type, was_unread = notification.id, notification.type, not notification.is_read
         self.db.delete(notification)
         self.db.commit()
+        notification_broker.publish([push_message(user_id, EVENT_DELETED, {
+            "id": notification_id,
+            "delta": stats_delta(
+                total=-1,
+                unread=-1 if was_unread else 0,
+                read=0 if was_unread else -1,
+                by_type={notification_type.value: -1}
+            )
+        })])
         return True
     
     def get_stats(self, user_id: int) -> NotificationStats:
@@ -3,13 +3,79 @@
 作者：张彦龙
 """
 from sqlalchemy.orm import Session
+from sqlalchemy import update, text
 from typing import List, Optional, Dict, Any
 from decimal import Decimal
 from datetime import datetime
+import json
+import logging
+import time
+import numpy as np
 from app.models.risk import RiskAssessment, RiskLevel, AssessmentStatus
+from app.models.scenario import CrossBorderScenario
 from app.schemas.risk import RiskAssessmentCreate, RiskAssessmentUpdate
 from app.core.config import settings
+from app.services.transfer_ledger_service import TransferLedgerService
 from app.utils.config_helper import ConfigHelper
+from app.utils.risk_snapshot import risk_snapshot
+from app.utils.risk_scoring import (
+    SCORE_DIMENSIONS, LEVELS, FLAG_UNSET, load_params, load_columns, score, diff, summarize, to_cents
+)
+
+logger = logging.getLogger(__name__)
+
+# 批量写回分批大小
+RESCORE_CHUNK_SIZE = 5000
+
+# PostgreSQL 下以数组参数展开为临时行集，一条 UPDATE 写回一批评估
+_PG_RESCORE_UPDATE = text("""
+    UPDATE risk_assessments AS r SET
+        overall_score = v.overall_score,
+        overall_risk_level = CAST(v.overall_risk_level AS risklevel),
+        exceeds_personal_threshold = v.exceeds_personal_threshold,
+        exceeds_sensitive_threshold = v.exceeds_sensitive_threshold,
+        requires_regulatory_approval = v.requires_regulatory_approval,
+        risk_factors = CAST(v.risk_factors AS json),
+        updated_at = now()
+    FROM unnest(
+        CAST(:ids AS integer[]), CAST(:overall_scores AS numeric[]), CAST(:levels AS text[]),
+        CAST(:exceeds_personal AS boolean[]), CAST(:exceeds_sensitive AS boolean[]),
+        CAST(:regulatory AS boolean[]), CAST(:risk_factors AS text[])
+    ) AS v(
+        id, overall_score, overall_risk_level, exceeds_personal_threshold,
+        exceeds_sensitive_threshold, requires_regulatory_approval, risk_factors
+    )
+    WHERE r.id = v.id
+""")
+
+
+def risk_score_of(overall_score) -> Optional[Decimal]:
+    """综合评分换算为风险评分（综合评分越高风险越低，风险评分 = 100 - 综合评分，与审批配置中的风险阈值同向）"""
+    if overall_score is None:
+        return None
+    return Decimal(100) - Decimal(str(overall_score))
+
+
+def build_risk_factors(
+    legal_environment_score,
+    security_measures_score,
+    exceeds_personal: Optional[bool],
+    exceeds_sensitive: Optional[bool]
+) -> Dict[str, Any]:
+    """构建风险因素"""
+    return {
+        "legal_environment": {
+            "score": float(legal_environment_score) if legal_environment_score else None,
+            "risk": "低" if legal_environment_score and legal_environment_score >= 70 else "中高"
+        },
+        "data_volume": {
+            "exceeds_personal": exceeds_personal,
+            "exceeds_sensitive": exceeds_sensitive
+        },
+        "security_measures": {
+            "score": float(security_measures_score) if security_measures_score else None
+        }
+    }
 
 
 class RiskAssessmentService:
@@ -63,25 +129,15 @@ class RiskAssessmentService:
         if not db_assessment:
             return None
         
-        # 计算综合评分（加权平均）
+        # 计算综合评分（按配置的维度权重加权平均）
         scores = []
         weights = []
-        
-        if db_assessment.legal_environment_score:
-            scores.append(float(db_assessment.legal_environment_score))
-            weights.append(0.3)
-        
-        if db_assessment.data_volume_score:
-            scores.append(float(db_assessment.data_volume_score))
-            weights.append(0.25)
-        
-        if db_assessment.security_measures_score:
-            scores.append(float(db_assessment.security_measures_score))
-            weights.append(0.25)
-        
-        if db_assessment.data_sensitivity_score:
-            scores.append(float(db_assessment.data_sensitivity_score))
-            weights.append(0.2)
+        params = load_params(self.config_helper)
+        for name, weight in zip(SCORE_DIMENSIONS, params.weights):
+            value = getattr(db_assessment, f"{name}_score")
+            if value:
+                scores.append(float(value))
+                weights.append(weight)
         
         if scores:
             total_weight = sum(weights)
@@ -105,20 +161,12 @@ class RiskAssessmentService:
         self._check_thresholds(db_assessment)
         
         # 构建风险因素
-        risk_factors = {
-            "legal_environment": {
-                "score": float(db_assessment.legal_environment_score) if db_assessment.legal_environment_score else None,
-                "risk": "低" if db_assessment.legal_environment_score and db_assessment.legal_environment_score >= 70 else "中高"
-            },
-            "data_volume": {
-                "exceeds_personal": db_assessment.exceeds_personal_threshold,
-                "exceeds_sensitive": db_assessment.exceeds_sensitive_threshold
-            },
-            "security_measures": {
-                "score": float(db_assessment.security_measures_score) if db_assessment.security_measures_score else None
-            }
-        }
-        db_assessment.risk_factors = risk_factors
+        db_assessment.risk_factors = build_risk_factors(
+            db_assessment.legal_environment_score,
+            db_assessment.security_measures_score,
+            db_assessment.exceeds_personal_threshold,
+            db_assessment.exceeds_sensitive_threshold
+        )
         
         # 判断是否需要监管审批
         db_assessment.requires_regulatory_approval = (
@@ -131,9 +179,156 @@ class RiskAssessmentService:
         db_assessment.completed_at = datetime.now()
         
         self.db.commit()
+        self._auto_approve(db_assessment.scenario_id)
         self.db.refresh(db_assessment)
         return db_assessment
     
+    def _auto_approve(self, scenario_id: int):
+        """评估完成后按最新评估结果对该场景的待审批申请执行自动审批（失败不影响评估结果）"""
+        from app.services.auto_approval_service import AutoApprovalService
+        try:
+            AutoApprovalService(self.db).run(scenario_ids=[scenario_id])
+        except Exception:
+            self.db.rollback()
+            logger.exception("场景 %s 风险评估完成后自动审批失败", scenario_id)
+    
+    def rescore_all(self, dry_run: bool = False, sample_size: int = 20) -> Dict[str, Any]:
+        """按当前权重和阈值向量化重算全部已完成评估，一次性批量写回发生变化的评估（dry_run 时只返回变化汇总）"""
+        started = time.monotonic()
+        columns = load_columns(self.db)
+        result = score(columns, load_params(self.config_helper))
+        summary = summarize(columns, result, sample_size)
+        summary["dry_run"] = dry_run
+        
+        if not dry_run:
+            rows = []
+            cents = to_cents(result.overall)
+            for i in np.flatnonzero(diff(columns, result)["any"]).tolist():
+                exceeds_personal = None if result.exceeds_personal[i] == FLAG_UNSET else bool(result.exceeds_personal[i])
+                exceeds_sensitive = None if result.exceeds_sensitive[i] == FLAG_UNSET else bool(result.exceeds_sensitive[i])
+                legal, _, security, _ = columns.scores[i].tolist()
+                rows.append({
+                    "id": int(columns.ids[i]),
+                    "overall_score": None if np.isnan(cents[i]) else Decimal(int(cents[i])) / 100,
+                    "overall_risk_level": LEVELS[result.level[i]] if result.level[i] >= 0 else None,
+                    "exceeds_personal_threshold": exceeds_personal,
+                    "exceeds_sensitive_threshold": exceeds_sensitive,
+                    "requires_regulatory_approval": bool(result.regulatory[i]),
+                    "risk_factors": build_risk_factors(
+                        None if np.isnan(legal) else legal, None if np.isnan(security) else security,
+                        exceeds_personal, exceeds_sensitive
+                    )
+                })
+            for start in range(0, len(rows), RESCORE_CHUNK_SIZE):
+                self._write_back(rows[start:start + RESCORE_CHUNK_SIZE])
+            self.db.commit()
+            if rows:
+                risk_snapshot.invalidate()
+        
+        summary["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        logger.info(
+            "风险评估重算%s：共 %s 条，变化 %s 条，耗时 %.3f 秒",
+            "（模拟）" if dry_run else "", summary["total"], summary["changed"], summary["elapsed_seconds"]
+        )
+        return summary
+    
+    def simulate_thresholds(self, candidate: Dict[str, Any], sample_size: int = 20) -> Dict[str, Any]:
+        """按候选阈值和权重模拟评估结果及自动审批资格变化（基于内存列式快照，不写库）"""
+        started = time.monotonic()
+        columns = risk_snapshot.get(self.db)
+        params = load_params(
+            self.config_helper,
+            weights=candidate.get("weights"),
+            high_threshold=candidate.get("risk_score_high"),
+            medium_threshold=candidate.get("risk_score_medium"),
+            personal_max=candidate.get("personal_info_max"),
+            sensitive_max=candidate.get("sensitive_info_max")
+        )
+        result = score(columns, params)
+        summary = summarize(columns, result, sample_size)
+        summary["params"] = params._asdict()
+        summary["auto_approval"] = self._simulate_auto_approval(columns, result, candidate, sample_size)
+        summary["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        return summary
+    
+    def _simulate_auto_approval(self, columns, result, candidate: Dict[str, Any], sample_size: int) -> Dict[str, Any]:
+        """比较待审批申请在当前与候选配置下的自动审批资格（两侧都按启用自动审批判定）"""
+        from app.services.auto_approval_service import AutoApprovalService
+        from app.utils.auto_approval import load_policy, compile_policy
+        
+        current_policy = load_policy(self.config_helper)
+        candidate_policy = current_policy._replace(enabled=True)
+        if candidate.get("auto_approve_risk_threshold") is not None:
+            candidate_policy = candidate_policy._replace(risk_threshold=float(candidate["auto_approve_risk_threshold"]))
+        if candidate.get("multi_level_risk_threshold") is not None and candidate_policy.multi_level_threshold is not None:
+            candidate_policy = candidate_policy._replace(multi_level_threshold=float(candidate["multi_level_risk_threshold"]))
+        decide_before = compile_policy(current_policy._replace(enabled=True))
+        decide_after = compile_policy(candidate_policy)
+        
+        # 各场景最近一次（ID最大）有综合评分的已完成评估在快照中的下标
+        scored = np.flatnonzero(~np.isnan(columns.overall))[::-1]
+        scenario_ids, first = np.unique(columns.scenario_ids[scored], return_index=True)
+        latest = dict(zip(scenario_ids.tolist(), scored[first].tolist()))
+        
+        def facts_at(facts, overall, level_result, pos):
+            """以快照中场景最近评估的结果替换判定事实中的评估部分"""
+            if pos is None or np.isnan(overall[pos]):
+                return facts._replace(risk_score=None, requires_regulatory_approval=False, exceeds_threshold=False)
+            return facts._replace(
+                risk_score=float(100 - overall[pos]),
+                requires_regulatory_approval=bool(level_result.regulatory[pos]),
+                exceeds_threshold=bool(level_result.exceeds_personal[pos] == 1 or level_result.exceeds_sensitive[pos] == 1)
+            )
+        
+        evaluated = 0
+        eligible_before = eligible_after = 0
+        lost: List[int] = []
+        gained: List[int] = []
+        reasons: Dict[str, int] = {}
+        for facts in AutoApprovalService(self.db).load_facts(None, None):
+            evaluated += 1
+            pos = latest.get(facts.scenario_id)
+            before = decide_before(facts_at(facts, columns.overall, columns, pos)) is None
+            reason = decide_after(facts_at(facts, result.overall, result, pos))
+            after = reason is None
+            eligible_before += before
+            eligible_after += after
+            if before and not after:
+                lost.append(facts.approval_id)
+            elif after and not before:
+                gained.append(facts.approval_id)
+            if reason is not None:
+                reasons[reason] = reasons.get(reason, 0) + 1
+        
+        return {
+            "enabled": current_policy.enabled,
+            "risk_threshold": candidate_policy.risk_threshold,
+            "multi_level_threshold": candidate_policy.multi_level_threshold,
+            "pending_evaluated": evaluated,
+            "eligible_before": eligible_before,
+            "eligible_after": eligible_after,
+            "lost": len(lost),
+            "gained": len(gained),
+            "ineligible_reasons": reasons,
+            "sample_lost_ids": lost[:sample_size],
+            "sample_gained_ids": gained[:sample_size]
+        }
+    
+    def _write_back(self, rows: List[Dict[str, Any]]):
+        """批量写回重算结果（PostgreSQL 一条 UPDATE ... FROM unnest，其他数据库按主键批量更新）"""
+        if self.db.get_bind().dialect.name != "postgresql":
+            self.db.execute(update(RiskAssessment), rows)
+            return
+        self.db.execute(_PG_RESCORE_UPDATE, {
+            "ids": [row["id"] for row in rows],
+            "overall_scores": [row["overall_score"] for row in rows],
+            "levels": [row["overall_risk_level"].name if row["overall_risk_level"] else None for row in rows],
+            "exceeds_personal": [row["exceeds_personal_threshold"] for row in rows],
+            "exceeds_sensitive": [row["exceeds_sensitive_threshold"] for row in rows],
+            "regulatory": [row["requires_regulatory_approval"] for row in rows],
+            "risk_factors": [json.dumps(row["risk_factors"], ensure_ascii=False) for row in rows],
+        })
+    
     def _check_thresholds(self, assessment: RiskAssessment):
         """检查阈值"""
         # 使用系统配置的阈值
@@ -189,10 +384,31 @@ class RiskAssessmentService:
                     "level": "medium"
                 })
         
+        # 接收方年度累计出境量（读取台账累计量，一次索引查询）
+        exposure = None
+        scenario = self.db.query(CrossBorderScenario).filter(
+            CrossBorderScenario.id == db_assessment.scenario_id
+        ).first()
+        if scenario:
+            exposure = TransferLedgerService(self.db).cumulative_exposure(scenario)
+            if exposure["exceeds_personal_threshold"]:
+                warnings.append({
+                    "type": "累计个人信息阈值",
+                    "message": f"本年度向接收方累计出境个人信息({exposure['personal_info_volume']})超过阈值({personal_threshold})",
+                    "level": "high"
+                })
+            if exposure["exceeds_sensitive_threshold"]:
+                warnings.append({
+                    "type": "累计敏感信息阈值",
+                    "message": f"本年度向接收方累计出境敏感个人信息({exposure['sensitive_info_volume']})超过阈值({sensitive_threshold})",
+                    "level": "critical"
+                })
+        
         return {
             "assessment_id": assessment_id,
             "exceeds_personal_threshold": db_assessment.exceeds_personal_threshold,
             "exceeds_sensitive_threshold": db_assessment.exceeds_sensitive_threshold,
+            "cumulative_exposure": exposure,
             "warnings": warnings
         }
 
@@ -0,0 +1,475 @@
+"""
+多数据源扫描服务
+作者：张彦龙
+"""
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed, TimeoutError as FutureTimeoutError
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime
+from contextlib import contextmanager
+import json
+import logging
+import threading
+import time
+from app.core.config import settings
+from app.core.database import SessionLocal, engine
+from app.models.scan import ScanSource, ScanJob
+from app.schemas.scan import ScanSourceCreate, ScanSourceUpdate, SourceScanResult, MultiSourceScanResponse
+from app.utils.classification_engine import ClassificationEngine
+from app.utils.data_scanner import DataScanner, ExistingAsset
+from app.utils.data_profiler import DataProfiler
+
+logger = logging.getLogger(__name__)
+
+# 扫描状态
+SCAN_STATUS_SUCCESS = "成功"
+SCAN_STATUS_PARTIAL = "部分失败"
+SCAN_STATUS_FAILED = "失败"
+SCAN_STATUS_TIMEOUT = "超时"
+
+# 扫描任务状态与触发方式
+JOB_STATUS_PENDING = "排队中"
+JOB_STATUS_RUNNING = "运行中"
+JOB_STATUS_SKIPPED = "已跳过"
+JOB_TRIGGER_SCHEDULED = "定时"
+JOB_TRIGGER_MANUAL = "手动"
+
+# 累加到数据源结果中的计数字段
+_SUMMARY_COUNTERS = (
+    "count", "updated_count", "classified_count", "tagged_count", "column_count", "sensitive_column_count",
+    "schema_count", "catalog_table_count", "catalog_column_count", "existing_count",
+    "new_count", "changed_count", "unchanged_count"
+)
+
+# 内容抽样剖析在后台线程池中执行，不阻塞扫描请求
+_profile_pool = ThreadPoolExecutor(max_workers=settings.PROFILE_MAX_WORKERS, thread_name_prefix="profile")
+
+# 扫描任务在后台串行执行（同一时刻全局只运行一个扫描，由单飞锁保证跨进程互斥）
+_job_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scan-job")
+
+# 非PostgreSQL部署时退化为进程内锁
+_local_scan_lock = threading.Lock()
+
+
+@contextmanager
+def scan_lock():
+    """扫描单飞锁：PostgreSQL 使用会话级 advisory lock 跨进程互斥，获取失败时不等待"""
+    if engine.dialect.name != "postgresql":
+        acquired = _local_scan_lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                _local_scan_lock.release()
+        return
+    
+    connection = engine.connect()
+    acquired = False
+    try:
+        acquired = bool(connection.execute(
+            select(func.pg_try_advisory_lock(settings.SCAN_LOCK_KEY))
+        ).scalar())
+        # 会话级锁在事务提交后仍然保持，避免长时间处于 idle in transaction
+        connection.commit()
+        yield acquired
+    finally:
+        try:
+            if acquired:
+                connection.execute(select(func.pg_advisory_unlock(settings.SCAN_LOCK_KEY)))
+                connection.commit()
+        finally:
+            connection.close()
+
+
+class ScanService:
+    """多数据源扫描服务类"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    # ========== 数据源管理 ==========
+    def list_sources(self, is_active: Optional[bool] = None) -> List[ScanSource]:
+        """获取扫描数据源列表"""
+        query = self.db.query(ScanSource)
+        if is_active is not None:
+            query = query.filter(ScanSource.is_active == is_active)
+        return query.order_by(ScanSource.id).all()
+    
+    def get_source(self, source_id: int) -> Optional[ScanSource]:
+        """获取扫描数据源"""
+        return self.db.query(ScanSource).filter(ScanSource.id == source_id).first()
+    
+    def create_source(self, source_data: ScanSourceCreate) -> ScanSource:
+        """登记扫描数据源"""
+        if self.db.query(ScanSource).filter(ScanSource.source_name == source_data.source_name).first():
+            raise ValueError(f"数据源 {source_data.source_name} 已存在")
+        self._validate_url(source_data.connection_url)
+        
+        db_source = ScanSource(**source_data.model_dump())
+        self.db.add(db_source)
+        self.db.commit()
+        self.db.refresh(db_source)
+        return db_source
+    
+    def update_source(self, source_id: int, source_data: ScanSourceUpdate) -> Optional[ScanSource]:
+        """更新扫描数据源"""
+        db_source = self.get_source(source_id)
+        if not db_source:
+            return None
+        
+        update_data = source_data.model_dump(exclude_unset=True)
+        if update_data.get("connection_url"):
+            self._validate_url(update_data["connection_url"])
+        for field, value in update_data.items():
+            setattr(db_source, field, value)
+        
+        self.db.commit()
+        self.db.refresh(db_source)
+        return db_source
+    
+    def delete_source(self, source_id: int) -> bool:
+        """删除扫描数据源（已登记的资产保留）"""
+        db_source = self.get_source(source_id)
+        if not db_source:
+            return False
+        self.db.delete(db_source)
+        self.db.commit()
+        return True
+    
+    @staticmethod
+    def _validate_url(connection_url: str):
+        """校验连接URL格式"""
+        try:
+            make_url(connection_url)
+        except Exception:
+            raise ValueError("数据库连接URL格式无效")
+    
+    # ========== 并发扫描 ==========
+    def scan_sources(self, source_ids: Optional[List[int]] = None) -> MultiSourceScanResponse:
+        """并发扫描多个数据源（数据源之间相互隔离，单个失败不影响其他）"""
+        started = time.monotonic()
+        query = self.db.query(ScanSource.id).filter(ScanSource.is_active == True)
+        if source_ids:
+            query = query.filter(ScanSource.id.in_(source_ids))
+        ids = [row.id for row in query.order_by(ScanSource.id).all()]
+        
+        results: List[SourceScanResult] = []
+        if ids:
+            with ThreadPoolExecutor(
+                max_workers=min(settings.SCAN_MAX_WORKERS, len(ids)),
+                thread_name_prefix="scan-source"
+            ) as pool:
+                results = list(pool.map(self.scan_source, ids))
+        
+        succeeded = sum(1 for r in results if r.status == SCAN_STATUS_SUCCESS)
+        return MultiSourceScanResponse(
+            total_sources=len(results),
+            succeeded=succeeded,
+            failed=len(results) - succeeded,
+            scanned_count=sum(r.count for r in results),
+            elapsed_seconds=round(time.monotonic() - started, 3),
+            results=results
+        )
+    
+    def scan_source(self, source_id: int) -> SourceScanResult:
+        """扫描单个数据源：Schema按数据源并发上限并行采集，每个Schema采集完立即识别并批量入库"""
+        started = time.monotonic()
+        db = SessionLocal()
+        source_engine: Optional[Engine] = None
+        result = SourceScanResult(source_id=source_id, source_name="", status=SCAN_STATUS_FAILED)
+        summary: Dict[str, Any] = {key: 0 for key in _SUMMARY_COUNTERS}
+        try:
+            source = db.query(ScanSource).filter(ScanSource.id == source_id).first()
+            if not source:
+                result.errors.append("数据源不存在")
+                return result
+            result.source_name = source.source_name
+            timeout = source.timeout_seconds or settings.SCAN_DEFAULT_TIMEOUT_SECONDS
+            deadline = started + timeout
+            schemas = [s.strip() for s in (source.schemas or "").split(",") if s.strip()]
+            
+            try:
+                source_engine = self._create_source_engine(source, timeout)
+                scanner = DataScanner(db, source_engine, schemas=schemas, asset_code_prefix=source.source_name)
+                with source_engine.connect() as connection:
+                    schema_names = scanner.list_schemas(connection)
+                existing_keys = scanner.load_existing_keys(source.source_name)
+            except Exception as e:
+                logger.warning("数据源 %s 连接或目录读取失败: %s", source.source_name, e)
+                result.errors.append(f"连接失败: {e}")
+                self._record_result(db, source, result)
+                return result
+            
+            timed_out = False
+            cancel_event = threading.Event()
+            pool = ThreadPoolExecutor(
+                max_workers=max(1, min(source.max_concurrency or 1, len(schema_names) or 1)),
+                thread_name_prefix=f"scan-{source.id}"
+            )
+            try:
+                futures = {
+                    pool.submit(
+                        self._scan_schema, source_engine, source.source_name, schema, existing_keys, deadline,
+                        cancel_event
+                    ): schema
+                    for schema in schema_names
+                }
+                for future in as_completed(futures, timeout=max(deadline - time.monotonic(), 0)):
+                    schema = futures[future]
+                    try:
+                        schema_summary = future.result()
+                    except Exception as e:
+                        logger.warning("数据源 %s 的 Schema %s 扫描失败: %s", source.source_name, schema, e)
+                        result.errors.append(f"{schema}: {e}")
+                        continue
+                    for key in _SUMMARY_COUNTERS:
+                        summary[key] += schema_summary.get(key, 0)
+            except FutureTimeoutError:
+                timed_out = True
+                result.errors.append(f"扫描超过 {timeout} 秒，未完成的Schema已取消")
+            finally:
+                # 通知运行中的Schema在下一张表或提交前停止，并等待其退出后再记录结果和释放连接池
+                cancel_event.set()
+                pool.shutdown(wait=True, cancel_futures=True)
+            
+            if timed_out:
+                result.status = SCAN_STATUS_TIMEOUT
+            elif result.errors:
+                result.status = SCAN_STATUS_PARTIAL if len(result.errors) < len(schema_names) else SCAN_STATUS_FAILED
+            else:
+                result.status = SCAN_STATUS_SUCCESS
+            result.count = summary["count"]
+            result.column_count = summary["column_count"]
+            result.summary = summary
+            result.elapsed_seconds = round(time.monotonic() - started, 3)
+            self._record_result(db, source, result)
+            if result.status in (SCAN_STATUS_SUCCESS, SCAN_STATUS_PARTIAL):
+                self.submit_profile(source_id)
+                result.profile_submitted = True
+            return result
+        except Exception as e:
+            logger.exception("数据源 %s 扫描异常", source_id)
+            db.rollback()
+            result.errors.append(str(e))
+            return result
+        finally:
+            if source_engine is not None:
+                source_engine.dispose()
+            db.close()
+    
+    def _scan_schema(
+        self,
+        source_engine: Engine,
+        source_name: str,
+        schema: str,
+        existing_keys: Dict[Tuple[str, str], ExistingAsset],
+        deadline: float,
+        cancel_event: Optional[threading.Event] = None
+    ) -> Dict[str, Any]:
+        """采集一个Schema并立即识别入库（每个任务使用独立的会话和连接，收到取消信号后不再写入）"""
+        if time.monotonic() > deadline:
+            raise TimeoutError("已超过数据源扫描时限")
+        db = SessionLocal()
+        try:
+            scanner = DataScanner(db, source_engine, asset_code_prefix=source_name, cancel_event=cancel_event)
+            stats: Dict[str, Any] = {}
+            with source_engine.connect() as connection:
+                tables = scanner.collect_schema(connection, schema, existing_keys, stats)
+            summary = scanner.save_scan_results(tables, source_name, ClassificationEngine(db))
+            scanner.check_cancelled()
+            scanner.mark_unchanged()
+            summary.update(stats)
+            return summary
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    # ========== 扫描任务 ==========
+    def create_job(
+        self,
+        source_ids: Optional[List[int]] = None,
+        created_by: Optional[int] = None,
+        trigger_type: str = JOB_TRIGGER_MANUAL,
+        submit: bool = True
+    ) -> ScanJob:
+        """登记扫描任务并提交后台执行"""
+        job = ScanJob(
+            trigger_type=trigger_type,
+            status=JOB_STATUS_PENDING,
+            source_ids=",".join(str(i) for i in source_ids) if source_ids else None,
+            created_by=created_by
+        )
+        self.db.add(job)
+        self.db.commit()
+        self.db.refresh(job)
+        if submit:
+            _job_pool.submit(ScanService.run_job, job.id)
+        return job
+    
+    def list_jobs(
+        self,
+        skip: int = 0,
+        limit: int = 20,
+        status: Optional[str] = None,
+        trigger_type: Optional[str] = None
+    ) -> Tuple[List[ScanJob], int]:
+        """获取扫描任务列表"""
+        query = self.db.query(ScanJob)
+        if status:
+            query = query.filter(ScanJob.status == status)
+        if trigger_type:
+            query = query.filter(ScanJob.trigger_type == trigger_type)
+        total = query.count()
+        jobs = query.order_by(ScanJob.created_at.desc(), ScanJob.id.desc()).offset(skip).limit(limit).all()
+        return jobs, total
+    
+    def get_job(self, job_id: int) -> Optional[ScanJob]:
+        """获取扫描任务"""
+        return self.db.query(ScanJob).filter(ScanJob.id == job_id).first()
+    
+    def last_scheduled_time(self) -> Optional[datetime]:
+        """最近一次定时扫描的登记时间"""
+        return self.db.query(func.max(ScanJob.created_at)).filter(
+            ScanJob.trigger_type == JOB_TRIGGER_SCHEDULED,
+            ScanJob.status != JOB_STATUS_SKIPPED
+        ).scalar()
+    
+    @staticmethod
+    def run_job(job_id: int, lock_held: bool = False):
+        """执行扫描任务（未持有单飞锁时先尝试获取，已有扫描在运行则跳过）"""
+        if lock_held:
+            ScanService._execute_job(job_id)
+            return
+        with scan_lock() as acquired:
+            if acquired:
+                ScanService._execute_job(job_id)
+                return
+        db = SessionLocal()
+        try:
+            job = db.query(ScanJob).filter(ScanJob.id == job_id).first()
+            if job:
+                job.status = JOB_STATUS_SKIPPED
+                job.error = "已有扫描任务正在运行"
+                job.finished_at = datetime.now()
+                db.commit()
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _execute_job(job_id: int):
+        """在持有单飞锁的前提下执行扫描：有登记的数据源时扫描数据源，否则扫描本库"""
+        db = SessionLocal()
+        try:
+            job = db.query(ScanJob).filter(ScanJob.id == job_id).first()
+            if not job:
+                return
+            job.status = JOB_STATUS_RUNNING
+            job.started_at = datetime.now()
+            db.commit()
+            
+            try:
+                source_ids = [int(i) for i in job.source_ids.split(",")] if job.source_ids else None
+                service = ScanService(db)
+                if source_ids or service.list_sources(is_active=True):
+                    response = service.scan_sources(source_ids)
+                    job.scanned_count = response.scanned_count
+                    job.summary = response.model_dump_json()
+                    if response.succeeded == response.total_sources:
+                        job.status = SCAN_STATUS_SUCCESS
+                    elif any(r.status in (SCAN_STATUS_SUCCESS, SCAN_STATUS_PARTIAL) for r in response.results):
+                        job.status = SCAN_STATUS_PARTIAL
+                    else:
+                        job.status = SCAN_STATUS_FAILED
+                else:
+                    result = DataScanner(db).scan_metadata(None, ClassificationEngine(db))
+                    ScanService.submit_profile(source_system="未知")
+                    job.scanned_count = result.get("count", 0)
+                    job.summary = json.dumps(result, ensure_ascii=False, default=str)
+                    job.status = SCAN_STATUS_SUCCESS
+            except Exception as e:
+                logger.exception("扫描任务 %s 执行失败", job_id)
+                db.rollback()
+                job = db.query(ScanJob).filter(ScanJob.id == job_id).first()
+                job.status = SCAN_STATUS_FAILED
+                job.error = str(e)[:2000]
+            job.finished_at = datetime.now()
+            db.commit()
+        finally:
+            db.close()
+    
+    # ========== 内容抽样剖析 ==========
+    @staticmethod
+    def submit_profile(
+        source_id: Optional[int] = None,
+        source_system: Optional[str] = None,
+        resample: bool = False
+    ) -> Future:
+        """提交后台剖析任务（指定数据源ID则连接该数据源，否则剖析本库中指定来源系统的资产）"""
+        if source_id is not None:
+            return _profile_pool.submit(ScanService.profile_source, source_id, resample)
+        return _profile_pool.submit(ScanService.profile_local, source_system, resample)
+    
+    @staticmethod
+    def profile_source(source_id: int, resample: bool = False) -> Dict[str, Any]:
+        """剖析已登记数据源的资产（独立会话和连接池）"""
+        db = SessionLocal()
+        source_engine: Optional[Engine] = None
+        try:
+            source = db.query(ScanSource).filter(ScanSource.id == source_id).first()
+            if not source:
+                raise ValueError(f"数据源 {source_id} 不存在")
+            source_engine = ScanService._create_source_engine(source, settings.PROFILE_TIMEOUT_SECONDS)
+            return DataProfiler(db, source_engine).profile_source(source.source_name, resample=resample)
+        except Exception:
+            logger.exception("数据源 %s 内容剖析失败", source_id)
+            db.rollback()
+            raise
+        finally:
+            if source_engine is not None:
+                source_engine.dispose()
+            db.close()
+    
+    @staticmethod
+    def profile_local(source_system: Optional[str] = None, resample: bool = False) -> Dict[str, Any]:
+        """剖析本库扫描得到的资产"""
+        db = SessionLocal()
+        try:
+            return DataProfiler(db).profile_source(source_system, resample=resample)
+        except Exception:
+            logger.exception("来源系统 %s 内容剖析失败", source_system)
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _create_source_engine(source: ScanSource, timeout: int) -> Engine:
+        """为数据源创建独立的连接池（连接数受单数据源并发上限约束）"""
+        url = make_url(source.connection_url)
+        connect_args = {}
+        if url.get_backend_name() == "postgresql":
+            # 语句级超时，避免单条目录查询拖住工作线程
+            connect_args = {
+                "connect_timeout": 10,
+                "options": f"-c statement_timeout={timeout * 1000}"
+            }
+        return create_engine(
+            url,
+            pool_pre_ping=True,
+            pool_size=source.max_concurrency or 1,
+            max_overflow=0,
+            connect_args=connect_args
+        )
+    
+    @staticmethod
+    def _record_result(db: Session, source: ScanSource, result: SourceScanResult):
+        """记录数据源最近一次扫描结果"""
+        source.last_scan_time = datetime.now()
+        source.last_scan_status = result.status
+        source.last_scan_count = result.count
+        source.last_error = "\n".join(result.errors)[:2000] if result.errors else None
+        db.commit()
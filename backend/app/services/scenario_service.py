@@ -3,10 +3,14 @@
 作者：张彦龙
 """
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 from app.models.scenario import CrossBorderScenario, ScenarioStatus
+from app.models.user import User
+from app.models.audit import AuditAction
 from app.schemas.scenario import CrossBorderScenarioCreate, CrossBorderScenarioUpdate
+from app.services.audit_service import AuditService
+from app.utils.batch_transition import transition_pending, batch_summary, audit_rows
 
 
 class ScenarioService:
@@ -127,4 +131,59 @@ class ScenarioService:
         self.db.commit()
         self.db.refresh(db_scenario)
         return db_scenario
-
+    
+    def batch_approve(
+        self,
+        scenario_ids: List[int],
+        approver_id: int,
+        comment: Optional[str] = None,
+        commit: bool = True
+    ) -> Dict[str, Any]:
+        """批量批准场景（单事务：锁定待审批记录、批量更新并多行写入审计日志，commit=False 时由调用方提交）"""
+        approver = self._get_approver(approver_id)
+        now = datetime.now()
+        result = transition_pending(
+            self.db, CrossBorderScenario, CrossBorderScenario.status, scenario_ids, ScenarioStatus.PENDING,
+            {
+                "status": ScenarioStatus.APPROVED,
+                "approver_id": approver_id,
+                "approved_at": now,
+                # 默认有效期1年
+                "expiry_date": now + timedelta(days=365)
+            }
+        )
+        AuditService(self.db).add_logs(audit_rows(
+            result.updated_ids, AuditAction.APPROVE, "场景", approver,
+            ScenarioStatus.PENDING.value, ScenarioStatus.APPROVED.value, {"batch": True, "comment": comment}
+        ))
+        if commit:
+            self.db.commit()
+        return batch_summary(result, "场景", "只有待审批状态的场景才能批准")
+    
+    def batch_reject(
+        self,
+        scenario_ids: List[int],
+        approver_id: int,
+        reason: str,
+        commit: bool = True
+    ) -> Dict[str, Any]:
+        """批量拒绝场景（单事务：锁定待审批记录、批量更新并多行写入审计日志，commit=False 时由调用方提交）"""
+        approver = self._get_approver(approver_id)
+        result = transition_pending(
+            self.db, CrossBorderScenario, CrossBorderScenario.status, scenario_ids, ScenarioStatus.PENDING,
+            {"status": ScenarioStatus.REJECTED, "approver_id": approver_id}
+        )
+        AuditService(self.db).add_logs(audit_rows(
+            result.updated_ids, AuditAction.REJECT, "场景", approver,
+            ScenarioStatus.PENDING.value, ScenarioStatus.REJECTED.value, {"batch": True, "reason": reason}
+        ))
+        if commit:
+            self.db.commit()
+        return batch_summary(result, "场景", "只有待审批状态的场景才能拒绝")
+    
+    def _get_approver(self, approver_id: int) -> User:
+        """获取审批人（不存在时抛出异常）"""
+        approver = self.db.query(User).filter(User.id == approver_id).first()
+        if not approver:
+            raise ValueError("审批人不存在")
+        return approver
@@ -6,8 +6,13 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
 from typing import List, Optional, Dict, Any
 import json
+import logging
 from app.models.system_config import SystemConfig, ConfigCategory, ConfigType
 from app.schemas.system_config import SystemConfigCreate, SystemConfigUpdate
+from app.utils.auto_approval import AUTO_APPROVE_CONFIG_KEYS
+from app.utils.risk_scoring import RISK_RESCORE_CONFIG_KEYS
+
+logger = logging.getLogger(__name__)
 
 
 class SystemConfigService:
@@ -119,6 +124,8 @@ class SystemConfigService:
         db_config.updated_by = updated_by
         self.db.commit()
         self.db.refresh(db_config)
+        if 'config_value' in update_data:
+            self._on_value_changed(db_config.config_key, updated_by)
         return db_config
     
     def delete_config(self, config_id: int) -> bool:
@@ -214,5 +221,22 @@ class SystemConfigService:
         
         config.updated_by = updated_by
         self.db.commit()
+        self._on_value_changed(config_key, updated_by)
         return True
+    
+    def _on_value_changed(self, config_key: str, updated_by: int):
+        """配置值变更后的联动：风险阈值或权重变更时批量重算风险评估，并重新评估全部待审批申请的自动审批"""
+        if config_key not in AUTO_APPROVE_CONFIG_KEYS and config_key not in RISK_RESCORE_CONFIG_KEYS:
+            return
+        from app.services.approval_service import ApprovalService
+        from app.services.auto_approval_service import AutoApprovalService
+        from app.services.risk_service import RiskAssessmentService
+        try:
+            if config_key in RISK_RESCORE_CONFIG_KEYS:
+                RiskAssessmentService(self.db).rescore_all()
+                ApprovalService(self.db).rebuild_queue_ranks()
+            AutoApprovalService(self.db).run(triggered_by=updated_by)
+        except Exception:
+            self.db.rollback()
+            logger.exception("配置 %s 变更后自动审批评估失败", config_key)
 
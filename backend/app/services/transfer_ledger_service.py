@@ -0,0 +1,279 @@
+"""
+跨境传输台账服务
+作者：张彦龙
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import insert, update, delete, select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from typing import Dict, Any, Optional, Callable
+from datetime import datetime
+import logging
+from app.models.audit import AuditLog, AuditAction
+from app.models.data_asset import DataLevel
+from app.models.risk import RiskAssessment, AssessmentStatus
+from app.models.scenario import TransferApproval, CrossBorderScenario
+from app.models.transfer_ledger import TransferLedgerEntry, TransferVolumeTotal
+from app.models.user import User
+from app.services.audit_service import flag_logs
+from app.utils.config_helper import ConfigHelper
+from app.utils.data_scanner import insert_ignore
+
+logger = logging.getLogger(__name__)
+
+# 传输状态
+TRANSFER_SUCCEEDED = "成功"
+TRANSFER_INTERCEPTED = "拦截"
+TRANSFER_RATE_LIMITED = "限流"
+
+# 计入个人信息累计量的数据类别（敏感个人信息同属个人信息）
+PERSONAL_CATEGORIES = (DataLevel.PERSONAL, DataLevel.SENSITIVE)
+
+# 累计量的维度
+TOTAL_KEY = ("recipient_name", "destination_country", "year", "data_category")
+
+
+class TransferLedgerService:
+    """跨境传输台账服务类（传输审计日志、台账明细与累计量在同一事务内写入，记录成功传输时锁定累计行复核阈值）"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.config_helper = ConfigHelper(db)
+    
+    def record_transfer(
+        self,
+        approval_id: int,
+        volumes: Dict[DataLevel, int],
+        user_id: Optional[int] = None,
+        transfer_status: str = TRANSFER_SUCCEEDED,
+        operation_details: Optional[Dict[str, Any]] = None,
+        rate_check: Optional[Callable[[], Optional[str]]] = None
+    ) -> AuditLog:
+        """记录一次跨境传输：写入传输审计日志，成功的传输同时追加台账明细并递增累计量
+        
+        成功的传输先锁定本次涉及的累计行并复核阈值，超过阈值时改记为拦截（审计日志记录原因），
+        复核与递增在同一事务内，并发传输不会各自通过检查后合计超过阈值。
+        rate_check 在阈值复核通过后调用以扣减传输频率额度，返回限流原因时改记为限流。
+        """
+        approval = self.db.query(TransferApproval).filter(TransferApproval.id == approval_id).first()
+        if not approval:
+            raise ValueError("审批不存在")
+        volumes = {DataLevel(category): int(volume) for category, volume in volumes.items() if volume}
+        if any(volume < 0 for volume in volumes.values()):
+            raise ValueError("传输数据量不能为负数")
+        
+        scenario = approval.scenario
+        user = self.db.query(User).filter(User.id == user_id).first() if user_id else None
+        total = sum(volumes.values())
+        operation_details = dict(operation_details or {})
+        now = datetime.now()
+        key = {
+            "recipient_name": scenario.recipient_name,
+            "destination_country": scenario.recipient_country,
+            "year": now.year
+        }
+        if transfer_status == TRANSFER_SUCCEEDED and volumes:
+            # 已锁定的行取锁定后的值，其余类别本次不递增，直接读取
+            totals = {**self.get_totals(**key), **self._lock_totals(key, volumes)}
+            reason = self._threshold_reason(scenario.id, self._exposure(scenario, totals, volumes, now.year))
+            if reason:
+                transfer_status = TRANSFER_INTERCEPTED
+                operation_details["reason"] = reason
+        if transfer_status == TRANSFER_SUCCEEDED and rate_check is not None:
+            reason = rate_check()
+            if reason:
+                transfer_status = TRANSFER_RATE_LIMITED
+                operation_details["reason"] = reason
+        
+        row, = flag_logs(self.db, [dict(
+            action=AuditAction.TRANSFER,
+            resource_type="审批",
+            resource_id=approval.id,
+            user_id=user.id if user else None,
+            username=user.username if user else None,
+            operation_details={
+                **operation_details,
+                "scenario_id": scenario.id,
+                "recipient_name": scenario.recipient_name,
+                "volumes": {category.value: volume for category, volume in volumes.items()}
+            },
+            transfer_volume=total,
+            destination_country=scenario.recipient_country,
+            transfer_status=transfer_status
+        )])
+        db_log = AuditLog(**row)
+        self.db.add(db_log)
+        self.db.flush()
+        
+        if transfer_status == TRANSFER_SUCCEEDED and volumes:
+            self.db.execute(insert(TransferLedgerEntry), [
+                {
+                    **key,
+                    "audit_log_id": db_log.id,
+                    "approval_id": approval.id,
+                    "scenario_id": scenario.id,
+                    "data_category": category,
+                    "volume": volume
+                }
+                for category, volume in volumes.items()
+            ])
+            self._increment_totals(key, volumes, now)
+            approval.actual_volume = (approval.actual_volume or 0) + total
+        
+        self.db.commit()
+        self.db.refresh(db_log)
+        return db_log
+    
+    def _lock_totals(self, key: Dict[str, Any], volumes: Dict[DataLevel, int]) -> Dict[DataLevel, int]:
+        """按固定类别顺序锁定本次涉及的累计行（不存在时先插入零值行），返回锁定后的累计量，在调用方事务内执行"""
+        categories = set(volumes)
+        # 个人信息阈值按个人信息与敏感个人信息合计判断，两类累计行需一并锁定
+        if categories & set(PERSONAL_CATEGORIES):
+            categories |= set(PERSONAL_CATEGORIES)
+        totals = {}
+        for category in sorted(categories, key=lambda item: item.name):
+            locked = self.db.query(TransferVolumeTotal.total_volume).filter(
+                *(getattr(TransferVolumeTotal, name) == value for name, value in key.items()),
+                TransferVolumeTotal.data_category == category
+            ).with_for_update()
+            row = locked.first()
+            if row is None:
+                self.db.execute(insert_ignore(self.db, TransferVolumeTotal), [
+                    {**key, "data_category": category, "total_volume": 0, "transfer_count": 0}
+                ])
+                row = locked.first()
+            totals[category] = int(row.total_volume or 0)
+        return totals
+    
+    def _increment_totals(self, key: Dict[str, Any], volumes: Dict[DataLevel, int], now: datetime):
+        """按维度原子递增累计量（不存在时插入），在调用方事务内执行"""
+        # 固定类别顺序加锁，避免并发传输交叉更新同一组累计行时死锁
+        rows = [
+            {**key, "data_category": category, "total_volume": volume, "transfer_count": 1, "last_transfer_at": now}
+            for category, volume in sorted(volumes.items(), key=lambda item: item[0].name)
+        ]
+        dialect = self.db.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            stmt = (pg_insert if dialect == "postgresql" else sqlite_insert)(TransferVolumeTotal)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(TOTAL_KEY),
+                set_={
+                    "total_volume": TransferVolumeTotal.total_volume + stmt.excluded.total_volume,
+                    "transfer_count": TransferVolumeTotal.transfer_count + stmt.excluded.transfer_count,
+                    "last_transfer_at": stmt.excluded.last_transfer_at
+                }
+            )
+            self.db.execute(stmt, rows)
+            return
+        for row in rows:
+            updated = self.db.execute(
+                update(TransferVolumeTotal)
+                .where(*(getattr(TransferVolumeTotal, name) == row[name] for name in TOTAL_KEY))
+                .values(
+                    total_volume=TransferVolumeTotal.total_volume + row["total_volume"],
+                    transfer_count=TransferVolumeTotal.transfer_count + 1,
+                    last_transfer_at=now
+                )
+            )
+            if updated.rowcount == 0:
+                self.db.execute(insert(TransferVolumeTotal), [row])
+    
+    def get_totals(self, recipient_name: str, destination_country: str, year: Optional[int] = None) -> Dict[DataLevel, int]:
+        """获取接收方在目的国的年度累计传输量（按唯一约束索引一次查询）"""
+        year = year or datetime.now().year
+        rows = self.db.query(TransferVolumeTotal.data_category, TransferVolumeTotal.total_volume).filter(
+            TransferVolumeTotal.recipient_name == recipient_name,
+            TransferVolumeTotal.destination_country == destination_country,
+            TransferVolumeTotal.year == year
+        ).all()
+        return {row.data_category: int(row.total_volume or 0) for row in rows}
+    
+    def cumulative_exposure(
+        self,
+        scenario: CrossBorderScenario,
+        additional: Optional[Dict[DataLevel, int]] = None,
+        year: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """场景接收方的年度累计出境量及是否超过阈值（additional 为本次拟传输量，计入后判断）"""
+        year = year or datetime.now().year
+        totals = self.get_totals(scenario.recipient_name, scenario.recipient_country, year)
+        return self._exposure(scenario, totals, additional, year)
+    
+    def _exposure(
+        self,
+        scenario: CrossBorderScenario,
+        totals: Dict[DataLevel, int],
+        additional: Optional[Dict[DataLevel, int]],
+        year: int
+    ) -> Dict[str, Any]:
+        """按给定累计量计算累计出境量及是否超过阈值（additional 计入后判断）"""
+        totals = dict(totals)
+        for category, volume in (additional or {}).items():
+            totals[DataLevel(category)] = totals.get(DataLevel(category), 0) + int(volume or 0)
+        
+        personal = sum(totals.get(category, 0) for category in PERSONAL_CATEGORIES)
+        sensitive = totals.get(DataLevel.SENSITIVE, 0)
+        personal_threshold = self.config_helper.get_personal_info_max_threshold()
+        sensitive_threshold = self.config_helper.get_sensitive_info_max_threshold()
+        return {
+            "recipient_name": scenario.recipient_name,
+            "destination_country": scenario.recipient_country,
+            "year": year,
+            "by_category": {category.value: volume for category, volume in totals.items()},
+            "personal_info_volume": personal,
+            "sensitive_info_volume": sensitive,
+            "personal_threshold": personal_threshold,
+            "sensitive_threshold": sensitive_threshold,
+            "exceeds_personal_threshold": personal >= personal_threshold,
+            "exceeds_sensitive_threshold": sensitive >= sensitive_threshold
+        }
+    
+    def check_transfer(self, approval_id: int, volumes: Dict[DataLevel, int]) -> Optional[str]:
+        """检查本次传输计入后累计量是否超过阈值，超过且场景未经监管审批评估时返回拦截原因"""
+        approval = self.db.query(TransferApproval).filter(TransferApproval.id == approval_id).first()
+        if not approval or not volumes:
+            return None
+        return self._threshold_reason(
+            approval.scenario_id, self.cumulative_exposure(approval.scenario, additional=volumes)
+        )
+    
+    def _threshold_reason(self, scenario_id: int, exposure: Dict[str, Any]) -> Optional[str]:
+        """累计量超过阈值且场景未经监管审批评估时返回拦截原因"""
+        if not (exposure["exceeds_personal_threshold"] or exposure["exceeds_sensitive_threshold"]):
+            return None
+        
+        # 最近一次已完成评估已判定需监管审批的场景，视为已履行申报程序
+        regulatory = self.db.query(RiskAssessment.requires_regulatory_approval).filter(
+            RiskAssessment.scenario_id == scenario_id,
+            RiskAssessment.status == AssessmentStatus.COMPLETED
+        ).order_by(RiskAssessment.id.desc()).first()
+        if regulatory and regulatory.requires_regulatory_approval:
+            return None
+        
+        if exposure["exceeds_sensitive_threshold"]:
+            return (
+                f"本年度向该接收方累计出境敏感个人信息将达到{exposure['sensitive_info_volume']}，"
+                f"超过阈值({exposure['sensitive_threshold']})，需申报数据出境安全评估"
+            )
+        return (
+            f"本年度向该接收方累计出境个人信息将达到{exposure['personal_info_volume']}，"
+            f"超过阈值({exposure['personal_threshold']})，需申报数据出境安全评估"
+        )
+    
+    def rebuild_totals(self) -> int:
+        """按台账明细重建全部累计量（用于核对或修复），返回累计行数"""
+        key_columns = [getattr(TransferLedgerEntry, name) for name in TOTAL_KEY]
+        self.db.execute(delete(TransferVolumeTotal))
+        self.db.execute(insert(TransferVolumeTotal).from_select(
+            [*TOTAL_KEY, "total_volume", "transfer_count", "last_transfer_at"],
+            select(
+                *key_columns,
+                func.sum(TransferLedgerEntry.volume),
+                func.count(func.distinct(TransferLedgerEntry.audit_log_id)),
+                func.max(TransferLedgerEntry.created_at)
+            ).group_by(*key_columns)
+        ))
+        self.db.commit()
+        count = self.db.query(func.count(TransferVolumeTotal.id)).scalar()
+        logger.info("跨境传输累计量已按台账重建：%s 行", count)
+        return count
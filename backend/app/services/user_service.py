@@ -2,11 +2,12 @@
 用户服务
 作者：张彦龙
 """
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional, Tuple
 from passlib.context import CryptContext
 from app.models.user import User
 from app.schemas.user import UserCreate
+from app.utils.query_count import count_query, COUNT_EXACT
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -19,7 +20,14 @@ class UserService:
     
     def list_users(self, skip: int = 0, limit: int = 100) -> List[User]:
         """获取用户列表"""
-        return self.db.query(User).offset(skip).limit(limit).all()
+        # 角色随用户批量预加载（一次IN查询），避免逐个用户懒加载
+        return self.db.query(User).options(
+            selectinload(User.roles)
+        ).order_by(User.id).offset(skip).limit(limit).all()
+    
+    def count_users(self, count: str = COUNT_EXACT) -> Tuple[Optional[int], str]:
+        """统计用户总数，返回（总数，实际采用的统计方式）"""
+        return count_query(self.db, self.db.query(User), count)
     
     def get_user(self, user_id: int) -> Optional[User]:
         """获取用户详情"""
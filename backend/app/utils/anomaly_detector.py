@@ -0,0 +1,453 @@
+"""
+审计事件流式异常检测引擎
+作者：张彦龙
+"""
+from collections import deque
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+from datetime import datetime
+import copy
+import math
+import threading
+import numpy as np
+from app.core.config import settings
+
+# 异常类型（按判定优先级排列，一个事件只标记首个命中的类型）
+HIGH_FREQUENCY = "高频操作"
+VOLUME_SPIKE = "传输量异常"
+COUNTRY_VOLUME_SPIKE = "目的国传输量异常"
+NEW_COUNTRY = "新目的国"
+COUNTRY_HIGH_FREQUENCY = "目的国高频传输"
+OFF_HOURS = "非工作时间操作"
+ANOMALY_TYPES = (HIGH_FREQUENCY, VOLUME_SPIKE, COUNTRY_VOLUME_SPIKE, NEW_COUNTRY, COUNTRY_HIGH_FREQUENCY, OFF_HOURS)
+
+# 传输事件的操作类型取值（与 AuditAction.TRANSFER 一致，避免引擎依赖模型）
+TRANSFER_ACTION = "传输"
+
+# 非工作时间需要关注的操作类型（传输、导出、删除）
+OFF_HOURS_ACTIONS = frozenset({"传输", "导出", "删除"})
+
+# 波动估计的下限（相对均值），避免历史传输量恒定时轻微变化即被标记
+MIN_RELATIVE_STD = 0.1
+
+
+class AnomalyParams(NamedTuple):
+    """异常检测参数"""
+    bucket_seconds: float  # 滑动窗口的分桶宽度
+    window_buckets: int  # 滑动窗口包含的桶数
+    user_max_events: int  # 单用户窗口内最多操作数
+    country_max_transfers: int  # 单目的国窗口内最多传输次数
+    decay_rate: float  # 传输量指数衰减均值的衰减率（每秒）
+    volume_sigma: float  # 传输量超过均值多少倍标准差视为异常
+    min_history: float  # 有效历史样本数不足时不判定传输量与新目的国
+    work_start: int  # 工作时间开始（时）
+    work_end: int  # 工作时间结束（时）
+
+
+class AuditEvent(NamedTuple):
+    """参与检测的审计事件字段"""
+    user_id: Optional[int]
+    action: str  # 操作类型取值
+    destination_country: Optional[str]
+    transfer_volume: Optional[float]
+    timestamp: float  # 秒
+    hour: int  # 本地时间的小时
+    weekday: int  # 本地时间的星期（0 为周一）
+
+
+def load_params() -> AnomalyParams:
+    """按系统设置构造检测参数"""
+    return AnomalyParams(
+        bucket_seconds=settings.ANOMALY_WINDOW_SECONDS / settings.ANOMALY_WINDOW_BUCKETS,
+        window_buckets=settings.ANOMALY_WINDOW_BUCKETS,
+        user_max_events=settings.ANOMALY_USER_MAX_EVENTS,
+        country_max_transfers=settings.ANOMALY_COUNTRY_MAX_TRANSFERS,
+        decay_rate=math.log(2) / (settings.ANOMALY_VOLUME_HALF_LIFE_HOURS * 3600),
+        volume_sigma=settings.ANOMALY_VOLUME_SIGMA,
+        min_history=settings.ANOMALY_MIN_HISTORY,
+        work_start=settings.ANOMALY_WORK_HOURS_START,
+        work_end=settings.ANOMALY_WORK_HOURS_END
+    )
+
+
+def to_event(action, user_id, destination_country, transfer_volume, created_at: Optional[datetime]) -> AuditEvent:
+    """由审计日志字段构造检测事件（时间按本地时区计算工作时间）"""
+    moment = created_at or datetime.now()
+    if moment.tzinfo is not None:
+        moment = moment.astimezone()
+    return AuditEvent(
+        user_id=user_id,
+        action=getattr(action, "value", action),
+        destination_country=destination_country,
+        transfer_volume=float(transfer_volume) if transfer_volume is not None else None,
+        timestamp=moment.timestamp(),
+        hour=moment.hour,
+        weekday=moment.weekday()
+    )
+
+
+def _volume_limit(weight: float, total: float, squares: float, params: AnomalyParams) -> Optional[float]:
+    """由衰减统计量计算传输量上限（有效样本不足时为空）"""
+    if weight < params.min_history:
+        return None
+    mean = total / weight
+    std = math.sqrt(max(squares / weight - mean * mean, 0.0))
+    return mean + params.volume_sigma * max(std, mean * MIN_RELATIVE_STD)
+
+
+class SlidingWindow:
+    """分桶滑动窗口计数（只保留窗口内非空桶）"""
+    __slots__ = ("buckets", "total")
+    
+    def __init__(self):
+        self.buckets: deque = deque()  # [桶序号, 计数]
+        self.total = 0
+    
+    def add(self, bucket: int, span: int) -> int:
+        """计入一个事件，返回窗口内（含本事件）的事件数"""
+        buckets = self.buckets
+        if buckets and bucket < buckets[-1][0]:
+            bucket = buckets[-1][0]  # 乱序到达的事件计入最新桶
+        while buckets and buckets[0][0] <= bucket - span:
+            self.total -= buckets.popleft()[1]
+        if buckets and buckets[-1][0] == bucket:
+            buckets[-1][1] += 1
+        else:
+            buckets.append([bucket, 1])
+        self.total += 1
+        return self.total
+
+
+class DecayedStats:
+    """按时间指数衰减的加权均值与二阶矩（传输量基线）"""
+    __slots__ = ("weight", "total", "squares", "updated")
+    
+    def __init__(self):
+        self.weight = 0.0
+        self.total = 0.0
+        self.squares = 0.0
+        self.updated = 0.0
+    
+    def observe(self, value: float, timestamp: float, params: AnomalyParams) -> Optional[float]:
+        """计入一个传输量，返回计入前的传输量上限"""
+        factor = math.exp(-params.decay_rate * max(timestamp - self.updated, 0.0)) if self.weight else 0.0
+        limit = _volume_limit(self.weight * factor, self.total * factor, self.squares * factor, params)
+        self.weight = self.weight * factor + 1.0
+        self.total = self.total * factor + value
+        self.squares = self.squares * factor + value * value
+        self.updated = max(timestamp, self.updated)
+        return limit
+
+
+class UserState:
+    """单用户检测状态"""
+    __slots__ = ("window", "volume", "transfers", "countries")
+    
+    def __init__(self):
+        self.window = SlidingWindow()
+        self.volume = DecayedStats()
+        self.transfers = 0
+        self.countries: Set[str] = set()
+
+
+class CountryState:
+    """单目的国检测状态"""
+    __slots__ = ("window", "volume")
+    
+    def __init__(self):
+        self.window = SlidingWindow()
+        self.volume = DecayedStats()
+
+
+class AnomalyDetector:
+    """审计事件流式异常检测（按用户、目的国维护滑动窗口与传输量基线，逐事件 O(1) 判定）"""
+    
+    def __init__(self, params: Optional[AnomalyParams] = None):
+        self.params = params or load_params()
+        self._lock = threading.Lock()
+        self.users: Dict[Optional[int], UserState] = {}
+        self.countries: Dict[str, CountryState] = {}
+    
+    def observe(self, event: AuditEvent, count_user: bool = True) -> Optional[Tuple[str, str]]:
+        """计入一个事件并返回异常（类型, 原因），无异常返回空
+        
+        系统操作（无用户）不参与用户维度的检测；count_user 为假时不计入用户操作频率（同一批次的后续记录）。
+        """
+        params = self.params
+        bucket = int(event.timestamp // params.bucket_seconds)
+        hits: Dict[str, str] = {}
+        with self._lock:
+            user = None
+            if event.user_id is not None:
+                user = self.users.get(event.user_id)
+                if user is None:
+                    user = self.users[event.user_id] = UserState()
+                if count_user:
+                    count = user.window.add(bucket, params.window_buckets)
+                    if count > params.user_max_events:
+                        hits[HIGH_FREQUENCY] = f"窗口内操作{count}次，超过{params.user_max_events}次"
+            
+            if event.action == TRANSFER_ACTION:
+                country_name = event.destination_country
+                if user is not None and event.transfer_volume is not None:
+                    limit = user.volume.observe(event.transfer_volume, event.timestamp, params)
+                    if limit is not None and event.transfer_volume > limit:
+                        hits[VOLUME_SPIKE] = f"传输量{event.transfer_volume:g}超过该用户基线上限{limit:.0f}"
+                if country_name:
+                    if user is not None:
+                        if user.transfers >= params.min_history and country_name not in user.countries:
+                            hits[NEW_COUNTRY] = f"首次向{country_name}传输"
+                        user.countries.add(country_name)
+                    country = self.countries.get(country_name)
+                    if country is None:
+                        country = self.countries[country_name] = CountryState()
+                    transfers = country.window.add(bucket, params.window_buckets)
+                    if transfers > params.country_max_transfers:
+                        hits[COUNTRY_HIGH_FREQUENCY] = (
+                            f"窗口内向{country_name}传输{transfers}次，超过{params.country_max_transfers}次"
+                        )
+                    if event.transfer_volume is not None:
+                        limit = country.volume.observe(event.transfer_volume, event.timestamp, params)
+                        if limit is not None and event.transfer_volume > limit:
+                            hits[COUNTRY_VOLUME_SPIKE] = (
+                                f"向{country_name}传输量{event.transfer_volume:g}超过该目的国基线上限{limit:.0f}"
+                            )
+                if user is not None:
+                    user.transfers += 1
+        
+        if event.action in OFF_HOURS_ACTIONS and self._off_hours(event.hour, event.weekday):
+            hits[OFF_HOURS] = f"非工作时间（{event.hour}时）{event.action}"
+        for anomaly_type in ANOMALY_TYPES:
+            if anomaly_type in hits:
+                return anomaly_type, hits[anomaly_type]
+        return None
+    
+    def _off_hours(self, hour, weekday):
+        """是否非工作时间（周末或工作时段以外，支持数组）"""
+        return (weekday >= 5) | (hour < self.params.work_start) | (hour >= self.params.work_end)
+    
+    def observe_batch(self, events: List[AuditEvent]) -> List[Optional[Tuple[str, str]]]:
+        """计入一次操作写入的一组事件（同一用户只计一次操作频率），返回各事件的异常"""
+        counted: Set[Optional[int]] = set()
+        results = []
+        for event in events:
+            results.append(self.observe(event, count_user=event.user_id not in counted))
+            counted.add(event.user_id)
+        return results
+    
+    def check_batch(self, events: List[AuditEvent]) -> List[Optional[Tuple[str, str]]]:
+        """判定一组待写入的事件，不改变检测状态（在涉及的用户、目的国状态副本上计算）"""
+        scratch = AnomalyDetector(self.params)
+        with self._lock:
+            for event in events:
+                if event.user_id in self.users and event.user_id not in scratch.users:
+                    scratch.users[event.user_id] = copy.deepcopy(self.users[event.user_id])
+                name = event.destination_country
+                if name in self.countries and name not in scratch.countries:
+                    scratch.countries[name] = copy.deepcopy(self.countries[name])
+        return scratch.observe_batch(events)
+    
+    def replay(self, events: List[AuditEvent]) -> List[Optional[Tuple[str, str]]]:
+        """按批回放历史事件（事件须按时间排序）：按用户、目的国分组向量化计算，结果与逐条计入一致
+        
+        同一用户同一时刻的多条记录（同一事务批量写入）只计一次操作频率，系统操作不参与用户维度检测。
+        """
+        n = len(events)
+        if not n:
+            return []
+        params = self.params
+        user_ids = [event.user_id for event in events]
+        actions = np.array([event.action for event in events], dtype=object)
+        countries = np.array([event.destination_country or "" for event in events], dtype=object)
+        volumes = np.array([np.nan if e.transfer_volume is None else e.transfer_volume for e in events], dtype=np.float64)
+        timestamps = np.array([event.timestamp for event in events], dtype=np.float64)
+        buckets = (timestamps // params.bucket_seconds).astype(np.int64)
+        hours = np.array([event.hour for event in events], dtype=np.int64)
+        weekdays = np.array([event.weekday for event in events], dtype=np.int64)
+        
+        reasons: Dict[str, Dict[int, str]] = {anomaly_type: {} for anomaly_type in ANOMALY_TYPES}
+        transfer = actions == TRANSFER_ACTION
+        with self._lock:
+            user_codes: Dict[Optional[int], List[int]] = {}
+            for index, user_id in enumerate(user_ids):
+                if user_id is not None:
+                    user_codes.setdefault(user_id, []).append(index)
+            for user_id, rows in user_codes.items():
+                state = self.users.get(user_id)
+                if state is None:
+                    state = self.users[user_id] = UserState()
+                self._replay_user(state, np.asarray(rows), transfer, countries, volumes, timestamps, buckets, reasons)
+            
+            country_rows = np.flatnonzero(transfer & (countries != ""))
+            for country_name in np.unique(countries[country_rows]).tolist():
+                rows = country_rows[countries[country_rows] == country_name]
+                state = self.countries.get(country_name)
+                if state is None:
+                    state = self.countries[country_name] = CountryState()
+                counts = self._replay_window(state.window, buckets[rows])
+                for index, count in zip(rows[counts > params.country_max_transfers].tolist(),
+                                        counts[counts > params.country_max_transfers].tolist()):
+                    reasons[COUNTRY_HIGH_FREQUENCY][index] = (
+                        f"窗口内向{country_name}传输{count}次，超过{params.country_max_transfers}次"
+                    )
+                with_volume = rows[~np.isnan(volumes[rows])]
+                for index, limit in self._replay_volume(state.volume, with_volume, volumes, timestamps):
+                    reasons[COUNTRY_VOLUME_SPIKE][index] = (
+                        f"向{country_name}传输量{volumes[index]:g}超过该目的国基线上限{limit:.0f}"
+                    )
+        
+        off_hours = np.isin(actions, list(OFF_HOURS_ACTIONS)) & self._off_hours(hours, weekdays)
+        for index in np.flatnonzero(off_hours).tolist():
+            reasons[OFF_HOURS][index] = f"非工作时间（{hours[index]}时）{actions[index]}"
+        
+        results: List[Optional[Tuple[str, str]]] = [None] * n
+        for anomaly_type in reversed(ANOMALY_TYPES):
+            for index, reason in reasons[anomaly_type].items():
+                results[index] = (anomaly_type, reason)
+        return results
+    
+    def _replay_user(self, state: UserState, rows, transfer, countries, volumes, timestamps, buckets, reasons):
+        """回放单个用户的事件（rows 为该用户事件的下标，按时间排序）"""
+        params = self.params
+        # 同一时刻的后续记录属于同一次批量操作，不重复计入操作频率
+        times = timestamps[rows]
+        counted = rows[np.concatenate([[True], times[1:] != times[:-1]])]
+        counts = self._replay_window(state.window, buckets[counted])
+        over = counts > params.user_max_events
+        for index, count in zip(counted[over].tolist(), counts[over].tolist()):
+            reasons[HIGH_FREQUENCY][index] = f"窗口内操作{count}次，超过{params.user_max_events}次"
+        
+        transfer_rows = rows[transfer[rows]]
+        if not len(transfer_rows):
+            return
+        with_volume = transfer_rows[~np.isnan(volumes[transfer_rows])]
+        for index, limit in self._replay_volume(state.volume, with_volume, volumes, timestamps):
+            reasons[VOLUME_SPIKE][index] = f"传输量{volumes[index]:g}超过该用户基线上限{limit:.0f}"
+        
+        # 新目的国：此前未传输过该国且此前传输次数达到历史下限（每个目的国只可能在首次出现时命中）
+        prior_transfers = state.transfers + np.arange(len(transfer_rows))
+        with_country = countries[transfer_rows] != ""
+        names, first = np.unique(countries[transfer_rows][with_country], return_index=True)
+        first_rows = np.flatnonzero(with_country)[first]
+        for name, position in zip(names.tolist(), first_rows.tolist()):
+            if name not in state.countries and prior_transfers[position] >= params.min_history:
+                reasons[NEW_COUNTRY][int(transfer_rows[position])] = f"首次向{name}传输"
+        state.countries.update(names.tolist())
+        state.transfers += len(transfer_rows)
+    
+    def _replay_window(self, window: SlidingWindow, event_buckets: np.ndarray) -> np.ndarray:
+        """回放一组事件的窗口计数（接续并更新窗口状态），返回各事件计入后的窗口内事件数"""
+        span = self.params.window_buckets
+        # 与逐条计入一致：乱序事件计入已出现的最新桶
+        floor = window.buckets[-1][0] if window.buckets else np.iinfo(np.int64).min
+        event_buckets = np.maximum.accumulate(np.maximum(event_buckets, floor))
+        seeds = np.array([bucket for bucket, _ in window.buckets], dtype=np.int64)
+        all_buckets = np.concatenate([seeds, event_buckets])
+        weights = np.concatenate([
+            np.array([count for _, count in window.buckets], dtype=np.int64),
+            np.ones(len(event_buckets), dtype=np.int64)
+        ])
+        cumulative = np.cumsum(weights)
+        # 各事件窗口起点之前的累计数
+        left = np.searchsorted(all_buckets, event_buckets - span + 1, side="left")
+        before = np.where(left > 0, cumulative[np.maximum(left - 1, 0)], 0)
+        counts = cumulative[len(seeds):] - before
+        
+        keep = all_buckets > int(all_buckets[-1]) - span
+        live, inverse = np.unique(all_buckets[keep], return_inverse=True)
+        totals = np.bincount(inverse, weights=weights[keep]).astype(np.int64)
+        window.buckets = deque([bucket, total] for bucket, total in zip(live.tolist(), totals.tolist()))
+        window.total = int(totals.sum())
+        return counts
+    
+    def _replay_volume(self, stats: DecayedStats, rows: np.ndarray, volumes, timestamps) -> List[Tuple[int, float]]:
+        """回放一组传输量（接续并更新衰减统计），返回超过计入前上限的（下标, 上限）"""
+        if not len(rows):
+            return []
+        params = self.params
+        values = volumes[rows]
+        times = np.maximum.accumulate(np.maximum(timestamps[rows], stats.updated))
+        last = times[-1]
+        # 以本组最后时刻为基准的衰减权重（不超过1，组内累加不会溢出）
+        weights = np.exp(-params.decay_rate * (last - times))
+        seed = math.exp(-params.decay_rate * (last - stats.updated)) if stats.weight else 0.0
+        cum_weight = stats.weight * seed + np.cumsum(weights)
+        cum_total = stats.total * seed + np.cumsum(weights * values)
+        cum_squares = stats.squares * seed + np.cumsum(weights * values * values)
+        
+        # 第 i 个传输量计入前的统计量（换算到其自身时刻）
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            scale = 1.0 / weights
+            prior_weight = np.concatenate([[stats.weight * seed], cum_weight[:-1]]) * scale
+            prior_total = np.concatenate([[stats.total * seed], cum_total[:-1]]) * scale
+            prior_squares = np.concatenate([[stats.squares * seed], cum_squares[:-1]]) * scale
+            mean = prior_total / prior_weight
+            std = np.sqrt(np.maximum(prior_squares / prior_weight - mean * mean, 0.0))
+            limits = mean + params.volume_sigma * np.maximum(std, mean * MIN_RELATIVE_STD)
+        flagged = (prior_weight >= params.min_history) & (values > limits)
+        
+        stats.weight = float(cum_weight[-1])
+        stats.total = float(cum_total[-1])
+        stats.squares = float(cum_squares[-1])
+        stats.updated = float(last)
+        return list(zip(rows[flagged].tolist(), limits[flagged].tolist()))
+    
+    def flag(self, rows: List[Dict[str, Any]]) -> List[AuditEvent]:
+        """检测一次操作待写入的审计日志并填写异常字段（不改变检测状态），返回写入提交后需计入的事件
+        
+        未启用时只补齐字段并返回空列表。
+        """
+        for row in rows:
+            row.setdefault("is_anomaly", False)
+            row.setdefault("anomaly_type", None)
+            row.setdefault("anomaly_reason", None)
+        if not settings.ANOMALY_DETECTION_ENABLED or not rows:
+            return []
+        events = [
+            to_event(
+                row.get("action"), row.get("user_id"), row.get("destination_country"),
+                row.get("transfer_volume"), row.get("created_at")
+            )
+            for row in rows
+        ]
+        for row, anomaly in zip(rows, self.check_batch(events)):
+            if anomaly:
+                row["is_anomaly"] = True
+                row["anomaly_type"], row["anomaly_reason"] = anomaly
+        return events
+
+
+class AnomalyDetectorHolder:
+    """进程内的实时检测器（回放预热后整体替换，预热期间计入的事件在替换前并入新检测器）"""
+    
+    def __init__(self):
+        self.detector = AnomalyDetector()
+        self._lock = threading.Lock()
+        self._captured: Optional[List[List[AuditEvent]]] = None
+    
+    def flag(self, rows: List[Dict[str, Any]]) -> List[AuditEvent]:
+        """检测一次操作待写入的审计日志，返回提交后需计入的事件"""
+        return self.detector.flag(rows)
+    
+    def record(self, events: List[AuditEvent]):
+        """计入一次已提交操作的事件"""
+        with self._lock:
+            self.detector.observe_batch(events)
+            if self._captured is not None:
+                self._captured.append(events)
+    
+    def begin_capture(self) -> datetime:
+        """开始暂存实时计入的事件（回放预热期间），返回开始时刻（回放应截止于此）"""
+        with self._lock:
+            self._captured = []
+            return datetime.now()
+    
+    def install(self, detector: AnomalyDetector):
+        """并入预热期间实时计入的事件后替换实时检测器"""
+        with self._lock:
+            for events in self._captured or []:
+                detector.observe_batch(events)
+            self._captured = None
+            self.detector = detector
+
+
+anomaly_detector = AnomalyDetectorHolder()
@@ -0,0 +1,73 @@
+"""
+自动审批规则引擎
+作者：张彦龙
+"""
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+# 变更后需要重新评估待审批申请的配置项
+AUTO_APPROVE_CONFIG_KEYS = (
+    "approval.auto_approve.enabled",
+    "approval.auto_approve.risk_threshold",
+    "approval.require_multi_level",
+    "approval.multi_level.risk_threshold",
+)
+
+
+class ApprovalFacts(NamedTuple):
+    """自动审批判定所需的审批事实（批量加载）"""
+    approval_id: int
+    scenario_id: int
+    scenario_active: bool  # 场景已批准且未到期
+    risk_score: Optional[float]  # 场景最近一次已完成评估换算的风险评分
+    requires_regulatory_approval: bool
+    exceeds_threshold: bool  # 超过个人信息或敏感个人信息阈值
+    has_core_asset: bool
+    has_blacklisted_asset: bool
+
+
+class AutoApprovalPolicy(NamedTuple):
+    """自动审批策略（由系统配置编译）"""
+    enabled: bool
+    risk_threshold: float
+    multi_level_threshold: Optional[float]  # 未启用多级审批时为空
+
+
+def load_policy(config_helper) -> AutoApprovalPolicy:
+    """读取自动审批相关配置（config_helper 为 ConfigHelper）"""
+    multi_level = None
+    if config_helper.get_require_multi_level():
+        multi_level = float(config_helper.get_multi_level_risk_threshold())
+    return AutoApprovalPolicy(
+        enabled=bool(config_helper.get_auto_approve_enabled()),
+        risk_threshold=float(config_helper.get_auto_approve_risk_threshold()),
+        multi_level_threshold=multi_level
+    )
+
+
+def compile_policy(policy: AutoApprovalPolicy) -> Callable[[ApprovalFacts], Optional[str]]:
+    """将策略编译为判定函数：符合自动审批条件返回None，否则返回首个不满足的原因"""
+    rules: List[Tuple[Callable[[ApprovalFacts], bool], str]] = [
+        (lambda f: f.scenario_active, "场景未批准或已到期"),
+        (lambda f: f.risk_score is not None, "场景无已完成的风险评估"),
+        (lambda f: f.risk_score <= policy.risk_threshold, f"风险评分高于自动审批阈值 {policy.risk_threshold:g}"),
+        (lambda f: not f.requires_regulatory_approval, "需要监管审批"),
+        (lambda f: not f.exceeds_threshold, "超过个人信息或敏感个人信息阈值"),
+        (lambda f: not f.has_core_asset, "涉及核心数据"),
+        (lambda f: not f.has_blacklisted_asset, "涉及黑名单资产"),
+    ]
+    if policy.multi_level_threshold is not None:
+        rules.insert(3, (
+            lambda f: f.risk_score < policy.multi_level_threshold,
+            f"风险评分达到多级审批阈值 {policy.multi_level_threshold:g}"
+        ))
+    
+    def decide(facts: ApprovalFacts) -> Optional[str]:
+        """判定单条审批"""
+        if not policy.enabled:
+            return "自动审批未启用"
+        for check, reason in rules:
+            if not check(facts):
+                return reason
+        return None
+    
+    return decide
@@ -0,0 +1,50 @@
+"""
+批量任务接管器
+作者：张彦龙
+"""
+from typing import Optional
+import asyncio
+import logging
+from app.core.config import settings
+from app.services.batch_job_service import BatchJobService
+
+logger = logging.getLogger(__name__)
+
+
+class BatchJobWatchdog:
+    """进程内批量任务接管器（启动时及定期接管排队中和执行进程已退出的任务）"""
+    
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+    
+    async def _run(self):
+        """接管主循环，数据库操作在线程中执行，不占用事件循环"""
+        interval = max(settings.BATCH_JOB_WATCH_SECONDS, 1)
+        while True:
+            try:
+                resumed = await asyncio.to_thread(BatchJobService.resume_unfinished)
+                if resumed:
+                    logger.info("已接管 %s 个未完成的批量任务", resumed)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("接管批量任务异常")
+            await asyncio.sleep(interval)
+    
+    def start(self):
+        """启动接管（需在事件循环中调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        """停止接管"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+batch_job_watchdog = BatchJobWatchdog()
@@ -0,0 +1,92 @@
+"""
+批量状态流转工具
+作者：张彦龙
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import update
+from typing import List, Dict, Any, Iterable, NamedTuple
+
+
+class TransitionResult(NamedTuple):
+    """批量状态流转结果"""
+    updated_ids: List[int]  # 成功流转的ID
+    missing_ids: List[int]  # 不存在的ID
+    invalid_ids: List[int]  # 状态不允许流转的ID
+
+
+def transition_pending(
+    db: Session,
+    model,
+    status_column,
+    ids: Iterable[int],
+    pending,
+    values: Dict[str, Any]
+) -> TransitionResult:
+    """在当前事务内将待处理记录批量流转：一次 SELECT ... FOR UPDATE 锁定，一次 UPDATE ... RETURNING 写入（不提交）"""
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return TransitionResult([], [], [])
+    
+    locked = [
+        row.id for row in db.query(model.id).filter(
+            model.id.in_(ids), status_column == pending
+        ).order_by(model.id).with_for_update().all()
+    ]
+    locked_set = set(locked)
+    others = [i for i in ids if i not in locked_set]
+    existing = set()
+    if others:
+        existing = {row.id for row in db.query(model.id).filter(model.id.in_(others)).all()}
+    
+    updated = set()
+    if locked:
+        updated = set(db.execute(
+            update(model)
+            .where(model.id.in_(locked), status_column == pending)
+            .values(**values)
+            .returning(model.id),
+            execution_options={"synchronize_session": False}
+        ).scalars().all())
+    
+    return TransitionResult(
+        updated_ids=[i for i in ids if i in updated],
+        missing_ids=[i for i in others if i not in existing],
+        invalid_ids=[i for i in ids if i in existing or (i in locked_set and i not in updated)]
+    )
+
+
+def batch_summary(result: TransitionResult, label: str, invalid_reason: str) -> Dict[str, Any]:
+    """生成批量操作响应（与逐条处理时的响应结构和错误信息一致）"""
+    errors = [f"{label} {i} 不存在或状态不允许" for i in result.missing_ids]
+    errors.extend(f"{label} {i}: {invalid_reason}" for i in result.invalid_ids)
+    return {
+        "success_count": len(result.updated_ids),
+        "error_count": len(errors),
+        "success_ids": result.updated_ids,
+        "errors": errors
+    }
+
+
+def audit_rows(
+    ids: Iterable[int],
+    action,
+    resource_type: str,
+    user,
+    before_status: str,
+    after_status: str,
+    details: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """构造批量操作的审计日志行"""
+    return [
+        {
+            "action": action,
+            "resource_type": resource_type,
+            "resource_id": resource_id,
+            "user_id": user.id,
+            "username": user.username,
+            "operation_details": details,
+            "before_data": {"status": before_status},
+            "after_data": {"status": after_status}
+        }
+        for resource_id in ids
+    ]
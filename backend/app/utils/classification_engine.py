@@ -3,10 +3,154 @@
 作者：张彦龙
 """
 from sqlalchemy.orm import Session
-from typing import Dict, Optional
+from sqlalchemy import func
+from typing import Dict, Optional, List, Tuple, Iterable, NamedTuple
 from app.models.data_asset import DataAsset, DataLevel, SensitiveTag
 from app.models.data_asset import DataClassification
+import logging
 import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 数据级别优先级（数值越大级别越高）
+DATA_LEVEL_RANK = {
+    DataLevel.PUBLIC: 0,
+    DataLevel.INTERNAL: 1,
+    DataLevel.PERSONAL: 2,
+    DataLevel.SENSITIVE: 3,
+    DataLevel.IMPORTANT: 4,
+    DataLevel.CORE: 5,
+}
+
+# 内置识别规则：(规则编码, 数据级别, 规则)
+BUILTIN_RULES = [
+    ("BUILTIN_CORE", DataLevel.CORE, "核心|core|国家安全"),
+    ("BUILTIN_IMPORTANT_EXPOSURE", DataLevel.IMPORTANT, "信贷总量|风险暴露|NON_REL_EXPOSURE"),
+    ("BUILTIN_IMPORTANT_PAYMENT", DataLevel.IMPORTANT, "跨境支付|清算规模"),
+    ("BUILTIN_IMPORTANT_INDUSTRY", DataLevel.IMPORTANT, "重点行业|关键客户"),
+    ("BUILTIN_IMPORTANT_CONTROLLER", DataLevel.IMPORTANT, "实际控制人|ACTUAL_CONTROLLER"),
+    ("BUILTIN_SENSITIVE_ID", DataLevel.SENSITIVE, "身份证|ID_NO|IDNO"),
+    ("BUILTIN_SENSITIVE_MOBILE", DataLevel.SENSITIVE, "手机号|MOB_NO|MOBILE"),
+    ("BUILTIN_SENSITIVE_CARD", DataLevel.SENSITIVE, "银行卡|CARD_NO|ACCT_NO"),
+    ("BUILTIN_SENSITIVE_NAME", DataLevel.SENSITIVE, "客户名称|CUST_NM|CUSTOMER_NAME"),
+    ("BUILTIN_PERSONAL_CUSTOMER", DataLevel.PERSONAL, "客户|CUST"),
+    ("BUILTIN_PERSONAL_INFO", DataLevel.PERSONAL, "个人信息|PERSONAL"),
+]
+
+_REGEX_META = set(".^$*+?{}[]\\()")
+
+
+def tag_data_level(tag: SensitiveTag) -> DataLevel:
+    """根据标签类型和风险等级推导数据级别"""
+    tag_type = (tag.tag_type or "").strip()
+    if tag_type == "核心数据":
+        return DataLevel.CORE
+    if tag_type == "重要数据":
+        return DataLevel.IMPORTANT
+    if tag_type == "PII":
+        return DataLevel.SENSITIVE if tag.risk_level == "高" else DataLevel.PERSONAL
+    return DataLevel.INTERNAL
+
+
+class MatchRule(NamedTuple):
+    """匹配规则（内置规则或敏感标签）"""
+    code: str
+    data_level: DataLevel
+    tag_id: Optional[int]
+
+
+class MatchResult(NamedTuple):
+    """一次匹配的结果"""
+    data_level: DataLevel
+    tag_ids: List[int]
+    rule_codes: List[str]
+
+
+class TagMatcher:
+    """多模式匹配器（纯字面量关键词合并为一个组合正则一次扫描，正则规则逐条匹配，报告全部命中规则）"""
+    
+    def __init__(self, rules: Iterable[Tuple[MatchRule, str]]):
+        self.rules: List[MatchRule] = []
+        # 关键词（小写） -> 命中的规则下标集合（包含其子串关键词对应的规则）
+        self._keyword_rules: Dict[str, frozenset] = {}
+        # 正则规则各自编译、单独匹配（内联标志、反向引用等无法安全合并到组合正则中）
+        self._regex_rules: List[Tuple[int, re.Pattern]] = []
+        
+        keyword_owner: Dict[str, set] = {}
+        
+        for rule, pattern in rules:
+            if not pattern:
+                continue
+            try:
+                compiled = re.compile(pattern, re.IGNORECASE)
+            except re.error as e:
+                logger.warning("识别规则 %s 无效，已忽略: %s", rule.code, e)
+                continue
+            
+            index = len(self.rules)
+            self.rules.append(rule)
+            
+            pieces = [p.strip() for p in pattern.split("|")]
+            if all(p and not (_REGEX_META & set(p)) for p in pieces):
+                for piece in pieces:
+                    keyword_owner.setdefault(piece.lower(), set()).add(index)
+            else:
+                self._regex_rules.append((index, compiled))
+        
+        # 每个位置只报告最长的关键词，预先合并被包含的短关键词的规则
+        keywords = sorted(keyword_owner, key=len, reverse=True)
+        for keyword in keywords:
+            owners = set()
+            for other in keywords:
+                if other in keyword:
+                    owners |= keyword_owner[other]
+            self._keyword_rules[keyword] = frozenset(owners)
+        
+        # 零宽先行断言逐个位置匹配，相互重叠的关键词都能命中
+        self._keyword_pattern = re.compile(
+            "(?=(" + "|".join(re.escape(k) for k in keywords) + "))", re.IGNORECASE
+        ) if keywords else None
+    
+    def match_indices(self, text: str) -> set:
+        """返回文本命中的规则下标集合"""
+        hits = set()
+        if not text:
+            return hits
+        if self._keyword_pattern is not None:
+            for m in self._keyword_pattern.finditer(text):
+                hits |= self._keyword_rules.get(m.group(1).lower(), frozenset())
+        for index, compiled in self._regex_rules:
+            if compiled.search(text):
+                hits.add(index)
+        return hits
+    
+    def match(self, *texts: Optional[str]) -> MatchResult:
+        """匹配一个或多个文本，返回最高数据级别和全部命中标签"""
+        hits = set()
+        for text in texts:
+            if text:
+                hits |= self.match_indices(text)
+        return self.result_for(hits)
+    
+    def result_for(self, hits: Iterable[int]) -> MatchResult:
+        """将规则下标集合转换为匹配结果"""
+        level = DataLevel.INTERNAL
+        tag_ids = []
+        rule_codes = []
+        for index in sorted(hits):
+            rule = self.rules[index]
+            rule_codes.append(rule.code)
+            if rule.tag_id is not None:
+                tag_ids.append(rule.tag_id)
+            if DATA_LEVEL_RANK[rule.data_level] > DATA_LEVEL_RANK[level]:
+                level = rule.data_level
+        return MatchResult(data_level=level, tag_ids=tag_ids, rule_codes=rule_codes)
+
+
+# 进程级匹配器缓存，仅当敏感标签表发生变化时重建
+_matcher_lock = threading.Lock()
+_matcher_cache: Dict[str, object] = {"signature": None, "matcher": None}
 
 
 class ClassificationEngine:
@@ -16,62 +160,81 @@ class ClassificationEngine:
         self.db = db
         self._load_detection_rules()
     
+    def _tag_signature(self) -> tuple:
+        """敏感标签表的变更签名（行数、最大ID、最近创建/更新时间）"""
+        row = self.db.query(
+            func.count(SensitiveTag.id),
+            func.max(SensitiveTag.id),
+            func.max(SensitiveTag.created_at),
+            func.max(SensitiveTag.updated_at)
+        ).one()
+        return tuple(row)
+    
     def _load_detection_rules(self):
-        """加载敏感标签识别规则"""
-        self.tags = self.db.query(SensitiveTag).filter(
-            SensitiveTag.is_active == True
-        ).all()
-        
-        # 重要数据识别规则
-        self.important_data_patterns = [
-            r"信贷总量|风险暴露|NON_REL_EXPOSURE",
-            r"跨境支付|清算规模",
-            r"重点行业|关键客户",
-            r"实际控制人|ACTUAL_CONTROLLER"
-        ]
+        """加载敏感标签识别规则（签名未变化时复用已编译的匹配器）"""
+        signature = self._tag_signature()
+        with _matcher_lock:
+            if _matcher_cache["signature"] != signature or _matcher_cache["matcher"] is None:
+                tags = self.db.query(SensitiveTag).filter(
+                    SensitiveTag.is_active == True
+                ).all()
+                rules = [
+                    (MatchRule(code=code, data_level=level, tag_id=None), pattern)
+                    for code, level, pattern in BUILTIN_RULES
+                ]
+                rules.extend(
+                    (MatchRule(code=tag.tag_code, data_level=tag_data_level(tag), tag_id=tag.id),
+                     tag.detection_rule)
+                    for tag in tags
+                )
+                _matcher_cache["matcher"] = TagMatcher(rules)
+                _matcher_cache["signature"] = signature
+            self.matcher: TagMatcher = _matcher_cache["matcher"]
+    
+    @staticmethod
+    def invalidate_cache():
+        """使已编译的匹配器失效（敏感标签变更后调用）"""
+        with _matcher_lock:
+            _matcher_cache["signature"] = None
+            _matcher_cache["matcher"] = None
     
     def classify_asset(self, asset: DataAsset) -> Optional[Dict]:
         """对数据资产进行分类分级"""
-        result = {
-            "data_level": DataLevel.INTERNAL,
-            "classification_id": None
+        match = self.matcher.match(asset.asset_name)
+        return {
+            "data_level": match.data_level,
+            "classification_id": None,
+            "tag_ids": match.tag_ids,
+            "matched_rules": match.rule_codes
         }
-        
-        # 检查表名和字段名
-        asset_name_lower = asset.asset_name.lower()
-        
-        # 检查是否为核心数据
-        if any(keyword in asset_name_lower for keyword in ["核心", "core", "国家安全"]):
-            result["data_level"] = DataLevel.CORE
-            return result
-        
-        # 检查是否为重要数据
-        for pattern in self.important_data_patterns:
-            if re.search(pattern, asset.asset_name, re.IGNORECASE):
-                result["data_level"] = DataLevel.IMPORTANT
-                break
-        
-        # 检查敏感个人信息
-        sensitive_keywords = [
-            "身份证|ID_NO|IDNO",
-            "手机号|MOB_NO|MOBILE",
-            "银行卡|CARD_NO|ACCT_NO",
-            "客户名称|CUST_NM|CUSTOMER_NAME"
-        ]
-        
-        for keyword in sensitive_keywords:
-            if re.search(keyword, asset.asset_name, re.IGNORECASE):
-                if result["data_level"] == DataLevel.INTERNAL:
-                    result["data_level"] = DataLevel.SENSITIVE
-                break
-        
-        # 检查一般个人信息
-        personal_keywords = ["客户|CUST", "个人信息|PERSONAL"]
-        if result["data_level"] == DataLevel.INTERNAL:
-            for keyword in personal_keywords:
-                if re.search(keyword, asset.asset_name, re.IGNORECASE):
-                    result["data_level"] = DataLevel.PERSONAL
-                    break
-        
-        return result
-
+    
+    def classify_columns(self, column_names: Iterable[str]) -> Dict[str, MatchResult]:
+        """批量识别字段名（同名字段只匹配一次）"""
+        results = {}
+        for name in set(column_names):
+            if not name:
+                continue
+            # 核心数据由表级规则或人工认定，字段层面不采用（避免 SCORE 等字段误命中 core）
+            hits = {
+                index for index in self.matcher.match_indices(name)
+                if self.matcher.rules[index].data_level != DataLevel.CORE
+            }
+            results[name] = self.matcher.result_for(hits)
+        return results
+    
+    def classify_table(
+        self,
+        asset_name: str,
+        column_results: Iterable[MatchResult] = ()
+    ) -> MatchResult:
+        """汇总表名与字段命中结果，得到资产级别和标签"""
+        table_match = self.matcher.match(asset_name)
+        level = table_match.data_level
+        tag_ids = set(table_match.tag_ids)
+        rule_codes = set(table_match.rule_codes)
+        for column_match in column_results:
+            tag_ids.update(column_match.tag_ids)
+            rule_codes.update(column_match.rule_codes)
+            if DATA_LEVEL_RANK[column_match.data_level] > DATA_LEVEL_RANK[level]:
+                level = column_match.data_level
+        return MatchResult(data_level=level, tag_ids=sorted(tag_ids), rule_codes=sorted(rule_codes))
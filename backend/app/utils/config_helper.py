@@ -5,6 +5,7 @@
 from sqlalchemy.orm import Session
 from typing import Any, Optional
 from app.services.system_config_service import SystemConfigService
+from app.utils.risk_scoring import DEFAULT_WEIGHTS
 
 
 class ConfigHelper:
@@ -31,6 +32,11 @@ class ConfigHelper:
         """获取中风险评分阈值"""
         return self.config_service.get_config_value("threshold.risk_score.medium", 40)
     
+    def get_risk_score_weights(self) -> dict:
+        """获取风险评分各维度权重"""
+        weights = self.config_service.get_config_value("threshold.risk_score.weights", DEFAULT_WEIGHTS)
+        return weights if isinstance(weights, dict) else DEFAULT_WEIGHTS
+    
     def get_data_volume_warning_threshold(self) -> int:
         """获取数据传输量预警阈值（GB）"""
         return self.config_service.get_config_value("threshold.data_volume.warning", 100)
@@ -0,0 +1,338 @@
+"""
+数据内容抽样剖析器
+作者：张彦龙
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import text, update
+from sqlalchemy.engine import Engine
+from typing import List, Optional, Dict, Any, NamedTuple, Callable, Iterable
+from datetime import datetime
+import logging
+import re
+import time
+import numpy as np
+from app.core.config import settings
+from app.core.database import engine
+from app.models.data_asset import DataAsset, DataAssetColumn, DataLevel
+from app.utils.classification_engine import DATA_LEVEL_RANK
+from app.utils.level_propagation import LevelPropagator
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL：按Schema一次取回各表的行数估算（未ANALYZE的表退回统计视图的活跃行数）
+PG_RELTUPLES_SQL = """
+SELECT c.relname AS table_name,
+       CASE WHEN c.reltuples >= 0 THEN c.reltuples::bigint ELSE s.n_live_tup END AS record_count
+FROM pg_catalog.pg_class c
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_catalog.pg_stat_user_tables s ON s.relid = c.oid
+WHERE n.nspname = :schema AND c.relkind IN ('r', 'p')
+"""
+
+# 参与内容抽样的字段类型（按类型名称包含关系判断）
+SAMPLED_TYPE_KEYWORDS = ("char", "text", "string", "clob", "bigint", "numeric", "decimal")
+
+# 身份证号校验（GB 11643）：前17位加权求和模11后对应的校验码
+ID_NO_WEIGHTS = np.array([7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2], dtype=np.int64)
+ID_NO_CHECK_CODES = np.frombuffer(b"10X98765432", dtype=np.uint8)
+
+
+def _digit_matrix(values: List[str], width: int) -> np.ndarray:
+    """将等长字符串转换为字节矩阵（每行一个值）"""
+    return np.frombuffer("".join(values).encode("ascii"), dtype=np.uint8).reshape(-1, width)
+
+
+def validate_id_no(values: List[str]) -> np.ndarray:
+    """批量校验18位身份证号的校验位"""
+    if not values:
+        return np.zeros(0, dtype=bool)
+    raw = _digit_matrix([v.upper() for v in values], 18)
+    checks = (raw[:, :17].astype(np.int64) - 48) @ ID_NO_WEIGHTS % 11
+    return ID_NO_CHECK_CODES[checks] == raw[:, 17]
+
+
+def validate_luhn(values: List[str]) -> np.ndarray:
+    """批量进行银行卡号 Luhn 校验（按长度分组矩阵运算）"""
+    result = np.zeros(len(values), dtype=bool)
+    if not values:
+        return result
+    lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+    for length in np.unique(lengths):
+        index = np.nonzero(lengths == length)[0]
+        digits = (_digit_matrix([values[i] for i in index], int(length)).astype(np.int64) - 48)[:, ::-1]
+        doubled = digits[:, 1::2] * 2
+        doubled -= 9 * (doubled > 9)
+        result[index] = (digits[:, 0::2].sum(axis=1) + doubled.sum(axis=1)) % 10 == 0
+    return result
+
+
+class ValueRule(NamedTuple):
+    """值级识别规则"""
+    code: str
+    data_level: DataLevel
+    pattern: str
+    validator: Optional[Callable[[List[str]], np.ndarray]] = None
+
+
+# 内置值级识别规则：对抽样内容整值匹配，并用校验位剔除误命中
+VALUE_RULES = [
+    ValueRule(
+        "VALUE_ID_NO", DataLevel.SENSITIVE,
+        r"[1-9]\d{5}(?:18|19|20)\d{2}(?:0[1-9]|1[0-2])(?:0[1-9]|[12]\d|3[01])\d{3}[\dXx]",
+        validate_id_no
+    ),
+    ValueRule("VALUE_MOBILE", DataLevel.SENSITIVE, r"(?:\+?86[- ]?)?1[3-9]\d{9}"),
+    ValueRule("VALUE_CARD_NO", DataLevel.SENSITIVE, r"[2-6]\d{15,18}", validate_luhn),
+]
+
+
+class ColumnProfile(NamedTuple):
+    """字段抽样剖析结果"""
+    sample_size: int
+    hit_ratio: float
+    rule_codes: List[str]
+    data_level: Optional[DataLevel]
+
+
+class ValueDetector:
+    """值级敏感信息检测器（整列拼接后一次正则扫描，校验位按矩阵批量计算）"""
+    
+    def __init__(self, rules: Iterable[ValueRule] = VALUE_RULES, hit_ratio_threshold: float = 0.3):
+        self.rules = [
+            (rule, re.compile(f"^(?:{rule.pattern})$", re.MULTILINE | re.ASCII))
+            for rule in rules
+        ]
+        self.hit_ratio_threshold = hit_ratio_threshold
+    
+    def detect(self, values: Iterable[Any]) -> ColumnProfile:
+        """检测一列抽样值，返回最高命中率及达到阈值的规则"""
+        cleaned = [str(v).strip() for v in values if v is not None]
+        cleaned = [v.replace("\n", " ") for v in cleaned if v]
+        if not cleaned:
+            return ColumnProfile(sample_size=0, hit_ratio=0.0, rule_codes=[], data_level=None)
+        
+        blob = "\n".join(cleaned)
+        best_ratio = 0.0
+        rule_codes = []
+        level = None
+        for rule, compiled in self.rules:
+            matches = compiled.findall(blob)
+            if not matches:
+                continue
+            hits = int(rule.validator(matches).sum()) if rule.validator else len(matches)
+            ratio = hits / len(cleaned)
+            best_ratio = max(best_ratio, ratio)
+            if ratio >= self.hit_ratio_threshold:
+                rule_codes.append(rule.code)
+                if level is None or DATA_LEVEL_RANK[rule.data_level] > DATA_LEVEL_RANK[level]:
+                    level = rule.data_level
+        return ColumnProfile(
+            sample_size=len(cleaned),
+            hit_ratio=round(best_ratio, 4),
+            rule_codes=rule_codes,
+            data_level=level
+        )
+
+
+class DataProfiler:
+    """数据内容抽样剖析器（行数取自统计信息，内容按 TABLESAMPLE 抽样，单表代价有上限）"""
+    
+    def __init__(
+        self,
+        db: Session,
+        source_engine: Optional[Engine] = None,
+        sample_rows: Optional[int] = None,
+        max_columns: Optional[int] = None,
+        timeout_seconds: Optional[int] = None,
+        hit_ratio_threshold: Optional[float] = None
+    ):
+        self.db = db
+        self.source_engine = source_engine or engine
+        self.sample_rows = sample_rows or settings.PROFILE_SAMPLE_ROWS
+        self.max_columns = max_columns or settings.PROFILE_MAX_COLUMNS
+        self.timeout_seconds = timeout_seconds or settings.PROFILE_TIMEOUT_SECONDS
+        self.detector = ValueDetector(
+            hit_ratio_threshold=hit_ratio_threshold or settings.PROFILE_HIT_RATIO_THRESHOLD
+        )
+    
+    def _estimate_record_counts(self, connection, schema: str) -> Dict[str, int]:
+        """读取Schema下各表的行数估算（仅PostgreSQL）"""
+        if connection.dialect.name != "postgresql":
+            return {}
+        with connection.begin():
+            return {
+                row.table_name: int(row.record_count)
+                for row in connection.execute(text(PG_RELTUPLES_SQL), {"schema": schema})
+                if row.record_count is not None
+            }
+    
+    def _sample_sql(self, connection, schema: str, table: str, columns: List[str], record_count: Optional[int]) -> str:
+        """构造抽样查询：大表按页抽样，小表直接限量读取"""
+        quote = connection.dialect.identifier_preparer.quote
+        is_pg = connection.dialect.name == "postgresql"
+        select_list = ", ".join(
+            f"CAST({quote(name)} AS TEXT)" if is_pg else quote(name) for name in columns
+        )
+        sql = f"SELECT {select_list} FROM {quote(schema)}.{quote(table)}"
+        if is_pg and record_count and record_count > self.sample_rows:
+            # 按页抽样会带来块内聚集，多抽一倍再由 LIMIT 截断
+            percent = min(100.0, max(0.0001, self.sample_rows * 200.0 / record_count))
+            sql += f" TABLESAMPLE SYSTEM ({percent:.4f})"
+        return sql + f" LIMIT {int(self.sample_rows)}"
+    
+    def _sample_table(
+        self,
+        connection,
+        schema: str,
+        table: str,
+        columns: List[str],
+        record_count: Optional[int]
+    ) -> List[tuple]:
+        """在语句超时约束下读取一张表的抽样数据"""
+        with connection.begin():
+            if connection.dialect.name == "postgresql":
+                connection.execute(text(f"SET LOCAL statement_timeout = {int(self.timeout_seconds * 1000)}"))
+            return connection.execute(
+                text(self._sample_sql(connection, schema, table, columns, record_count))
+            ).fetchall()
+    
+    @staticmethod
+    def _is_sampled_type(data_type: Optional[str]) -> bool:
+        """判断字段类型是否参与内容抽样"""
+        data_type = (data_type or "").lower()
+        return any(keyword in data_type for keyword in SAMPLED_TYPE_KEYWORDS)
+    
+    def profile_source(
+        self,
+        source_system: Optional[str],
+        asset_ids: Optional[List[int]] = None,
+        resample: bool = False
+    ) -> Dict[str, Any]:
+        """剖析一个来源系统的资产：刷新行数估算，并对未剖析（或要求重新抽样）的表抽样检测内容"""
+        started = time.monotonic()
+        stats = {
+            "asset_count": 0,
+            "record_count_updated": 0,
+            "sampled_count": 0,
+            "sampled_column_count": 0,
+            "sensitive_column_count": 0,
+            "raised_count": 0,
+            "failed_count": 0
+        }
+        query = self.db.query(
+            DataAsset.id, DataAsset.schema_name, DataAsset.table_name,
+            DataAsset.data_level, DataAsset.last_profile_time
+        ).filter(
+            DataAsset.is_active == True,
+            DataAsset.schema_name.isnot(None),
+            DataAsset.table_name.isnot(None)
+        )
+        if source_system:
+            query = query.filter(DataAsset.source_system == source_system)
+        if asset_ids:
+            query = query.filter(DataAsset.id.in_(asset_ids))
+        by_schema: Dict[str, list] = {}
+        for row in query.all():
+            by_schema.setdefault(row.schema_name, []).append(row)
+            stats["asset_count"] += 1
+        
+        with self.source_engine.connect() as connection:
+            for schema, assets in by_schema.items():
+                try:
+                    estimates = self._estimate_record_counts(connection, schema)
+                except Exception as e:
+                    logger.warning("Schema %s 行数估算失败: %s", schema, e)
+                    estimates = {}
+                pending = [a for a in assets if resample or a.last_profile_time is None]
+                self._profile_schema(connection, schema, assets, pending, estimates, stats)
+        
+        stats["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        logger.info(
+            "内容剖析完成：资产 %s 个，抽样 %s 张表，敏感字段 %s 个，耗时 %.3f 秒",
+            stats["asset_count"], stats["sampled_count"], stats["sensitive_column_count"], stats["elapsed_seconds"]
+        )
+        return stats
+    
+    def _profile_schema(
+        self,
+        connection,
+        schema: str,
+        assets: list,
+        pending: list,
+        estimates: Dict[str, int],
+        stats: Dict[str, Any]
+    ):
+        """剖析一个Schema并批量写回结果"""
+        now = datetime.now()
+        record_counts = {a.id: estimates[a.table_name] for a in assets if a.table_name in estimates}
+        
+        columns_by_asset: Dict[int, list] = {}
+        if pending:
+            column_rows = self.db.query(
+                DataAssetColumn.id, DataAssetColumn.asset_id, DataAssetColumn.column_name,
+                DataAssetColumn.data_type, DataAssetColumn.data_level
+            ).filter(
+                DataAssetColumn.asset_id.in_([a.id for a in pending])
+            ).order_by(DataAssetColumn.asset_id, DataAssetColumn.ordinal_position).all()
+            for row in column_rows:
+                if self._is_sampled_type(row.data_type):
+                    columns_by_asset.setdefault(row.asset_id, []).append(row)
+        
+        column_updates = []
+        asset_updates = []
+        raised_ids = []
+        for asset in pending:
+            columns = columns_by_asset.get(asset.id, [])[:self.max_columns]
+            level = asset.data_level
+            if columns:
+                try:
+                    rows = self._sample_table(
+                        connection, schema, asset.table_name,
+                        [c.column_name for c in columns], record_counts.get(asset.id)
+                    )
+                except Exception as e:
+                    logger.warning("表 %s.%s 抽样失败: %s", schema, asset.table_name, e)
+                    stats["failed_count"] += 1
+                    continue
+                if asset.id not in record_counts and len(rows) < self.sample_rows:
+                    # 未取到统计信息但整表已读完，抽样行数即为实际行数
+                    record_counts[asset.id] = len(rows)
+                for position, column in enumerate(columns):
+                    profile = self.detector.detect(row[position] for row in rows)
+                    column_level = column.data_level
+                    if profile.data_level and (
+                        column_level is None or DATA_LEVEL_RANK[profile.data_level] > DATA_LEVEL_RANK[column_level]
+                    ):
+                        column_level = profile.data_level
+                    if profile.rule_codes:
+                        stats["sensitive_column_count"] += 1
+                    if column_level and (level is None or DATA_LEVEL_RANK[column_level] > DATA_LEVEL_RANK[level]):
+                        level = column_level
+                    column_updates.append({
+                        "id": column.id,
+                        "data_level": column_level,
+                        "sample_size": profile.sample_size,
+                        "sample_hit_ratio": profile.hit_ratio,
+                        "sample_rules": ",".join(profile.rule_codes) or None
+                    })
+                stats["sampled_column_count"] += len(columns)
+            stats["sampled_count"] += 1
+            if level != asset.data_level:
+                stats["raised_count"] += 1
+                raised_ids.append(asset.id)
+            # 级别只升不降
+            asset_updates.append({"id": asset.id, "data_level": level, "last_profile_time": now})
+        
+        if record_counts:
+            self.db.execute(
+                update(DataAsset),
+                [{"id": asset_id, "record_count": count} for asset_id, count in record_counts.items()]
+            )
+            stats["record_count_updated"] += len(record_counts)
+        if asset_updates:
+            self.db.execute(update(DataAsset), asset_updates)
+        if column_updates:
+            self.db.execute(update(DataAssetColumn), column_updates)
+        self.db.commit()
+        if raised_ids:
+            LevelPropagator(self.db).propagate(raised_ids)
@@ -3,64 +3,490 @@
 作者：张彦龙
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import inspect, text
-from typing import List, Optional
-from app.models.data_asset import DataAsset
+from sqlalchemy import inspect, text, insert, update, delete
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from typing import List, Optional, Dict, Any, NamedTuple, Set, Tuple
+from datetime import datetime
+import hashlib
+import logging
+import threading
+import time
+from app.models.data_asset import DataAsset, DataAssetColumn, DataLevel, asset_tag_association
 from app.core.database import engine
+from app.utils.classification_engine import ClassificationEngine, DATA_LEVEL_RANK
+from app.utils.level_propagation import LevelPropagator
+from app.utils.text_search import build_search_text
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_SCHEMAS = ("information_schema", "pg_catalog", "pg_toast")
+
+# PostgreSQL：列出用户Schema
+PG_SCHEMA_SQL = """
+SELECT nspname FROM pg_catalog.pg_namespace
+WHERE nspname NOT IN ('information_schema', 'pg_catalog', 'pg_toast')
+  AND nspname NOT LIKE 'pg_temp_%' AND nspname NOT LIKE 'pg_toast_temp_%'
+ORDER BY nspname
+"""
+
+# PostgreSQL：一次取回Schema下全部表和字段（直接读pg_catalog，比information_schema更快）
+PG_CATALOG_SQL = """
+SELECT c.relname AS table_name,
+       a.attname AS column_name,
+       pg_catalog.format_type(a.atttypid, a.atttypmod) AS data_type,
+       a.attnum AS ordinal_position,
+       NOT a.attnotnull AS is_nullable
+FROM pg_catalog.pg_class c
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_catalog.pg_attribute a
+       ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+WHERE n.nspname = :schema AND c.relkind IN ('r', 'p')
+ORDER BY c.relname, a.attnum
+"""
+
+# PostgreSQL：只取回指定表的字段（增量扫描时仅拉取新增/变更的表）
+PG_CATALOG_TABLES_SQL = """
+SELECT c.relname AS table_name,
+       a.attname AS column_name,
+       pg_catalog.format_type(a.atttypid, a.atttypmod) AS data_type,
+       a.attnum AS ordinal_position,
+       NOT a.attnotnull AS is_nullable
+FROM pg_catalog.pg_class c
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_catalog.pg_attribute a
+       ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+WHERE n.nspname = :schema AND c.relkind IN ('r', 'p') AND c.relname = ANY(:tables)
+ORDER BY c.relname, a.attnum
+"""
+
+# PostgreSQL：在服务端计算每张表的结构指纹（字段数:md5(字段名:类型,...)），与 fingerprint_columns 一致
+PG_FINGERPRINT_SQL = """
+SELECT c.relname AS table_name,
+       count(a.attname) || ':' || md5(coalesce(string_agg(
+           a.attname || ':' || pg_catalog.format_type(a.atttypid, a.atttypmod), ',' ORDER BY a.attnum
+       ), '')) AS fingerprint
+FROM pg_catalog.pg_class c
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_catalog.pg_attribute a
+       ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+WHERE n.nspname = :schema AND c.relkind IN ('r', 'p')
+GROUP BY c.relname
+"""
+
+# 其他数据库：information_schema 通用查询
+INFORMATION_SCHEMA_SQL = """
+SELECT t.table_name AS table_name,
+       c.column_name AS column_name,
+       c.data_type AS data_type,
+       c.ordinal_position AS ordinal_position,
+       CASE WHEN c.is_nullable = 'YES' THEN 1 ELSE 0 END AS is_nullable
+FROM information_schema.tables t
+LEFT JOIN information_schema.columns c
+       ON c.table_schema = t.table_schema AND c.table_name = t.table_name
+WHERE t.table_schema = :schema AND t.table_type = 'BASE TABLE'
+ORDER BY t.table_name, c.ordinal_position
+"""
+
+
+class ColumnMetadata(NamedTuple):
+    """字段元数据"""
+    column_name: str
+    data_type: Optional[str]
+    ordinal_position: int
+    is_nullable: Optional[bool]
+
+
+class TableMetadata(NamedTuple):
+    """表元数据"""
+    schema_name: str
+    table_name: str
+    columns: List[ColumnMetadata]
+    fingerprint: Optional[str] = None
+    # 已登记资产（结构发生变化）的ID和当前级别，新表为空
+    asset_id: Optional[int] = None
+    current_level: Optional[DataLevel] = None
+
+
+class ExistingAsset(NamedTuple):
+    """已登记资产的扫描状态"""
+    asset_id: int
+    fingerprint: Optional[str]
+    data_level: Optional[DataLevel]
+
+
+def fingerprint_columns(columns: List[ColumnMetadata]) -> str:
+    """计算表结构指纹：字段数:md5(按序号排列的 字段名:类型)"""
+    ordered = sorted(columns, key=lambda c: c.ordinal_position)
+    digest = hashlib.md5(
+        ",".join(f"{c.column_name}:{c.data_type}" for c in ordered).encode("utf-8")
+    ).hexdigest()
+    return f"{len(ordered)}:{digest}"
+
+
+def insert_ignore(db: Session, target):
+    """按数据库方言构造 INSERT ... ON CONFLICT DO NOTHING 语句"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return pg_insert(target).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return sqlite_insert(target).on_conflict_do_nothing()
+    return insert(target)
+
+
+class ScanCancelledError(Exception):
+    """扫描已被取消（如数据源扫描超时）"""
 
 
 class DataScanner:
     """数据资产扫描器"""
     
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        db: Session,
+        source_engine: Optional[Engine] = None,
+        schemas: Optional[List[str]] = None,
+        asset_code_prefix: Optional[str] = None,
+        cancel_event: Optional[threading.Event] = None
+    ):
         self.db = db
+        self.source_engine = source_engine or engine
+        # 限定扫描的Schema，为空则扫描全部用户Schema
+        self.schemas = schemas or None
+        # 多数据源时资产编码加上数据源前缀，避免不同系统同名表冲突
+        self.asset_code_prefix = asset_code_prefix
+        # 结构未变化、只需刷新扫描时间的资产
+        self.unchanged_asset_ids: List[int] = []
+        # 取消信号：采集和识别时逐表检查，提交前再检查一次，已取消则不写入
+        self.cancel_event = cancel_event
+    
+    def check_cancelled(self):
+        """已取消时抛出 ScanCancelledError"""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ScanCancelledError("扫描已取消")
     
-    def scan_metadata(self, source_system: Optional[str] = None) -> List[DataAsset]:
-        """扫描数据库元数据"""
-        scanned_assets = []
+    def list_schemas(self, connection) -> List[str]:
+        """列出需要扫描的Schema"""
+        if connection.dialect.name == "postgresql":
+            schemas = [row[0] for row in connection.execute(text(PG_SCHEMA_SQL))]
+        else:
+            schemas = [
+                schema for schema in inspect(connection).get_schema_names()
+                if schema not in SYSTEM_SCHEMAS
+            ]
+        if self.schemas:
+            schemas = [schema for schema in schemas if schema in self.schemas]
+        return schemas
+    
+    def _fetch_schema_catalog(
+        self,
+        connection,
+        schema: str,
+        table_names: Optional[List[str]] = None
+    ) -> Dict[str, List[ColumnMetadata]]:
+        """一次目录查询取回Schema下全部（或指定）表及字段"""
+        params: Dict[str, Any] = {"schema": schema}
+        if connection.dialect.name == "postgresql":
+            sql = PG_CATALOG_SQL
+            if table_names is not None:
+                sql = PG_CATALOG_TABLES_SQL
+                params["tables"] = list(table_names)
+        else:
+            sql = INFORMATION_SCHEMA_SQL
+        tables: Dict[str, List[ColumnMetadata]] = {}
+        for row in connection.execute(text(sql), params):
+            columns = tables.setdefault(row.table_name, [])
+            if row.column_name is not None:
+                columns.append(ColumnMetadata(
+                    column_name=row.column_name,
+                    data_type=row.data_type,
+                    ordinal_position=row.ordinal_position,
+                    is_nullable=bool(row.is_nullable) if row.is_nullable is not None else None
+                ))
+        if table_names is not None and connection.dialect.name != "postgresql":
+            wanted = set(table_names)
+            tables = {name: columns for name, columns in tables.items() if name in wanted}
+        return tables
+    
+    def _fetch_schema_fingerprints(self, connection, schema: str) -> Optional[Dict[str, str]]:
+        """在服务端批量计算Schema下各表的结构指纹（仅PostgreSQL，其他数据库返回None）"""
+        if connection.dialect.name != "postgresql":
+            return None
+        return {
+            row.table_name: row.fingerprint
+            for row in connection.execute(text(PG_FINGERPRINT_SQL), {"schema": schema})
+        }
+    
+    def load_existing_keys(self, source_system: Optional[str] = None) -> Dict[Tuple[str, str], ExistingAsset]:
+        """一次性载入本来源系统已登记的 (schema, table) 及其结构指纹（其他数据源的同名表不参与比对）"""
+        query = self.db.query(
+            DataAsset.schema_name, DataAsset.table_name,
+            DataAsset.id, DataAsset.schema_fingerprint, DataAsset.data_level
+        ).filter(
+            DataAsset.schema_name.isnot(None),
+            DataAsset.source_system == (source_system or "未知")
+        )
+        return {
+            (row.schema_name, row.table_name): ExistingAsset(row.id, row.schema_fingerprint, row.data_level)
+            for row in query.all()
+        }
+    
+    def collect_schema(
+        self,
+        connection,
+        schema: str,
+        existing_keys: Dict[Tuple[str, str], ExistingAsset],
+        stats: Dict[str, Any]
+    ) -> List[TableMetadata]:
+        """增量采集单个Schema：比较结构指纹，只返回新增或结构变化的表"""
+        for key in ("schema_count", "catalog_table_count", "catalog_column_count",
+                    "existing_count", "new_count", "changed_count", "unchanged_count"):
+            stats.setdefault(key, 0)
+        stats["schema_count"] += 1
         
-        try:
-            # 查询所有表
-            inspector = inspect(engine)
-            schemas = inspector.get_schema_names()
-            
-            for schema in schemas:
-                if schema in ['information_schema', 'pg_catalog']:
+        fingerprints = self._fetch_schema_fingerprints(connection, schema)
+        if fingerprints is not None:
+            # 先比对指纹，只为新增/变更的表拉取字段
+            pending = []
+            for table_name, fingerprint in fingerprints.items():
+                stats["catalog_table_count"] += 1
+                existing = existing_keys.get((schema, table_name))
+                if existing and existing.fingerprint == fingerprint:
+                    stats["existing_count"] += 1
+                    stats["unchanged_count"] += 1
+                    self.unchanged_asset_ids.append(existing.asset_id)
+                else:
+                    pending.append(table_name)
+            catalog = self._fetch_schema_catalog(connection, schema, pending) if pending else {}
+        else:
+            catalog = self._fetch_schema_catalog(connection, schema)
+            fingerprints = {name: fingerprint_columns(columns) for name, columns in catalog.items()}
+            stats["catalog_table_count"] += len(catalog)
+        
+        tables = []
+        for table_name, columns in catalog.items():
+            self.check_cancelled()
+            stats["catalog_column_count"] += len(columns)
+            fingerprint = fingerprints.get(table_name) or fingerprint_columns(columns)
+            existing = existing_keys.get((schema, table_name))
+            if existing:
+                if existing.fingerprint == fingerprint:
+                    stats["existing_count"] += 1
+                    stats["unchanged_count"] += 1
+                    self.unchanged_asset_ids.append(existing.asset_id)
                     continue
-                
-                tables = inspector.get_table_names(schema=schema)
-                
-                for table_name in tables:
-                    # 检查资产是否已存在
-                    existing_asset = self.db.query(DataAsset).filter(
-                        DataAsset.schema_name == schema,
-                        DataAsset.table_name == table_name
-                    ).first()
-                    
-                    if existing_asset:
-                        continue
-                    
-                    # 获取表信息
-                    columns = inspector.get_columns(table_name, schema=schema)
-                    
-                    # 创建数据资产
-                    asset = DataAsset(
-                        asset_name=f"{schema}.{table_name}",
-                        asset_code=f"{schema}_{table_name}".upper(),
-                        asset_type="表",
-                        source_system=source_system or "未知",
-                        schema_name=schema,
-                        table_name=table_name,
-                        field_count=len(columns),
-                        description=f"自动扫描发现的表：{schema}.{table_name}"
-                    )
-                    
-                    self.db.add(asset)
-                    scanned_assets.append(asset)
+                stats["existing_count"] += 1
+                stats["changed_count"] += 1
+                tables.append(TableMetadata(
+                    schema_name=schema, table_name=table_name, columns=columns, fingerprint=fingerprint,
+                    asset_id=existing.asset_id, current_level=existing.data_level
+                ))
+            else:
+                stats["new_count"] += 1
+                tables.append(TableMetadata(
+                    schema_name=schema, table_name=table_name, columns=columns, fingerprint=fingerprint
+                ))
+        return tables
+    
+    def collect_metadata(self, source_system: Optional[str] = None) -> Tuple[List[TableMetadata], Dict[str, Any]]:
+        """采集新增或结构变化的表及其字段元数据（每个Schema一次指纹查询+一次字段查询）"""
+        stats: Dict[str, Any] = {}
+        existing_keys = self.load_existing_keys(source_system)
+        
+        tables = []
+        with self.source_engine.connect() as connection:
+            for schema in self.list_schemas(connection):
+                tables.extend(self.collect_schema(connection, schema, existing_keys, stats))
+        
+        return tables, stats
+    
+    def _insert_ignore(self, target):
+        """构造 INSERT ... ON CONFLICT DO NOTHING 语句"""
+        return insert_ignore(self.db, target)
+    
+    def _asset_code(self, table: TableMetadata) -> str:
+        """生成资产编码"""
+        code = f"{table.schema_name}_{table.table_name}"
+        if self.asset_code_prefix:
+            code = f"{self.asset_code_prefix}_{code}"
+        return code.upper()[:100]
+    
+    def save_scan_results(
+        self,
+        tables: List[TableMetadata],
+        source_system: Optional[str],
+        classifier: ClassificationEngine
+    ) -> Dict[str, Any]:
+        """批量识别字段并写入资产、字段和标签关联（新表多行 INSERT ... ON CONFLICT，变更表批量 UPDATE）"""
+        summary = {
+            "count": 0,
+            "updated_count": 0,
+            "classified_count": 0,
+            "tagged_count": 0,
+            "column_count": 0,
+            "sensitive_column_count": 0
+        }
+        if not tables:
+            return summary
         
-        except Exception as e:
-            print(f"扫描元数据时出错: {e}")
+        # 同名字段在整批表中只识别一次
+        column_results = classifier.classify_columns(
+            column.column_name for table in tables for column in table.columns
+        )
         
+        now = datetime.now()
+        new_rows = []
+        changed_rows = []
+        table_results = []
+        for table in tables:
+            self.check_cancelled()
+            asset_name = f"{table.schema_name}.{table.table_name}"
+            table_result = classifier.classify_table(
+                asset_name,
+                (column_results[c.column_name] for c in table.columns if c.column_name in column_results)
+            )
+            if table.asset_id is not None:
+                # 结构变化的已登记资产：级别只升不降，保留人工调高的级别
+                level = table_result.data_level
+                if table.current_level and DATA_LEVEL_RANK[table.current_level] > DATA_LEVEL_RANK[level]:
+                    level = table.current_level
+                table_result = table_result._replace(data_level=level)
+                changed_rows.append({
+                    "id": table.asset_id,
+                    "field_count": len(table.columns),
+                    "data_level": level,
+                    "schema_fingerprint": table.fingerprint,
+                    "last_scan_time": now,
+                    # 结构变化后需要重新抽样剖析
+                    "last_profile_time": None
+                })
+            else:
+                asset_code = self._asset_code(table)
+                description = f"自动扫描发现的表：{asset_name}"
+                new_rows.append({
+                    "asset_name": asset_name,
+                    "asset_code": asset_code,
+                    "asset_type": "表",
+                    "source_system": source_system or "未知",
+                    "schema_name": table.schema_name,
+                    "table_name": table.table_name,
+                    "field_count": len(table.columns),
+                    "data_level": table_result.data_level,
+                    "effective_level": table_result.data_level,
+                    "schema_fingerprint": table.fingerprint,
+                    "description": description,
+                    # 批量插入不经过ORM事件，需显式生成检索分词文本
+                    "search_text": build_search_text(asset_name, asset_code, description),
+                    "last_scan_time": now
+                })
+            table_results.append(table_result)
+        
+        asset_ids: Dict[Tuple[str, str], int] = {}
+        if new_rows:
+            # 并发扫描或重复登记时跳过已存在的资产编码
+            inserted = self.db.execute(
+                self._insert_ignore(DataAsset).returning(DataAsset.id, DataAsset.asset_code),
+                new_rows
+            ).all()
+            codes = {asset_code: asset_id for asset_id, asset_code in inserted}
+            for row in new_rows:
+                if row["asset_code"] in codes:
+                    asset_ids[(row["schema_name"], row["table_name"])] = codes[row["asset_code"]]
+        if changed_rows:
+            # 按主键批量更新，并清空旧的字段记录后重新写入
+            self.db.execute(update(DataAsset), changed_rows)
+            self.db.execute(
+                delete(DataAssetColumn).where(DataAssetColumn.asset_id.in_([row["id"] for row in changed_rows]))
+            )
+        
+        column_rows = []
+        tag_rows = []
+        for table, table_result in zip(tables, table_results):
+            asset_id = table.asset_id or asset_ids.get((table.schema_name, table.table_name))
+            if asset_id is None:
+                continue
+            for column in table.columns:
+                match = column_results.get(column.column_name)
+                if match and match.rule_codes:
+                    summary["sensitive_column_count"] += 1
+                column_rows.append({
+                    "asset_id": asset_id,
+                    "column_name": column.column_name,
+                    "data_type": column.data_type,
+                    "ordinal_position": column.ordinal_position,
+                    "is_nullable": column.is_nullable,
+                    "data_level": match.data_level if match else DataLevel.INTERNAL,
+                    "matched_tags": ",".join(match.rule_codes)[:500] if match and match.rule_codes else None
+                })
+            tag_rows.extend({"asset_id": asset_id, "tag_id": tag_id} for tag_id in table_result.tag_ids)
+            if table_result.data_level != DataLevel.INTERNAL:
+                summary["classified_count"] += 1
+            if table_result.tag_ids:
+                summary["tagged_count"] += 1
+        
+        if column_rows:
+            self.db.execute(self._insert_ignore(DataAssetColumn), column_rows)
+        if tag_rows:
+            self.db.execute(self._insert_ignore(asset_tag_association), tag_rows)
+        self.check_cancelled()
         self.db.commit()
-        return scanned_assets
-
+        
+        raised_ids = [
+            row["id"] for row, table in zip(changed_rows, (t for t in tables if t.asset_id is not None))
+            if row["data_level"] != table.current_level
+        ]
+        if raised_ids:
+            # 结构变化导致级别上调时沿血缘传播
+            LevelPropagator(self.db).propagate(raised_ids)
+        
+        summary["count"] = len(asset_ids)
+        summary["updated_count"] = len(changed_rows)
+        summary["column_count"] = len(column_rows)
+        return summary
+    
+    def mark_unchanged(self, chunk_size: int = 5000) -> int:
+        """批量刷新结构未变化资产的扫描时间"""
+        asset_ids, self.unchanged_asset_ids = self.unchanged_asset_ids, []
+        if not asset_ids:
+            return 0
+        now = datetime.now()
+        for start in range(0, len(asset_ids), chunk_size):
+            chunk = asset_ids[start:start + chunk_size]
+            self.db.execute(
+                update(DataAsset).where(DataAsset.id.in_(chunk)).values(last_scan_time=now),
+                execution_options={"synchronize_session": False}
+            )
+        self.db.commit()
+        return len(asset_ids)
+    
+    def scan_metadata(
+        self,
+        source_system: Optional[str] = None,
+        classifier: Optional[ClassificationEngine] = None
+    ) -> Dict[str, Any]:
+        """扫描数据库元数据，识别字段敏感信息并批量入库（读取目录失败时抛出异常，不按空结果处理）"""
+        started = time.monotonic()
+        try:
+            tables, stats = self.collect_metadata(source_system)
+        except Exception:
+            # 空结果会被记为扫描成功，且未变化标记会作用于空结果，因此回滚后继续抛出，由调用方记为失败
+            logger.exception("扫描元数据时出错")
+            self.db.rollback()
+            raise
+        catalog_seconds = time.monotonic() - started
+        
+        if classifier is None:
+            classifier = ClassificationEngine(self.db)
+        
+        summary = self.save_scan_results(tables, source_system, classifier)
+        self.mark_unchanged()
+        summary.update(stats)
+        summary["catalog_seconds"] = round(catalog_seconds, 3)
+        summary["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        logger.info(
+            "元数据扫描完成：目录表 %s 个，新增 %s 个，结构变化 %s 个，未变化 %s 个，耗时 %.3f 秒",
+            stats.get("catalog_table_count", 0), summary["count"], summary["updated_count"],
+            stats.get("unchanged_count", 0), summary["elapsed_seconds"]
+        )
+        return summary
@@ -0,0 +1,58 @@
+"""
+到期扫描器
+作者：张彦龙
+"""
+from typing import Optional
+import asyncio
+import logging
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.expiry_service import ExpiryService
+
+logger = logging.getLogger(__name__)
+
+
+def run_expiry_sweep() -> dict:
+    """执行一轮到期扫描（独立会话）"""
+    db = SessionLocal()
+    try:
+        return ExpiryService(db).sweep()
+    finally:
+        db.close()
+
+
+class ExpirySweeper:
+    """进程内到期扫描器（定期将超时审批、到期场景及其审批流转为已过期，多实例可同时运行）"""
+    
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+    
+    async def _run(self):
+        """扫描主循环，数据库操作在线程中执行，不占用事件循环"""
+        interval = max(settings.EXPIRY_SWEEP_SECONDS, 1)
+        while True:
+            try:
+                await asyncio.to_thread(run_expiry_sweep)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("到期扫描异常")
+            await asyncio.sleep(interval)
+    
+    def start(self):
+        """启动扫描（需在事件循环中调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        """停止扫描"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+expiry_sweeper = ExpirySweeper()
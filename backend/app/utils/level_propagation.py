@@ -0,0 +1,122 @@
+"""
+数据级别血缘传播引擎
+作者：张彦龙
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import update
+from typing import List, Dict, Any, Iterable, Set, Tuple
+import logging
+import time
+import numpy as np
+from app.models.data_asset import DataAsset, DataLevel, AssetLineage
+from app.utils.classification_engine import DATA_LEVEL_RANK
+
+logger = logging.getLogger(__name__)
+
+# 级别序号 -> 数据级别
+RANK_LEVELS: List[DataLevel] = sorted(DATA_LEVEL_RANK, key=DATA_LEVEL_RANK.get)
+
+# IN 列表分批大小
+CHUNK_SIZE = 5000
+
+
+class LevelPropagator:
+    """数据级别传播引擎：有效级别 = 自身及全部上游资产级别的最高值，只重算受影响的下游子图
+    
+    结果会持久化并用于拦截核心数据，下游子图直接取自 asset_lineage 表（含本事务内未提交的边），
+    不使用可能滞后于其他进程修改的进程内血缘图缓存。
+    """
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def _load_levels(self, asset_ids: List[int]) -> Dict[int, tuple]:
+        """分批读取资产的自身级别和当前有效级别"""
+        levels = {}
+        for start in range(0, len(asset_ids), CHUNK_SIZE):
+            chunk = asset_ids[start:start + CHUNK_SIZE]
+            for row in self.db.query(
+                DataAsset.id, DataAsset.data_level, DataAsset.effective_level
+            ).filter(DataAsset.id.in_(chunk)).all():
+                levels[row.id] = (row.data_level, row.effective_level)
+        return levels
+    
+    def _downstream_subgraph(self, seeds: Set[int]) -> Tuple[Set[int], List[int], List[int]]:
+        """按层分批查询血缘边表，返回（传递下游闭包（含起点）, 指向闭包内资产的边起点, 边终点）"""
+        closure = set(seeds)
+        frontier = sorted(seeds)
+        while frontier:
+            found = set()
+            for start in range(0, len(frontier), CHUNK_SIZE):
+                found.update(row.target_asset_id for row in self.db.query(AssetLineage.target_asset_id).filter(
+                    AssetLineage.source_asset_id.in_(frontier[start:start + CHUNK_SIZE])
+                ).all())
+            frontier = sorted(found - closure)
+            closure.update(frontier)
+        
+        edge_src, edge_dst = [], []
+        targets = sorted(closure)
+        for start in range(0, len(targets), CHUNK_SIZE):
+            for row in self.db.query(AssetLineage.source_asset_id, AssetLineage.target_asset_id).filter(
+                AssetLineage.target_asset_id.in_(targets[start:start + CHUNK_SIZE])
+            ).all():
+                edge_src.append(row.source_asset_id)
+                edge_dst.append(row.target_asset_id)
+        return closure, edge_src, edge_dst
+    
+    def propagate(self, asset_ids: Iterable[int]) -> Dict[str, Any]:
+        """重算给定资产及其全部传递下游的有效级别，并批量写回发生变化的资产"""
+        started = time.monotonic()
+        seeds = {int(i) for i in asset_ids}
+        stats = {"affected_count": 0, "updated_count": 0}
+        if not seeds:
+            return stats
+        
+        # 没有血缘边的资产（如刚扫描登记的表）只受自身级别影响
+        closure, edge_src, edge_dst = self._downstream_subgraph(seeds)
+        boundary = set(edge_src) - closure
+        
+        node_ids = sorted(closure) + sorted(boundary)
+        levels = self._load_levels(node_ids)
+        position = {asset_id: i for i, asset_id in enumerate(node_ids)}
+        
+        # 闭包内从自身级别重新计算（可能降级），闭包外的上游直接采用已持久化的有效级别
+        effective = np.zeros(len(node_ids), dtype=np.int8)
+        for asset_id, i in position.items():
+            data_level, effective_level = levels.get(asset_id, (DataLevel.INTERNAL, None))
+            level = data_level if asset_id in closure else (effective_level or data_level)
+            effective[i] = DATA_LEVEL_RANK[level]
+        
+        # 沿边取最大值直至收敛（有环时同样收敛，迭代次数不超过级别数与路径长度）
+        src = np.fromiter((position[i] for i in edge_src), dtype=np.int64, count=len(edge_src))
+        dst = np.fromiter((position[i] for i in edge_dst), dtype=np.int64, count=len(edge_dst))
+        while src.size:
+            previous = effective.copy()
+            np.maximum.at(effective, dst, effective[src])
+            if np.array_equal(previous, effective):
+                break
+        
+        rows = []
+        for asset_id in closure:
+            if asset_id not in levels:
+                continue
+            level = RANK_LEVELS[effective[position[asset_id]]]
+            if levels[asset_id][1] != level:
+                rows.append({"id": asset_id, "effective_level": level})
+        for start in range(0, len(rows), CHUNK_SIZE):
+            self.db.execute(update(DataAsset), rows[start:start + CHUNK_SIZE])
+        self.db.commit()
+        
+        stats["affected_count"] = len(closure)
+        stats["updated_count"] = len(rows)
+        stats["elapsed_seconds"] = round(time.monotonic() - started, 3)
+        logger.info(
+            "级别传播完成：受影响资产 %s 个，更新 %s 个，耗时 %.3f 秒",
+            stats["affected_count"], stats["updated_count"], stats["elapsed_seconds"]
+        )
+        return stats
+    
+    def recompute_all(self) -> Dict[str, Any]:
+        """全量重算所有资产的有效级别"""
+        asset_ids = [row.id for row in self.db.query(DataAsset.id).all()]
+        return self.propagate(asset_ids)
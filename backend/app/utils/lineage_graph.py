@@ -0,0 +1,308 @@
+"""
+内存血缘图索引
+作者：张彦龙
+"""
+from sqlalchemy.orm import Session
+from typing import List, Optional, Dict, Tuple, Iterable, NamedTuple
+import json
+import logging
+import threading
+import time
+import numpy as np
+from app.core.config import settings
+from app.models.data_asset import DataAsset, AssetLineage, DataLevel
+from app.models.scenario import TransferApproval, ApprovalAsset, ApprovalStatus
+
+logger = logging.getLogger(__name__)
+
+
+class AssetInfo(NamedTuple):
+    """血缘图中的资产信息"""
+    asset_id: int
+    name: str
+    code: str
+    data_level: DataLevel
+
+
+class ApprovalHit(NamedTuple):
+    """命中子图的已批准传输审批"""
+    approval_id: int
+    scenario_id: int
+    asset_ids: List[int]
+
+
+def _expand(ptr: np.ndarray, idx: np.ndarray, frontier: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """按 CSR 邻接数组一次取出整层前沿的全部邻居，返回 (邻居, 来源节点)"""
+    starts = ptr[frontier]
+    counts = ptr[frontier + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total)
+    return idx[offsets], np.repeat(frontier, counts)
+
+
+def _build_csr(src: np.ndarray, dst: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """由边列表构造 CSR 邻接数组"""
+    order = np.argsort(src, kind="stable")
+    ptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=size), out=ptr[1:])
+    return ptr, dst[order]
+
+
+class LineageIndex:
+    """内存血缘图：资产编号压缩为连续下标，上下游以 CSR 整数数组存储，查询不访问数据库"""
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.loaded_at: Optional[float] = None
+        self._index: Dict[int, int] = {}
+        self._assets: List[AssetInfo] = []
+        # 边列表（下标），增量修改后惰性重建 CSR
+        self._edge_src = np.empty(0, dtype=np.int64)
+        self._edge_dst = np.empty(0, dtype=np.int64)
+        # 已批准审批：审批ID -> (场景ID, 资产下标数组)
+        self._approvals: Dict[int, Tuple[int, np.ndarray]] = {}
+        self._dirty = True
+        self._down_ptr = self._down_idx = self._up_ptr = self._up_idx = None
+        self._approval_asset = self._approval_pos = None
+        self._approval_ids: List[int] = []
+    
+    # ========== 加载与增量维护 ==========
+    def load(self, db: Session):
+        """从数据库全量加载资产、血缘边和已批准审批"""
+        started = time.monotonic()
+        assets = db.query(
+            DataAsset.id, DataAsset.asset_name, DataAsset.asset_code, DataAsset.data_level
+        ).order_by(DataAsset.id).all()
+        edges = db.query(AssetLineage.source_asset_id, AssetLineage.target_asset_id).all()
+        approvals = db.query(
+            TransferApproval.id, TransferApproval.scenario_id
+        ).filter(TransferApproval.approval_status == ApprovalStatus.APPROVED).all()
+        approval_assets: Dict[int, List[int]] = {}
+        for approval_id, asset_id in db.query(ApprovalAsset.approval_id, ApprovalAsset.asset_id).join(
+            TransferApproval, TransferApproval.id == ApprovalAsset.approval_id
+        ).filter(TransferApproval.approval_status == ApprovalStatus.APPROVED).all():
+            approval_assets.setdefault(approval_id, []).append(asset_id)
+        
+        with self._lock:
+            self._index = {}
+            self._assets = []
+            for row in assets:
+                self._index[row.id] = len(self._assets)
+                self._assets.append(AssetInfo(row.id, row.asset_name, row.asset_code, row.data_level))
+            pairs = [
+                (self._index[s], self._index[t]) for s, t in edges
+                if s in self._index and t in self._index
+            ]
+            edge_array = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+            self._edge_src = edge_array[:, 0].copy()
+            self._edge_dst = edge_array[:, 1].copy()
+            self._approvals = {}
+            for row in approvals:
+                self._set_approval(row.id, row.scenario_id, approval_assets.get(row.id, []))
+            self._dirty = True
+            self.loaded_at = time.monotonic()
+        logger.info(
+            "血缘图已加载：资产 %s 个，边 %s 条，已批准审批 %s 个，耗时 %.3f 秒",
+            len(self._assets), len(self._edge_src), len(self._approvals), time.monotonic() - started
+        )
+    
+    def ensure_loaded(self, db: Session, asset_id: Optional[int] = None):
+        """未加载、已过期或缺少指定资产时重新加载"""
+        with self._lock:
+            expired = (
+                self.loaded_at is None
+                or time.monotonic() - self.loaded_at > settings.LINEAGE_GRAPH_TTL_SECONDS
+                or (asset_id is not None and asset_id not in self._index)
+            )
+        if expired:
+            self.load(db)
+    
+    def has_asset(self, asset_id: int) -> bool:
+        """资产是否在图中"""
+        return asset_id in self._index
+    
+    def get_asset(self, asset_id: int) -> AssetInfo:
+        """获取图中资产信息"""
+        return self._assets[self._index[asset_id]]
+    
+    def upsert_asset(self, asset_id: int, name: str, code: str, data_level: DataLevel):
+        """新增或更新资产信息（如级别调整）"""
+        with self._lock:
+            if self.loaded_at is None:
+                return
+            info = AssetInfo(asset_id, name, code, data_level)
+            if asset_id in self._index:
+                self._assets[self._index[asset_id]] = info
+            else:
+                self._index[asset_id] = len(self._assets)
+                self._assets.append(info)
+                self._dirty = True
+    
+    def replace_edges(
+        self,
+        asset_id: int,
+        upstream_ids: Optional[Iterable[int]] = None,
+        downstream_ids: Optional[Iterable[int]] = None
+    ):
+        """替换资产的直接上游和/或下游边（与 DataAssetService.set_lineage 语义一致）"""
+        with self._lock:
+            if self.loaded_at is None:
+                return
+            related = set(upstream_ids or []) | set(downstream_ids or []) | {asset_id}
+            if not related.issubset(self._index):
+                # 涉及图中尚未登记的资产时，下次查询全量重载
+                self.loaded_at = None
+                return
+            node = self._index[asset_id]
+            keep = np.ones(len(self._edge_src), dtype=bool)
+            new_src, new_dst = [], []
+            if upstream_ids is not None:
+                keep &= self._edge_dst != node
+                for related_id in upstream_ids:
+                    new_src.append(self._index[related_id])
+                    new_dst.append(node)
+            if downstream_ids is not None:
+                keep &= self._edge_src != node
+                for related_id in downstream_ids:
+                    new_src.append(node)
+                    new_dst.append(self._index[related_id])
+            self._edge_src = np.concatenate([self._edge_src[keep], np.array(new_src, dtype=np.int64)])
+            self._edge_dst = np.concatenate([self._edge_dst[keep], np.array(new_dst, dtype=np.int64)])
+            self._dirty = True
+    
+    def invalidate(self):
+        """标记需要全量重载（如批量删除资产后）"""
+        with self._lock:
+            self.loaded_at = None
+    
+    def set_approval(self, approval_id: int, scenario_id: int, data_assets, approved: bool = True):
+        """登记或移除已批准审批（data_assets 可为ID列表或JSON字符串）"""
+        with self._lock:
+            if self.loaded_at is None:
+                return
+            if approved:
+                self._set_approval(approval_id, scenario_id, self._parse_asset_ids(data_assets))
+            else:
+                self._approvals.pop(approval_id, None)
+            self._dirty = True
+    
+    def _set_approval(self, approval_id: int, scenario_id: int, asset_ids: List[int]):
+        """记录审批涉及的资产下标（图中不存在的资产忽略）"""
+        nodes = [self._index[i] for i in asset_ids if i in self._index]
+        self._approvals[approval_id] = (scenario_id, np.array(nodes, dtype=np.int64))
+    
+    @staticmethod
+    def _parse_asset_ids(data_assets) -> List[int]:
+        """解析审批涉及的资产ID"""
+        if isinstance(data_assets, str):
+            try:
+                data_assets = json.loads(data_assets)
+            except (json.JSONDecodeError, TypeError):
+                return []
+        if not isinstance(data_assets, list):
+            return []
+        return [i for i in data_assets if isinstance(i, int)]
+    
+    def _rebuild(self):
+        """重建 CSR 邻接数组和资产-审批倒排数组"""
+        size = len(self._assets)
+        self._down_ptr, self._down_idx = _build_csr(self._edge_src, self._edge_dst, size)
+        self._up_ptr, self._up_idx = _build_csr(self._edge_dst, self._edge_src, size)
+        self._approval_ids = list(self._approvals)
+        nodes = [self._approvals[i][1] for i in self._approval_ids]
+        self._approval_asset = np.concatenate(nodes) if nodes else np.empty(0, dtype=np.int64)
+        self._approval_pos = np.repeat(
+            np.arange(len(nodes), dtype=np.int64), [len(n) for n in nodes]
+        ) if nodes else np.empty(0, dtype=np.int64)
+        self._dirty = False
+    
+    # ========== 查询 ==========
+    def _bfs(
+        self,
+        source,
+        downstream: bool = True,
+        max_depth: Optional[int] = None,
+        target: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """按层向量化广度优先遍历（起点可为多个下标），返回 (各节点深度, 各节点前驱)，不可达为 -1"""
+        if self._dirty:
+            self._rebuild()
+        ptr, idx = (self._down_ptr, self._down_idx) if downstream else (self._up_ptr, self._up_idx)
+        size = len(self._assets)
+        depth = np.full(size, -1, dtype=np.int64)
+        parent = np.full(size, -1, dtype=np.int64)
+        frontier = np.unique(np.asarray(source, dtype=np.int64).reshape(-1))
+        depth[frontier] = 0
+        level = 0
+        while frontier.size and (max_depth is None or level < max_depth):
+            level += 1
+            neighbors, parents = _expand(ptr, idx, frontier)
+            fresh = depth[neighbors] < 0
+            neighbors, first = np.unique(neighbors[fresh], return_index=True)
+            depth[neighbors] = level
+            parent[neighbors] = parents[fresh][first]
+            if target is not None and depth[target] >= 0:
+                break
+            frontier = neighbors
+        return depth, parent
+    
+    def downstream(self, asset_id: int, max_depth: Optional[int] = None) -> List[Tuple[AssetInfo, int]]:
+        """传递下游资产及其距离（按距离、资产ID排序，不含自身）"""
+        with self._lock:
+            depth, _ = self._bfs(self._index[asset_id], max_depth=max_depth)
+            reached = np.nonzero(depth > 0)[0]
+            reached = reached[np.lexsort((reached, depth[reached]))]
+            return [(self._assets[i], int(depth[i])) for i in reached]
+    
+    def downstream_subgraph(self, asset_ids: Iterable[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """多起点传递下游闭包（含起点）及所有指向闭包内资产的边，返回 (闭包资产ID, 边起点ID, 边终点ID)"""
+        with self._lock:
+            sources = [self._index[i] for i in asset_ids if i in self._index]
+            empty = np.empty(0, dtype=np.int64)
+            if not sources:
+                return empty, empty, empty
+            depth, _ = self._bfs(sources)
+            closure = depth >= 0
+            ids = np.fromiter((info.asset_id for info in self._assets), dtype=np.int64, count=len(self._assets))
+            inbound = closure[self._edge_dst]
+            return ids[closure], ids[self._edge_src[inbound]], ids[self._edge_dst[inbound]]
+    
+    def shortest_path(self, source_id: int, target_id: int) -> Optional[List[AssetInfo]]:
+        """沿下游方向的最短血缘路径，不可达返回 None"""
+        with self._lock:
+            source, target = self._index[source_id], self._index[target_id]
+            if source == target:
+                return [self._assets[source]]
+            depth, parent = self._bfs(source, target=target)
+            if depth[target] < 0:
+                return None
+            path = [target]
+            while path[-1] != source:
+                path.append(int(parent[path[-1]]))
+            return [self._assets[i] for i in reversed(path)]
+    
+    def approvals_touching(self, asset_ids: Iterable[int]) -> List[ApprovalHit]:
+        """涉及给定资产集合的已批准审批"""
+        with self._lock:
+            if self._dirty:
+                self._rebuild()
+            mask = np.zeros(len(self._assets), dtype=bool)
+            mask[[self._index[i] for i in asset_ids if i in self._index]] = True
+            touched = mask[self._approval_asset]
+            hits = []
+            for pos in np.unique(self._approval_pos[touched]):
+                approval_id = self._approval_ids[pos]
+                scenario_id, nodes = self._approvals[approval_id]
+                hits.append(ApprovalHit(
+                    approval_id=approval_id,
+                    scenario_id=scenario_id,
+                    asset_ids=[self._assets[i].asset_id for i in nodes[mask[nodes]]]
+                ))
+            return hits
+
+
+# 进程级血缘图实例
+lineage_index = LineageIndex()
@@ -0,0 +1,204 @@
+"""
+通知推送代理
+作者：张彦龙
+"""
+from typing import Any, Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 推送事件类型
+EVENT_STATS = "stats"  # 连接建立时的通知统计快照
+EVENT_NOTIFICATION = "notification"  # 新通知
+EVENT_READ = "read"  # 通知已读
+EVENT_DELETED = "deleted"  # 通知已删除
+EVENT_RESYNC = "resync"  # 事件积压被丢弃或推送中断，客户端需重新拉取统计
+
+
+def push_message(user_id: int, event: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """构造推送消息（data 需可 JSON 序列化）"""
+    return {"user_id": user_id, "event": event, "data": data}
+
+
+class Subscription:
+    """单个推送连接的待发送事件队列（只在事件循环内读写）"""
+    
+    def __init__(self, user_id: int, max_size: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(max_size, 1))
+    
+    def put(self, event: str, data: Dict[str, Any]):
+        """放入事件；客户端消费过慢导致积压满时清空队列，只保留一个重新同步事件"""
+        try:
+            self.queue.put_nowait((event, data))
+        except asyncio.QueueFull:
+            self.clear()
+            self.queue.put_nowait((EVENT_RESYNC, {}))
+    
+    def clear(self):
+        """丢弃待发送的事件"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+    
+    async def get(self, timeout: float) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """等待下一个事件，超时返回空（用于发送心跳）"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class NotificationBroker:
+    """通知推送代理：服务层在事务提交后发布，按用户分发给已连接的 SSE / WebSocket 客户端
+    
+    memory 模式只分发给本进程的连接；redis 模式经 Redis 发布订阅分发给所有工作进程，
+    Redis 不可用期间退回本进程分发。发布可在任意线程调用，分发在事件循环内执行。
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._redis = None
+        self._redis_retry_at = 0.0
+    
+    @staticmethod
+    def _shared_mode() -> bool:
+        """是否经 Redis 在多个工作进程间分发"""
+        return settings.NOTIFICATION_PUSH_BACKEND == "redis"
+    
+    def has_audience(self, user_id: int) -> bool:
+        """是否可能有连接接收该用户的事件（redis 模式下其他进程的连接不可知，视为有）"""
+        return self._shared_mode() or user_id in self._subscribers
+    
+    def subscribe(self, user_id: int) -> Subscription:
+        """登记一个推送连接（需在事件循环中调用）"""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        subscription = Subscription(user_id, settings.NOTIFICATION_PUSH_QUEUE_SIZE)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription: Subscription):
+        """注销推送连接"""
+        subscriptions = self._subscribers.get(subscription.user_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscribers[subscription.user_id]
+    
+    def connection_count(self) -> int:
+        """本进程当前的推送连接数"""
+        return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+    
+    def publish(self, messages: List[Dict[str, Any]]):
+        """发布推送消息（线程安全；没有接收连接的消息直接丢弃，推送失败不影响业务）"""
+        messages = [message for message in messages if self.has_audience(message["user_id"])]
+        if not messages:
+            return
+        client = self._shared()
+        if client is not None:
+            try:
+                client.publish(settings.NOTIFICATION_PUSH_REDIS_CHANNEL, json.dumps(messages, ensure_ascii=False))
+                return
+            except Exception as e:
+                logger.warning(
+                    "Redis 通知发布不可用，%s 秒内只推送本进程连接: %s",
+                    settings.NOTIFICATION_PUSH_REDIS_RETRY_SECONDS, e
+                )
+                self._redis_retry_at = time.monotonic() + settings.NOTIFICATION_PUSH_REDIS_RETRY_SECONDS
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._dispatch, messages)
+    
+    def _shared(self):
+        """获取 Redis 发布客户端（未启用或暂不可用时为空）"""
+        if not self._shared_mode() or time.monotonic() < self._redis_retry_at:
+            return None
+        with self._lock:
+            if self._redis is None:
+                try:
+                    import redis
+                    self._redis = redis.Redis(
+                        host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB,
+                        socket_timeout=settings.NOTIFICATION_PUSH_REDIS_TIMEOUT,
+                        socket_connect_timeout=settings.NOTIFICATION_PUSH_REDIS_TIMEOUT
+                    )
+                except ImportError:
+                    logger.warning("未安装 redis，通知只推送本进程连接")
+                    self._redis_retry_at = math.inf
+                    return None
+            return self._redis
+    
+    def _dispatch(self, messages: List[Dict[str, Any]]):
+        """分发给本进程的连接（在事件循环内执行）"""
+        for message in messages:
+            for subscription in tuple(self._subscribers.get(message["user_id"], ())):
+                subscription.put(message["event"], message["data"])
+    
+    def _resync_all(self):
+        """通知本进程所有连接重新同步（推送中断期间可能漏发事件）"""
+        for subscriptions in tuple(self._subscribers.values()):
+            for subscription in tuple(subscriptions):
+                subscription.put(EVENT_RESYNC, {})
+    
+    async def _listen(self):
+        """订阅 Redis 频道并分发给本进程的连接，断开后按间隔重连"""
+        try:
+            import redis.asyncio as aioredis
+        except ImportError:
+            logger.warning("未安装 redis，通知只推送本进程连接")
+            return
+        interrupted = False
+        while True:
+            client = aioredis.Redis(
+                host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB,
+                socket_connect_timeout=settings.NOTIFICATION_PUSH_REDIS_TIMEOUT,
+                health_check_interval=settings.NOTIFICATION_PUSH_HEARTBEAT_SECONDS
+            )
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.subscribe(settings.NOTIFICATION_PUSH_REDIS_CHANNEL)
+                    if interrupted:
+                        self._resync_all()
+                        interrupted = False
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._dispatch(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(
+                    "Redis 通知订阅中断，%s 秒后重连: %s", settings.NOTIFICATION_PUSH_REDIS_RETRY_SECONDS, e
+                )
+                interrupted = True
+            finally:
+                await client.aclose()
+            await asyncio.sleep(settings.NOTIFICATION_PUSH_REDIS_RETRY_SECONDS)
+    
+    def start(self):
+        """启动推送代理（需在事件循环中调用；redis 模式下同时订阅频道）"""
+        self._loop = asyncio.get_running_loop()
+        if self._shared_mode() and (self._listener is None or self._listener.done()):
+            self._listener = self._loop.create_task(self._listen())
+    
+    async def stop(self):
+        """停止推送代理"""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+
+notification_broker = NotificationBroker()
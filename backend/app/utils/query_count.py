@@ -0,0 +1,116 @@
+"""
+查询总数统计工具
+作者：张彦龙
+"""
+from sqlalchemy.orm import Session, Query
+from sqlalchemy.sql.expression import Executable, ClauseElement
+from sqlalchemy.ext.compiler import compiles
+from typing import Optional, Dict, Tuple
+import logging
+import threading
+import time
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 总数统计方式
+COUNT_EXACT = "exact"  # COUNT(*) 精确统计
+COUNT_ESTIMATE = "estimate"  # 执行计划行数估算
+COUNT_CACHED = "cached"  # 按筛选条件缓存精确总数
+COUNT_NONE = "none"  # 不统计总数
+COUNT_STRATEGIES = (COUNT_EXACT, COUNT_ESTIMATE, COUNT_CACHED, COUNT_NONE)
+# 接口查询参数校验用正则
+COUNT_STRATEGY_PATTERN = "^(" + "|".join(COUNT_STRATEGIES) + ")$"
+
+
+class _Explain(Executable, ClauseElement):
+    """EXPLAIN 包装语句（绑定参数按原语句正常处理）"""
+    inherit_cache = False
+    
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def estimate_count(db: Session, query: Query) -> Optional[int]:
+    """读取执行计划的行数估算（仅PostgreSQL，不支持或失败时返回None）"""
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    try:
+        plan = db.execute(_Explain(query.order_by(None).statement)).scalar()
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        logger.warning("执行计划行数估算失败: %s", e)
+        return None
+
+
+class CountCache:
+    """进程内总数缓存（键为筛选后的SQL及参数，短TTL过期）"""
+    
+    def __init__(self):
+        self._entries: Dict[Tuple, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def signature(query: Query) -> Tuple:
+        """筛选条件签名"""
+        compiled = query.order_by(None).statement.compile()
+        return str(compiled), tuple(sorted((k, repr(v)) for k, v in compiled.params.items()))
+    
+    def get(self, key: Tuple) -> Optional[int]:
+        """读取未过期的缓存总数"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            return entry[1]
+    
+    def set(self, key: Tuple, total: int):
+        """写入缓存总数（超过上限时先清理过期条目，仍超限则整体清空）"""
+        with self._lock:
+            now = time.monotonic()
+            if len(self._entries) >= settings.COUNT_CACHE_MAX_ENTRIES:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] >= now}
+                if len(self._entries) >= settings.COUNT_CACHE_MAX_ENTRIES:
+                    self._entries.clear()
+            self._entries[key] = (now + settings.COUNT_CACHE_TTL_SECONDS, total)
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+
+count_cache = CountCache()
+
+
+def count_query(db: Session, query: Query, strategy: str = COUNT_EXACT) -> Tuple[Optional[int], str]:
+    """按指定方式统计查询总数，返回（总数，实际采用的方式）；估算不可用或结果过小时回退为精确统计"""
+    if strategy == COUNT_NONE:
+        return None, COUNT_NONE
+    if strategy == COUNT_ESTIMATE:
+        total = estimate_count(db, query)
+        if total is not None and total >= settings.COUNT_ESTIMATE_EXACT_BELOW:
+            return total, COUNT_ESTIMATE
+    elif strategy == COUNT_CACHED:
+        key = CountCache.signature(query)
+        total = count_cache.get(key)
+        if total is None:
+            total = query.order_by(None).count()
+            count_cache.set(key, total)
+        return total, COUNT_CACHED
+    return query.order_by(None).count(), COUNT_EXACT
+
+
+def set_count_headers(response, total: Optional[int], strategy: str):
+    """列表接口以响应头返回总数及统计方式（保持原有列表响应体不变）"""
+    response.headers["X-Count-Strategy"] = strategy
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
@@ -0,0 +1,222 @@
+"""
+传输频率限流器
+作者：张彦龙
+"""
+from typing import Dict, List, NamedTuple, Optional
+import logging
+import math
+import threading
+import time
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+
+# 场景申报的传输频率对应的计量周期（天），一次性传输不补充令牌；实时或未申报的场景不做审批级限流
+FREQUENCY_PERIOD_DAYS: Dict[str, Optional[int]] = {"日": 1, "周": 7, "月": 30, "一次性": None}
+
+# 本进程内存模式最多保留的令牌桶数，超过时清理已回满的桶（已回满与不存在等价）
+MAX_LOCAL_BUCKETS = 100000
+
+# Redis 共享模式：多个令牌桶原子地一起判定和扣减（任一不足则都不扣），时间取 Redis 服务器时钟
+# KEYS：令牌桶键；ARGV：扣减数、是否扣减（0 只判定），之后依次为每个桶的容量和每秒补充数
+REDIS_ACQUIRE_SCRIPT = """
+redis.replicate_commands()
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local cost = tonumber(ARGV[1])
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i + 1])
+    local refill = tonumber(ARGV[2 * i + 2])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1])
+    if tokens == nil then
+        tokens = capacity
+    else
+        tokens = math.min(capacity, tokens + math.max(0, now - tonumber(state[2])) * refill)
+    end
+    if tokens < cost then
+        return {0, i, tostring(tokens)}
+    end
+    levels[i] = tokens
+end
+if ARGV[2] == '0' then
+    return {1, 0, '0'}
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i + 1])
+    local refill = tonumber(ARGV[2 * i + 2])
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - cost), 'ts', tostring(now))
+    if refill > 0 then
+        redis.call('EXPIRE', key, math.ceil(capacity / refill) + 60)
+    end
+end
+return {1, 0, '0'}
+"""
+
+
+class RateLimit(NamedTuple):
+    """令牌桶参数"""
+    capacity: float  # 桶容量（允许的突发次数）
+    refill_per_second: float  # 每秒补充的令牌数（0 表示不补充）
+
+
+class RateDecision(NamedTuple):
+    """限流判定结果"""
+    allowed: bool
+    key: Optional[str] = None  # 令牌不足的桶
+    retry_after: Optional[float] = None  # 预计可重试的秒数（不补充令牌的桶为空）
+
+
+def daily_limit(max_per_day: float) -> RateLimit:
+    """每天最多 max_per_day 次（一天的额度可突发使用，按时间匀速补充）"""
+    return RateLimit(float(max_per_day), float(max_per_day) / SECONDS_PER_DAY)
+
+
+def frequency_limit(frequency: Optional[str], max_per_period: float) -> Optional[RateLimit]:
+    """按场景申报的传输频率换算限流：每个申报周期最多 max_per_period 次（实时或未申报时不限）"""
+    if frequency not in FREQUENCY_PERIOD_DAYS:
+        return None
+    days = FREQUENCY_PERIOD_DAYS[frequency]
+    if days is None:
+        return RateLimit(float(max_per_period), 0.0)
+    return RateLimit(float(max_per_period), float(max_per_period) / (days * SECONDS_PER_DAY))
+
+
+def _retry_after(tokens: float, cost: float, limit: RateLimit) -> Optional[float]:
+    """令牌补足所需秒数"""
+    if limit.refill_per_second <= 0:
+        return None
+    return (cost - tokens) / limit.refill_per_second
+
+
+class LocalRateLimiter:
+    """本进程内存令牌桶（每个工作进程各自计数，判定为一次加锁的字典操作）"""
+    
+    def __init__(self, max_buckets: int = MAX_LOCAL_BUCKETS):
+        self._lock = threading.Lock()
+        self._max_buckets = max_buckets
+        # 键 -> [令牌数, 更新时间, 容量, 每秒补充数]
+        self._buckets: Dict[str, List[float]] = {}
+    
+    def acquire(self, limits: Dict[str, RateLimit], cost: float = 1.0) -> RateDecision:
+        """所有令牌桶都足够时一起扣减，否则都不扣减"""
+        return self._evaluate(limits, cost, deduct=True)
+    
+    def peek(self, limits: Dict[str, RateLimit], cost: float = 1.0) -> RateDecision:
+        """判定令牌是否足够，不扣减"""
+        return self._evaluate(limits, cost, deduct=False)
+    
+    def _evaluate(self, limits: Dict[str, RateLimit], cost: float, deduct: bool) -> RateDecision:
+        """按当前令牌数判定，deduct 为真且全部足够时一起扣减"""
+        now = time.monotonic()
+        with self._lock:
+            levels = {}
+            for key, limit in limits.items():
+                bucket = self._buckets.get(key)
+                tokens = limit.capacity if bucket is None else min(
+                    limit.capacity, bucket[0] + (now - bucket[1]) * limit.refill_per_second
+                )
+                if tokens < cost:
+                    return RateDecision(False, key, _retry_after(tokens, cost, limit))
+                levels[key] = tokens
+            if not deduct:
+                return RateDecision(True)
+            for key, tokens in levels.items():
+                limit = limits[key]
+                self._buckets[key] = [tokens - cost, now, limit.capacity, limit.refill_per_second]
+            if len(self._buckets) > self._max_buckets:
+                self._prune(now)
+        return RateDecision(True)
+    
+    def _prune(self, now: float):
+        """清理已回满的令牌桶"""
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items()
+            if bucket[0] + (now - bucket[1]) * bucket[3] < bucket[2]
+        }
+
+
+class RedisRateLimiter:
+    """Redis 共享令牌桶（Lua 脚本原子判定，多个工作进程共用计数）"""
+    
+    def __init__(self, client, prefix: str):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(REDIS_ACQUIRE_SCRIPT)
+    
+    def acquire(self, limits: Dict[str, RateLimit], cost: float = 1.0) -> RateDecision:
+        """所有令牌桶都足够时一起扣减，否则都不扣减"""
+        return self._evaluate(limits, cost, deduct=True)
+    
+    def peek(self, limits: Dict[str, RateLimit], cost: float = 1.0) -> RateDecision:
+        """判定令牌是否足够，不扣减"""
+        return self._evaluate(limits, cost, deduct=False)
+    
+    def _evaluate(self, limits: Dict[str, RateLimit], cost: float, deduct: bool) -> RateDecision:
+        """执行 Lua 脚本判定（deduct 为真时同时扣减）"""
+        keys = list(limits)
+        args: List[float] = [cost, 1 if deduct else 0]
+        for key in keys:
+            args.extend([limits[key].capacity, limits[key].refill_per_second])
+        allowed, index, tokens = self._script(keys=[self.prefix + key for key in keys], args=args)
+        if allowed:
+            return RateDecision(True)
+        key = keys[int(index) - 1]
+        return RateDecision(False, key, _retry_after(float(tokens), cost, limits[key]))
+
+
+class TransferRateLimiter:
+    """传输限流入口：按配置使用本进程内存或 Redis 共享模式，Redis 不可用期间退回内存模式"""
+    
+    def __init__(self):
+        self.local = LocalRateLimiter()
+        self._lock = threading.Lock()
+        self._redis: Optional[RedisRateLimiter] = None
+        self._redis_retry_at = 0.0
+    
+    def _shared(self) -> Optional[RedisRateLimiter]:
+        """获取 Redis 共享限流器（未启用或暂不可用时为空）"""
+        if settings.RATE_LIMIT_BACKEND != "redis" or time.monotonic() < self._redis_retry_at:
+            return None
+        with self._lock:
+            if self._redis is None:
+                try:
+                    import redis
+                    client = redis.Redis(
+                        host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB,
+                        socket_timeout=settings.RATE_LIMIT_REDIS_TIMEOUT,
+                        socket_connect_timeout=settings.RATE_LIMIT_REDIS_TIMEOUT
+                    )
+                    self._redis = RedisRateLimiter(client, settings.RATE_LIMIT_REDIS_PREFIX)
+                except ImportError:
+                    logger.warning("未安装 redis，传输限流使用本进程内存模式")
+                    self._redis_retry_at = math.inf
+                    return None
+            return self._redis
+    
+    def acquire(self, limits: Dict[str, RateLimit], cost: float = 1.0) -> RateDecision:
+        """判定并扣减令牌"""
+        return self._evaluate(limits, cost, deduct=True)
+    
+    def peek(self, limits: Dict[str, RateLimit], cost: float = 1.0) -> RateDecision:
+        """只判定不扣减（用于只读检查）"""
+        return self._evaluate(limits, cost, deduct=False)
+    
+    def _evaluate(self, limits: Dict[str, RateLimit], cost: float, deduct: bool) -> RateDecision:
+        """优先使用 Redis 共享模式判定，不可用时退回本进程内存模式"""
+        shared = self._shared()
+        if shared is not None:
+            try:
+                return (shared.acquire if deduct else shared.peek)(limits, cost)
+            except Exception as e:
+                logger.warning(
+                    "Redis 限流不可用，%s 秒内使用本进程内存模式: %s", settings.RATE_LIMIT_REDIS_RETRY_SECONDS, e
+                )
+                self._redis_retry_at = time.monotonic() + settings.RATE_LIMIT_REDIS_RETRY_SECONDS
+        return (self.local.acquire if deduct else self.local.peek)(limits, cost)
+
+
+transfer_rate_limiter = TransferRateLimiter()
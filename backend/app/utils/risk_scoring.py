@@ -0,0 +1,237 @@
+"""
+风险评分向量化计算引擎
+作者：张彦龙
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import Float, cast
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
+import numpy as np
+from app.models.risk import RiskAssessment, RiskLevel, AssessmentStatus
+
+# 参与加权的维度评分（与权重配置的键一一对应）
+SCORE_DIMENSIONS: Tuple[str, ...] = ("legal_environment", "data_volume", "security_measures", "data_sensitivity")
+
+# 默认权重
+DEFAULT_WEIGHTS: Dict[str, float] = {
+    "legal_environment": 0.3,
+    "data_volume": 0.25,
+    "security_measures": 0.25,
+    "data_sensitivity": 0.2,
+}
+
+# 低于中风险阈值时，综合评分不低于此值为高风险，否则为极高风险
+HIGH_RISK_FLOOR = 40
+
+# 风险等级编码（-1 表示未评定）
+LEVELS: List[RiskLevel] = [RiskLevel.LOW, RiskLevel.MEDIUM, RiskLevel.HIGH, RiskLevel.CRITICAL]
+LEVEL_CODE: Dict[RiskLevel, int] = {level: code for code, level in enumerate(LEVELS)}
+NO_LEVEL = -1
+
+# 阈值标记编码（-1 表示未判定）
+FLAG_UNSET = -1
+
+# 变更后需要重算风险评估的配置项
+RISK_RESCORE_CONFIG_KEYS = (
+    "threshold.risk_score.high",
+    "threshold.risk_score.medium",
+    "threshold.risk_score.weights",
+    "threshold.personal_info.max",
+    "threshold.sensitive_info.max",
+)
+
+
+class RiskParams(NamedTuple):
+    """风险评分参数（权重与阈值）"""
+    weights: Tuple[float, ...]  # 按 SCORE_DIMENSIONS 顺序
+    high_threshold: float
+    medium_threshold: float
+    personal_max: float
+    sensitive_max: float
+
+
+class ScoreColumns(NamedTuple):
+    """风险评估的列式数据（一行一个评估）"""
+    ids: np.ndarray  # int64
+    scenario_ids: np.ndarray  # int64
+    scores: np.ndarray  # float64 (n, 4)，缺失为 NaN
+    personal: np.ndarray  # float64，缺失为 NaN
+    sensitive: np.ndarray  # float64，缺失为 NaN
+    overall: np.ndarray  # float64，缺失为 NaN
+    level: np.ndarray  # int8，未评定为 NO_LEVEL
+    exceeds_personal: np.ndarray  # int8，未判定为 FLAG_UNSET
+    exceeds_sensitive: np.ndarray  # int8，未判定为 FLAG_UNSET
+    regulatory: np.ndarray  # bool
+
+
+class ScoreResult(NamedTuple):
+    """向量化评分结果"""
+    overall: np.ndarray
+    level: np.ndarray
+    exceeds_personal: np.ndarray
+    exceeds_sensitive: np.ndarray
+    regulatory: np.ndarray
+
+
+def load_params(config_helper, **overrides) -> RiskParams:
+    """读取风险评分参数（config_helper 为 ConfigHelper），overrides 可覆盖任意参数用于模拟"""
+    weights = overrides.pop("weights", None) or config_helper.get_risk_score_weights()
+    params = RiskParams(
+        weights=tuple(float(weights.get(name, DEFAULT_WEIGHTS[name])) for name in SCORE_DIMENSIONS),
+        high_threshold=float(config_helper.get_risk_score_high_threshold()),
+        medium_threshold=float(config_helper.get_risk_score_medium_threshold()),
+        personal_max=float(config_helper.get_personal_info_max_threshold()),
+        sensitive_max=float(config_helper.get_sensitive_info_max_threshold())
+    )
+    return params._replace(**{k: float(v) for k, v in overrides.items() if v is not None})
+
+
+def _floats(values: List[Optional[float]]) -> np.ndarray:
+    """可空数值列转换为 float64 数组（空值为 NaN）"""
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def _flags(values: List[Optional[bool]]) -> np.ndarray:
+    """可空布尔列转换为 int8 数组（空值为 FLAG_UNSET）"""
+    return np.array([FLAG_UNSET if v is None else int(v) for v in values], dtype=np.int8)
+
+
+def build_columns(rows: List[tuple]) -> ScoreColumns:
+    """由查询结果行构造列式数据（行结构见 COLUMN_QUERY）"""
+    if not rows:
+        empty = np.empty(0, dtype=np.float64)
+        return ScoreColumns(
+            np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty((0, 4)), empty, empty, empty,
+            np.empty(0, dtype=np.int8), np.empty(0, dtype=np.int8), np.empty(0, dtype=np.int8), np.empty(0, dtype=bool)
+        )
+    columns = list(zip(*rows))
+    return ScoreColumns(
+        ids=np.array(columns[0], dtype=np.int64),
+        scenario_ids=np.array(columns[1], dtype=np.int64),
+        scores=np.column_stack([_floats(columns[i]) for i in range(2, 6)]),
+        personal=_floats(columns[6]),
+        sensitive=_floats(columns[7]),
+        overall=_floats(columns[8]),
+        level=np.array([NO_LEVEL if v is None else LEVEL_CODE[v] for v in columns[9]], dtype=np.int8),
+        exceeds_personal=_flags(columns[10]),
+        exceeds_sensitive=_flags(columns[11]),
+        regulatory=np.array([bool(v) for v in columns[12]], dtype=bool)
+    )
+
+
+# 列式加载的查询列（数值列在数据库端转为浮点，避免逐个构造 Decimal）
+COLUMN_QUERY = (
+    RiskAssessment.id,
+    RiskAssessment.scenario_id,
+    cast(RiskAssessment.legal_environment_score, Float),
+    cast(RiskAssessment.data_volume_score, Float),
+    cast(RiskAssessment.security_measures_score, Float),
+    cast(RiskAssessment.data_sensitivity_score, Float),
+    cast(RiskAssessment.personal_info_count, Float),
+    cast(RiskAssessment.sensitive_info_count, Float),
+    cast(RiskAssessment.overall_score, Float),
+    RiskAssessment.overall_risk_level,
+    RiskAssessment.exceeds_personal_threshold,
+    RiskAssessment.exceeds_sensitive_threshold,
+    RiskAssessment.requires_regulatory_approval,
+)
+
+
+def load_columns(db: Session, min_id: int = 0) -> ScoreColumns:
+    """加载已完成评估的列式数据（min_id 用于增量加载）"""
+    rows = db.query(*COLUMN_QUERY).filter(
+        RiskAssessment.status == AssessmentStatus.COMPLETED,
+        RiskAssessment.id > min_id
+    ).order_by(RiskAssessment.id).all()
+    return build_columns(rows)
+
+
+def score(columns: ScoreColumns, params: RiskParams) -> ScoreResult:
+    """向量化计算综合评分、风险等级、阈值标记和是否需要监管审批（与单条计算规则一致）"""
+    scores = columns.scores
+    # 单条计算中评分为空或为0的维度不参与加权
+    present = ~np.isnan(scores) & (scores != 0)
+    weights = np.where(present, np.asarray(params.weights, dtype=np.float64), 0.0)
+    total_weight = weights.sum(axis=1)
+    weighted = (np.where(present, scores, 0.0) * weights).sum(axis=1)
+    has_scores = present.any(axis=1)
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        computed = np.where(total_weight > 0, weighted / total_weight, 0.0)
+    overall = np.where(has_scores, computed, columns.overall)
+    
+    level = np.select(
+        [computed >= params.high_threshold, computed >= params.medium_threshold, computed >= HIGH_RISK_FLOOR],
+        [LEVEL_CODE[RiskLevel.LOW], LEVEL_CODE[RiskLevel.MEDIUM], LEVEL_CODE[RiskLevel.HIGH]],
+        LEVEL_CODE[RiskLevel.CRITICAL]
+    ).astype(np.int8)
+    level = np.where(has_scores, level, columns.level).astype(np.int8)
+    
+    # 数量为空或为0时保留原标记
+    exceeds_personal = _threshold_flags(columns.personal, params.personal_max, columns.exceeds_personal)
+    exceeds_sensitive = _threshold_flags(columns.sensitive, params.sensitive_max, columns.exceeds_sensitive)
+    
+    regulatory = (
+        (exceeds_personal == 1) | (exceeds_sensitive == 1)
+        | (level == LEVEL_CODE[RiskLevel.HIGH]) | (level == LEVEL_CODE[RiskLevel.CRITICAL])
+    )
+    return ScoreResult(overall, level, exceeds_personal, exceeds_sensitive, regulatory)
+
+
+def _threshold_flags(counts: np.ndarray, threshold: float, current: np.ndarray) -> np.ndarray:
+    """数量达到阈值的标记（数量为空或为0时保留原标记）"""
+    counted = ~np.isnan(counts) & (counts != 0)
+    return np.where(counted, (np.nan_to_num(counts) >= threshold).astype(np.int8), current).astype(np.int8)
+
+
+def to_cents(values: np.ndarray) -> np.ndarray:
+    """综合评分按两位小数四舍五入（与 Numeric(5,2) 存储一致，避免二进制浮点的半数误差）"""
+    return np.floor(values * 100 + 0.5 + 1e-6)
+
+
+def diff(columns: ScoreColumns, result: ScoreResult) -> Dict[str, np.ndarray]:
+    """比较新旧结果，返回各字段变化的行掩码及任一字段变化的掩码"""
+    old_overall = to_cents(columns.overall)
+    new_overall = to_cents(result.overall)
+    overall_changed = ~((old_overall == new_overall) | (np.isnan(old_overall) & np.isnan(new_overall)))
+    changes = {
+        "overall_score": overall_changed,
+        "overall_risk_level": columns.level != result.level,
+        "exceeds_personal_threshold": columns.exceeds_personal != result.exceeds_personal,
+        "exceeds_sensitive_threshold": columns.exceeds_sensitive != result.exceeds_sensitive,
+        "requires_regulatory_approval": columns.regulatory != result.regulatory,
+    }
+    changes["any"] = np.logical_or.reduce(list(changes.values())) if len(columns.ids) else np.zeros(0, dtype=bool)
+    return changes
+
+
+def summarize(columns: ScoreColumns, result: ScoreResult, sample_size: int = 20) -> Dict[str, Any]:
+    """汇总变化：各字段变化条数、风险等级迁移分布、监管审批翻转数及样例ID"""
+    changes = diff(columns, result)
+    level_names = {code: level.value for level, code in LEVEL_CODE.items()}
+    level_names[NO_LEVEL] = "未评定"
+    
+    transitions: Dict[str, int] = {}
+    moved = changes["overall_risk_level"]
+    if moved.any():
+        pairs, counts = np.unique(
+            np.stack([columns.level[moved], result.level[moved]], axis=1), axis=0, return_counts=True
+        )
+        for (before, after), count in zip(pairs.tolist(), counts.tolist()):
+            transitions[f"{level_names[before]}→{level_names[after]}"] = count
+    
+    to_regulatory = ~columns.regulatory & result.regulatory
+    from_regulatory = columns.regulatory & ~result.regulatory
+    return {
+        "total": int(len(columns.ids)),
+        "changed": int(changes["any"].sum()),
+        "field_changes": {name: int(mask.sum()) for name, mask in changes.items() if name != "any"},
+        "level_transitions": transitions,
+        "level_distribution": {
+            level_names[code]: int((result.level == code).sum()) for code in [*LEVEL_CODE.values(), NO_LEVEL]
+        },
+        "regulatory_added": int(to_regulatory.sum()),
+        "regulatory_removed": int(from_regulatory.sum()),
+        "sample_changed_ids": columns.ids[changes["any"]][:sample_size].tolist(),
+        "sample_regulatory_added_ids": columns.ids[to_regulatory][:sample_size].tolist(),
+        "sample_regulatory_removed_ids": columns.ids[from_regulatory][:sample_size].tolist(),
+    }
@@ -0,0 +1,119 @@
+"""
+风险评估列式快照
+作者：张彦龙
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func, or_
+from typing import Optional
+from datetime import datetime, timedelta
+import logging
+import threading
+import time
+import numpy as np
+from app.core.config import settings
+from app.models.risk import RiskAssessment, AssessmentStatus
+from app.utils.risk_scoring import COLUMN_QUERY, ScoreColumns, build_columns
+
+logger = logging.getLogger(__name__)
+
+# 增量刷新时的时间回看量（容忍更新时间戳早于上次刷新、提交晚于上次刷新的行）
+REFRESH_LOOKBACK = timedelta(seconds=5)
+
+
+def _take(columns: ScoreColumns, index: np.ndarray) -> ScoreColumns:
+    """按下标选取行"""
+    return ScoreColumns(*(array[index] for array in columns))
+
+
+def _concat(left: ScoreColumns, right: ScoreColumns) -> ScoreColumns:
+    """按行拼接"""
+    return ScoreColumns(*(np.concatenate([a, b]) for a, b in zip(left, right)))
+
+
+class RiskSnapshot:
+    """已完成风险评估的内存列式快照（按更新时间增量刷新，定期全量重载以同步删除）"""
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.loaded_at: Optional[float] = None
+        self._columns: Optional[ScoreColumns] = None
+        self._watermark: Optional[datetime] = None
+        self._max_id = 0
+    
+    def _query(self, db: Session):
+        """快照查询：评分列、状态及变更时间"""
+        return db.query(
+            *COLUMN_QUERY, RiskAssessment.status,
+            func.coalesce(RiskAssessment.updated_at, RiskAssessment.created_at)
+        )
+    
+    @staticmethod
+    def _split(rows):
+        """拆分查询结果为评分列行和状态"""
+        return [row[:-2] for row in rows], [row[-2] for row in rows]
+    
+    @staticmethod
+    def _db_now(db: Session) -> datetime:
+        """数据库当前时间（水位取数据库时钟，避免应用服务器时钟偏差）"""
+        return db.query(func.now()).scalar()
+    
+    def load(self, db: Session):
+        """全量加载"""
+        started = time.monotonic()
+        watermark = self._db_now(db)
+        rows, _ = self._split(self._query(db).filter(
+            RiskAssessment.status == AssessmentStatus.COMPLETED
+        ).order_by(RiskAssessment.id).all())
+        columns = build_columns(rows)
+        with self._lock:
+            self._columns = columns
+            self._watermark = watermark
+            self._max_id = int(columns.ids[-1]) if len(columns.ids) else 0
+            self.loaded_at = time.monotonic()
+        logger.info("风险评估快照已加载：%s 条，耗时 %.3f 秒", len(columns.ids), time.monotonic() - started)
+    
+    def refresh(self, db: Session):
+        """增量刷新：上次刷新以来新增或变更的评估覆盖写入，不再是已完成状态的移出快照"""
+        with self._lock:
+            watermark, max_id = self._watermark, self._max_id
+        next_watermark = self._db_now(db)
+        rows, statuses = self._split(self._query(db).filter(or_(
+            RiskAssessment.id > max_id,
+            func.coalesce(RiskAssessment.updated_at, RiskAssessment.created_at) >= watermark - REFRESH_LOOKBACK
+        )).order_by(RiskAssessment.id).all())
+        with self._lock:
+            self._watermark = next_watermark
+        if not rows:
+            return
+        changed = build_columns(rows)
+        completed = np.array([status == AssessmentStatus.COMPLETED for status in statuses], dtype=bool)
+        
+        with self._lock:
+            base = self._columns
+            # 先移除所有变更行的旧版本，再追加仍为已完成状态的新版本，最后按ID排序
+            keep = ~np.isin(base.ids, changed.ids)
+            merged = _concat(_take(base, np.flatnonzero(keep)), _take(changed, np.flatnonzero(completed)))
+            self._columns = _take(merged, np.argsort(merged.ids, kind="stable"))
+            self._max_id = max(self._max_id, int(changed.ids.max()))
+    
+    def get(self, db: Session) -> ScoreColumns:
+        """获取最新快照（未加载或超过全量重载间隔时全量加载，否则增量刷新）"""
+        with self._lock:
+            expired = (
+                self.loaded_at is None
+                or time.monotonic() - self.loaded_at > settings.RISK_SNAPSHOT_RELOAD_SECONDS
+            )
+        if expired:
+            self.load(db)
+        else:
+            self.refresh(db)
+        with self._lock:
+            return self._columns
+    
+    def invalidate(self):
+        """标记需要全量重载"""
+        with self._lock:
+            self.loaded_at = None
+
+
+risk_snapshot = RiskSnapshot()
@@ -0,0 +1,116 @@
+"""
+定时扫描调度器
+作者：张彦龙
+"""
+from typing import Optional
+from datetime import datetime, timezone
+import asyncio
+import logging
+import random
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.scan_service import ScanService, JOB_TRIGGER_SCHEDULED, scan_lock
+from app.utils.config_helper import ConfigHelper
+
+logger = logging.getLogger(__name__)
+
+
+def _seconds_since(moment: datetime) -> float:
+    """距某一时刻已过去的秒数（兼容带时区与不带时区的时间）"""
+    if moment.tzinfo is None:
+        return (datetime.now() - moment).total_seconds()
+    return (datetime.now(timezone.utc) - moment).total_seconds()
+
+
+def seconds_until_due(started_at: Optional[datetime] = None) -> Optional[float]:
+    """距下一次定时扫描的秒数（小于等于0表示已到期，扫描间隔未配置时返回None）
+    
+    从未执行过定时扫描时从调度启动时刻起算一个间隔，避免应用启动即对全部数据源全量扫描。
+    """
+    db = SessionLocal()
+    try:
+        interval_hours = ConfigHelper(db).get_data_scan_interval()
+        if not interval_hours or float(interval_hours) <= 0:
+            return None
+        last_time = ScanService(db).last_scheduled_time() or started_at
+        if last_time is None:
+            return 0
+        return float(interval_hours) * 3600 - _seconds_since(last_time)
+    finally:
+        db.close()
+
+
+def run_scheduled_scan(started_at: Optional[datetime] = None) -> Optional[int]:
+    """在单飞锁内复核是否到期并执行一次定时扫描，返回任务ID（未执行返回None）"""
+    with scan_lock() as acquired:
+        if not acquired:
+            logger.info("其他实例正在扫描，本次定时扫描跳过")
+            return None
+        # 持锁后再次确认，避免多个实例先后拿到锁重复扫描
+        remaining = seconds_until_due(started_at)
+        if remaining is None or remaining > 0:
+            return None
+        db = SessionLocal()
+        try:
+            job = ScanService(db).create_job(trigger_type=JOB_TRIGGER_SCHEDULED, submit=False)
+            job_id = job.id
+        finally:
+            db.close()
+        logger.info("定时扫描任务 %s 开始执行", job_id)
+        ScanService.run_job(job_id, lock_held=True)
+        return job_id
+
+
+class ScanScheduler:
+    """进程内定时扫描调度器（按 system.data_scan.interval 触发，到期后随机延迟以错开多实例）"""
+    
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._started_at: Optional[datetime] = None
+    
+    @staticmethod
+    def _jitter() -> float:
+        """随机延迟秒数"""
+        return random.uniform(0, max(settings.SCAN_SCHEDULE_JITTER_SECONDS, 0))
+    
+    async def _run(self):
+        """调度主循环：轮询是否到期，扫描在线程中执行，不占用事件循环"""
+        poll = max(settings.SCAN_SCHEDULER_POLL_SECONDS, 1)
+        jitter = self._jitter()
+        while True:
+            try:
+                remaining = await asyncio.to_thread(seconds_until_due, self._started_at)
+                if remaining is not None and remaining + jitter <= 0:
+                    job_id = await asyncio.to_thread(run_scheduled_scan, self._started_at)
+                    if job_id is not None:
+                        jitter = self._jitter()
+                        continue
+                    # 其他扫描持有单飞锁（如耗时较长的手动扫描）时按轮询间隔重试，避免反复抢锁
+                    delay = poll
+                else:
+                    delay = poll if remaining is None else min(poll, max(remaining + jitter, 1))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("定时扫描调度异常")
+                delay = poll
+            await asyncio.sleep(delay)
+    
+    def start(self):
+        """启动调度（需在事件循环中调用）"""
+        if self._task is None or self._task.done():
+            self._started_at = datetime.now()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        """停止调度"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+scan_scheduler = ScanScheduler()
@@ -0,0 +1,53 @@
+"""
+检索分词工具
+作者：张彦龙
+"""
+from typing import List, Optional
+import re
+
+# 英文/数字词与连续中文片段
+_TOKEN_RE = re.compile(r"[A-Za-z0-9]+|[\u4e00-\u9fff]+")
+
+
+def _is_cjk(token: str) -> bool:
+    """是否为中文片段"""
+    return "\u4e00" <= token[0] <= "\u9fff"
+
+
+def tokenize(text: Optional[str], unigrams: bool = True) -> List[str]:
+    """分词：英文按非字母数字切分并转小写（CUST_ID -> cust, id），中文切为二元组（可附带单字）"""
+    tokens: List[str] = []
+    seen = set()
+    for match in _TOKEN_RE.finditer(text or ""):
+        piece = match.group().lower()
+        if _is_cjk(piece):
+            parts = [piece[i:i + 2] for i in range(len(piece) - 1)] or [piece]
+            if unigrams and len(piece) > 1:
+                parts.extend(piece)
+        else:
+            parts = [piece]
+        for part in parts:
+            if part not in seen:
+                seen.add(part)
+                tokens.append(part)
+    return tokens
+
+
+def build_search_text(*fields: Optional[str]) -> str:
+    """生成写入 search_text 列的分词文本（空格分隔，供 to_tsvector('simple', ...) 建索引）"""
+    tokens: List[str] = []
+    seen = set()
+    for field in fields:
+        for token in tokenize(field):
+            if token not in seen:
+                seen.add(token)
+                tokens.append(token)
+    return " ".join(tokens)
+
+
+def build_tsquery(term: str) -> Optional[str]:
+    """将用户输入转换为 to_tsquery('simple', ...) 表达式：各词 AND 组合并支持前缀匹配"""
+    tokens = tokenize(term, unigrams=False)
+    if not tokens:
+        return None
+    return " & ".join(f"{token}:*" for token in tokens)
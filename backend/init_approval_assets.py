@@ -0,0 +1,21 @@
+"""
+迁移审批涉及资产到关联表
+作者：张彦龙
+"""
+from app.core.database import SessionLocal
+from app.services.approval_service import ApprovalService
+
+
+def migrate_approval_assets():
+    """将审批表中的 data_assets JSON 字段导入 approval_asset 表（未使用 Alembic 迁移时执行）"""
+    db = SessionLocal()
+    try:
+        print("正在迁移审批涉及资产...")
+        count = ApprovalService(db).import_legacy_assets()
+        print(f"审批涉及资产迁移完成，共导入 {count} 条关联")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    migrate_approval_assets()
@@ -2,6 +2,7 @@
 数据库初始化脚本
 作者：张彦龙
 """
+from sqlalchemy import text
 from app.core.database import engine, Base
 from app.models import *  # 导入所有模型
 from app.core.config import settings
@@ -9,6 +10,10 @@ from app.core.config import settings
 def init_database():
     """初始化数据库表结构"""
     print("正在创建数据库表...")
+    if engine.dialect.name == "postgresql":
+        # 资产名称/编码的三元组索引依赖 pg_trgm 扩展（升级已有数据库时由 alembic 迁移创建）
+        with engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
     Base.metadata.create_all(bind=engine)
     print("数据库表创建完成！")
     print(f"数据库连接: {settings.DATABASE_URL.split('@')[1] if '@' in settings.DATABASE_URL else 'N/A'}")
@@ -0,0 +1,21 @@
+"""
+迁移旧版血缘关系到血缘边表
+作者：张彦龙
+"""
+from app.core.database import SessionLocal
+from app.services.data_asset_service import DataAssetService
+
+
+def migrate_lineage():
+    """将资产表中的 upstream_assets/downstream_assets JSON 字段导入 asset_lineage 表"""
+    db = SessionLocal()
+    try:
+        print("正在迁移血缘关系...")
+        count = DataAssetService(db).import_legacy_lineage()
+        print(f"血缘关系迁移完成，共导入 {count} 条边")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    migrate_lineage()
@@ -69,6 +69,18 @@ def init_default_configs():
                 "is_public": False,
                 "default_value": "40"
             },
+            {
+                "config_key": "threshold.risk_score.weights",
+                "config_name": "风险评分维度权重",
+                "config_value": '{"legal_environment": 0.3, "data_volume": 0.25, "security_measures": 0.25, "data_sensitivity": 0.2}',
+                "config_type": ConfigType.JSON,
+                "category": ConfigCategory.THRESHOLD,
+                "description": "综合评分按各维度评分加权平均计算，修改后将批量重算已完成的风险评估",
+                "is_encrypted": False,
+                "is_editable": True,
+                "is_public": False,
+                "default_value": '{"legal_environment": 0.3, "data_volume": 0.25, "security_measures": 0.25, "data_sensitivity": 0.2}'
+            },
             {
                 "config_key": "threshold.data_volume.warning",
                 "config_name": "数据传输量预警阈值（GB）",
@@ -0,0 +1,26 @@
+"""
+测试公共夹具
+作者：张彦龙
+"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import app.models  # noqa: F401  注册全部模型
+from app.core.database import Base
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """每个测试独立的 SQLite 数据库"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    """数据库会话"""
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
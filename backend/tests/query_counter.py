@@ -0,0 +1,44 @@
+"""
+SQL语句计数工具（用于发现 N+1 查询）
+作者：张彦龙
+"""
+from contextlib import contextmanager
+from typing import List
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryCounter:
+    """记录代码块内执行的SQL语句"""
+    
+    def __init__(self):
+        self.statements: List[str] = []
+    
+    @property
+    def count(self) -> int:
+        """语句条数"""
+        return len(self.statements)
+    
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(bind: Engine):
+    """统计代码块内在指定引擎上执行的SQL语句条数"""
+    counter = QueryCounter()
+    event.listen(bind, "before_cursor_execute", counter._on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(bind, "before_cursor_execute", counter._on_execute)
+
+
+@contextmanager
+def assert_max_queries(bind: Engine, limit: int):
+    """断言代码块内执行的SQL语句不超过 limit 条（列表接口应与返回行数无关）"""
+    with count_queries(bind) as counter:
+        yield counter
+    if counter.count > limit:
+        statements = "\n".join(counter.statements)
+        raise AssertionError(f"执行了 {counter.count} 条SQL，超过上限 {limit} 条：\n{statements}")
@@ -0,0 +1,60 @@
+"""
+审计异常检测测试
+作者：张彦龙
+"""
+from datetime import datetime, timedelta
+import pytest
+from app.core.config import settings
+from app.models.audit import AuditLog, AuditAction
+from app.services.audit_service import AuditService
+from app.utils.anomaly_detector import AnomalyDetector, anomaly_detector, to_event
+
+# 工作日工作时间，避免命中非工作时间规则
+BASE = datetime(2026, 10, 20, 10)
+
+
+@pytest.fixture(autouse=True)
+def fresh_detector():
+    """每个测试使用空白的实时检测器"""
+    anomaly_detector.install(AnomalyDetector())
+
+
+def _view_rows(user_id, count):
+    return [
+        {"action": AuditAction.VIEW, "user_id": user_id, "created_at": BASE + timedelta(seconds=i)}
+        for i in range(count)
+    ]
+
+
+def test_batch_counts_as_one_operation_and_skips_system_rows(db):
+    count = settings.ANOMALY_USER_MAX_EVENTS + 5
+    service = AuditService(db)
+    service.add_logs(_view_rows(None, count) + _view_rows(1, count))
+    db.commit()
+    
+    assert db.query(AuditLog).filter(AuditLog.is_anomaly == True).count() == 0
+    assert None not in anomaly_detector.detector.users
+    assert anomaly_detector.detector.users[1].window.total == 1
+
+
+def test_rolled_back_events_are_not_counted(db):
+    service = AuditService(db)
+    service.add_logs(_view_rows(1, 1))
+    assert 1 not in anomaly_detector.detector.users
+    db.rollback()
+    assert 1 not in anomaly_detector.detector.users
+    
+    service.add_logs(_view_rows(1, 1))
+    db.commit()
+    assert anomaly_detector.detector.users[1].window.total == 1
+
+
+def test_install_merges_events_recorded_during_replay():
+    anomaly_detector.begin_capture()
+    anomaly_detector.record([to_event(AuditAction.VIEW, 1, None, None, BASE)])
+    replayed = AnomalyDetector()
+    replayed.replay([to_event(AuditAction.VIEW, 2, None, None, BASE - timedelta(minutes=1))])
+    anomaly_detector.install(replayed)
+    
+    assert anomaly_detector.detector is replayed
+    assert set(replayed.users) == {1, 2}
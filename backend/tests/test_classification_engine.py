@@ -0,0 +1,47 @@
+"""
+多模式匹配器测试
+作者：张彦龙
+"""
+from app.models.data_asset import DataLevel
+from app.utils.classification_engine import TagMatcher, MatchRule
+
+
+def _matcher(*rules):
+    """按（规则编码, 数据级别, 规则）构造匹配器"""
+    return TagMatcher(
+        (MatchRule(code=code, data_level=level, tag_id=None), pattern) for code, level, pattern in rules
+    )
+
+
+def test_inline_flag_and_backreference_rules():
+    matcher = _matcher(
+        ("KW", DataLevel.PERSONAL, "CUST"),
+        ("INLINE", DataLevel.SENSITIVE, "(?i)id.no"),
+        ("BACKREF", DataLevel.IMPORTANT, r"(ab)\1")
+    )
+    assert matcher.match("CUST_ID_NO").rule_codes == ["KW", "INLINE"]
+    result = matcher.match("xx_abab")
+    assert result.rule_codes == ["BACKREF"]
+    assert result.data_level == DataLevel.IMPORTANT
+    assert matcher.match("abba").rule_codes == []
+
+
+def test_invalid_rule_is_ignored():
+    matcher = _matcher(("BAD", DataLevel.CORE, "(unclosed"), ("KW", DataLevel.PERSONAL, "CUST"))
+    assert matcher.match("CUST_NM").rule_codes == ["KW"]
+
+
+def test_keyword_and_regex_overlap():
+    matcher = _matcher(("ID_NO", DataLevel.SENSITIVE, "ID_NO"), ("CORE_ID", DataLevel.CORE, "ID_N."))
+    result = matcher.match("CUST_ID_NO")
+    assert result.rule_codes == ["ID_NO", "CORE_ID"]
+    assert result.data_level == DataLevel.CORE
+
+
+def test_overlapping_keywords():
+    matcher = _matcher(
+        ("CUST_ID", DataLevel.PERSONAL, "CUST_ID"),
+        ("ID_NO", DataLevel.SENSITIVE, "ID_NO"),
+        ("ID", DataLevel.INTERNAL, "ID")
+    )
+    assert matcher.match("cust_id_no").rule_codes == ["CUST_ID", "ID_NO", "ID"]
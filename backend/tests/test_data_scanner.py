@@ -0,0 +1,26 @@
+"""
+数据资产扫描器测试
+作者：张彦龙
+"""
+from app.models.data_asset import DataAsset, DataLevel
+from app.utils.data_scanner import DataScanner
+
+
+def test_existing_keys_scoped_to_source_system(db, engine):
+    # 本地数据库与已登记的远程数据源存在同名 Schema.表
+    db.add_all([
+        DataAsset(
+            asset_name="public.customer", asset_code="PUBLIC_CUSTOMER", data_level=DataLevel.INTERNAL,
+            source_system="未知", schema_name="public", table_name="customer", schema_fingerprint="1:local"
+        ),
+        DataAsset(
+            asset_name="public.customer", asset_code="CRM_PUBLIC_CUSTOMER", data_level=DataLevel.SENSITIVE,
+            source_system="CRM", schema_name="public", table_name="customer", schema_fingerprint="1:remote"
+        )
+    ])
+    db.commit()
+    
+    local = DataScanner(db, engine).load_existing_keys(None)
+    assert local[("public", "customer")].fingerprint == "1:local"
+    remote = DataScanner(db, engine, asset_code_prefix="CRM").load_existing_keys("CRM")
+    assert remote[("public", "customer")].fingerprint == "1:remote"
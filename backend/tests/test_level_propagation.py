@@ -0,0 +1,34 @@
+"""
+数据级别传播测试
+作者：张彦龙
+"""
+from app.models.data_asset import DataAsset, DataLevel, AssetLineage
+from app.utils.level_propagation import LevelPropagator
+
+
+def test_propagation_reads_lineage_table(db):
+    # 边只写入血缘表、未同步进程内血缘图（如其他进程新增的血缘）
+    core = DataAsset(asset_name="core", asset_code="CORE", data_level=DataLevel.CORE)
+    derived = DataAsset(asset_name="derived", asset_code="DERIVED", data_level=DataLevel.INTERNAL)
+    report = DataAsset(asset_name="report", asset_code="REPORT", data_level=DataLevel.PUBLIC)
+    db.add_all([core, derived, report])
+    db.flush()
+    db.add_all([
+        AssetLineage(source_asset_id=core.id, target_asset_id=derived.id),
+        AssetLineage(source_asset_id=derived.id, target_asset_id=report.id)
+    ])
+    db.commit()
+    
+    stats = LevelPropagator(db).propagate([core.id])
+    assert stats["affected_count"] == 3
+    db.expire_all()
+    assert derived.effective_level == DataLevel.CORE
+    assert report.effective_level == DataLevel.CORE
+    
+    # 删除上游边后重算下游，失去核心上游的资产降级
+    db.query(AssetLineage).filter(AssetLineage.source_asset_id == core.id).delete()
+    db.commit()
+    LevelPropagator(db).propagate([derived.id])
+    db.expire_all()
+    assert derived.effective_level == DataLevel.INTERNAL
+    assert report.effective_level == DataLevel.INTERNAL
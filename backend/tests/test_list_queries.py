@@ -0,0 +1,89 @@
+"""
+列表接口SQL语句条数测试（语句条数应与返回行数无关）
+作者：张彦龙
+"""
+import asyncio
+import json
+import pytest
+from fastapi import Response
+from app.api.v1.endpoints import approvals as approvals_endpoint
+from app.api.v1.endpoints import interception as interception_endpoint
+from app.api.v1.endpoints import users as users_endpoint
+from app.models.data_asset import DataAsset, DataLevel
+from app.models.scenario import CrossBorderScenario, TransferApproval, ApprovalAsset, ApprovalStatus
+from app.models.user import User, Role
+from app.utils.query_count import COUNT_NONE
+from tests.query_counter import assert_max_queries
+
+ROW_COUNTS = [3, 30]
+
+
+def _seed_users(db, row_count: int):
+    """创建用户，每个用户两个角色"""
+    roles = [Role(name=f"role-{i}") for i in range(2)]
+    db.add_all(roles)
+    for i in range(row_count):
+        db.add(User(username=f"user-{i}", email=f"user-{i}@example.com", hashed_password="x", roles=roles))
+    db.commit()
+
+
+def _seed_approvals(db, row_count: int):
+    """创建已批准的审批，每个审批各自的场景和两个涉及资产"""
+    applicant = User(username="applicant", email="applicant@example.com", hashed_password="x")
+    db.add(applicant)
+    db.flush()
+    for i in range(row_count):
+        scenario = CrossBorderScenario(
+            scenario_name=f"场景{i}", scenario_code=f"S{i}", recipient_name="境外接收方",
+            recipient_country="SG", data_purpose="测试", created_by=applicant.id
+        )
+        assets = [
+            DataAsset(asset_name=f"资产{i}-{j}", asset_code=f"A{i}-{j}", data_level=DataLevel.INTERNAL)
+            for j in range(2)
+        ]
+        db.add(scenario)
+        db.add_all(assets)
+        db.flush()
+        approval = TransferApproval(
+            scenario_id=scenario.id, applicant_id=applicant.id, approval_status=ApprovalStatus.APPROVED,
+            data_assets=json.dumps([asset.id for asset in assets])
+        )
+        db.add(approval)
+        db.flush()
+        db.add_all(ApprovalAsset(approval_id=approval.id, asset_id=asset.id) for asset in assets)
+    db.commit()
+
+
+@pytest.mark.parametrize("row_count", ROW_COUNTS)
+def test_whitelist_query_count(engine, db, row_count):
+    _seed_approvals(db, row_count)
+    # 白名单ID、系统配置、审批联表场景、涉及资产各一条
+    with assert_max_queries(engine, 4):
+        entries = asyncio.run(interception_endpoint.get_whitelist(db=db))
+    assert len(entries) == row_count
+    assert all(entry.scenario_name and len(entry.asset_ids) == 2 for entry in entries)
+
+
+@pytest.mark.parametrize("row_count", ROW_COUNTS)
+def test_user_list_query_count(engine, db, row_count):
+    _seed_users(db, row_count)
+    # 用户、角色各一条
+    with assert_max_queries(engine, 2):
+        users = asyncio.run(users_endpoint.list_users(
+            response=Response(), skip=0, limit=100, count=COUNT_NONE, db=db
+        ))
+    assert len(users) == row_count
+    assert all(len(user.roles) == 2 for user in users)
+
+
+@pytest.mark.parametrize("row_count", ROW_COUNTS)
+def test_approval_list_query_count(engine, db, row_count):
+    _seed_approvals(db, row_count)
+    # 白名单ID、系统配置、审批、涉及资产各一条
+    with assert_max_queries(engine, 4):
+        approvals = asyncio.run(approvals_endpoint.list_approvals(
+            response=Response(), skip=0, limit=100, scenario_id=None, status=None,
+            asset_id=None, count=COUNT_NONE, db=db
+        ))
+    assert len(approvals) == row_count
+    assert all(len(approval.data_assets) == 2 for approval in approvals)
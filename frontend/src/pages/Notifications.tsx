@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react'
+import React, { useState, useEffect, useRef } from 'react'
 import {
   List,
   Card,
@@ -50,6 +50,25 @@ interface NotificationStats {
   by_type: Record<string, number>
 }
 
+type StatsDelta = NotificationStats
+
+// 按推送的统计增量更新统计
+const applyDelta = (stats: NotificationStats | null, delta: StatsDelta): NotificationStats | null => {
+  if (!stats) {
+    return stats
+  }
+  const byType = { ...stats.by_type }
+  Object.entries(delta.by_type || {}).forEach(([type, count]) => {
+    byType[type] = (byType[type] || 0) + count
+  })
+  return {
+    total: stats.total + delta.total,
+    unread: stats.unread + delta.unread,
+    read: stats.read + delta.read,
+    by_type: byType
+  }
+}
+
 const Notifications: React.FC = () => {
   const [notifications, setNotifications] = useState<Notification[]>([])
   const [stats, setStats] = useState<NotificationStats | null>(null)
@@ -58,11 +77,49 @@ const Notifications: React.FC = () => {
   const [typeFilter, setTypeFilter] = useState<string>('all')
   const navigate = useNavigate()
 
+  const filtersRef = useRef({ filter, typeFilter })
+  filtersRef.current = { filter, typeFilter }
+
   useEffect(() => {
     loadData()
-    loadStats()
   }, [filter, typeFilter])
 
+  useEffect(() => {
+    loadStats()
+
+    // 订阅实时推送：连接（含断线重连）后推送统计快照，之后推送新通知和统计增量，无需轮询
+    const source = notificationsApi.stream()
+    const parse = (event: Event) => JSON.parse((event as MessageEvent).data)
+    source.addEventListener('stats', (event) => setStats(parse(event)))
+    source.addEventListener('resync', (event) => {
+      setStats(parse(event))
+      loadData()
+    })
+    source.addEventListener('notification', (event) => {
+      const data = parse(event)
+      const notification: Notification = data.notification
+      const { filter: currentFilter, typeFilter: currentType } = filtersRef.current
+      setStats((prev) => applyDelta(prev, data.delta))
+      if (currentFilter !== 'read' && (currentType === 'all' || currentType === notification.type)) {
+        setNotifications((prev) => [notification, ...prev])
+      }
+    })
+    source.addEventListener('read', (event) => {
+      const data = parse(event)
+      const ids: number[] | null = data.ids
+      setStats((prev) => applyDelta(prev, data.delta))
+      setNotifications((prev) => prev.map((item) =>
+        ids === null || ids.includes(item.id) ? { ...item, is_read: true, status: '已读' } : item
+      ))
+    })
+    source.addEventListener('deleted', (event) => {
+      const data = parse(event)
+      setStats((prev) => applyDelta(prev, data.delta))
+      setNotifications((prev) => prev.filter((item) => item.id !== data.id))
+    })
+    return () => source.close()
+  }, [])
+
   const loadData = async () => {
     setLoading(true)
     try {
@@ -110,7 +167,6 @@ const Notifications: React.FC = () => {
       await notificationsApi.markAsRead(id)
       message.success('已标记为已读')
       loadData()
-      loadStats()
     } catch (error: any) {
       message.error('操作失败: ' + (error.message || '未知错误'))
     }
@@ -121,7 +177,6 @@ const Notifications: React.FC = () => {
       const result: any = await notificationsApi.markAllAsRead()
       message.success(result.message || '已全部标记为已读')
       loadData()
-      loadStats()
     } catch (error: any) {
       message.error('操作失败: ' + (error.message || '未知错误'))
     }
@@ -132,7 +187,6 @@ const Notifications: React.FC = () => {
       await notificationsApi.delete(id)
       message.success('已删除')
       loadData()
-      loadStats()
     } catch (error: any) {
       message.error('删除失败: ' + (error.message || '未知错误'))
     }
@@ -166,7 +166,11 @@ export const notificationsApi = {
   markAsRead: (id: number) => api.put(`/notifications/${id}/read`),
   markAllAsRead: () => api.put('/notifications/read-all'),
   delete: (id: number) => api.delete(`/notifications/${id}`),
-  create: (data: any) => api.post('/notifications', data)
+  create: (data: any) => api.post('/notifications', data),
+  // 实时推送（Server-Sent Events）；EventSource 无法设置请求头，令牌通过查询参数传递
+  stream: () => new EventSource(
+    `/api/v1/notifications/stream?token=${encodeURIComponent(localStorage.getItem('token') || '')}`
+  )
 }
 
 export const systemConfigApi = {